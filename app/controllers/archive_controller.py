@@ -0,0 +1,172 @@
+from app.database.db_config import get_db
+from app.models.models import (Order, OrderItem, OrderArchive, OrderItemArchive, OrderHistory,
+                               OrderItemHistory, DailySalesSummary, SyncWatermark)
+from app.models.status import OrderStatus
+from app.controllers.turnover_controller import TurnoverController
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import func, select, insert, delete, literal
+from datetime import datetime, timedelta
+from app.utils.instrumentation import instrument_controller
+
+# Đơn đã thanh toán/hủy cũ hơn số ngày này được chuyển sang bảng lưu trữ
+ARCHIVE_AFTER_DAYS = 90
+
+# Số đơn chuyển trong mỗi giao dịch, giữ khóa ghi của SQLite ngắn
+ARCHIVE_BATCH_SIZE = 500
+
+# Các trạng thái đơn không còn thay đổi
+ARCHIVED_STATUSES = [OrderStatus.PAID, OrderStatus.CANCELLED]
+
+WATERMARK_NAME = "order_archive"
+
+@instrument_controller
+class ArchiveController:
+    @staticmethod
+    def archive_orders(older_than_days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE):
+        """
+        Chuyển các đơn đã thanh toán/hủy cũ hơn older_than_days ngày (tính theo ngày đặt)
+        sang orders_archive/order_items_archive và cập nhật bảng tổng hợp doanh thu theo ngày
+
+        Returns:
+            tuple: (success, message)
+        """
+        cutoff = datetime.combine(datetime.now().date() - timedelta(days=older_than_days), datetime.min.time())
+
+        # Tổng hợp luân chuyển bàn đọc bảng orders, cần cập nhật trước khi đơn rời đi
+        TurnoverController.refresh_summary()
+
+        order_columns = [column.name for column in Order.__table__.columns]
+        item_columns = [column.name for column in OrderItem.__table__.columns]
+
+        db = get_db()
+        archived = 0
+        days = set()
+        try:
+            while True:
+                rows = db.query(Order.id, func.date(Order.order_time)).filter(
+                    Order.status.in_(ARCHIVED_STATUSES),
+                    Order.order_time < cutoff
+                ).order_by(Order.id).limit(batch_size).all()
+                if not rows:
+                    break
+
+                order_ids = [order_id for order_id, _ in rows]
+                days.update(day for _, day in rows if day)
+                archived_at = datetime.now()
+
+                db.execute(insert(OrderArchive).from_select(
+                    order_columns + ["archived_at"],
+                    select(*Order.__table__.columns, literal(archived_at)).where(Order.id.in_(order_ids))
+                ))
+                db.execute(insert(OrderItemArchive).from_select(
+                    item_columns,
+                    select(*OrderItem.__table__.columns).where(OrderItem.order_id.in_(order_ids))
+                ))
+                db.execute(delete(OrderItem).where(OrderItem.order_id.in_(order_ids)))
+                db.execute(delete(Order).where(Order.id.in_(order_ids)))
+                db.commit()
+                archived += len(order_ids)
+
+            ArchiveController._refresh_rollups(db, sorted(days))
+
+            watermark = db.query(SyncWatermark).filter(SyncWatermark.name == WATERMARK_NAME).first()
+            if watermark is None:
+                watermark = SyncWatermark(name=WATERMARK_NAME)
+                db.add(watermark)
+            # Mốc chỉ tiến lên: mọi đơn đã thanh toán trước mốc nằm trong bảng lưu trữ
+            if watermark.timestamp is None or cutoff > watermark.timestamp:
+                watermark.timestamp = cutoff
+            watermark.updated_at = datetime.now()
+            db.commit()
+
+            return True, f"Đã lưu trữ {archived} đơn hàng trước ngày {cutoff.strftime('%d/%m/%Y')}"
+        except SQLAlchemyError as e:
+            db.rollback()
+            print(f"Database error: {e}")
+            return False, f"Đã lưu trữ {archived} đơn hàng trước khi gặp lỗi: {e}"
+        finally:
+            db.close()
+
+    @staticmethod
+    def _refresh_rollups(db, days):
+        """Tính lại dòng tổng hợp doanh thu của các ngày bị ảnh hưởng từ view hợp nhất"""
+        if not days:
+            return
+
+        start = datetime.strptime(days[0], "%Y-%m-%d")
+        end = datetime.strptime(days[-1], "%Y-%m-%d") + timedelta(days=1)
+        paid = [
+            OrderHistory.status == OrderStatus.PAID,
+            OrderHistory.order_time >= start,
+            OrderHistory.order_time < end
+        ]
+
+        order_rows = db.query(
+            func.date(OrderHistory.order_time),
+            func.count(OrderHistory.id),
+            func.sum(OrderHistory.total_amount),
+            func.sum(OrderHistory.discount),
+            func.sum(OrderHistory.final_amount)
+        ).filter(*paid).group_by(func.date(OrderHistory.order_time)).all()
+
+        items_sold = dict(db.query(
+            func.date(OrderHistory.order_time),
+            func.sum(OrderItemHistory.quantity)
+        ).join(
+            OrderItemHistory, OrderItemHistory.order_id == OrderHistory.id
+        ).filter(*paid).group_by(func.date(OrderHistory.order_time)).all())
+
+        affected = [datetime.strptime(day, "%Y-%m-%d").date() for day in days]
+        db.query(DailySalesSummary).filter(
+            DailySalesSummary.day.in_(affected)
+        ).delete(synchronize_session=False)
+
+        now = datetime.now()
+        summary = [{
+            "day": datetime.strptime(day, "%Y-%m-%d").date(),
+            "orders_count": count,
+            "items_sold": items_sold.get(day) or 0,
+            "total_amount": total or 0,
+            "discount": discount or 0,
+            "revenue": revenue or 0,
+            "updated_at": now
+        } for day, count, total, discount, revenue in order_rows if day in days]
+        if summary:
+            db.execute(insert(DailySalesSummary), summary)
+
+    @staticmethod
+    def archived_before():
+        """
+        Mốc lưu trữ: mọi đơn đã thanh toán đặt trước thời điểm này nằm trong bảng lưu trữ
+        và đã có trong daily_sales_summary
+
+        Returns:
+            datetime: Mốc lưu trữ, hoặc None nếu chưa lưu trữ lần nào
+        """
+        db = get_db()
+        try:
+            watermark = db.query(SyncWatermark.timestamp).filter(SyncWatermark.name == WATERMARK_NAME).scalar()
+            return watermark
+        except SQLAlchemyError as e:
+            print(f"Database error: {e}")
+            return None
+        finally:
+            db.close()
+
+    @staticmethod
+    def get_archive_status():
+        """Số đơn đang dùng, số đơn đã lưu trữ và mốc lưu trữ"""
+        db = get_db()
+        try:
+            return {
+                "live_orders": db.query(func.count(Order.id)).scalar() or 0,
+                "archived_orders": db.query(func.count(OrderArchive.id)).scalar() or 0,
+                "archived_before": db.query(SyncWatermark.timestamp).filter(
+                    SyncWatermark.name == WATERMARK_NAME
+                ).scalar()
+            }
+        except SQLAlchemyError as e:
+            print(f"Database error: {e}")
+            return {"live_orders": 0, "archived_orders": 0, "archived_before": None}
+        finally:
+            db.close()
@@ -0,0 +1,54 @@
+from app.database.backup import (create_backup, verify_backup, list_backups, BackupError,
+                                 DEFAULT_BACKUP_DIR, KEEP_BACKUPS)
+from app.utils.instrumentation import instrument_controller
+
+@instrument_controller
+class BackupController:
+    @staticmethod
+    def backup_database(backup_dir=DEFAULT_BACKUP_DIR, keep=KEEP_BACKUPS, verify=True, progress=None):
+        """
+        Sao lưu trực tuyến cơ sở dữ liệu (xem app.database.backup) và khôi phục thử bản vừa tạo
+
+        Chạy lâu với cơ sở dữ liệu lớn: giao diện gọi từ luồng nền.
+
+        Args:
+            backup_dir: Thư mục chứa các bản sao lưu
+            keep: Số bản sao lưu được giữ lại
+            verify: Khôi phục thử vào thư mục tạm để kiểm tra
+            progress: Hàm progress(đã chép, tổng số trang)
+
+        Returns:
+            tuple: (success, message)
+        """
+        try:
+            manifest = create_backup(backup_dir, keep=keep, progress=progress)
+        except BackupError as e:
+            print(f"Backup error: {e}")
+            return False, str(e)
+
+        copied = manifest["copy"]
+        message = (f"Đã sao lưu vào {manifest['path']}\n"
+                   f"{manifest['database_bytes'] / 1024 / 1024:.1f} MB -> "
+                   f"{manifest['compressed_bytes'] / 1024 / 1024:.1f} MB, "
+                   f"{copied['steps']} bước trong {copied['seconds']:.1f}s"
+                   + (f", sao chép lại {copied['restarts']} lần do có ghi chen" if copied["restarts"] else ""))
+        if manifest["removed"]:
+            message += f"\nĐã xóa {len(manifest['removed'])} bản sao lưu cũ"
+        if not verify:
+            return True, message
+
+        verified, detail = verify_backup(manifest)
+        return verified, f"{message}\n{detail}"
+
+    @staticmethod
+    def verify_latest(backup_dir=DEFAULT_BACKUP_DIR):
+        """Khôi phục thử bản sao lưu mới nhất; trả về (success, message)"""
+        backups = list_backups(backup_dir)
+        if not backups:
+            return False, "Chưa có bản sao lưu nào"
+        return verify_backup(backups[0])
+
+    @staticmethod
+    def get_backups(backup_dir=DEFAULT_BACKUP_DIR):
+        """Danh sách bản sao lưu (tệp mô tả), mới nhất trước"""
+        return list_backups(backup_dir)
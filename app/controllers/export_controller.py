@@ -0,0 +1,113 @@
+from app.database.db_config import get_db
+from app.models.models import OrderHistory, OrderItemHistory, MenuItem, SyncWatermark
+from app.utils.columnar_store import ColumnarStore, DEFAULT_STORE_DIR, to_columns, concat_columns
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import func, select
+from datetime import datetime
+from app.utils.instrumentation import instrument_controller
+
+# Số dòng đọc mỗi lần khi stream dữ liệu (yield_per)
+CHUNK_ROWS = 5000
+
+WATERMARK_NAME = "columnar_export"
+
+# Phân vùng duy nhất của bảng thực đơn (không phân theo tháng)
+MENU_PARTITION = "snapshot"
+
+@instrument_controller
+class ExportController:
+    @staticmethod
+    def _month_range(month):
+        start = datetime.strptime(month, "%Y-%m")
+        end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+        return start, end
+
+    @staticmethod
+    def _stream(db, table, statement):
+        """Đọc kết quả theo từng khối CHUNK_ROWS dòng và chuyển thành các mảng cột"""
+        result = db.execute(statement.execution_options(yield_per=CHUNK_ROWS))
+        chunks = [to_columns(table, rows) for rows in result.partitions()]
+        return concat_columns(chunks, table)
+
+    @staticmethod
+    def export_order_history(store_dir=DEFAULT_STORE_DIR, force=False):
+        """
+        Xuất orders và order_items (gồm cả dữ liệu đã lưu trữ) sang kho dạng cột theo tháng
+
+        Chạy tăng dần: chỉ ghi các tháng chưa có, tháng hiện tại và các tháng có đơn
+        được thanh toán sau lần xuất trước.
+
+        Args:
+            store_dir: Thư mục kho dạng cột
+            force: Ghi lại toàn bộ các tháng
+
+        Returns:
+            tuple: (success, message)
+        """
+        store = ColumnarStore(store_dir)
+        db = get_db()
+        try:
+            month_of = func.strftime("%Y-%m", OrderHistory.order_time)
+            months = sorted(month for (month,) in db.query(month_of).distinct() if month)
+
+            watermark = db.query(SyncWatermark).filter(SyncWatermark.name == WATERMARK_NAME).first()
+            changed = set()
+            if watermark and watermark.timestamp:
+                changed = {month for (month,) in db.query(month_of).filter(
+                    OrderHistory.paid_at > watermark.timestamp
+                ).distinct()}
+            latest_paid = db.query(func.max(OrderHistory.paid_at)).scalar()
+
+            exported = set(store.partitions("orders")) & set(store.partitions("order_items"))
+            current_month = datetime.now().strftime("%Y-%m")
+            pending = [
+                month for month in months
+                if force or month not in exported or month >= current_month or month in changed
+            ]
+
+            for month in pending:
+                start, end = ExportController._month_range(month)
+                orders = select(
+                    OrderHistory.id, OrderHistory.table_id, OrderHistory.staff_id, OrderHistory.customer_id,
+                    OrderHistory.order_time, OrderHistory.paid_at, OrderHistory.status,
+                    OrderHistory.total_amount, OrderHistory.discount, OrderHistory.final_amount
+                ).where(
+                    OrderHistory.order_time >= start,
+                    OrderHistory.order_time < end
+                ).order_by(OrderHistory.id)
+                items = select(
+                    OrderItemHistory.id, OrderItemHistory.order_id, OrderItemHistory.menu_item_id,
+                    OrderItemHistory.quantity, OrderItemHistory.unit_price, OrderItemHistory.line_total,
+                    OrderItemHistory.status,
+                    OrderHistory.order_time, OrderHistory.status
+                ).join(
+                    OrderHistory, OrderHistory.id == OrderItemHistory.order_id
+                ).where(
+                    OrderHistory.order_time >= start,
+                    OrderHistory.order_time < end
+                ).order_by(OrderItemHistory.id)
+
+                store.write_partition("orders", month, ExportController._stream(db, "orders", orders))
+                store.write_partition("order_items", month, ExportController._stream(db, "order_items", items))
+
+            menu = select(MenuItem.id, MenuItem.name, MenuItem.price, MenuItem.category_id).order_by(MenuItem.id)
+            store.write_partition("menu_items", MENU_PARTITION, ExportController._stream(db, "menu_items", menu))
+
+            if watermark is None:
+                watermark = SyncWatermark(name=WATERMARK_NAME)
+                db.add(watermark)
+            watermark.timestamp = latest_paid or watermark.timestamp
+            watermark.updated_at = datetime.now()
+            db.commit()
+
+            return True, f"Đã xuất {len(pending)}/{len(months)} tháng vào {store_dir}"
+        except SQLAlchemyError as e:
+            db.rollback()
+            print(f"Database error: {e}")
+            return False, f"Lỗi cơ sở dữ liệu: {e}"
+        except OSError as e:
+            db.rollback()
+            print(f"Export error: {e}")
+            return False, f"Lỗi ghi tệp: {e}"
+        finally:
+            db.close()
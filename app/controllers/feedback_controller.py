@@ -1,11 +1,37 @@
 from app.database.db_config import get_db
 from app.models.models import Feedback, Order, Customer
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import func, desc
+from sqlalchemy import func, desc, case, and_, or_
 from sqlalchemy.orm import joinedload
 from datetime import datetime, timedelta
+import threading
+import time
+from app.utils.instrumentation import instrument_controller
 
+# Thống kê đánh giá được lưu tạm trong khoảng thời gian này (giây)
+STATS_TTL_SECONDS = 30
+
+# Các cột được phép sắp xếp trong get_all_feedbacks
+SORTABLE_COLUMNS = {
+    "created_at": Feedback.created_at,
+    "rating": Feedback.rating,
+    "service_rating": Feedback.service_rating,
+    "food_rating": Feedback.food_rating,
+    "ambience_rating": Feedback.ambience_rating,
+}
+
+@instrument_controller
 class FeedbackController:
+    _stats_cache = None
+    _stats_cached_at = 0
+    _lock = threading.Lock()
+    
+    @staticmethod
+    def invalidate_stats():
+        """Xóa thống kê đã lưu tạm (gọi sau khi thêm/xóa đánh giá)"""
+        with FeedbackController._lock:
+            FeedbackController._stats_cache = None
+    
     @staticmethod
     def add_feedback(order_id, rating, comment=None, service_rating=None, 
                      food_rating=None, ambience_rating=None, customer_id=None):
@@ -35,6 +61,7 @@ class FeedbackController:
             
             db.add(new_feedback)
             db.commit()
+            FeedbackController.invalidate_stats()
             return True
         except SQLAlchemyError as e:
             db.rollback()
@@ -57,8 +84,47 @@ class FeedbackController:
             db.close()
     
     @staticmethod
-    def get_all_feedbacks(limit=100, offset=0, sort_by="created_at", sort_dir="desc"):
-        """Lấy tất cả đánh giá với phân trang"""
+    def _after_cursor(column, descending, last_value, last_id):
+        """
+        Điều kiện keyset cho các dòng sau con trỏ (last_value, last_id)
+        
+        Các cột điểm thành phần có thể NULL; SQLite xếp NULL nhỏ nhất (đầu khi tăng dần, cuối khi
+        giảm dần) và so sánh với NULL không khớp dòng nào, nên nhóm NULL được xử lý bằng IS NULL.
+        """
+        if descending:
+            if last_value is None:
+                # Đang ở nhóm NULL cuối danh sách: chỉ còn các dòng NULL có id nhỏ hơn
+                return and_(column.is_(None), Feedback.id < last_id)
+            return or_(
+                column < last_value,
+                and_(column == last_value, Feedback.id < last_id),
+                column.is_(None)
+            )
+        if last_value is None:
+            # Đang ở nhóm NULL đầu danh sách: các dòng NULL còn lại rồi mọi dòng có giá trị
+            return or_(and_(column.is_(None), Feedback.id > last_id), column.isnot(None))
+        return or_(
+            column > last_value,
+            and_(column == last_value, Feedback.id > last_id)
+        )
+    
+    @staticmethod
+    def get_all_feedbacks(limit=100, offset=0, sort_by="created_at", sort_dir="desc", after=None):
+        """
+        Lấy tất cả đánh giá với phân trang
+        
+        Args:
+            limit: Số đánh giá mỗi trang
+            offset: Vị trí bắt đầu (chỉ dùng khi không có after)
+            sort_by: Cột sắp xếp (xem SORTABLE_COLUMNS)
+            sort_dir: "asc" hoặc "desc"
+            after: Con trỏ keyset (giá trị cột sắp xếp, id) của đánh giá cuối trang trước (giá trị
+                   có thể là None với các cột điểm thành phần); trang kế tiếp được lấy bằng range
+                   scan trên chỉ mục thay vì bỏ qua offset dòng
+        """
+        column = SORTABLE_COLUMNS.get(sort_by, Feedback.created_at)
+        descending = sort_dir.lower() == "desc"
+        
         db = get_db()
         try:
             query = db.query(Feedback).options(
@@ -66,14 +132,20 @@ class FeedbackController:
                 joinedload(Feedback.customer)
             )
             
-            # Sắp xếp
-            if sort_dir.lower() == "desc":
-                query = query.order_by(desc(getattr(Feedback, sort_by)))
+            # Phân trang theo keyset: (cột sắp xếp, id) sau con trỏ
+            if after is not None:
+                query = query.filter(FeedbackController._after_cursor(column, descending, *after))
+            
+            # Sắp xếp (id để thứ tự ổn định khi trùng giá trị)
+            if descending:
+                query = query.order_by(desc(column), desc(Feedback.id))
             else:
-                query = query.order_by(getattr(Feedback, sort_by))
+                query = query.order_by(column, Feedback.id)
             
             # Phân trang
-            feedbacks = query.offset(offset).limit(limit).all()
+            if after is None and offset:
+                query = query.offset(offset)
+            feedbacks = query.limit(limit).all()
             return feedbacks
         except SQLAlchemyError as e:
             print(f"Database error: {e}")
@@ -83,42 +155,44 @@ class FeedbackController:
     
     @staticmethod
     def get_feedback_stats():
-        """Lấy thống kê về đánh giá"""
+        """Lấy thống kê về đánh giá (một truy vấn tổng hợp, lưu tạm STATS_TTL_SECONDS giây)"""
+        with FeedbackController._lock:
+            cached = FeedbackController._stats_cache
+            if cached is not None and time.monotonic() - FeedbackController._stats_cached_at < STATS_TTL_SECONDS:
+                return dict(cached, rating_distribution=dict(cached['rating_distribution']))
+        
         db = get_db()
         try:
-            # Tổng số đánh giá
-            total_count = db.query(func.count(Feedback.id)).scalar()
-            
-            # Đếm số lượng theo số sao
-            rating_counts = db.query(
-                Feedback.rating, 
-                func.count(Feedback.id)
-            ).group_by(Feedback.rating).all()
+            thirty_days_ago = datetime.now() - timedelta(days=30)
             
-            # Tính trung bình
-            avg_rating = db.query(func.avg(Feedback.rating)).scalar() or 0
-            avg_service = db.query(func.avg(Feedback.service_rating)).scalar() or 0
-            avg_food = db.query(func.avg(Feedback.food_rating)).scalar() or 0
-            avg_ambience = db.query(func.avg(Feedback.ambience_rating)).scalar() or 0
+            # Tổng số, phân bố theo số sao, các điểm trung bình và số đánh giá gần đây trong một lần quét
+            row = db.query(
+                func.count(Feedback.id),
+                func.avg(Feedback.rating),
+                func.avg(Feedback.service_rating),
+                func.avg(Feedback.food_rating),
+                func.avg(Feedback.ambience_rating),
+                func.sum(case((Feedback.created_at >= thirty_days_ago, 1), else_=0)),
+                *[func.sum(case((Feedback.rating == rating, 1), else_=0)) for rating in range(1, 6)]
+            ).one()
             
-            # Đánh giá gần đây (30 ngày)
-            thirty_days_ago = datetime.now() - timedelta(days=30)
-            recent_count = db.query(func.count(Feedback.id)).filter(
-                Feedback.created_at >= thirty_days_ago
-            ).scalar()
+            total_count, avg_rating, avg_service, avg_food, avg_ambience, recent_count = row[:6]
             
             # Đóng gói kết quả
             stats = {
-                'total_count': total_count,
-                'rating_distribution': {rating: count for rating, count in rating_counts},
-                'avg_rating': round(float(avg_rating), 1),
-                'avg_service': round(float(avg_service), 1),
-                'avg_food': round(float(avg_food), 1),
-                'avg_ambience': round(float(avg_ambience), 1),
-                'recent_count': recent_count
+                'total_count': total_count or 0,
+                'rating_distribution': {rating: count for rating, count in zip(range(1, 6), row[6:]) if count},
+                'avg_rating': round(float(avg_rating or 0), 1),
+                'avg_service': round(float(avg_service or 0), 1),
+                'avg_food': round(float(avg_food or 0), 1),
+                'avg_ambience': round(float(avg_ambience or 0), 1),
+                'recent_count': recent_count or 0
             }
             
-            return stats
+            with FeedbackController._lock:
+                FeedbackController._stats_cache = stats
+                FeedbackController._stats_cached_at = time.monotonic()
+            return dict(stats, rating_distribution=dict(stats['rating_distribution']))
         except SQLAlchemyError as e:
             print(f"Database error: {e}")
             return None
@@ -136,6 +210,7 @@ class FeedbackController:
             
             db.delete(feedback)
             db.commit()
+            FeedbackController.invalidate_stats()
             return True
         except SQLAlchemyError as e:
             db.rollback()
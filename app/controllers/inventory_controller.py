@@ -1,9 +1,13 @@
 from app.database.db_config import get_db
+from app.database.write_queue import write_queue
+from app.database.concurrency import VersionConflict, check_version
 from app.models.models import Inventory, MenuItem, Recipe
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime
 from sqlalchemy import func
+from app.utils.instrumentation import instrument_controller
 
+@instrument_controller
 class InventoryController:
     @staticmethod
     def get_all_inventory_items():
@@ -16,7 +20,22 @@ class InventoryController:
             return []
         finally:
             db.close()
-    
+
+    @staticmethod
+    def get_inventory_page(after_id=None, limit=100):
+        """Lấy một trang mục trong kho theo keyset (id tăng dần)"""
+        db = get_db()
+        try:
+            query = db.query(Inventory)
+            if after_id is not None:
+                query = query.filter(Inventory.id > after_id)
+            return query.order_by(Inventory.id).limit(limit).all()
+        except SQLAlchemyError as e:
+            print(f"Database error: {e}")
+            return []
+        finally:
+            db.close()
+
     @staticmethod
     def get_inventory_item(inventory_id):
         """Lấy thông tin một mục trong kho dựa trên ID"""
@@ -54,13 +73,19 @@ class InventoryController:
             db.close()
     
     @staticmethod
-    def update_inventory_item(inventory_id, name=None, quantity=None, unit=None, supplier=None, min_quantity=None):
-        """Cập nhật thông tin đầy đủ của một mục trong kho"""
-        db = get_db()
-        try:
+    def update_inventory_item(inventory_id, name=None, quantity=None, unit=None, supplier=None, min_quantity=None,
+                              expected_version=None):
+        """
+        Cập nhật thông tin đầy đủ của một mục trong kho
+
+        Args:
+            expected_version: Phiên bản lúc mở form sửa; trả về Conflict nếu đã bị sửa ở nơi khác
+        """
+        def work(db):
             item = db.query(Inventory).filter(Inventory.id == inventory_id).first()
             if not item:
                 return False
+            check_version(item, expected_version)
             
             if name:
                 item.name = name
@@ -74,14 +99,16 @@ class InventoryController:
                 item.min_quantity = min_quantity
                 
             item.last_update = datetime.now()
-            db.commit()
             return True
+        
+        try:
+            return write_queue.run(work)
+        except VersionConflict as e:
+            print(e)
+            return e.conflict
         except SQLAlchemyError as e:
-            db.rollback()
             print(f"Database error: {e}")
             return False
-        finally:
-            db.close()
     
     @staticmethod
     def delete_inventory_item(inventory_id):
@@ -262,8 +289,7 @@ class InventoryController:
         """Cập nhật kho sau khi có đơn hàng mới"""
         from app.models.models import OrderItem
         
-        db = get_db()
-        try:
+        def work(db):
             # Lấy tất cả món trong đơn hàng
             order_items = db.query(OrderItem).filter(OrderItem.order_id == order_id).all()
             
@@ -280,32 +306,61 @@ class InventoryController:
                     if inventory:
                         inventory.quantity -= item["quantity"]
                         inventory.last_update = datetime.now()
-            
-            db.commit()
             return True
+        
+        try:
+            return write_queue.run(work)
+        except VersionConflict as e:
+            print(e)
+            return e.conflict
         except SQLAlchemyError as e:
-            db.rollback()
             print(f"Database error: {e}")
             return False
-        finally:
-            db.close()
     
     @staticmethod
-    def update_inventory_quantity(inventory_id, new_quantity):
-        """Cập nhật số lượng của một mục trong kho"""
-        db = get_db()
-        try:
+    def update_inventory_quantity(inventory_id, new_quantity, expected_version=None):
+        """
+        Cập nhật số lượng của một mục trong kho
+
+        Args:
+            expected_version: Phiên bản lúc đọc số lượng cũ; trả về Conflict nếu kho đã thay đổi
+        """
+        def work(db):
             item = db.query(Inventory).filter(Inventory.id == inventory_id).first()
             if not item:
                 return False
+            check_version(item, expected_version)
             
             item.quantity = new_quantity
             item.last_update = datetime.now()
-            db.commit()
             return True
+        
+        try:
+            return write_queue.run(work)
+        except VersionConflict as e:
+            print(e)
+            return e.conflict
         except SQLAlchemyError as e:
-            db.rollback()
             print(f"Database error: {e}")
             return False
-        finally:
-            db.close() 
\ No newline at end of file
+    
+    @staticmethod
+    def adjust_inventory_quantity(inventory_id, delta):
+        """Tăng/giảm số lượng của một mục trong kho (nhập thêm, hao hụt) dựa trên số lượng hiện tại"""
+        def work(db):
+            item = db.query(Inventory).filter(Inventory.id == inventory_id).first()
+            if not item:
+                return False
+            
+            item.quantity += delta
+            item.last_update = datetime.now()
+            return True
+        
+        try:
+            return write_queue.run(work)
+        except VersionConflict as e:
+            print(e)
+            return e.conflict
+        except SQLAlchemyError as e:
+            print(f"Database error: {e}")
+            return False
\ No newline at end of file
@@ -1,14 +1,24 @@
 from app.database.db_config import get_db
 from app.models.models import MenuItem, MenuCategory
+from app.controllers.reference_cache import reference_cache, MENU
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import joinedload
+from app.utils.instrumentation import instrument_controller
 
+@instrument_controller
 class MenuController:
     @staticmethod
     def get_all_categories():
+        cached = reference_cache.get(MENU, "categories")
+        if cached is not None:
+            return cached
+        
         db = get_db()
         try:
-            return db.query(MenuCategory).all()
+            generation = reference_cache.generation(MENU)
+            categories = db.query(MenuCategory).all()
+            reference_cache.put(MENU, "categories", categories, generation)
+            return categories
         except SQLAlchemyError as e:
             print(f"Database error: {e}")
             return []
@@ -17,6 +27,11 @@ class MenuController:
     
     @staticmethod
     def get_items_by_category(category_id):
+        # Lọc từ danh sách món đã lưu tạm nếu có, tránh một truy vấn cho mỗi lần chọn danh mục
+        cached = reference_cache.get(MENU, "items")
+        if cached is not None:
+            return [item for item in cached if item.category_id == category_id]
+        
         db = get_db()
         try:
             # Sử dụng joinedload để tải trước quan hệ category
@@ -34,14 +49,21 @@ class MenuController:
     
     @staticmethod
     def get_all_items():
+        cached = reference_cache.get(MENU, "items")
+        if cached is not None:
+            return cached
+        
         db = get_db()
         try:
+            generation = reference_cache.generation(MENU)
             # Sử dụng joinedload để tải trước quan hệ category
-            return db.query(MenuItem).options(
+            items = db.query(MenuItem).options(
                 joinedload(MenuItem.category)
             ).filter(
                 MenuItem.is_available == True
             ).all()
+            reference_cache.put(MENU, "items", items, generation)
+            return items
         except SQLAlchemyError as e:
             print(f"Database error: {e}")
             return []
@@ -78,6 +100,7 @@ class MenuController:
             )
             db.add(new_item)
             db.commit()
+            reference_cache.invalidate(MENU)
             return True
         except SQLAlchemyError as e:
             db.rollback()
@@ -99,6 +122,7 @@ class MenuController:
                     setattr(item, key, value)
             
             db.commit()
+            reference_cache.invalidate(MENU)
             return True
         except SQLAlchemyError as e:
             db.rollback()
@@ -118,6 +142,7 @@ class MenuController:
             # Soft delete - just mark as unavailable
             item.is_available = False
             db.commit()
+            reference_cache.invalidate(MENU)
             return True
         except SQLAlchemyError as e:
             db.rollback()
@@ -1,79 +1,136 @@
 from app.database.db_config import get_db
-from app.models.models import Order, MenuItem, OrderItem, Table
+from app.database.write_queue import write_queue
+from app.database.concurrency import Conflict, VersionConflict, check_version
+from app.models.models import (Order, MenuItem, OrderItem, Table, Reservation, OrderHistory,
+                               OrderItemHistory, DailySalesSummary)
+from app.models.status import (OrderStatus, ItemStatus, ORDER_TRANSITIONS, ITEM_TRANSITIONS,
+                               ACTIVE_ORDER_STATUSES, can_transition)
+from app.controllers.table_state_store import table_state_store
+from app.controllers.reservation_controller import ReservationController
+from app.controllers.archive_controller import ArchiveController
+from app.utils.table_allocation import DEFAULT_DWELL_MINUTES
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy import func
 from sqlalchemy.orm import joinedload
 from datetime import datetime, timedelta
+from app.utils.instrumentation import instrument_controller
 
+# Lượt đặt còn chờ khách đến (có thể chuyển sang "đã đến" khi mở đơn)
+BOOKED_RESERVATION_STATUSES = ["đã đặt", "đã xác nhận"]
+
+@instrument_controller
 class OrderController:
     @staticmethod
-    def create_order(table_id, staff_id, customer_id=None):
-        db = get_db()
-        try:
+    def create_order(table_id, staff_id, customer_id=None, reservation_id=None):
+        """
+        Mở đơn hàng cho bàn
+        
+        Returns:
+            int | Conflict | None: ID đơn hàng; Conflict (falsy, có message để giao diện hiển thị)
+                nếu lượt đặt không hợp lệ hoặc bàn sắp có khách đặt trước; None nếu lỗi
+        """
+        order_time = datetime.now()
+        
+        # Lượt đặt không hợp lệ/bàn đã có khách đặt là kết quả nghiệp vụ: work trả về Conflict trước khi
+        # ghi gì (không ném VersionConflict, vốn dành cho xung đột phiên bản, để không hủy cả lô ghi)
+        def work(db):
             # Update table status
             table = db.query(Table).filter(Table.id == table_id).first()
             if not table:
                 return None
             
+            order_customer_id = customer_id
+            if reservation_id:
+                # Khách đặt trước đã đến: lượt đặt phải thuộc bàn này và chưa bị hủy/đã dùng
+                reservation = db.query(Reservation).filter(Reservation.id == reservation_id).first()
+                if not reservation:
+                    return Conflict(f"Không tìm thấy lượt đặt #{reservation_id}", "Reservation", reservation_id)
+                if reservation.table_id != table_id:
+                    return Conflict(f"Lượt đặt #{reservation.id} không thuộc {table.name}",
+                                    "Reservation", reservation.id)
+                if reservation.status not in BOOKED_RESERVATION_STATUSES:
+                    return Conflict(f"Lượt đặt #{reservation.id} đang ở trạng thái \"{reservation.status}\"",
+                                    "Reservation", reservation.id, current=reservation.status)
+                reservation.status = "đã đến"
+                order_customer_id = customer_id or reservation.customer_id
+            else:
+                # Khách vãng lai không được ngồi vào bàn sắp có khách đặt trước
+                walk_in_end = order_time + timedelta(minutes=DEFAULT_DWELL_MINUTES)
+                conflict = ReservationController.find_conflict(
+                    table_id, order_time, walk_in_end,
+                    statuses=BOOKED_RESERVATION_STATUSES, db=db
+                )
+                if conflict:
+                    return Conflict(
+                        f"{table.name} đã được đặt trước lúc {conflict.reservation_time.strftime('%H:%M')}",
+                        "Reservation", conflict.id
+                    )
+            
             table.status = "đang phục vụ"
             
             # Create new order
             new_order = Order(
                 table_id=table_id,
                 staff_id=staff_id,
-                customer_id=customer_id,
-                status="chờ xử lý",
-                order_time=datetime.now()
+                customer_id=order_customer_id,
+                status=OrderStatus.PENDING,
+                order_time=order_time
             )
             
             db.add(new_order)
-            db.commit()
-            db.refresh(new_order)
+            db.flush()
             return new_order.id
+        
+        try:
+            order_id = write_queue.run(work)
+        except VersionConflict as e:
+            print(e)
+            return e.conflict
         except SQLAlchemyError as e:
-            db.rollback()
             print(f"Database error: {e}")
             return None
-        finally:
-            db.close()
+        
+        if order_id:
+            table_state_store.order_opened(table_id, order_id, order_time)
+        return order_id
     
     @staticmethod
     def create_online_order(staff_id, customer_name=None, phone_number=None, order_type="Mang đi"):
         """Tạo đơn hàng online không gắn với bàn cụ thể"""
-        db = get_db()
-        try:
+        def work(db):
             # Create new order
             new_order = Order(
                 staff_id=staff_id,
-                status="chờ xử lý",
+                status=OrderStatus.PENDING,
                 order_time=datetime.now(),
                 note=f"Đơn hàng {order_type.lower()} - KH: {customer_name} - SĐT: {phone_number}"
             )
             
             db.add(new_order)
-            db.commit()
-            db.refresh(new_order)
+            db.flush()
             return new_order.id
+        
+        try:
+            return write_queue.run(work)
+        except VersionConflict as e:
+            print(e)
+            return e.conflict
         except SQLAlchemyError as e:
-            db.rollback()
             print(f"Database error: {e}")
             return None
-        finally:
-            db.close()
     
     @staticmethod
     def add_item_to_order(order_id, menu_item_id, quantity=1, note=None):
-        db = get_db()
-        try:
+        def work(db):
             # Get the order
             order = db.query(Order).filter(Order.id == order_id).first()
-            if not order or order.status == "đã thanh toán":
-                return False
+            if not order or order.status not in ACTIVE_ORDER_STATUSES:
+                return None
             
             # Get the menu item
             menu_item = db.query(MenuItem).filter(MenuItem.id == menu_item_id).first()
             if not menu_item:
-                return False
+                return None
             
             # Check if item is already in the order
             existing_item = db.query(OrderItem).filter(
@@ -82,47 +139,67 @@ class OrderController:
             ).first()
             
             if existing_item:
-                # Update quantity
+                # Update quantity, giữ đơn giá lúc món được gọi lần đầu
+                if existing_item.unit_price is None:
+                    existing_item.unit_price = menu_item.price
+                unit_price = existing_item.unit_price
                 existing_item.quantity += quantity
+                existing_item.line_total = unit_price * existing_item.quantity
                 existing_item.note = note
             else:
                 # Add new item
+                unit_price = menu_item.price
                 new_item = OrderItem(
                     order_id=order_id,
                     menu_item_id=menu_item_id,
                     quantity=quantity,
+                    unit_price=unit_price,
+                    line_total=unit_price * quantity,
                     note=note,
-                    status="chờ pha chế"
+                    status=ItemStatus.WAITING
                 )
                 db.add(new_item)
             
             # Update order total
-            total = quantity * menu_item.price
+            total = quantity * unit_price
             order.total_amount += total
             order.final_amount = order.total_amount - order.discount
-            
-            db.commit()
-            return True
+            return order.total_amount
+        
+        try:
+            running_total = write_queue.run(work)
+        except VersionConflict as e:
+            print(e)
+            return e.conflict
         except SQLAlchemyError as e:
-            db.rollback()
             print(f"Database error: {e}")
             return False
-        finally:
-            db.close()
+        
+        if running_total is None:
+            return False
+        table_state_store.order_total_changed(order_id, running_total)
+        return True
     
     @staticmethod
-    def update_order_item(order_id, menu_item_id, quantity, note=None):
-        db = get_db()
-        try:
+    def update_order_item(order_id, menu_item_id, quantity, note=None, expected_version=None):
+        """
+        Sửa số lượng/ghi chú một món trong đơn
+
+        Args:
+            expected_version: Phiên bản đơn hàng lúc hiển thị (get_order_details()['version']);
+                nếu đơn đã bị sửa ở máy khác thì trả về Conflict
+        """
+        def work(db):
             # Get the order
             order = db.query(Order).filter(Order.id == order_id).first()
-            if not order or order.status == "đã thanh toán":
-                return False
+            if not order or order.status not in ACTIVE_ORDER_STATUSES:
+                return None
+            check_version(order, expected_version)
             
             # Get the menu item
             menu_item = db.query(MenuItem).filter(MenuItem.id == menu_item_id).first()
             if not menu_item:
-                return False
+                return None
             
             # Check if item is in the order
             existing_item = db.query(OrderItem).filter(
@@ -131,11 +208,12 @@ class OrderController:
             ).first()
             
             if not existing_item:
-                return False
+                return None
             
-            # Calculate price difference
-            old_total = existing_item.quantity * menu_item.price
-            new_total = quantity * menu_item.price
+            # Calculate price difference theo đơn giá đã lưu của món
+            unit_price = existing_item.unit_price if existing_item.unit_price is not None else menu_item.price
+            old_total = existing_item.quantity * unit_price
+            new_total = quantity * unit_price
             difference = new_total - old_total
             
             if quantity <= 0:
@@ -144,20 +222,28 @@ class OrderController:
             else:
                 # Update quantity
                 existing_item.quantity = quantity
+                existing_item.unit_price = unit_price
+                existing_item.line_total = new_total
                 existing_item.note = note
             
             # Update order total
             order.total_amount += difference
             order.final_amount = order.total_amount - order.discount
-            
-            db.commit()
-            return True
+            return order.total_amount
+        
+        try:
+            running_total = write_queue.run(work)
+        except VersionConflict as e:
+            print(e)
+            return e.conflict
         except SQLAlchemyError as e:
-            db.rollback()
             print(f"Database error: {e}")
             return False
-        finally:
-            db.close()
+        
+        if running_total is None:
+            return False
+        table_state_store.order_total_changed(order_id, running_total)
+        return True
     
     @staticmethod
     def get_order_details(order_id):
@@ -179,11 +265,11 @@ class OrderController:
                 items_details.append({
                     'id': item.menu_item.id,
                     'name': item.menu_item.name,
-                    'price': item.menu_item.price,
+                    'price': item.unit_price,
                     'quantity': item.quantity,
                     'note': item.note,
                     'status': item.status,
-                    'subtotal': item.menu_item.price * item.quantity
+                    'subtotal': item.line_total
                 })
             
             order_details = {
@@ -201,6 +287,7 @@ class OrderController:
                 'final_amount': order.final_amount,
                 'payment_method': order.payment_method,
                 'note': order.note,
+                'version': order.version,
                 'items': items_details
             }
             
@@ -221,12 +308,97 @@ class OrderController:
                 joinedload(Order.staff),
                 joinedload(Order.customer),
                 joinedload(Order.order_items)
-            ).filter(Order.status != "đã thanh toán").all()
+            ).filter(Order.status != OrderStatus.PAID).all()
+        except SQLAlchemyError as e:
+            print(f"Database error: {e}")
+            return []
+        finally:
+            db.close()
+
+    @staticmethod
+    def get_orders_page(before_id=None, limit=100, statuses=None, exclude_statuses=None):
+        """
+        Lấy một trang đơn hàng theo keyset (id giảm dần) cho các bảng lịch sử lớn
+
+        Args:
+            before_id: Chỉ lấy các đơn có id nhỏ hơn (None cho trang đầu)
+            limit: Số đơn tối đa
+            statuses: Chỉ lấy các trạng thái này
+            exclude_statuses: Bỏ qua các trạng thái này
+
+        Returns:
+            list: Các dòng (id, table_name, order_time, status, total_amount, final_amount)
+        """
+        db = get_db()
+        try:
+            query = db.query(
+                Order.id,
+                Table.name.label("table_name"),
+                Order.order_time,
+                Order.status,
+                Order.total_amount,
+                Order.final_amount
+            ).outerjoin(Table, Table.id == Order.table_id)
+
+            if statuses:
+                query = query.filter(Order.status.in_(statuses))
+            if exclude_statuses:
+                query = query.filter(Order.status.notin_(exclude_statuses))
+            if before_id is not None:
+                query = query.filter(Order.id < before_id)
+
+            return query.order_by(Order.id.desc()).limit(limit).all()
         except SQLAlchemyError as e:
             print(f"Database error: {e}")
             return []
         finally:
             db.close()
+
+    @staticmethod
+    def count_orders(statuses=None):
+        """Đếm số đơn hàng (theo trạng thái nếu có)"""
+        db = get_db()
+        try:
+            query = db.query(func.count(Order.id))
+            if statuses:
+                query = query.filter(Order.status.in_(statuses))
+            return query.scalar() or 0
+        except SQLAlchemyError as e:
+            print(f"Database error: {e}")
+            return 0
+        finally:
+            db.close()
+
+    @staticmethod
+    def get_order(order_id):
+        """Lấy một đơn hàng kèm bàn, nhân viên và các món"""
+        db = get_db()
+        try:
+            return db.query(Order).options(
+                joinedload(Order.table),
+                joinedload(Order.staff),
+                joinedload(Order.order_items).joinedload(OrderItem.menu_item)
+            ).filter(Order.id == order_id).first()
+        except SQLAlchemyError as e:
+            print(f"Database error: {e}")
+            return None
+        finally:
+            db.close()
+
+    @staticmethod
+    def get_upcoming_reservation(table_id):
+        """
+        Lượt đặt còn chờ khách của bàn trong khoảng mở đơn (từ bây giờ đến DEFAULT_DWELL_MINUTES
+        phút sau), để giao diện mở đơn cho đúng khách đặt trước (create_order(reservation_id=...))
+        
+        Returns:
+            Reservation | None
+        """
+        now = datetime.now()
+        return ReservationController.find_conflict(
+            table_id, now, now + timedelta(minutes=DEFAULT_DWELL_MINUTES),
+            statuses=BOOKED_RESERVATION_STATUSES
+        )
     
     @staticmethod
     def get_orders_by_table(table_id):
@@ -240,7 +412,7 @@ class OrderController:
                 joinedload(Order.order_items)
             ).filter(
                 Order.table_id == table_id,
-                Order.status != "đã thanh toán"
+                Order.status != OrderStatus.PAID
             ).all()
         except SQLAlchemyError as e:
             print(f"Database error: {e}")
@@ -249,15 +421,17 @@ class OrderController:
             db.close()
     
     @staticmethod
-    def complete_order(order_id, payment_method="tiền mặt", discount=0):
-        db = get_db()
-        try:
+    def complete_order(order_id, payment_method="tiền mặt", discount=0, expected_version=None):
+        def work(db):
             order = db.query(Order).filter(Order.id == order_id).first()
-            if not order or order.status == "đã thanh toán":
-                return False
+            if not order or not can_transition(order.status, OrderStatus.PAID, ORDER_TRANSITIONS):
+                return False, None
+            # Không thanh toán theo tổng tiền đã cũ nếu đơn vừa được sửa ở máy khác
+            check_version(order, expected_version)
             
             # Update order
-            order.status = "đã thanh toán"
+            order.status = OrderStatus.PAID
+            order.paid_at = datetime.now()
             order.payment_method = payment_method
             order.discount = discount
             order.final_amount = order.total_amount - discount
@@ -265,39 +439,49 @@ class OrderController:
             # Update table status
             if order.table:
                 order.table.status = "trống"
-            
-            db.commit()
-            return True
+            return True, order.table_id
+        
+        try:
+            closed, table_id = write_queue.run(work)
+        except VersionConflict as e:
+            print(e)
+            return e.conflict
         except SQLAlchemyError as e:
-            db.rollback()
             print(f"Database error: {e}")
             return False
-        finally:
-            db.close()
+        
+        if closed:
+            table_state_store.order_closed(order_id, table_id)
+        return closed
     
     @staticmethod
-    def cancel_order(order_id):
-        db = get_db()
-        try:
+    def cancel_order(order_id, expected_version=None):
+        def work(db):
             order = db.query(Order).filter(Order.id == order_id).first()
-            if not order or order.status == "đã thanh toán":
-                return False
+            if not order or not can_transition(order.status, OrderStatus.CANCELLED, ORDER_TRANSITIONS):
+                return False, None
+            check_version(order, expected_version)
             
             # Update order
-            order.status = "hủy"
+            order.status = OrderStatus.CANCELLED
             
             # Update table status
             if order.table:
                 order.table.status = "trống"
-            
-            db.commit()
-            return True
+            return True, order.table_id
+        
+        try:
+            closed, table_id = write_queue.run(work)
+        except VersionConflict as e:
+            print(e)
+            return e.conflict
         except SQLAlchemyError as e:
-            db.rollback()
             print(f"Database error: {e}")
             return False
-        finally:
-            db.close()
+        
+        if closed:
+            table_state_store.order_closed(order_id, table_id)
+        return closed
     
     @staticmethod
     def get_daily_revenue(day=None):
@@ -307,13 +491,21 @@ class OrderController:
         start_date = datetime.combine(day, datetime.min.time())
         end_date = start_date + timedelta(days=1)
         
+        # Ngày đã lưu trữ đọc từ bảng tổng hợp, ngày còn lại chỉ chạm bảng đang dùng
+        archived_before = ArchiveController.archived_before()
+        
         db = get_db()
         try:
-            revenue = db.query(func.sum(Order.final_amount)).filter(
-                Order.order_time >= start_date,
-                Order.order_time < end_date,
-                Order.status == "đã thanh toán"
-            ).scalar() or 0
+            if archived_before and start_date < archived_before:
+                revenue = db.query(DailySalesSummary.revenue).filter(
+                    DailySalesSummary.day == start_date.date()
+                ).scalar() or 0
+            else:
+                revenue = db.query(func.sum(Order.final_amount)).filter(
+                    Order.order_time >= start_date,
+                    Order.order_time < end_date,
+                    Order.status == OrderStatus.PAID
+                ).scalar() or 0
             
             return revenue
         except SQLAlchemyError as e:
@@ -332,21 +524,21 @@ class OrderController:
             result = db.query(
                 MenuItem.id,
                 MenuItem.name,
-                func.sum(OrderItem.quantity).label('total_ordered')
+                func.sum(OrderItemHistory.quantity).label('total_ordered')
             ).join(
-                OrderItem,
-                MenuItem.id == OrderItem.menu_item_id
+                OrderItemHistory,
+                MenuItem.id == OrderItemHistory.menu_item_id
             ).join(
-                Order,
-                Order.id == OrderItem.order_id
+                OrderHistory,
+                OrderHistory.id == OrderItemHistory.order_id
             ).filter(
-                Order.order_time >= start_date,
-                Order.status == "đã thanh toán"
+                OrderHistory.order_time >= start_date,
+                OrderHistory.status == OrderStatus.PAID
             ).group_by(
                 MenuItem.id,
                 MenuItem.name
             ).order_by(
-                func.sum(OrderItem.quantity).desc()
+                func.sum(OrderItemHistory.quantity).desc()
             ).limit(limit).all()
             
             return result
@@ -366,7 +558,7 @@ class OrderController:
                 joinedload(Order.staff),
                 joinedload(Order.order_items).joinedload(OrderItem.menu_item)
             ).filter(
-                Order.status.in_(["chờ xử lý", "đang phục vụ"])
+                Order.status.in_(ACTIVE_ORDER_STATUSES)
             ).order_by(Order.order_time.desc()).all()
         except SQLAlchemyError as e:
             print(f"Database error: {e}")
@@ -385,8 +577,8 @@ class OrderController:
             ).join(
                 MenuItem, OrderItem.menu_item_id == MenuItem.id
             ).filter(
-                Order.status.in_(["chờ xử lý", "đang phục vụ"]),
-                OrderItem.status == "chờ pha chế"
+                Order.status.in_(ACTIVE_ORDER_STATUSES),
+                OrderItem.status == ItemStatus.WAITING
             ).order_by(Order.order_time.asc()).options(
                 joinedload(OrderItem.menu_item).joinedload(MenuItem.category),
                 joinedload(OrderItem.order).joinedload(Order.table)
@@ -402,26 +594,26 @@ class OrderController:
     @staticmethod
     def complete_order_item(order_item_id, staff_id=None):
         """Đánh dấu một món đã hoàn thành pha chế"""
-        db = get_db()
-        try:
+        def work(db):
             # Tìm order item
             order_item = db.query(OrderItem).filter(OrderItem.id == order_item_id).first()
-            if not order_item:
+            if not order_item or not can_transition(order_item.status, ItemStatus.DONE, ITEM_TRANSITIONS):
                 return False
                 
             # Cập nhật trạng thái
-            order_item.status = "đã hoàn thành"
+            order_item.status = ItemStatus.DONE
             order_item.completed_by = staff_id
             order_item.completed_at = datetime.now()
-            
-            db.commit()
             return True
+        
+        try:
+            return write_queue.run(work)
+        except VersionConflict as e:
+            print(e)
+            return e.conflict
         except SQLAlchemyError as e:
-            db.rollback()
             print(f"Database error: {e}")
             return False
-        finally:
-            db.close()
     
     @staticmethod
     def get_completed_items_count(staff_id):
@@ -434,7 +626,7 @@ class OrderController:
             end_date = start_date + timedelta(days=1)
             
             count = db.query(func.count(OrderItem.id)).filter(
-                OrderItem.status == "đã hoàn thành",
+                OrderItem.status == ItemStatus.DONE,
                 OrderItem.completed_by == staff_id,
                 OrderItem.completed_at >= start_date,
                 OrderItem.completed_at < end_date
@@ -449,19 +641,34 @@ class OrderController:
     
     @staticmethod
     def update_order_status(order_id, status):
-        """Cập nhật trạng thái của đơn hàng"""
-        db = get_db()
+        """
+        Cập nhật trạng thái của đơn hàng theo bảng chuyển trạng thái ORDER_TRANSITIONS
+
+        Args:
+            status: OrderStatus, mã số hoặc nhãn trạng thái
+        """
         try:
+            new_status = OrderStatus.parse(status)
+        except ValueError as e:
+            print(e)
+            return False
+        
+        def work(db):
             order = db.query(Order).filter(Order.id == order_id).first()
             if not order:
                 return False
+            if not can_transition(order.status, new_status, ORDER_TRANSITIONS):
+                print(f"Không thể chuyển đơn #{order_id} từ '{order.status.label}' sang '{new_status.label}'")
+                return False
             
-            order.status = status
-            db.commit()
+            order.status = new_status
             return True
+        
+        try:
+            return write_queue.run(work)
+        except VersionConflict as e:
+            print(e)
+            return e.conflict
         except SQLAlchemyError as e:
-            db.rollback()
             print(f"Database error: {e}")
             return False
-        finally:
-            db.close() 
\ No newline at end of file
@@ -0,0 +1,81 @@
+"""
+Reference Cache
+Bộ nhớ đệm dữ liệu tham chiếu (danh mục, thực đơn, nhân viên) dùng chung cho các màn hình
+
+Danh mục, thực đơn và danh sách nhân viên hầu như không đổi trong ca nhưng màn hình thực đơn,
+gọi món, kho, nhân viên và ca làm đều đọc lại khi dựng. Kết quả được giữ theo nhóm ("menu",
+"staff") tối đa MAX_AGE_SECONDS giây (để thấy thay đổi từ máy POS khác) và bị xóa ngay khi
+controller của nhóm ghi dữ liệu. app.controllers.warmup nạp sẵn trong lúc màn hình đăng nhập
+đang hiển thị.
+
+Giá trị là danh sách đối tượng ORM đã tách khỏi session (chỉ đọc); get() trả về bản sao của
+danh sách nên người gọi có thể sắp xếp/lọc mà không ảnh hưởng bộ đệm.
+"""
+
+import threading
+import time
+
+from app.utils.instrumentation import registry as instrumentation
+
+MAX_AGE_SECONDS = 300
+
+MENU = "menu"
+STAFF = "staff"
+
+
+class ReferenceCache:
+    def __init__(self, max_age=MAX_AGE_SECONDS):
+        self.max_age = max_age
+        self._entries = {}  # (nhóm, khóa) -> (thời điểm nạp, danh sách)
+        self._generations = {}  # nhóm -> số lần bị xóa, kết quả đọc trước lần xóa không được lưu
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, group, key):
+        """Bản sao danh sách đã lưu, None nếu chưa có hoặc đã quá hạn"""
+        with self._lock:
+            entry = self._entries.get((group, key))
+            if entry is not None and time.monotonic() - entry[0] < self.max_age:
+                self._stats["hits"] += 1
+                return list(entry[1])
+            self._stats["misses"] += 1
+            return None
+
+    def generation(self, group):
+        """Đọc trước khi truy vấn và truyền cho put()"""
+        with self._lock:
+            return self._generations.get(group, 0)
+
+    def put(self, group, key, values, generation):
+        """Lưu kết quả nếu nhóm không bị xóa trong lúc truy vấn"""
+        with self._lock:
+            if self._generations.get(group, 0) == generation:
+                self._entries[(group, key)] = (time.monotonic(), list(values))
+
+    def invalidate(self, group):
+        """Xóa dữ liệu của nhóm (gọi sau khi ghi)"""
+        with self._lock:
+            self._generations[group] = self._generations.get(group, 0) + 1
+            for entry_key in [entry_key for entry_key in self._entries if entry_key[0] == group]:
+                del self._entries[entry_key]
+            self._stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            for group in {group for group, _ in self._entries}:
+                self._generations[group] = self._generations.get(group, 0) + 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            return {
+                **self._stats,
+                "entries": {f"{group}.{key}": {"rows": len(values), "age_s": round(now - loaded_at, 1)}
+                            for (group, key), (loaded_at, values) in self._entries.items()},
+            }
+
+
+# Bộ đệm dùng chung trong tiến trình
+reference_cache = ReferenceCache()
+instrumentation.add_section("reference_cache", reference_cache.stats)
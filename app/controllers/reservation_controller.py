@@ -0,0 +1,333 @@
+from app.database.db_config import get_db
+from app.models.models import Reservation, Table, TableTurnoverDaily
+from app.utils.interval_index import KeyedIntervalIndex
+from app.utils.table_allocation import rank_tables, allocate_parties, DEFAULT_DWELL_MINUTES
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import func
+from datetime import datetime, timedelta
+import threading
+import time
+from app.utils.instrumentation import instrument_controller
+
+# Các trạng thái đặt bàn còn giữ chỗ
+ACTIVE_RESERVATION_STATUSES = ["đã đặt", "đã xác nhận", "đã đến"]
+
+# Chỉ mục được tải lại sau khoảng thời gian này để thấy thay đổi từ máy POS khác
+INDEX_TTL_SECONDS = 30
+
+# Giới hạn thời gian ngồi dự kiến (phút)
+MIN_PREDICTED_DWELL = 30
+MAX_PREDICTED_DWELL = 180
+
+# Thời lượng đặt bàn dài nhất (phút), dùng để giới hạn truy vấn kiểm tra trùng
+MAX_RESERVATION_MINUTES = 24 * 60
+
+@instrument_controller
+class ReservationController:
+    _index = None
+    _index_loaded_at = 0
+    _tables = None
+    _dwell_by_capacity = None
+    _lock = threading.RLock()
+
+    # ------------------------------------------------------------------ #
+    # Chỉ mục lượt đặt theo bàn
+    # ------------------------------------------------------------------ #
+    @staticmethod
+    def _reservation_end(reservation_time, duration):
+        return reservation_time + timedelta(minutes=duration or DEFAULT_DWELL_MINUTES)
+
+    @staticmethod
+    def _get_index():
+        """Lấy chỉ mục lượt đặt còn hiệu lực (tải lại khi hết hạn)"""
+        with ReservationController._lock:
+            expired = time.monotonic() - ReservationController._index_loaded_at > INDEX_TTL_SECONDS
+            if ReservationController._index is None or expired:
+                ReservationController._load_index()
+            return ReservationController._index
+
+    @staticmethod
+    def _load_index():
+        since = datetime.now() - timedelta(minutes=MAX_RESERVATION_MINUTES)
+        db = get_db()
+        try:
+            rows = db.query(
+                Reservation.id, Reservation.table_id, Reservation.reservation_time, Reservation.duration
+            ).filter(
+                Reservation.status.in_(ACTIVE_RESERVATION_STATUSES),
+                Reservation.reservation_time >= since
+            ).all()
+            tables = db.query(Table.id, Table.name, Table.capacity, Table.location).all()
+        except SQLAlchemyError as e:
+            print(f"Database error: {e}")
+            return
+        finally:
+            db.close()
+
+        index = KeyedIntervalIndex()
+        for reservation_id, table_id, reservation_time, duration in rows:
+            if table_id is not None:
+                end = ReservationController._reservation_end(reservation_time, duration)
+                index.add(table_id, reservation_time, end, reservation_id)
+
+        ReservationController._index = index
+        ReservationController._tables = [
+            {"id": table_id, "name": name, "capacity": capacity or 0, "location": location}
+            for table_id, name, capacity, location in tables
+        ]
+        ReservationController._index_loaded_at = time.monotonic()
+
+    @staticmethod
+    def invalidate_index():
+        with ReservationController._lock:
+            ReservationController._index = None
+            ReservationController._dwell_by_capacity = None
+
+    # ------------------------------------------------------------------ #
+    # Truy vấn
+    # ------------------------------------------------------------------ #
+    @staticmethod
+    def get_reservations(day=None):
+        """Lấy các lượt đặt trong một ngày (mặc định hôm nay)"""
+        if day is None:
+            day = datetime.now().date()
+        start_date = datetime.combine(day, datetime.min.time())
+        end_date = start_date + timedelta(days=1)
+
+        db = get_db()
+        try:
+            return db.query(Reservation).filter(
+                Reservation.reservation_time >= start_date,
+                Reservation.reservation_time < end_date
+            ).order_by(Reservation.reservation_time).all()
+        except SQLAlchemyError as e:
+            print(f"Database error: {e}")
+            return []
+        finally:
+            db.close()
+
+    @staticmethod
+    def has_conflict(table_id, start, end, exclude_id=None):
+        """Kiểm tra bàn đã có lượt đặt giao với [start, end) chưa (dùng chỉ mục)"""
+        return ReservationController._get_index().overlaps(table_id, start, end, exclude_id)
+
+    @staticmethod
+    def find_conflict(table_id, start, end, exclude_id=None, statuses=None, db=None):
+        """
+        Kiểm tra trùng lịch trực tiếp trên cơ sở dữ liệu bằng range probe theo
+        chỉ mục (table_id, reservation_time), dùng khi ghi để tránh dữ liệu cũ
+
+        Returns:
+            Reservation: Lượt đặt bị trùng đầu tiên, hoặc None
+        """
+        own_session = db is None
+        if own_session:
+            db = get_db()
+        try:
+            query = db.query(Reservation).filter(
+                Reservation.table_id == table_id,
+                Reservation.status.in_(statuses or ACTIVE_RESERVATION_STATUSES),
+                Reservation.reservation_time < end,
+                Reservation.reservation_time > start - timedelta(minutes=MAX_RESERVATION_MINUTES)
+            )
+            if exclude_id is not None:
+                query = query.filter(Reservation.id != exclude_id)
+            for reservation in query.order_by(Reservation.reservation_time).all():
+                if ReservationController._reservation_end(reservation.reservation_time, reservation.duration) > start:
+                    return reservation
+            return None
+        except SQLAlchemyError as e:
+            print(f"Database error: {e}")
+            return None
+        finally:
+            if own_session:
+                db.close()
+
+    @staticmethod
+    def predict_dwell(num_guests):
+        """
+        Dự đoán thời gian ngồi (phút) của một nhóm khách dựa trên thời gian ngồi
+        trung bình 90 ngày gần nhất của loại bàn nhỏ nhất đủ chỗ
+        """
+        with ReservationController._lock:
+            if ReservationController._dwell_by_capacity is None:
+                ReservationController._dwell_by_capacity = ReservationController._load_dwell_by_capacity()
+            dwell_by_capacity = ReservationController._dwell_by_capacity
+
+        fitting = sorted(capacity for capacity in dwell_by_capacity if capacity >= num_guests)
+        if not fitting:
+            return DEFAULT_DWELL_MINUTES
+        minutes = dwell_by_capacity[fitting[0]]
+        return int(min(max(minutes, MIN_PREDICTED_DWELL), MAX_PREDICTED_DWELL))
+
+    @staticmethod
+    def _load_dwell_by_capacity():
+        since = (datetime.now() - timedelta(days=90)).date()
+        db = get_db()
+        try:
+            rows = db.query(
+                Table.capacity,
+                func.sum(TableTurnoverDaily.dwell_minutes),
+                func.sum(
+                    TableTurnoverDaily.dwell_under_30 + TableTurnoverDaily.dwell_30_60
+                    + TableTurnoverDaily.dwell_60_90 + TableTurnoverDaily.dwell_over_90
+                )
+            ).join(
+                Table, Table.id == TableTurnoverDaily.table_id
+            ).filter(
+                TableTurnoverDaily.day >= since
+            ).group_by(Table.capacity).all()
+            return {capacity: total / count for capacity, total, count in rows if count}
+        except SQLAlchemyError as e:
+            print(f"Database error: {e}")
+            return {}
+        finally:
+            db.close()
+
+    @staticmethod
+    def find_available_tables(num_guests, start, end):
+        """
+        Tìm các bàn trống cho num_guests khách trong khoảng [start, end)
+        (ví dụ: bàn nào trống cho 4 người từ 19:00 đến 20:30)
+
+        Returns:
+            list: Các bàn [{'id', 'name', 'capacity', 'location'}] theo thứ tự phù hợp nhất
+        """
+        with ReservationController._lock:
+            index = ReservationController._get_index()
+            tables = ReservationController._tables or []
+            return [dict(table) for table in rank_tables(tables, index, num_guests, start, end)]
+
+    @staticmethod
+    def get_availability(start, end, party_sizes):
+        """
+        Truy vấn hàng loạt: với mỗi số khách, danh sách id bàn còn trống trong [start, end)
+
+        Returns:
+            dict: {num_guests: [table_id, ...]}
+        """
+        with ReservationController._lock:
+            index = ReservationController._get_index()
+            tables = ReservationController._tables or []
+            free = [table for table in tables if not index.overlaps(table["id"], start, end)]
+            return {
+                size: [table["id"] for table in rank_tables(free, index, size, start, end)]
+                for size in party_sizes
+            }
+
+    @staticmethod
+    def allocate_table(num_guests, start, duration=None):
+        """
+        Chọn bàn phù hợp nhất cho một nhóm khách
+
+        Returns:
+            tuple: (table_id hoặc None, thời lượng dự kiến theo phút)
+        """
+        duration = duration or ReservationController.predict_dwell(num_guests)
+        end = start + timedelta(minutes=duration)
+        ranked = ReservationController.find_available_tables(num_guests, start, end)
+        return (ranked[0]["id"] if ranked else None), duration
+
+    @staticmethod
+    def plan_allocation(parties):
+        """
+        Xếp bàn cho nhiều nhóm khách mà không ghi vào cơ sở dữ liệu
+
+        Args:
+            parties: [{'num_guests': n, 'start': datetime, 'duration': phút (tùy chọn)}]
+
+        Returns:
+            list: table_id cho từng nhóm (None nếu không còn bàn phù hợp)
+        """
+        with ReservationController._lock:
+            index = ReservationController._get_index()
+            tables = ReservationController._tables or []
+            # Xếp trên bản sao để không làm bẩn chỉ mục dùng chung
+            planning_index = KeyedIntervalIndex()
+            for table_id in index.keys():
+                for start, end, payload in index.index_for(table_id):
+                    planning_index.add(table_id, start, end, payload)
+        return allocate_parties(tables, planning_index, parties, ReservationController.predict_dwell)
+
+    # ------------------------------------------------------------------ #
+    # Ghi dữ liệu
+    # ------------------------------------------------------------------ #
+    @staticmethod
+    def create_reservation(reservation_time, num_guests, table_id=None, customer_id=None,
+                           duration=None, note=None):
+        """
+        Tạo lượt đặt bàn mới, tự xếp bàn nếu không chỉ định table_id
+
+        Returns:
+            tuple: (reservation_id hoặc None, message)
+        """
+        if table_id is None:
+            table_id, duration = ReservationController.allocate_table(num_guests, reservation_time, duration)
+            if table_id is None:
+                return None, "Không còn bàn phù hợp trong khoảng thời gian này"
+        duration = duration or ReservationController.predict_dwell(num_guests)
+        end = reservation_time + timedelta(minutes=duration)
+
+        db = get_db()
+        try:
+            table = db.query(Table).filter(Table.id == table_id).first()
+            if not table:
+                return None, "Bàn không tồn tại"
+            if (table.capacity or 0) < num_guests:
+                return None, f"{table.name} chỉ có {table.capacity} chỗ"
+
+            if ReservationController.find_conflict(table_id, reservation_time, end, db=db):
+                return None, f"{table.name} đã được đặt trong khoảng thời gian này"
+
+            reservation = Reservation(
+                customer_id=customer_id,
+                table_id=table_id,
+                reservation_time=reservation_time,
+                duration=duration,
+                num_guests=num_guests,
+                status="đã đặt",
+                note=note
+            )
+            db.add(reservation)
+            db.commit()
+            db.refresh(reservation)
+
+            with ReservationController._lock:
+                if ReservationController._index is not None:
+                    ReservationController._index.add(table_id, reservation_time, end, reservation.id)
+            return reservation.id, f"Đã đặt {table.name} lúc {reservation_time.strftime('%H:%M %d/%m/%Y')}"
+        except SQLAlchemyError as e:
+            db.rollback()
+            print(f"Database error: {e}")
+            return None, f"Lỗi cơ sở dữ liệu: {e}"
+        finally:
+            db.close()
+
+    @staticmethod
+    def update_reservation_status(reservation_id, status):
+        """Cập nhật trạng thái lượt đặt (đã đặt, đã xác nhận, đã đến, hủy)"""
+        db = get_db()
+        try:
+            reservation = db.query(Reservation).filter(Reservation.id == reservation_id).first()
+            if not reservation:
+                return False, "Lượt đặt không tồn tại"
+
+            reservation.status = status
+            table_id = reservation.table_id
+            db.commit()
+
+            if status not in ACTIVE_RESERVATION_STATUSES:
+                with ReservationController._lock:
+                    if ReservationController._index is not None:
+                        ReservationController._index.remove(table_id, reservation_id)
+            return True, "Đã cập nhật lượt đặt"
+        except SQLAlchemyError as e:
+            db.rollback()
+            print(f"Database error: {e}")
+            return False, f"Lỗi cơ sở dữ liệu: {e}"
+        finally:
+            db.close()
+
+    @staticmethod
+    def cancel_reservation(reservation_id):
+        return ReservationController.update_reservation_status(reservation_id, "hủy")
@@ -1,12 +1,49 @@
 from app.database.db_config import get_db
-from app.models.models import Shift, Staff
+from app.models.models import Shift, Staff, ShiftTemplate
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import and_, or_
+from sqlalchemy import insert, delete
 from datetime import datetime, timedelta
+import logging
 
-from app.utils.csp_scheduler import generate_optimal_shifts
+from app.controllers.stats_controller import StatsController
+from app.utils.csp_scheduler import STANDARD_SHIFTS, build_shift, SolverStats, describe_stats, STATUS_SOLVED
+from app.utils.roster_scheduler import solve_roster, COVERAGE_ROLES
+from app.utils.shift_optimizer import optimize_shifts, demand_from_hourly_orders, DEFAULT_TIME_BUDGET
+from app.utils.interval_index import KeyedIntervalIndex
+from app.utils.instrumentation import instrument_controller
 
+# Độ dài tối đa của một ca, dùng để giới hạn range probe theo (staff_id, start_time)
+MAX_SHIFT_HOURS = 24
+
+# Số id tối đa trong một câu lệnh DELETE ... IN (giới hạn tham số của SQLite)
+DELETE_BATCH_SIZE = 500
+
+# Số ngày lịch sử đơn hàng dùng để dự báo nhu cầu nhân viên theo giờ
+DEMAND_HISTORY_DAYS = 30
+
+# Thời gian tìm kiếm tối đa của bộ giải lịch (giây)
+SOLVER_TIMEOUT = 10
+
+logger = logging.getLogger(__name__)
+
+@instrument_controller
 class ShiftController:
+    @staticmethod
+    def _find_overlapping_shift(db, staff_id, start_time, end_time, exclude_id=None):
+        """
+        Tìm ca trùng giờ của nhân viên bằng range probe trên chỉ mục (staff_id, start_time):
+        chỉ các ca bắt đầu trong (start_time - MAX_SHIFT_HOURS, end_time) mới có thể giao nhau
+        """
+        query = db.query(Shift).filter(
+            Shift.staff_id == staff_id,
+            Shift.start_time < end_time,
+            Shift.start_time > start_time - timedelta(hours=MAX_SHIFT_HOURS),
+            Shift.end_time > start_time
+        )
+        if exclude_id is not None:
+            query = query.filter(Shift.id != exclude_id)
+        return query.first()
+    
     @staticmethod
     def get_all_shifts():
         db = get_db()
@@ -64,17 +101,7 @@ class ShiftController:
                 return False, "Nhân viên không tồn tại"
             
             # Kiểm tra xem ca làm việc có bị trùng không
-            existing_shift = db.query(Shift).filter(
-                and_(
-                    Shift.staff_id == staff_id,
-                    Shift.date == date,
-                    or_(
-                        and_(Shift.start_time <= start_time, Shift.end_time > start_time),
-                        and_(Shift.start_time < end_time, Shift.end_time >= end_time),
-                        and_(Shift.start_time >= start_time, Shift.end_time <= end_time)
-                    )
-                )
-            ).first()
+            existing_shift = ShiftController._find_overlapping_shift(db, staff_id, start_time, end_time)
             
             if existing_shift:
                 return False, "Nhân viên đã có ca làm việc trong khoảng thời gian này"
@@ -97,6 +124,75 @@ class ShiftController:
         finally:
             db.close()
     
+    @staticmethod
+    def add_shifts(shifts):
+        """
+        Thêm nhiều ca làm việc (ví dụ cả tuần) trong một lần kiểm tra và một giao dịch
+        
+        Args:
+            shifts: Danh sách [{'staff_id', 'date', 'start_time', 'end_time', 'status' (tùy chọn)}]
+            
+        Returns:
+            tuple: (success, message) - không ca nào được thêm nếu có lỗi
+        """
+        if not shifts:
+            return True, "Không có ca làm việc nào cần thêm"
+        
+        db = get_db()
+        try:
+            staff_ids = {shift["staff_id"] for shift in shifts}
+            existing_staff = {staff_id for (staff_id,) in db.query(Staff.id).filter(Staff.id.in_(staff_ids)).all()}
+            
+            # Tải các ca hiện có của các nhân viên liên quan trong một truy vấn
+            window_start = min(shift["start_time"] for shift in shifts) - timedelta(hours=MAX_SHIFT_HOURS)
+            window_end = max(shift["end_time"] for shift in shifts)
+            index = KeyedIntervalIndex()
+            for shift_id, staff_id, start_time, end_time in db.query(
+                Shift.id, Shift.staff_id, Shift.start_time, Shift.end_time
+            ).filter(
+                Shift.staff_id.in_(staff_ids),
+                Shift.start_time < window_end,
+                Shift.start_time > window_start
+            ).all():
+                index.add(staff_id, start_time, end_time, shift_id)
+            
+            # Kiểm tra từng ca với các ca hiện có và các ca trong cùng đợt
+            errors = []
+            rows = []
+            for position, shift in enumerate(shifts):
+                staff_id = shift["staff_id"]
+                start_time, end_time = shift["start_time"], shift["end_time"]
+                label = f"Ca {position + 1} ({start_time.strftime('%d/%m %H:%M')})"
+                
+                if staff_id not in existing_staff:
+                    errors.append(f"{label}: nhân viên không tồn tại")
+                elif start_time >= end_time:
+                    errors.append(f"{label}: thời gian bắt đầu phải trước thời gian kết thúc")
+                elif index.overlaps(staff_id, start_time, end_time):
+                    errors.append(f"{label}: nhân viên đã có ca làm việc trong khoảng thời gian này")
+                else:
+                    index.add(staff_id, start_time, end_time, ("new", position))
+                    rows.append({
+                        "staff_id": staff_id,
+                        "date": shift["date"],
+                        "start_time": start_time,
+                        "end_time": end_time,
+                        "status": shift.get("status", "lịch")
+                    })
+            
+            if errors:
+                return False, "\n".join(errors)
+            
+            db.execute(insert(Shift), rows)
+            db.commit()
+            return True, f"Đã thêm {len(rows)} ca làm việc thành công"
+        except SQLAlchemyError as e:
+            db.rollback()
+            print(f"Database error: {e}")
+            return False, f"Lỗi cơ sở dữ liệu: {e}"
+        finally:
+            db.close()
+    
     @staticmethod
     def update_shift(shift_id, **kwargs):
         db = get_db()
@@ -105,25 +201,15 @@ class ShiftController:
             if not shift:
                 return False, "Ca làm việc không tồn tại"
             
-            # Kiểm tra xem có bị trùng ca không nếu thay đổi thời gian
-            if ('start_time' in kwargs or 'end_time' in kwargs or 'date' in kwargs) and 'staff_id' in kwargs:
+            # Kiểm tra xem có bị trùng ca không nếu thay đổi thời gian hoặc nhân viên
+            if 'start_time' in kwargs or 'end_time' in kwargs or 'staff_id' in kwargs:
                 start_time = kwargs.get('start_time', shift.start_time)
                 end_time = kwargs.get('end_time', shift.end_time)
-                date = kwargs.get('date', shift.date)
                 staff_id = kwargs.get('staff_id', shift.staff_id)
                 
-                existing_shift = db.query(Shift).filter(
-                    and_(
-                        Shift.staff_id == staff_id,
-                        Shift.date == date,
-                        or_(
-                            and_(Shift.start_time <= start_time, Shift.end_time > start_time),
-                            and_(Shift.start_time < end_time, Shift.end_time >= end_time),
-                            and_(Shift.start_time >= start_time, Shift.end_time <= end_time)
-                        ),
-                        Shift.id != shift_id  # Loại trừ chính nó
-                    )
-                ).first()
+                existing_shift = ShiftController._find_overlapping_shift(
+                    db, staff_id, start_time, end_time, exclude_id=shift_id  # Loại trừ chính nó
+                )
                 
                 if existing_shift:
                     return False, "Nhân viên đã có ca làm việc trong khoảng thời gian này"
@@ -180,67 +266,206 @@ class ShiftController:
             db.close()
     
     @staticmethod
-    def generate_automatic_schedule(week_start_date, min_staff_per_day=2, max_shifts_per_week=5):
+    def _apply_schedule_diff(db, week_start_date, week_end_date, generated_shifts):
+        """
+        Áp dụng lịch mới theo kiểu diff: giữ các ca trùng khớp (cùng nhân viên, giờ
+        bắt đầu, giờ kết thúc), xóa các ca còn lại bằng một DELETE theo tập id và
+        thêm các ca mới bằng một lệnh insert executemany
+        
+        Returns:
+            tuple: (số ca giữ lại, số ca thêm mới, số ca đã xóa)
+        """
+        # Khoảng nửa mở theo datetime để không bỏ sót các ca của ngày cuối
+        range_start = datetime.combine(week_start_date, datetime.min.time())
+        range_end = datetime.combine(week_end_date, datetime.min.time()) + timedelta(days=1)
+        existing = db.query(Shift.id, Shift.staff_id, Shift.start_time, Shift.end_time).filter(
+            Shift.date >= range_start,
+            Shift.date < range_end
+        ).all()
+        
+        wanted = {}
+        for shift_data in generated_shifts:
+            key = (shift_data["staff_id"], shift_data["start_time"], shift_data["end_time"])
+            wanted[key] = shift_data
+        
+        kept_keys = set()
+        delete_ids = []
+        for shift_id, staff_id, start_time, end_time in existing:
+            key = (staff_id, start_time, end_time)
+            if key in wanted and key not in kept_keys:
+                kept_keys.add(key)
+            else:
+                delete_ids.append(shift_id)
+        
+        new_rows = [{
+            "staff_id": shift_data["staff_id"],
+            "date": shift_data["date"],
+            "start_time": shift_data["start_time"],
+            "end_time": shift_data["end_time"],
+            "status": shift_data["status"]
+        } for key, shift_data in wanted.items() if key not in kept_keys]
+        
+        for offset in range(0, len(delete_ids), DELETE_BATCH_SIZE):
+            batch = delete_ids[offset:offset + DELETE_BATCH_SIZE]
+            db.execute(delete(Shift).where(Shift.id.in_(batch)))
+        
+        if new_rows:
+            db.execute(insert(Shift), new_rows)
+        
+        return len(kept_keys), len(new_rows), len(delete_ids)
+    
+    @staticmethod
+    def get_shift_templates():
+        """
+        Lấy các ca mẫu đang dùng cho lập lịch tự động
+        
+        Returns:
+            list: Các ca mẫu dạng dict như STANDARD_SHIFTS (dùng STANDARD_SHIFTS nếu chưa cấu hình)
+        """
+        db = get_db()
+        try:
+            templates = db.query(ShiftTemplate).filter(
+                ShiftTemplate.is_active == True
+            ).order_by(ShiftTemplate.start_hour, ShiftTemplate.start_minute, ShiftTemplate.id).all()
+            if not templates:
+                return list(STANDARD_SHIFTS)
+            return [{
+                "name": template.name,
+                "start_hour": template.start_hour,
+                "start_minute": template.start_minute or 0,
+                "end_hour": template.end_hour,
+                "end_minute": template.end_minute or 0,
+                "min_per_role": template.min_per_role or 0
+            } for template in templates]
+        except SQLAlchemyError as e:
+            print(f"Database error: {e}")
+            return list(STANDARD_SHIFTS)
+        finally:
+            db.close()
+    
+    @staticmethod
+    def _log_schedule_stats(week_start_date, weeks, stats):
+        """Ghi log thống kê bộ giải để theo dõi các tuần khó xếp lịch"""
+        level = logging.INFO if stats.get("status") == STATUS_SOLVED else logging.WARNING
+        logger.log(level, "Tạo lịch tự động từ %s (%d tuần): %s", week_start_date, weeks, describe_stats(stats))
+        for name, subproblem in stats.get("subproblems", {}).items():
+            logger.debug("  Bài toán con %s: %s", name, describe_stats(subproblem))
+        optimizer = stats.get("optimizer")
+        if optimizer:
+            logger.info("  Tối ưu: %d bước, chi phí %.1f -> %.1f trong %.2fs",
+                        optimizer["iterations"], optimizer["initial_cost"], optimizer["best_cost"],
+                        optimizer["elapsed"])
+    
+    @staticmethod
+    def generate_automatic_schedule(week_start_date, min_staff_per_day=2, max_shifts_per_week=5,
+                                    optimize=False, weeks=1, time_budget=DEFAULT_TIME_BUDGET,
+                                    coverage_roles=COVERAGE_ROLES, timeout=SOLVER_TIMEOUT,
+                                    allow_partial=False):
         """
         Tạo lịch làm việc tự động sử dụng thuật toán CSP
         
+        Thuật toán chạy khi chưa mở giao dịch ghi; lịch mới được áp dụng theo kiểu
+        diff trong một giao dịch ngắn. Có thể gọi từ luồng nền.
+        
         Args:
             week_start_date: Ngày bắt đầu tuần
             min_staff_per_day: Số nhân viên tối thiểu mỗi ngày
             max_shifts_per_week: Số ca tối đa mỗi nhân viên một tuần
+            optimize: Tối ưu lịch theo nhu cầu từng giờ và cân bằng giờ làm
+            weeks: Số tuần cần xếp lịch
+            time_budget: Thời gian tối đa cho pha tối ưu (giây)
+            coverage_roles: Các vai trò phải có mặt trong mỗi ca (theo min_per_role của ca mẫu)
+            timeout: Thời gian tìm kiếm tối đa của bộ giải (giây)
+            allow_partial: Áp dụng lời giải một phần khi bộ giải hết thời gian
             
         Returns:
-            tuple: (success, message)
+            tuple: (success, message, stats) với stats là thống kê bộ giải (số nút, số lần
+                   quay lui, số lần kiểm tra ràng buộc, độ sâu lớn nhất, thời gian từng pha)
         """
+        timing = SolverStats()
+        stats = {}
         db = get_db()
         try:
-            # Lấy danh sách nhân viên đang hoạt động
-            staff_list = db.query(Staff).filter(Staff.is_active == True).all()
+            with timing.phase("load"):
+                # Lấy danh sách nhân viên đang hoạt động
+                staff_list = db.query(Staff).filter(Staff.is_active == True).all()
+                templates = ShiftController.get_shift_templates()
             
             if not staff_list:
-                return False, "Không có nhân viên nào đang hoạt động"
+                return False, "Không có nhân viên nào đang hoạt động", stats
             
-            # Xóa tất cả ca làm việc đã có trong tuần này
-            week_end_date = week_start_date + timedelta(days=6)
-            existing_shifts = db.query(Shift).filter(
-                Shift.date >= week_start_date,
-                Shift.date <= week_end_date
-            ).all()
-            
-            for shift in existing_shifts:
-                db.delete(shift)
+            # Lập lịch theo vai trò (các vai trò được giải song song)
+            with timing.phase("roster"):
+                slots, error, stats = solve_roster(
+                    [(staff.id, staff.role) for staff in staff_list],
+                    weeks,
+                    templates,
+                    min_staff_per_day,
+                    max_shifts_per_week,
+                    coverage_roles,
+                    timeout=timeout,
+                    allow_partial=allow_partial
+                )
+            if slots is None:
+                return False, error or "Không thể tạo lịch làm việc thỏa mãn tất cả ràng buộc", stats
             
-            # Tạo lịch tự động bằng thuật toán CSP
-            optimal_shifts = generate_optimal_shifts(
-                staff_list,
-                week_start_date,
-                min_staff_per_day,
-                max_shifts_per_week
-            )
+            summary = None
+            if optimize:
+                # Dự báo nhu cầu theo giờ từ lịch sử đơn hàng, sau đó tối ưu lời giải CSP
+                with timing.phase("optimize"):
+                    hourly_orders = StatsController.get_hourly_distribution(DEMAND_HISTORY_DAYS)
+                    demand = demand_from_hourly_orders(hourly_orders, DEMAND_HISTORY_DAYS, shifts=templates)
+                    optimal_shifts, summary = optimize_shifts(
+                        staff_list,
+                        week_start_date,
+                        demand,
+                        weeks,
+                        min_staff_per_day,
+                        max_shifts_per_week,
+                        time_budget,
+                        shifts=templates,
+                        initial_slots=slots,
+                        coverage_roles=coverage_roles
+                    )
+                stats["optimizer"] = summary
+            else:
+                optimal_shifts = [
+                    build_shift(staff_id, week_start_date + timedelta(days=day), templates[shift_idx])
+                    for staff_id, day, shift_idx in slots
+                ]
             
             if not optimal_shifts:
-                return False, "Không thể tạo lịch làm việc thỏa mãn tất cả ràng buộc"
+                return False, "Không thể tạo lịch làm việc thỏa mãn tất cả ràng buộc", stats
             
-            # Lưu lịch làm việc vào cơ sở dữ liệu
-            for shift_data in optimal_shifts:
-                new_shift = Shift(
-                    staff_id=shift_data["staff_id"],
-                    date=shift_data["date"],
-                    start_time=shift_data["start_time"],
-                    end_time=shift_data["end_time"],
-                    status=shift_data["status"]
+            # Thay thế các ca làm việc trong khoảng thời gian bằng lịch mới
+            with timing.phase("apply"):
+                week_end_date = week_start_date + timedelta(days=7 * weeks - 1)
+                kept, inserted, deleted = ShiftController._apply_schedule_diff(
+                    db, week_start_date, week_end_date, optimal_shifts
                 )
-                db.add(new_shift)
+                db.commit()
             
-            db.commit()
-            return True, f"Đã tạo {len(optimal_shifts)} ca làm việc tự động"
+            message = (f"Đã tạo {len(optimal_shifts)} ca làm việc tự động "
+                       f"(giữ nguyên {kept}, thêm {inserted}, xóa {deleted})")
+            if error:
+                message += f"\n{error}"
+            if summary:
+                message += (f"\nThiếu {summary['understaffed_hours']} giờ-người so với nhu cầu, "
+                            f"giờ làm mỗi nhân viên từ {summary['min_staff_hours']:.0f}h "
+                            f"đến {summary['max_staff_hours']:.0f}h")
+            return True, message, stats
             
         except SQLAlchemyError as e:
             db.rollback()
             print(f"Database error: {e}")
-            return False, f"Lỗi cơ sở dữ liệu: {e}"
+            return False, f"Lỗi cơ sở dữ liệu: {e}", stats
         finally:
             db.close()
+            # Thời gian từng pha: pha tổng của controller và pha bên trong bộ giải
+            solver_phases = stats.get("phases", {})
+            stats["phases"] = dict(timing.phases)
+            stats["phases"].update({f"roster.{name}": seconds for name, seconds in solver_phases.items()})
+            ShiftController._log_schedule_stats(week_start_date, weeks, stats)
     
     @staticmethod
     def get_staff_workload(week_start_date=None):
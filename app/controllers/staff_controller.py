@@ -1,8 +1,11 @@
 from app.database.db_config import get_db
 from app.models.models import Staff
+from app.controllers.reference_cache import reference_cache, STAFF
 from sqlalchemy.exc import SQLAlchemyError
 import hashlib
+from app.utils.instrumentation import instrument_controller
 
+@instrument_controller
 class StaffController:
     @staticmethod
     def hash_password(password):
@@ -30,9 +33,16 @@ class StaffController:
     
     @staticmethod
     def get_all_staff():
+        cached = reference_cache.get(STAFF, "active")
+        if cached is not None:
+            return cached
+        
         db = get_db()
         try:
-            return db.query(Staff).filter(Staff.is_active == True).all()
+            generation = reference_cache.generation(STAFF)
+            staffs = db.query(Staff).filter(Staff.is_active == True).all()
+            reference_cache.put(STAFF, "active", staffs, generation)
+            return staffs
         except SQLAlchemyError as e:
             print(f"Database error: {e}")
             return []
@@ -74,6 +84,7 @@ class StaffController:
             
             db.add(new_staff)
             db.commit()
+            reference_cache.invalidate(STAFF)
             return True
         except SQLAlchemyError as e:
             db.rollback()
@@ -100,6 +111,7 @@ class StaffController:
                     setattr(staff, key, value)
             
             db.commit()
+            reference_cache.invalidate(STAFF)
             return True
         except SQLAlchemyError as e:
             db.rollback()
@@ -120,6 +132,7 @@ class StaffController:
             staff.is_active = False
             
             db.commit()
+            reference_cache.invalidate(STAFF)
             return True
         except SQLAlchemyError as e:
             db.rollback()
@@ -144,6 +157,7 @@ class StaffController:
             staff.password = StaffController.hash_password(new_password)
             
             db.commit()
+            reference_cache.invalidate(STAFF)
             return True
         except SQLAlchemyError as e:
             db.rollback()
@@ -1,30 +1,73 @@
-from app.database.db_config import get_db
-from app.models.models import Order, MenuItem, OrderItem, Staff
+from app.database.db_config import get_db, get_analytics_db
+from app.database.consolidation import ALL_BRANCHES, analytics_exists
+from app.models.models import (OrderHistory, OrderItemHistory, MenuItem, Staff, DailySalesSummary,
+                               Branch, BranchOrder, BranchOrderItem, BranchMenuItem, BranchStaff)
+from app.models.status import OrderStatus
+from app.controllers.archive_controller import ArchiveController
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import func, and_, extract
+from sqlalchemy import func, and_, extract, select
 from datetime import datetime, timedelta
 import pandas as pd
 import numpy as np
+from app.utils.instrumentation import instrument_controller
 
+@instrument_controller
 class StatsController:
+    # Các báo cáo nhận branches: None đọc cơ sở dữ liệu của quán, ALL_BRANCHES hoặc danh sách mã
+    # chi nhánh đọc kho hợp nhất (app.database.consolidation)
     @staticmethod
-    def get_revenue_by_date_range(start_date, end_date):
-        db = get_db()
+    def _filter_branches(query, model, branches):
+        """Giới hạn truy vấn trên kho hợp nhất trong các chi nhánh được chọn"""
+        if branches == ALL_BRANCHES:
+            return query
+        return query.filter(model.branch_id.in_(select(Branch.id).where(Branch.code.in_(list(branches)))))
+    
+    @staticmethod
+    def get_revenue_by_date_range(start_date, end_date, branches=None):
+        # Ngày trước mốc lưu trữ đọc từ bảng tổng hợp, các ngày còn lại từ view hợp nhất
+        archived_before = ArchiveController.archived_before() if branches is None else None
+        live_start = start_date
+        
+        db = get_db() if branches is None else get_analytics_db()
         try:
-            orders = db.query(
-                func.date(Order.order_time).label('date'),
-                func.sum(Order.final_amount).label('revenue')
-            ).filter(
-                Order.order_time >= start_date,
-                Order.order_time <= end_date,
-                Order.status == "đã thanh toán"
-            ).group_by(
-                func.date(Order.order_time)
-            ).all()
+            orders = []
+            if branches is not None:
+                orders += StatsController._filter_branches(db.query(
+                    func.date(BranchOrder.order_time).label('date'),
+                    func.sum(BranchOrder.final_amount).label('revenue')
+                ).filter(
+                    BranchOrder.order_time >= start_date,
+                    BranchOrder.order_time <= end_date,
+                    BranchOrder.status == OrderStatus.PAID
+                ), BranchOrder, branches).group_by(
+                    func.date(BranchOrder.order_time)
+                ).all()
+            elif archived_before and pd.Timestamp(start_date) < pd.Timestamp(archived_before):
+                orders += db.query(
+                    DailySalesSummary.day.label('date'),
+                    DailySalesSummary.revenue.label('revenue')
+                ).filter(
+                    DailySalesSummary.day >= pd.Timestamp(start_date).date(),
+                    DailySalesSummary.day <= pd.Timestamp(end_date).date(),
+                    DailySalesSummary.day < archived_before.date()
+                ).all()
+                live_start = max(pd.Timestamp(start_date), pd.Timestamp(archived_before)).to_pydatetime()
+            
+            if branches is None:
+                orders += db.query(
+                    func.date(OrderHistory.order_time).label('date'),
+                    func.sum(OrderHistory.final_amount).label('revenue')
+                ).filter(
+                    OrderHistory.order_time >= live_start,
+                    OrderHistory.order_time <= end_date,
+                    OrderHistory.status == OrderStatus.PAID
+                ).group_by(
+                    func.date(OrderHistory.order_time)
+                ).all()
             
             # Convert to DataFrame for easier manipulation
             if orders:
-                df = pd.DataFrame([(o.date, o.revenue) for o in orders], columns=['date', 'revenue'])
+                df = pd.DataFrame([(str(o.date), o.revenue) for o in orders], columns=['date', 'revenue'])
                 df['date'] = pd.to_datetime(df['date'])
                 df = df.set_index('date')
                 
@@ -41,32 +84,80 @@ class StatsController:
             db.close()
     
     @staticmethod
-    def get_top_selling_items(start_date, end_date, limit=10):
+    def get_top_selling_items(start_date, end_date, limit=10, branches=None):
+        if branches is not None:
+            return StatsController._get_branch_top_selling_items(start_date, end_date, limit, branches)
+        
         db = get_db()
         try:
+            # Doanh thu theo đơn giá lúc bán (line_total), gộp trên bảng món;
+            # tên món chỉ được tra cho các dòng đứng đầu
+            top = db.query(
+                OrderItemHistory.menu_item_id.label('id'),
+                func.sum(OrderItemHistory.quantity).label('quantity'),
+                func.sum(OrderItemHistory.line_total).label('revenue')
+            ).join(
+                OrderHistory,
+                and_(
+                    OrderHistory.id == OrderItemHistory.order_id,
+                    OrderHistory.order_time >= start_date,
+                    OrderHistory.order_time <= end_date,
+                    OrderHistory.status == OrderStatus.PAID
+                )
+            ).group_by(
+                OrderItemHistory.menu_item_id
+            ).order_by(
+                func.sum(OrderItemHistory.quantity).desc()
+            ).limit(limit).subquery()
+            
             items = db.query(
-                MenuItem.id,
+                top.c.id,
                 MenuItem.name,
-                func.sum(OrderItem.quantity).label('quantity'),
-                func.sum(MenuItem.price * OrderItem.quantity).label('revenue')
+                top.c.quantity,
+                top.c.revenue
+            ).join(
+                MenuItem, MenuItem.id == top.c.id
+            ).order_by(
+                top.c.quantity.desc()
+            ).all()
+            
+            return items
+        except SQLAlchemyError as e:
+            print(f"Database error: {e}")
+            return []
+        finally:
+            db.close()
+    
+    @staticmethod
+    def _get_branch_top_selling_items(start_date, end_date, limit, branches):
+        """Món bán chạy trên kho hợp nhất; id món khác nhau giữa các chi nhánh nên gộp theo tên"""
+        db = get_analytics_db()
+        try:
+            return StatsController._filter_branches(db.query(
+                func.min(BranchMenuItem.id).label('id'),
+                BranchMenuItem.name,
+                func.sum(BranchOrderItem.quantity).label('quantity'),
+                func.sum(BranchOrderItem.line_total).label('revenue')
             ).join(
-                OrderItem,
-                MenuItem.id == OrderItem.menu_item_id
+                BranchOrder,
+                and_(
+                    BranchOrder.branch_id == BranchOrderItem.branch_id,
+                    BranchOrder.id == BranchOrderItem.order_id,
+                    BranchOrder.order_time >= start_date,
+                    BranchOrder.order_time <= end_date,
+                    BranchOrder.status == OrderStatus.PAID
+                )
             ).join(
-                Order,
+                BranchMenuItem,
                 and_(
-                    Order.id == OrderItem.order_id,
-                    Order.order_time >= start_date,
-                    Order.order_time <= end_date,
-                    Order.status == "đã thanh toán"
+                    BranchMenuItem.branch_id == BranchOrderItem.branch_id,
+                    BranchMenuItem.id == BranchOrderItem.menu_item_id
                 )
-            ).group_by(
-                MenuItem.id
+            ), BranchOrderItem, branches).group_by(
+                BranchMenuItem.name
             ).order_by(
-                func.sum(OrderItem.quantity).desc()
+                func.sum(BranchOrderItem.quantity).desc()
             ).limit(limit).all()
-            
-            return items
         except SQLAlchemyError as e:
             print(f"Database error: {e}")
             return []
@@ -74,19 +165,23 @@ class StatsController:
             db.close()
     
     @staticmethod
-    def get_hourly_distribution(days=30):
+    def get_hourly_distribution(days=30, branches=None):
         start_date = datetime.now() - timedelta(days=days)
+        orders = OrderHistory if branches is None else BranchOrder
         
-        db = get_db()
+        db = get_db() if branches is None else get_analytics_db()
         try:
-            hourly_data = db.query(
-                extract('hour', Order.order_time).label('hour'),
-                func.count(Order.id).label('count')
+            query = db.query(
+                extract('hour', orders.order_time).label('hour'),
+                func.count(orders.id).label('count')
             ).filter(
-                Order.order_time >= start_date,
-                Order.status == "đã thanh toán"
-            ).group_by(
-                extract('hour', Order.order_time)
+                orders.order_time >= start_date,
+                orders.status == OrderStatus.PAID
+            )
+            if branches is not None:
+                query = StatsController._filter_branches(query, BranchOrder, branches)
+            hourly_data = query.group_by(
+                extract('hour', orders.order_time)
             ).all()
             
             # Convert to a more usable format
@@ -102,21 +197,24 @@ class StatsController:
             db.close()
     
     @staticmethod
-    def get_staff_performance(start_date, end_date):
+    def get_staff_performance(start_date, end_date, branches=None):
+        if branches is not None:
+            return StatsController._get_branch_staff_performance(start_date, end_date, branches)
+        
         db = get_db()
         try:
             performance = db.query(
                 Staff.id,
                 Staff.name,
-                func.count(Order.id).label('orders_count'),
-                func.sum(Order.final_amount).label('total_revenue')
+                func.count(OrderHistory.id).label('orders_count'),
+                func.sum(OrderHistory.final_amount).label('total_revenue')
             ).join(
-                Order,
+                OrderHistory,
                 and_(
-                    Staff.id == Order.staff_id,
-                    Order.order_time >= start_date,
-                    Order.order_time <= end_date,
-                    Order.status == "đã thanh toán"
+                    Staff.id == OrderHistory.staff_id,
+                    OrderHistory.order_time >= start_date,
+                    OrderHistory.order_time <= end_date,
+                    OrderHistory.status == OrderStatus.PAID
                 )
             ).group_by(
                 Staff.id
@@ -130,13 +228,93 @@ class StatsController:
             db.close()
     
     @staticmethod
-    def predict_revenue(days_ahead=7):
+    def _get_branch_staff_performance(start_date, end_date, branches):
+        """Hiệu suất nhân viên trên kho hợp nhất (nhân viên được phân biệt theo chi nhánh)"""
+        db = get_analytics_db()
+        try:
+            return StatsController._filter_branches(db.query(
+                BranchStaff.id,
+                BranchStaff.name,
+                Branch.code.label('branch'),
+                func.count(BranchOrder.id).label('orders_count'),
+                func.sum(BranchOrder.final_amount).label('total_revenue')
+            ).join(
+                Branch, Branch.id == BranchStaff.branch_id
+            ).join(
+                BranchOrder,
+                and_(
+                    BranchOrder.branch_id == BranchStaff.branch_id,
+                    BranchOrder.staff_id == BranchStaff.id,
+                    BranchOrder.order_time >= start_date,
+                    BranchOrder.order_time <= end_date,
+                    BranchOrder.status == OrderStatus.PAID
+                )
+            ), BranchStaff, branches).group_by(
+                BranchStaff.branch_id, BranchStaff.id
+            ).all()
+        except SQLAlchemyError as e:
+            print(f"Database error: {e}")
+            return []
+        finally:
+            db.close()
+    
+    @staticmethod
+    def get_revenue_by_branch(start_date, end_date, branches=ALL_BRANCHES):
+        """
+        Doanh thu theo ngày của từng chi nhánh từ kho hợp nhất
+        
+        Returns:
+            DataFrame: chỉ mục là ngày, mỗi cột là mã một chi nhánh
+        """
+        db = get_analytics_db()
+        try:
+            rows = StatsController._filter_branches(db.query(
+                func.date(BranchOrder.order_time).label('date'),
+                Branch.code.label('branch'),
+                func.sum(BranchOrder.final_amount).label('revenue')
+            ).join(
+                Branch, Branch.id == BranchOrder.branch_id
+            ).filter(
+                BranchOrder.order_time >= start_date,
+                BranchOrder.order_time <= end_date,
+                BranchOrder.status == OrderStatus.PAID
+            ), BranchOrder, branches).group_by(
+                func.date(BranchOrder.order_time), Branch.code
+            ).all()
+            
+            if not rows:
+                return pd.DataFrame()
+            df = pd.DataFrame([(str(r.date), r.branch, r.revenue) for r in rows], columns=['date', 'branch', 'revenue'])
+            df['date'] = pd.to_datetime(df['date'])
+            df = df.pivot(index='date', columns='branch', values='revenue')
+            return df.reindex(pd.date_range(start=start_date, end=end_date), fill_value=0).fillna(0)
+        except SQLAlchemyError as e:
+            print(f"Database error: {e}")
+            return pd.DataFrame()
+        finally:
+            db.close()
+    
+    @staticmethod
+    def get_branch_codes():
+        """Mã các chi nhánh trong kho hợp nhất (rỗng nếu chưa hợp nhất lần nào)"""
+        if not analytics_exists():
+            return []
+        db = get_analytics_db()
+        try:
+            return [code for (code,) in db.query(Branch.code).order_by(Branch.code)]
+        except SQLAlchemyError:
+            return []
+        finally:
+            db.close()
+    
+    @staticmethod
+    def predict_revenue(days_ahead=7, branches=None):
         """Simple revenue prediction using linear regression"""
         # Get last 30 days data
         end_date = datetime.now()
         start_date = end_date - timedelta(days=30)
         
-        revenue_df = StatsController.get_revenue_by_date_range(start_date, end_date)
+        revenue_df = StatsController.get_revenue_by_date_range(start_date, end_date, branches)
         
         if revenue_df.empty:
             return [0] * days_ahead
@@ -160,22 +338,57 @@ class StatsController:
         return predictions.tolist()
     
     @staticmethod
-    def get_category_distribution(start_date, end_date):
+    def _get_branch_category_distribution(start_date, end_date, branches):
+        """Số món bán theo danh mục trên kho hợp nhất"""
+        db = get_analytics_db()
+        try:
+            return StatsController._filter_branches(db.query(
+                BranchMenuItem.category_id,
+                func.sum(BranchOrderItem.quantity).label('count')
+            ).join(
+                BranchOrderItem,
+                and_(
+                    BranchMenuItem.branch_id == BranchOrderItem.branch_id,
+                    BranchMenuItem.id == BranchOrderItem.menu_item_id
+                )
+            ).join(
+                BranchOrder,
+                and_(
+                    BranchOrder.branch_id == BranchOrderItem.branch_id,
+                    BranchOrder.id == BranchOrderItem.order_id,
+                    BranchOrder.order_time >= start_date,
+                    BranchOrder.order_time <= end_date,
+                    BranchOrder.status == OrderStatus.PAID
+                )
+            ), BranchOrderItem, branches).group_by(
+                BranchMenuItem.category_id
+            ).all()
+        except SQLAlchemyError as e:
+            print(f"Database error: {e}")
+            return []
+        finally:
+            db.close()
+    
+    @staticmethod
+    def get_category_distribution(start_date, end_date, branches=None):
+        if branches is not None:
+            return StatsController._get_branch_category_distribution(start_date, end_date, branches)
+        
         db = get_db()
         try:
             category_data = db.query(
                 MenuItem.category_id,
-                func.sum(OrderItem.quantity).label('count')
+                func.sum(OrderItemHistory.quantity).label('count')
             ).join(
-                OrderItem,
-                MenuItem.id == OrderItem.menu_item_id
+                OrderItemHistory,
+                MenuItem.id == OrderItemHistory.menu_item_id
             ).join(
-                Order,
+                OrderHistory,
                 and_(
-                    Order.id == OrderItem.order_id,
-                    Order.order_time >= start_date,
-                    Order.order_time <= end_date,
-                    Order.status == "đã thanh toán"
+                    OrderHistory.id == OrderItemHistory.order_id,
+                    OrderHistory.order_time >= start_date,
+                    OrderHistory.order_time <= end_date,
+                    OrderHistory.status == OrderStatus.PAID
                 )
             ).group_by(
                 MenuItem.category_id
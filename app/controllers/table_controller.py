@@ -1,8 +1,11 @@
 from app.database.db_config import get_db
 from app.models.models import Table
+from app.controllers.table_state_store import table_state_store
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import joinedload
+from app.utils.instrumentation import instrument_controller
 
+@instrument_controller
 class TableController:
     @staticmethod
     def get_all_tables():
@@ -47,6 +50,7 @@ class TableController:
             
             table.status = status
             db.commit()
+            table_state_store.table_status_changed(table_id, status)
             return True
         except SQLAlchemyError as e:
             db.rollback()
@@ -67,6 +71,7 @@ class TableController:
             )
             db.add(new_table)
             db.commit()
+            table_state_store.tables_changed()
             return True
         except SQLAlchemyError as e:
             db.rollback()
@@ -88,6 +93,7 @@ class TableController:
                     setattr(table, key, value)
             
             db.commit()
+            table_state_store.tables_changed()
             return True
         except SQLAlchemyError as e:
             db.rollback()
@@ -106,6 +112,7 @@ class TableController:
             
             db.delete(table)
             db.commit()
+            table_state_store.tables_changed()
             return True
         except SQLAlchemyError as e:
             db.rollback()
@@ -0,0 +1,258 @@
+"""
+Table State Store
+Bộ nhớ đệm trạng thái bàn (trạng thái, đơn hiện tại, giờ vào bàn, tạm tính)
+dùng chung cho sơ đồ bàn và các controller.
+
+Các controller cập nhật store ngay khi có sự kiện đơn hàng (tạo đơn, thêm món,
+thanh toán, hủy), còn sơ đồ bàn chỉ vẽ lại những bàn có thay đổi. Để đồng bộ
+với các máy POS khác, refresh() đọc lại toàn bộ trạng thái bằng một truy vấn
+duy nhất và chỉ báo về các bàn khác với bản đang giữ; refresh_if_changed() chỉ
+làm việc đó khi change_outbox có thay đổi mới của orders/tables.
+"""
+
+import threading
+
+from sqlalchemy import and_
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.database.change_log import latest_seq
+from app.database.db_config import get_db
+from app.models.models import Table, Order
+from app.models.status import ACTIVE_ORDER_STATUSES
+
+# Thay đổi ở các bảng này làm thay đổi trạng thái bàn
+CHANGE_TABLES = ("orders", "tables")
+
+
+class TableState:
+    """Ảnh chụp trạng thái của một bàn"""
+
+    __slots__ = ("id", "name", "capacity", "location", "status",
+                 "order_id", "seated_at", "running_total")
+
+    def __init__(self, table_id, name, capacity, location, status,
+                 order_id=None, seated_at=None, running_total=0):
+        self.id = table_id
+        self.name = name
+        self.capacity = capacity
+        self.location = location
+        self.status = status
+        self.order_id = order_id
+        self.seated_at = seated_at
+        self.running_total = running_total or 0
+
+    def key(self):
+        """Bộ giá trị dùng để so sánh hai ảnh chụp của cùng một bàn"""
+        return (self.name, self.capacity, self.location, self.status,
+                self.order_id, self.seated_at, self.running_total)
+
+    def copy(self):
+        return TableState(self.id, self.name, self.capacity, self.location, self.status,
+                          self.order_id, self.seated_at, self.running_total)
+
+
+class TableStateStore:
+    """
+    Lưu trạng thái hiện tại của tất cả các bàn theo table_id.
+
+    Listener đăng ký qua subscribe() nhận danh sách table_id đã thay đổi
+    (kể cả bàn bị xóa - khi đó get() trả về None).
+    """
+
+    def __init__(self):
+        self._states = {}
+        self._order_tables = {}  # order_id -> table_id của các đơn đang mở
+        self._loaded = False
+        self._change_seq = None  # seq cuối của CHANGE_TABLES trong outbox khi đọc snapshot
+        self._lock = threading.RLock()
+        self._listeners = []
+
+    # ------------------------------------------------------------------ #
+    # Đăng ký nhận thay đổi
+    # ------------------------------------------------------------------ #
+    def subscribe(self, callback):
+        with self._lock:
+            if callback not in self._listeners:
+                self._listeners.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def _notify(self, changed_ids):
+        if not changed_ids:
+            return
+        with self._lock:
+            listeners = list(self._listeners)
+        for callback in listeners:
+            try:
+                callback(list(changed_ids))
+            except Exception as e:
+                print(f"Table state listener error: {e}")
+
+    # ------------------------------------------------------------------ #
+    # Đọc trạng thái
+    # ------------------------------------------------------------------ #
+    def get(self, table_id):
+        """Lấy bản sao trạng thái của một bàn, None nếu bàn không tồn tại"""
+        self._ensure_loaded()
+        with self._lock:
+            state = self._states.get(table_id)
+            return state.copy() if state else None
+
+    def all(self):
+        """Lấy bản sao trạng thái của tất cả các bàn, sắp xếp theo id"""
+        self._ensure_loaded()
+        with self._lock:
+            return [self._states[table_id].copy() for table_id in sorted(self._states)]
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.refresh()
+
+    # ------------------------------------------------------------------ #
+    # Đồng bộ với cơ sở dữ liệu
+    # ------------------------------------------------------------------ #
+    @staticmethod
+    def _load_snapshot():
+        """Đọc trạng thái tất cả các bàn kèm đơn đang mở bằng một truy vấn"""
+        db = get_db()
+        try:
+            rows = db.query(
+                Table.id, Table.name, Table.capacity, Table.location, Table.status,
+                Order.id, Order.order_time, Order.total_amount
+            ).outerjoin(
+                Order,
+                and_(
+                    Order.table_id == Table.id,
+                    Order.status.in_(ACTIVE_ORDER_STATUSES)
+                )
+            ).order_by(Table.id, Order.order_time).all()
+        except SQLAlchemyError as e:
+            print(f"Database error: {e}")
+            return None
+        finally:
+            db.close()
+
+        snapshot = {}
+        for table_id, name, capacity, location, status, order_id, order_time, total in rows:
+            # Nếu một bàn có nhiều đơn đang mở, giữ đơn mới nhất
+            snapshot[table_id] = TableState(table_id, name, capacity, location, status,
+                                            order_id, order_time, total)
+        return snapshot
+
+    def refresh(self, change_seq=None):
+        """
+        Đồng bộ lại với cơ sở dữ liệu (ví dụ khi máy POS khác thay đổi dữ liệu)
+
+        Args:
+            change_seq: seq outbox đọc ngay trước snapshot (do refresh_if_changed truyền vào)
+
+        Returns:
+            list: Danh sách table_id có thay đổi so với lần đồng bộ trước
+        """
+        snapshot = self._load_snapshot()
+        if snapshot is None:
+            return []
+
+        with self._lock:
+            changed = [table_id for table_id in set(self._states) | set(snapshot)
+                       if table_id not in snapshot
+                       or table_id not in self._states
+                       or self._states[table_id].key() != snapshot[table_id].key()]
+            self._states = snapshot
+            self._order_tables = {state.order_id: table_id
+                                  for table_id, state in snapshot.items() if state.order_id}
+            first_load = not self._loaded
+            self._loaded = True
+            self._change_seq = change_seq
+
+        if not first_load:
+            self._notify(sorted(changed))
+        return sorted(changed)
+
+    def refresh_if_changed(self):
+        """
+        Đồng bộ lại chỉ khi outbox có thay đổi của orders/tables sau lần đọc trước
+        (kể cả thay đổi từ máy POS khác); mỗi lần kiểm tra chỉ đọc vài mục chỉ mục
+
+        Returns:
+            list: Danh sách table_id có thay đổi
+        """
+        db = get_db()
+        try:
+            seq = latest_seq(db, CHANGE_TABLES)
+        except SQLAlchemyError as e:
+            print(f"Database error: {e}")
+            return []
+        finally:
+            db.close()
+
+        with self._lock:
+            if self._loaded and self._change_seq == seq:
+                return []
+        return self.refresh(change_seq=seq)
+
+    def invalidate(self):
+        """Bỏ bộ nhớ đệm, lần đọc tiếp theo sẽ tải lại toàn bộ"""
+        with self._lock:
+            self._loaded = False
+
+    # ------------------------------------------------------------------ #
+    # Sự kiện từ các controller
+    # ------------------------------------------------------------------ #
+    def _update(self, table_id, **changes):
+        if table_id is None:
+            return
+        with self._lock:
+            if not self._loaded:
+                # Chưa ai đọc store, lần đọc đầu tiên sẽ lấy dữ liệu mới nhất
+                return
+            state = self._states.get(table_id)
+            if state is None:
+                self._loaded = False
+                return
+            before = state.key()
+            for attr, value in changes.items():
+                setattr(state, attr, value)
+            if state.order_id:
+                self._order_tables[state.order_id] = table_id
+            if state.key() == before:
+                return
+        self._notify([table_id])
+
+    def order_opened(self, table_id, order_id, seated_at, running_total=0):
+        """Một đơn mới được tạo cho bàn"""
+        self._update(table_id, status="đang phục vụ", order_id=order_id,
+                     seated_at=seated_at, running_total=running_total or 0)
+
+    def order_total_changed(self, order_id, running_total, table_id=None):
+        """Tổng tiền tạm tính của một đơn đang mở thay đổi"""
+        if table_id is None:
+            with self._lock:
+                table_id = self._order_tables.get(order_id)
+        self._update(table_id, running_total=running_total or 0)
+
+    def order_closed(self, order_id, table_id=None):
+        """Đơn được thanh toán hoặc hủy, bàn trở về trạng thái trống"""
+        with self._lock:
+            mapped_table = self._order_tables.pop(order_id, None)
+        table_id = table_id if table_id is not None else mapped_table
+        self._update(table_id, status="trống", order_id=None,
+                     seated_at=None, running_total=0)
+
+    def table_status_changed(self, table_id, status):
+        """Trạng thái bàn được cập nhật trực tiếp"""
+        self._update(table_id, status=status)
+
+    def tables_changed(self):
+        """Danh sách bàn thay đổi (thêm, sửa, xóa bàn)"""
+        with self._lock:
+            loaded = self._loaded
+        if loaded:
+            self.refresh()
+
+
+# Store dùng chung trong tiến trình
+table_state_store = TableStateStore()
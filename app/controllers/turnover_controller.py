@@ -0,0 +1,152 @@
+from app.database.db_config import get_db
+from app.models.models import Order, OrderItem, Table, TableTurnoverDaily, SyncWatermark
+from app.models.status import OrderStatus
+from app.utils.turnover_analytics import summarize_turns, section_report, dwell_distribution
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import func, insert
+from datetime import datetime, timedelta
+import pandas as pd
+from app.utils.instrumentation import instrument_controller
+
+WATERMARK_NAME = "table_turnover_daily"
+
+@instrument_controller
+class TurnoverController:
+    @staticmethod
+    def refresh_summary():
+        """
+        Cập nhật tăng dần bảng tổng hợp luân chuyển bàn
+
+        Chỉ những ngày có đơn thanh toán sau lần cập nhật trước mới được tính lại.
+        Đơn cũ chưa có paid_at được ước lượng bằng thời điểm hoàn thành món cuối cùng.
+
+        Returns:
+            int: Số ngày đã được tính lại
+        """
+        db = get_db()
+        try:
+            watermark = db.query(SyncWatermark).filter(SyncWatermark.name == WATERMARK_NAME).first()
+
+            # Những ngày có đơn mới thanh toán kể từ lần cập nhật trước
+            filters = [Order.status == OrderStatus.PAID, Order.table_id.isnot(None)]
+            if watermark and watermark.timestamp:
+                filters.append(Order.paid_at > watermark.timestamp)
+            changed = db.query(
+                func.date(Order.order_time),
+                func.max(Order.paid_at)
+            ).filter(*filters).group_by(func.date(Order.order_time)).all()
+
+            if not changed:
+                return 0
+
+            days = sorted(datetime.strptime(day, "%Y-%m-%d").date() for day, _ in changed if day)
+            latest_paid = max((paid for _, paid in changed if paid), default=None)
+
+            # Thời điểm rời bàn: paid_at, hoặc món cuối cùng hoàn thành với dữ liệu cũ
+            last_item = db.query(
+                OrderItem.order_id.label("order_id"),
+                func.max(OrderItem.completed_at).label("completed_at")
+            ).group_by(OrderItem.order_id).subquery()
+
+            start = datetime.combine(days[0], datetime.min.time())
+            end = datetime.combine(days[-1], datetime.min.time()) + timedelta(days=1)
+            rows = db.query(
+                Order.table_id,
+                Order.order_time,
+                func.coalesce(Order.paid_at, last_item.c.completed_at),
+                Order.final_amount
+            ).outerjoin(
+                last_item, last_item.c.order_id == Order.id
+            ).filter(
+                Order.status == OrderStatus.PAID,
+                Order.table_id.isnot(None),
+                Order.order_time >= start,
+                Order.order_time < end
+            ).all()
+
+            visits = pd.DataFrame(rows, columns=["table_id", "order_time", "paid_at", "revenue"])
+            visits = visits[pd.to_datetime(visits["order_time"]).dt.date.isin(days)]
+            summary = summarize_turns(visits)
+
+            # Thay thế các dòng tổng hợp của những ngày bị ảnh hưởng
+            db.query(TableTurnoverDaily).filter(
+                TableTurnoverDaily.day.in_(days)
+            ).delete(synchronize_session=False)
+            if not summary.empty:
+                db.execute(insert(TableTurnoverDaily), summary.to_dict("records"))
+
+            if watermark is None:
+                watermark = SyncWatermark(name=WATERMARK_NAME)
+                db.add(watermark)
+            # Đơn cũ không có paid_at chỉ được xử lý ở lần chạy đầu tiên
+            watermark.timestamp = latest_paid or watermark.timestamp or datetime.min
+            watermark.updated_at = datetime.now()
+
+            db.commit()
+            return len(days)
+        except SQLAlchemyError as e:
+            db.rollback()
+            print(f"Database error: {e}")
+            return 0
+        finally:
+            db.close()
+
+    @staticmethod
+    def _load_summary(start_date, end_date):
+        db = get_db()
+        try:
+            summary_rows = db.query(
+                TableTurnoverDaily.day,
+                TableTurnoverDaily.table_id,
+                TableTurnoverDaily.turns,
+                TableTurnoverDaily.dwell_minutes,
+                TableTurnoverDaily.revenue,
+                TableTurnoverDaily.dwell_under_30,
+                TableTurnoverDaily.dwell_30_60,
+                TableTurnoverDaily.dwell_60_90,
+                TableTurnoverDaily.dwell_over_90
+            ).filter(
+                TableTurnoverDaily.day >= start_date,
+                TableTurnoverDaily.day < end_date
+            ).all()
+            table_rows = db.query(Table.id, Table.location, Table.capacity).all()
+        except SQLAlchemyError as e:
+            print(f"Database error: {e}")
+            summary_rows, table_rows = [], []
+        finally:
+            db.close()
+
+        summary = pd.DataFrame(summary_rows, columns=[
+            "day", "table_id", "turns", "dwell_minutes", "revenue",
+            "dwell_under_30", "dwell_30_60", "dwell_60_90", "dwell_over_90"
+        ])
+        tables = pd.DataFrame(table_rows, columns=["table_id", "location", "capacity"])
+        return summary, tables
+
+    @staticmethod
+    def _as_date(value):
+        return value.date() if isinstance(value, datetime) else value
+
+    @staticmethod
+    def get_section_report(start_date, end_date):
+        """
+        Báo cáo quay bàn theo khu vực và sức chứa trong khoảng [start_date, end_date)
+
+        Returns:
+            DataFrame: Xem turnover_analytics.section_report
+        """
+        TurnoverController.refresh_summary()
+        start_date = TurnoverController._as_date(start_date)
+        end_date = TurnoverController._as_date(end_date)
+        summary, tables = TurnoverController._load_summary(start_date, end_date)
+        return section_report(summary, tables, (end_date - start_date).days)
+
+    @staticmethod
+    def get_dwell_distribution(start_date, end_date, by="location"):
+        """Phân bố thời gian ngồi theo khu vực ("location") hoặc sức chứa ("capacity")"""
+        TurnoverController.refresh_summary()
+        summary, tables = TurnoverController._load_summary(
+            TurnoverController._as_date(start_date),
+            TurnoverController._as_date(end_date)
+        )
+        return dwell_distribution(summary, tables, by)
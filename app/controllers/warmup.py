@@ -0,0 +1,96 @@
+"""
+Warmup
+Khởi động nóng trong lúc màn hình đăng nhập đang hiển thị
+
+Lần đầu dựng màn hình sau đăng nhập phải làm nhiều việc chỉ cần làm một lần: import các thư viện
+nặng, cấu hình mapper của SQLAlchemy, mở kết nối cho pool, biên dịch các câu truy vấn nóng (lưu
+trong cache biên dịch của engine) và đọc dữ liệu tham chiếu. warm_up() làm trước các việc đó trên
+luồng nền (LoginView.WarmupWorker): danh mục, thực đơn, nhân viên được nạp vào reference_cache,
+trạng thái bàn vào table_state_store, còn các truy vấn trang đơn hàng/kho và thống kê đánh giá
+được chạy một lần để biên dịch sẵn và đưa các trang dữ liệu vào bộ nhớ đệm của SQLite.
+
+Ở chế độ dịch vụ (COFFEE_SERVICE_URL), thực đơn và đơn hàng do dịch vụ phục vụ nên bộ đệm cục bộ
+chỉ được StaffController và sơ đồ bàn dùng đến.
+"""
+
+import importlib
+import logging
+import time
+
+from sqlalchemy.orm import configure_mappers
+
+from app.database.db_config import engine
+
+logger = logging.getLogger(__name__)
+
+# Module import lần đầu tốn nhiều thời gian khi dựng cửa sổ chính (thống kê, kho, ca làm).
+# Chỉ gồm module không phải giao diện: các module PyQt vẫn được import trên luồng giao diện.
+PRELOAD_MODULES = (
+    "numpy", "pandas", "matplotlib.figure",
+    "app.controllers.order_controller", "app.controllers.inventory_controller",
+    "app.controllers.feedback_controller", "app.controllers.shift_controller",
+    "app.controllers.stats_controller", "app.controllers.backup_controller",
+)
+
+# Số kết nối mở sẵn: luồng giao diện và một luồng nền (làm mới trạng thái, sao lưu...)
+POOL_CONNECTIONS = 2
+
+
+def _open_pool():
+    connections = [engine.connect() for _ in range(POOL_CONNECTIONS)]
+    for conn in connections:
+        conn.exec_driver_sql("SELECT 1")
+        conn.close()  # trả về pool, kết nối vẫn mở
+
+
+def _load_reference_data():
+    from app.controllers.menu_controller import MenuController
+    from app.controllers.staff_controller import StaffController
+    from app.controllers.table_state_store import table_state_store
+
+    MenuController.get_all_categories()
+    MenuController.get_all_items()
+    StaffController.get_all_staff()
+    table_state_store.refresh()
+
+
+def _compile_hot_statements():
+    from app.controllers.staff_controller import StaffController
+    from app.controllers.order_controller import OrderController
+    from app.controllers.inventory_controller import InventoryController
+    from app.controllers.feedback_controller import FeedbackController
+
+    # Tài khoản rỗng không khớp ai, chỉ để biên dịch sẵn câu truy vấn đăng nhập
+    StaffController.authenticate("", "")
+    OrderController.get_orders_page()
+    InventoryController.get_inventory_page()
+    FeedbackController.get_feedback_stats()
+
+
+STEPS = [
+    ("imports", lambda: [importlib.import_module(module) for module in PRELOAD_MODULES]),
+    ("mappers", configure_mappers),
+    ("pool", _open_pool),
+    ("statements", _compile_hot_statements),
+    ("reference_data", _load_reference_data),
+]
+
+
+def warm_up():
+    """
+    Chạy các bước khởi động nóng; lỗi của một bước được ghi log và không chặn các bước sau
+
+    Returns:
+        dict: {tên bước: thời gian (ms)}, bước lỗi có giá trị None
+    """
+    timings = {}
+    for name, step in STEPS:
+        began = time.perf_counter()
+        try:
+            step()
+            timings[name] = round((time.perf_counter() - began) * 1000, 1)
+        except Exception:
+            logger.exception("Lỗi khởi động nóng ở bước %s", name)
+            timings[name] = None
+    logger.info("Khởi động nóng xong: %s", timings)
+    return timings
@@ -0,0 +1,299 @@
+"""
+Backup
+Sao lưu trực tuyến cơ sở dữ liệu SQLite trong lúc các máy POS vẫn ghi
+
+Sao chép tệp .db đang được ghi có thể cho bản hỏng, còn sao chép một lần toàn bộ giữ khóa đọc
+suốt quá trình và chặn mọi lần ghi. Ở đây dùng API backup của SQLite (sqlite3.Connection.backup)
+theo từng bước PAGES_PER_STEP trang: khóa đọc chỉ giữ trong một bước, giữa hai bước nghỉ
+STEP_PAUSE_MS để các giao dịch ghi đang chờ được commit.
+
+Ở chế độ WAL (mặc định, xem init_db) kết nối nguồn giữ một giao dịch đọc suốt quá trình: các bước
+cùng đọc một ảnh chụp nhất quán mà không chặn ghi. Với tệp ở chế độ rollback journal, mỗi lần một
+kết nối khác ghi vào, SQLite bắt đầu sao chép lại từ đầu; khi đó số trang mỗi bước được nhân
+RESTART_GROWTH, quá MAX_RESTARTS lần thì phần còn lại được chép trong một bước để chắc chắn hoàn tất.
+
+Bản chụp được nén gzip theo luồng thành <tên>.db.gz kèm tệp mô tả <tên>.json (số dòng từng bảng,
+sha256 của tệp nén), chỉ giữ KEEP_BACKUPS bản mới nhất. verify_backup() giải nén ra thư mục
+tạm, chạy PRAGMA quick_check và so số dòng với tệp mô tả.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from app.database.db_config import engine
+
+DEFAULT_BACKUP_DIR = os.path.join("app", "database", "backups")
+BACKUP_PREFIX = "coffee_management"
+
+# Số trang mỗi bước (trang 4 KB: 256 trang = 1 MB) và thời gian nghỉ giữa hai bước
+PAGES_PER_STEP = 256
+STEP_PAUSE_MS = 5
+
+# Sao chép lại từ đầu khi có ghi chen: tăng số trang mỗi bước, quá MAX_RESTARTS thì chép một bước
+MAX_RESTARTS = 3
+RESTART_GROWTH = 8
+
+# Thời gian chờ khi cơ sở dữ liệu đang bị khóa ghi (giây)
+BUSY_TIMEOUT = 30
+
+KEEP_BACKUPS = 7
+
+# Kích thước khối khi nén/giải nén theo luồng; mức 6 nhỏ gần bằng mức 9 nhưng nhanh hơn nhiều lần
+CHUNK_BYTES = 1024 * 1024
+COMPRESS_LEVEL = 6
+
+# Chỉ một bản sao lưu được tạo tại một thời điểm trong tiến trình
+_backup_lock = threading.Lock()
+
+
+class BackupError(Exception):
+    """Không tạo, kiểm tra hoặc khôi phục được bản sao lưu"""
+
+
+class _Restarted(Exception):
+    """SQLite bắt đầu sao chép lại từ đầu vì cơ sở dữ liệu nguồn vừa bị ghi"""
+
+
+class _HashingWriter:
+    """Ghi vào tệp đích đồng thời tính sha256 của các byte đã ghi"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.digest = hashlib.sha256()
+
+    def write(self, data):
+        self.digest.update(data)
+        return self.raw.write(data)
+
+    def flush(self):
+        self.raw.flush()
+
+
+def database_path():
+    """Đường dẫn tệp SQLite đang dùng (theo DATABASE_URL)"""
+    return engine.url.database
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _table_counts(path):
+    """Số dòng của từng bảng trong một tệp SQLite"""
+    conn = sqlite3.connect(path)
+    try:
+        tables = [name for (name,) in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+        )]
+        return {table: conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0] for table in tables}
+    finally:
+        conn.close()
+
+
+def copy_online(source, target, pages_per_step=PAGES_PER_STEP, pause_ms=STEP_PAUSE_MS, progress=None):
+    """
+    Chụp cơ sở dữ liệu source vào tệp target bằng API backup, từng bước pages_per_step trang
+
+    Args:
+        progress: Hàm progress(đã chép, tổng số trang) gọi sau mỗi bước
+
+    Returns:
+        dict: {'pages', 'steps', 'restarts', 'seconds', 'journal_mode'}
+    """
+    began = time.perf_counter()
+    pause = pause_ms / 1000
+    restarts = steps = 0
+    while True:
+        state = {"remaining": None, "total": 0}
+
+        def on_step(status, remaining, total):
+            nonlocal steps
+            if state["remaining"] is not None and remaining > state["remaining"]:
+                raise _Restarted()
+            state["remaining"], state["total"] = remaining, total
+            steps += 1
+            if progress:
+                progress(total - remaining, total)
+            if remaining:
+                # Khóa đọc đã được nhả sau bước vừa rồi: nhường cho các giao dịch ghi
+                time.sleep(pause)
+
+        if os.path.exists(target):
+            os.remove(target)
+        src = sqlite3.connect(source, timeout=BUSY_TIMEOUT)
+        dst = sqlite3.connect(target)
+        try:
+            journal_mode = src.execute("PRAGMA journal_mode").fetchone()[0]
+            if journal_mode == "wal":
+                # Giữ ảnh chụp đọc cho mọi bước: người ghi không bị chặn, sao chép không bị làm lại
+                src.execute("BEGIN")
+                src.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            src.backup(dst, pages=pages_per_step, progress=on_step, sleep=pause)
+            return {"pages": state["total"], "steps": steps, "restarts": restarts,
+                    "seconds": round(time.perf_counter() - began, 3), "journal_mode": journal_mode}
+        except _Restarted:
+            restarts += 1
+            pages_per_step = -1 if restarts > MAX_RESTARTS else pages_per_step * RESTART_GROWTH
+        finally:
+            dst.close()
+            src.close()
+
+
+def compress_file(source, target):
+    """Nén gzip theo luồng (từng khối CHUNK_BYTES); trả về sha256 của tệp nén"""
+    with open(source, "rb") as raw_in, open(target, "wb") as raw_out:
+        writer = _HashingWriter(raw_out)
+        with gzip.GzipFile(filename=os.path.basename(source), mode="wb",
+                           compresslevel=COMPRESS_LEVEL, fileobj=writer) as gz:
+            shutil.copyfileobj(raw_in, gz, CHUNK_BYTES)
+    return writer.digest.hexdigest()
+
+
+def list_backups(backup_dir=DEFAULT_BACKUP_DIR):
+    """Tệp mô tả của các bản sao lưu, mới nhất trước"""
+    if not os.path.isdir(backup_dir):
+        return []
+    manifests = []
+    for name in sorted(os.listdir(backup_dir), reverse=True):
+        if not (name.startswith(BACKUP_PREFIX) and name.endswith(".json")):
+            continue
+        try:
+            with open(os.path.join(backup_dir, name), encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            continue
+        manifest["path"] = os.path.join(backup_dir, manifest["file"])
+        manifests.append(manifest)
+    return manifests
+
+
+def rotate_backups(backup_dir=DEFAULT_BACKUP_DIR, keep=KEEP_BACKUPS):
+    """Xóa các bản sao lưu cũ, giữ lại keep bản mới nhất; trả về tên các bản đã xóa"""
+    removed = []
+    for manifest in list_backups(backup_dir)[keep:]:
+        for path in (manifest["path"], os.path.join(backup_dir, manifest["name"] + ".json")):
+            if os.path.exists(path):
+                os.remove(path)
+        removed.append(manifest["name"])
+    return removed
+
+
+def create_backup(backup_dir=DEFAULT_BACKUP_DIR, keep=KEEP_BACKUPS, pages_per_step=PAGES_PER_STEP,
+                  pause_ms=STEP_PAUSE_MS, progress=None, source=None):
+    """
+    Tạo bản sao lưu nén của cơ sở dữ liệu đang chạy rồi xoay vòng các bản cũ
+
+    Returns:
+        dict: Tệp mô tả bản sao lưu (thêm 'path' và 'removed')
+
+    Raises:
+        BackupError: Đang có bản sao lưu khác chạy, hoặc lỗi SQLite/ghi tệp
+    """
+    if not _backup_lock.acquire(blocking=False):
+        raise BackupError("Đang có một bản sao lưu khác được tạo")
+    source = source or database_path()
+    name = f"{BACKUP_PREFIX}-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    if os.path.exists(os.path.join(backup_dir, name + ".json")):
+        name += datetime.now().strftime("-%f")
+    snapshot = os.path.join(backup_dir, name + ".db.tmp")
+    archive = os.path.join(backup_dir, name + ".db.gz")
+    try:
+        os.makedirs(backup_dir, exist_ok=True)
+        copied = copy_online(source, snapshot, pages_per_step, pause_ms, progress)
+        counts = _table_counts(snapshot)
+        began = time.perf_counter()
+        sha256 = compress_file(snapshot, archive)
+
+        manifest = {
+            "name": name,
+            "file": os.path.basename(archive),
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "source": os.path.abspath(source),
+            "database_bytes": os.path.getsize(snapshot),
+            "compressed_bytes": os.path.getsize(archive),
+            "sha256": sha256,
+            "tables": counts,
+            "copy": copied,
+            "compress_seconds": round(time.perf_counter() - began, 3),
+        }
+        with open(os.path.join(backup_dir, name + ".json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+    except (sqlite3.Error, OSError) as e:
+        if os.path.exists(archive):
+            os.remove(archive)
+        raise BackupError(f"Không tạo được bản sao lưu: {e}") from e
+    finally:
+        if os.path.exists(snapshot):
+            os.remove(snapshot)
+        _backup_lock.release()
+
+    manifest["path"] = archive
+    manifest["removed"] = rotate_backups(backup_dir, keep)
+    return manifest
+
+
+def restore_backup(archive, target, overwrite=False):
+    """
+    Giải nén bản sao lưu ra tệp target (ứng dụng phải được đóng nếu target là cơ sở dữ liệu đang dùng)
+
+    Raises:
+        BackupError: target đã tồn tại (khi không overwrite) hoặc lỗi đọc/ghi tệp
+    """
+    if os.path.exists(target) and not overwrite:
+        raise BackupError(f"Tệp {target} đã tồn tại")
+    partial = target + ".restoring"
+    try:
+        with gzip.open(archive, "rb") as gz, open(partial, "wb") as out:
+            shutil.copyfileobj(gz, out, CHUNK_BYTES)
+        os.replace(partial, target)
+    except (OSError, EOFError) as e:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise BackupError(f"Không khôi phục được {archive}: {e}") from e
+    return target
+
+
+def verify_backup(manifest):
+    """
+    Khôi phục thử bản sao lưu vào thư mục tạm và kiểm tra
+
+    Returns:
+        tuple: (success, message)
+    """
+    archive = manifest["path"]
+    if not os.path.exists(archive):
+        return False, f"Không tìm thấy {archive}"
+    if _file_sha256(archive) != manifest["sha256"]:
+        return False, f"{manifest['file']}: tệp nén bị thay đổi hoặc hỏng (sai sha256)"
+
+    workdir = tempfile.mkdtemp(prefix="coffee-restore-")
+    try:
+        restored = restore_backup(archive, os.path.join(workdir, "restored.db"))
+        conn = sqlite3.connect(restored)
+        try:
+            check = conn.execute("PRAGMA quick_check").fetchone()[0]
+        finally:
+            conn.close()
+        if check != "ok":
+            return False, f"{manifest['file']}: quick_check báo lỗi: {check}"
+        counts = _table_counts(restored)
+        mismatched = sorted(table for table, count in manifest["tables"].items() if counts.get(table) != count)
+        if mismatched:
+            return False, f"{manifest['file']}: số dòng không khớp ở các bảng {', '.join(mismatched)}"
+        return True, f"{manifest['file']}: khôi phục thử thành công ({sum(counts.values())} dòng, {len(counts)} bảng)"
+    except (BackupError, sqlite3.Error) as e:
+        return False, f"{manifest['file']}: {e}"
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,344 @@
+"""
+Sinh nhanh dữ liệu lịch sử (ca làm, đơn hàng, món) cho kiểm thử tải và benchmark
+
+Số đơn mỗi giờ theo phân phối Poisson với cường độ phụ thuộc thứ trong tuần và giờ
+trong ngày. Toàn bộ thuộc tính được sinh theo mảng NumPy cho từng lô ngày, rồi ghi
+bằng một câu lệnh Core insert() biên dịch sẵn chạy executemany trong một giao dịch lớn.
+"""
+
+import queue
+import threading
+import time
+from datetime import datetime
+from itertools import repeat
+from math import gcd
+
+import numpy as np
+from sqlalchemy import insert, func, select
+
+from app.models.models import Order, OrderItem, Shift
+from app.models.status import OrderStatus, ItemStatus
+
+# Số đơn trung bình mỗi ngày của một quán (scale = 1)
+ORDERS_PER_DAY = 15
+
+# Hệ số theo thứ trong tuần (thứ 2 .. chủ nhật)
+DAY_FACTORS = np.array([0.8, 0.9, 1.0, 1.1, 1.2, 1.5, 1.5])
+
+# Giờ mở cửa và hệ số theo từng giờ từ 8h đến 21h
+OPEN_HOUR = 8
+HOUR_FACTORS = np.array([0.5, 0.8, 1.0, 1.2, 1.5, 1.2, 1.0, 0.8, 1.0, 1.2, 1.5, 1.3, 1.0, 0.7])
+
+# Ca sáng 8h-15h, ca chiều 15h-22h
+SHIFT_CHANGE_HOUR = 15
+CLOSE_HOUR = 22
+
+ONLINE_ORDER_RATE = 0.3  # tỷ lệ đơn mang đi (không có bàn)
+MEMBER_RATE = 0.3  # tỷ lệ đơn của khách hàng đăng ký
+LOYAL_POINTS = 50  # khách trên mức điểm này được giảm 10%
+MAX_ITEMS_PER_ORDER = 5
+PAYMENT_METHODS = np.array(["tiền mặt", "thẻ", "ví điện tử"], dtype=object)
+
+# Số món ghi trong mỗi giao dịch
+ITEMS_PER_TRANSACTION = 1_000_000
+
+# Bộ nhớ đệm trang SQLite khi ghi hàng loạt (KB)
+BULK_CACHE_KB = 256 * 1024
+
+ORDER_COLUMNS = ["id", "table_id", "staff_id", "customer_id", "order_time", "status", "total_amount",
+                 "discount", "final_amount", "payment_method", "note", "paid_at"]
+ITEM_COLUMNS = ["id", "order_id", "menu_item_id", "quantity", "unit_price", "line_total", "note", "status",
+                "created_at", "completed_at", "completed_by"]
+SHIFT_COLUMNS = ["staff_id", "date", "start_time", "end_time", "status"]
+
+# Mã ký tự (UTF-32) của "1970-01-01 HH:MM:SS.000000" cho từng giây trong ngày
+_SECOND_CODES = None
+
+def _timestamps(values):
+    """
+    datetime64 (làm tròn giây) -> chuỗi 'YYYY-MM-DD HH:MM:SS.000000' đúng định dạng SQLAlchemy
+    lưu trong SQLite. Ghép phần ngày và phần giờ từ bảng tra thay vì định dạng từng giá trị.
+    """
+    global _SECOND_CODES
+    if len(values) == 0:
+        return []
+    if _SECOND_CODES is None:
+        text = np.datetime_as_string(np.datetime64("1970-01-01T00:00:00", "us") + np.arange(86400) * 1_000_000, unit="us").astype("U26")
+        _SECOND_CODES = text.view(np.uint32).reshape(86400, -1).copy()
+        _SECOND_CODES[:, 10] = ord(" ")
+
+    seconds = values.astype("datetime64[s]")
+    days = seconds.astype("datetime64[D]")
+    first_day = days.min()
+    day_index = (days - first_day).astype(np.int64)
+    day_text = np.datetime_as_string(first_day + np.arange(day_index.max() + 1), unit="D").astype("U10")
+    day_codes = day_text.view(np.uint32).reshape(len(day_text), -1)
+
+    codes = _SECOND_CODES[(seconds - days).astype(np.int64)]
+    codes[:, :day_codes.shape[1]] = day_codes[day_index]
+    return codes.view(f"U{codes.shape[1]}").ravel().tolist()
+
+def _insert_sql(engine, model, columns):
+    return str(insert(model.__table__).compile(dialect=engine.dialect, column_keys=columns))
+
+class BulkHistoryGenerator:
+    """Sinh dữ liệu lịch sử theo lô ngày bằng NumPy"""
+
+    def __init__(self, engine, tables, staff, customers, menu_items, scale=1.0, seed=None):
+        """
+        Args:
+            engine: SQLAlchemy engine
+            tables: Danh sách id bàn
+            staff: [(id, role, shift)] với shift là "Sáng", "Chiều" hoặc "Toàn thời gian"
+            customers: [(id, points)]
+            menu_items: [(id, price)]
+            scale: Hệ số nhân số đơn (ví dụ 10 ~ 10 quán)
+            seed: Hạt giống ngẫu nhiên để tái lập dữ liệu
+        """
+        self.engine = engine
+        self.scale = scale
+        self.rng = np.random.default_rng(seed)
+
+        self.table_ids = np.array(tables, dtype=np.int64)
+        self.morning_staff = np.array([s[0] for s in staff if s[2] in ("Sáng", "Toàn thời gian")], dtype=np.int64)
+        self.afternoon_staff = np.array([s[0] for s in staff if s[2] in ("Chiều", "Toàn thời gian")], dtype=np.int64)
+        self.baristas = np.array([s[0] for s in staff if s[1] == "Pha chế"], dtype=np.int64)
+        self.staff = staff
+        self.customer_ids = np.array([c[0] for c in customers], dtype=np.int64)
+        self.loyal = np.array([(c[1] or 0) > LOYAL_POINTS for c in customers], dtype=bool)
+        self.menu_ids = np.array([m[0] for m in menu_items], dtype=np.int64)
+        self.menu_prices = np.array([m[1] for m in menu_items], dtype=np.float64)
+
+        if not len(self.menu_ids) or not len(self.morning_staff) or not len(self.afternoon_staff):
+            raise ValueError("Cần có món và nhân viên cho cả ca sáng lẫn ca chiều")
+
+        # Bước nhảy nguyên tố cùng nhau với số món: (đầu + j * bước) % n cho các món khác nhau
+        n = len(self.menu_ids)
+        self.strides = np.array([s for s in range(1, n) if gcd(s, n) == 1] or [1], dtype=np.int64)
+
+        self.order_sql = _insert_sql(engine, Order, ORDER_COLUMNS)
+        self.item_sql = _insert_sql(engine, OrderItem, ITEM_COLUMNS)
+        self.shift_sql = _insert_sql(engine, Shift, SHIFT_COLUMNS)
+
+    # ------------------------------------------------------------------ #
+    # Sinh dữ liệu
+    # ------------------------------------------------------------------ #
+    def _orders_for_days(self, first_day, num_days, next_order_id, next_item_id, now):
+        rng = self.rng
+        days = first_day + np.arange(num_days).astype("timedelta64[D]")
+        weekdays = (days.astype(np.int64) + 3) % 7  # 1970-01-01 là thứ 5
+
+        # Số đơn mỗi giờ ~ Poisson(cường độ theo thứ và giờ)
+        rates = ORDERS_PER_DAY * self.scale * DAY_FACTORS[weekdays][:, None] * HOUR_FACTORS[None, :] / len(HOUR_FACTORS)
+        counts = rng.poisson(rates).ravel()
+        slot_starts = (days.astype("datetime64[s]")[:, None]
+                       + ((OPEN_HOUR + np.arange(len(HOUR_FACTORS))) * 3600).astype("timedelta64[s]")[None, :]).ravel()
+        slot_hours = np.tile(OPEN_HOUR + np.arange(len(HOUR_FACTORS)), num_days)
+
+        order_times = np.repeat(slot_starts, counts) + rng.integers(0, 3600, counts.sum()).astype("timedelta64[s]")
+        hours = np.repeat(slot_hours, counts)
+        keep = order_times < np.datetime64(now, "s")
+        order_times, hours = order_times[keep], hours[keep]
+        ordering = np.argsort(order_times, kind="stable")
+        order_times, hours = order_times[ordering], hours[ordering]
+        num_orders = len(order_times)
+        if num_orders == 0:
+            return [], []
+
+        order_ids = next_order_id + np.arange(num_orders)
+        morning = hours < SHIFT_CHANGE_HOUR
+        staff_ids = np.where(
+            morning,
+            self.morning_staff[rng.integers(0, len(self.morning_staff), num_orders)],
+            self.afternoon_staff[rng.integers(0, len(self.afternoon_staff), num_orders)]
+        )
+
+        online = rng.random(num_orders) < ONLINE_ORDER_RATE
+        table_ids = np.full(num_orders, None, dtype=object)
+        if len(self.table_ids):
+            seated = ~online
+            table_ids[seated] = self.table_ids[rng.integers(0, len(self.table_ids), int(seated.sum()))].tolist()
+
+        customer_ids = np.full(num_orders, None, dtype=object)
+        loyal = np.zeros(num_orders, dtype=bool)
+        if len(self.customer_ids):
+            member = rng.random(num_orders) < MEMBER_RATE
+            customer_index = rng.integers(0, len(self.customer_ids), int(member.sum()))
+            customer_ids[member] = self.customer_ids[customer_index].tolist()
+            loyal[member] = self.loyal[customer_index]
+
+        # Các món của đơn: món khác nhau trong cùng một đơn
+        n_menu = len(self.menu_ids)
+        items_per_order = np.minimum(rng.integers(1, MAX_ITEMS_PER_ORDER + 1, num_orders), n_menu)
+        num_items = int(items_per_order.sum())
+        item_order = np.repeat(np.arange(num_orders), items_per_order)
+        offsets = np.cumsum(items_per_order) - items_per_order
+        position = np.arange(num_items) - np.repeat(offsets, items_per_order)
+        first = rng.integers(0, n_menu, num_orders)
+        stride = self.strides[rng.integers(0, len(self.strides), num_orders)]
+        menu_index = (first[item_order] + position * stride[item_order]) % n_menu
+        quantities = rng.integers(1, 4, num_items)
+
+        unit_prices = self.menu_prices[menu_index]
+        line_totals = unit_prices * quantities
+        totals = np.bincount(item_order, weights=line_totals, minlength=num_orders)
+        discounts = np.where(loyal, totals * 0.1, 0.0)
+
+        completed = order_times[item_order] + (rng.integers(5, 16, num_items) * 60).astype("timedelta64[s]")
+        paid = np.maximum.reduceat(completed, offsets) + (rng.integers(5, 41, num_orders) * 60).astype("timedelta64[s]")
+        completed_by = (self.baristas[rng.integers(0, len(self.baristas), num_items)].tolist()
+                        if len(self.baristas) else repeat(None))
+
+        order_time_text = _timestamps(order_times)
+        orders = list(zip(
+            order_ids.tolist(), table_ids.tolist(), staff_ids.tolist(), customer_ids.tolist(),
+            order_time_text, repeat(int(OrderStatus.PAID)), totals.tolist(), discounts.tolist(),
+            (totals - discounts).tolist(), PAYMENT_METHODS[rng.integers(0, len(PAYMENT_METHODS), num_orders)].tolist(),
+            np.where(online, "Đơn hàng mang đi", None).tolist(), _timestamps(paid)
+        ))
+        created_text = np.array(order_time_text, dtype=object)[item_order].tolist()
+        items = list(zip(
+            (next_item_id + np.arange(num_items)).tolist(), order_ids[item_order].tolist(),
+            self.menu_ids[menu_index].tolist(), quantities.tolist(), unit_prices.tolist(), line_totals.tolist(),
+            repeat(None), repeat(int(ItemStatus.DONE)),
+            created_text, _timestamps(completed), completed_by
+        ))
+        return orders, items
+
+    def _shifts_for_days(self, first_day, num_days, now):
+        days = first_day + np.arange(num_days).astype("timedelta64[D]")
+        rows = []
+        for staff_id, _, shift in self.staff:
+            for start_hour, end_hour, shifts in ((OPEN_HOUR, SHIFT_CHANGE_HOUR, ("Sáng", "Toàn thời gian")),
+                                                 (SHIFT_CHANGE_HOUR, CLOSE_HOUR, ("Chiều", "Toàn thời gian"))):
+                if shift not in shifts:
+                    continue
+                starts = days.astype("datetime64[s]") + np.timedelta64(start_hour * 3600, "s")
+                ends = days.astype("datetime64[s]") + np.timedelta64(end_hour * 3600, "s")
+                past = days.astype("datetime64[s]") < np.datetime64(now, "s")
+                rows.extend(zip(
+                    repeat(staff_id), _timestamps(days), _timestamps(starts), _timestamps(ends),
+                    np.where(past, "đã làm", "lịch").tolist()
+                ))
+        return rows
+
+    # ------------------------------------------------------------------ #
+    # Ghi dữ liệu
+    # ------------------------------------------------------------------ #
+    def _batches(self, first_day, days, days_per_batch, next_order_id, next_item_id, now, with_shifts):
+        for offset in range(0, days, days_per_batch):
+            num_days = min(days_per_batch, days - offset)
+            batch_start = first_day + np.timedelta64(offset, "D")
+            orders, items = self._orders_for_days(batch_start, num_days, next_order_id, next_item_id, now)
+            shifts = self._shifts_for_days(batch_start, num_days, now) if with_shifts else []
+            next_order_id += len(orders)
+            next_item_id += len(items)
+            yield batch_start + np.timedelta64(num_days - 1, "D"), orders, items, shifts
+
+    def generate(self, start_date, days, with_shifts=True, progress=print):
+        """
+        Sinh và ghi dữ liệu cho `days` ngày kể từ start_date (chỉ các đơn trong quá khứ)
+
+        Lô kế tiếp được sinh trên một luồng riêng trong khi lô hiện tại đang được ghi.
+        Chỉ mục phụ và trigger outbox thay đổi của orders/order_items được xóa trong lúc ghi và
+        tạo lại ở cuối, nên dữ liệu sinh hàng loạt không xuất hiện trong change_outbox.
+
+        Returns:
+            dict: {'orders': n, 'order_items': n, 'shifts': n, 'seconds': thời gian chạy}
+        """
+        began = time.perf_counter()
+        now = datetime.now()
+        first_day = np.datetime64(start_date.date(), "D")
+
+        # Số ngày mỗi giao dịch để mỗi lô có khoảng ITEMS_PER_TRANSACTION món
+        items_per_day = ORDERS_PER_DAY * self.scale * DAY_FACTORS.mean() * HOUR_FACTORS.mean() * (MAX_ITEMS_PER_ORDER + 1) / 2
+        days_per_batch = max(1, int(ITEMS_PER_TRANSACTION / max(items_per_day, 1)))
+
+        totals = {"orders": 0, "order_items": 0, "shifts": 0}
+        with self.engine.connect() as conn:
+            # Ghi hàng loạt: không cần fsync sau mỗi giao dịch, nhật ký giữ trong bộ nhớ
+            journal_mode = conn.exec_driver_sql("PRAGMA journal_mode").scalar()
+            conn.exec_driver_sql("PRAGMA synchronous=OFF")
+            conn.exec_driver_sql("PRAGMA journal_mode=MEMORY")
+            conn.exec_driver_sql(f"PRAGMA cache_size=-{BULK_CACHE_KB}")
+            next_order_id = (conn.execute(select(func.max(Order.id))).scalar() or 0) + 1
+            next_item_id = (conn.execute(select(func.max(OrderItem.id))).scalar() or 0) + 1
+            # Chỉ mục phụ và trigger outbox thay đổi của orders/order_items (tạo lại ở cuối)
+            indexes = conn.exec_driver_sql(
+                "SELECT type, name, sql FROM sqlite_master WHERE type IN ('index', 'trigger') AND sql IS NOT NULL "
+                "AND tbl_name IN ('orders', 'order_items')"
+            ).fetchall()
+            for kind, name, _ in indexes:
+                conn.exec_driver_sql(f"DROP {kind.upper()} {name}")
+            conn.commit()
+
+            batches = _prefetch(self._batches(
+                first_day, days, days_per_batch, next_order_id, next_item_id, now, with_shifts
+            ))
+            try:
+                for last_day, orders, items, shifts in batches:
+                    with conn.begin():
+                        if orders:
+                            conn.exec_driver_sql(self.order_sql, orders)
+                            conn.exec_driver_sql(self.item_sql, items)
+                        if shifts:
+                            conn.exec_driver_sql(self.shift_sql, shifts)
+
+                    totals["orders"] += len(orders)
+                    totals["order_items"] += len(items)
+                    totals["shifts"] += len(shifts)
+                    if progress:
+                        progress(f"Đã tạo dữ liệu đến ngày {last_day}: {totals['orders']} đơn, "
+                                 f"{totals['order_items']} món")
+            finally:
+                batches.close()
+                if conn.in_transaction():
+                    conn.rollback()
+                with conn.begin():
+                    for _, _, sql in indexes:
+                        conn.exec_driver_sql(sql)
+                conn.exec_driver_sql(f"PRAGMA journal_mode={journal_mode}")
+                conn.exec_driver_sql("PRAGMA synchronous=FULL")
+                conn.commit()
+
+        totals["seconds"] = time.perf_counter() - began
+        return totals
+
+def _prefetch(iterable):
+    """Chạy iterable trên một luồng nền, luôn chuẩn bị sẵn một phần tử kế tiếp"""
+    buffer = queue.Queue(maxsize=1)
+    stop = threading.Event()
+    done = object()
+
+    def produce():
+        try:
+            for element in iterable:
+                while not stop.is_set():
+                    try:
+                        buffer.put(element, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+            buffer.put(done)
+        except Exception as e:
+            buffer.put(e)
+
+    worker = threading.Thread(target=produce, daemon=True)
+    worker.start()
+
+    def consume():
+        try:
+            while True:
+                element = buffer.get()
+                if element is done:
+                    return
+                if isinstance(element, Exception):
+                    raise element
+                yield element
+        finally:
+            stop.set()
+            worker.join()
+
+    return consume()
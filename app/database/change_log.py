@@ -0,0 +1,322 @@
+"""
+Change Log
+Outbox ghi nhận thay đổi (change data capture) cho các hệ thống con chạy tăng dần
+
+Trigger SQLite trên các bảng trong CAPTURED_TABLES ghi mỗi dòng được thêm/sửa/xóa vào bảng
+change_outbox (seq tăng dần, tên bảng, id dòng, thao tác I/U/D) trong cùng giao dịch với thay đổi,
+nên mọi đường ghi (ORM, Core, máy POS khác, dịch vụ đơn hàng) đều được ghi nhận.
+
+Mỗi consumer (tổng hợp, màn hình pha chế, xuất dữ liệu, sao lưu...) có một con trỏ lưu trong
+sync_watermarks với tên "changes:<tên>": đọc các thay đổi sau con trỏ theo lô, xử lý, rồi ack()
+để tiến con trỏ. compact() xóa các dòng mà mọi consumer đã xử lý, hoặc khi có retention_days thì
+chỉ xóa dòng cũ hơn số ngày đó (bên đọc không đăng ký consumer, như consolidation đọc tệp chi nhánh,
+vẫn đọc tăng dần được nếu đồng bộ trong khoảng giữ lại). Consumer mới bắt đầu từ cuối outbox
+(tự quét toàn bộ một lần); consumer bị dọn mất thay đổi chưa đọc (missed()) phải quét lại.
+
+Dữ liệu sinh hàng loạt bởi bulk_generator không đi qua outbox (trigger được tạm bỏ khi ghi).
+"""
+
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.database.db_config import get_db
+from app.models.models import ChangeRecord, SyncWatermark
+
+# Các bảng được theo dõi (đều có khóa chính id)
+CAPTURED_TABLES = [
+    "orders", "order_items", "orders_archive", "order_items_archive",
+    "inventories", "menu_items", "tables", "reservations", "shifts", "feedbacks", "customers",
+]
+
+# Thao tác SQL -> mã thao tác và dòng dùng để lấy id (NEW/OLD)
+TRIGGER_OPS = [("INSERT", "I", "NEW"), ("UPDATE", "U", "NEW"), ("DELETE", "D", "OLD")]
+
+INSERT, UPDATE, DELETE = "I", "U", "D"
+
+CONSUMER_PREFIX = "changes:"
+COMPACTED_WATERMARK = "change_outbox_compacted"
+
+DEFAULT_BATCH_SIZE = 500
+
+Change = namedtuple("Change", ["seq", "table", "row_id", "op", "changed_at"])
+
+
+def trigger_name(table, op):
+    return f"trg_{table}_change_{op.lower()}"
+
+
+def create_change_triggers(conn, tables=None):
+    """Tạo trigger ghi outbox cho các bảng được theo dõi (bỏ qua bảng chưa tồn tại)"""
+    existing = {name for (name,) in conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'"))}
+    for table in tables or CAPTURED_TABLES:
+        if table not in existing:
+            continue
+        for sql_op, op, row in TRIGGER_OPS:
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {trigger_name(table, sql_op)} AFTER {sql_op} ON {table} "
+                f"BEGIN INSERT INTO {ChangeRecord.__tablename__} (table_name, row_id, op, changed_at) "
+                f"VALUES ('{table}', {row}.id, '{op}', datetime('now', 'localtime')); END"
+            ))
+
+
+def latest_seq(db, tables=None):
+    """seq lớn nhất trong outbox (0 nếu rỗng), chỉ tính các bảng trong tables nếu có"""
+    if not tables:
+        # Bộ đếm AUTOINCREMENT vẫn giữ giá trị khi outbox đã được dọn hết
+        return db.execute(text(
+            "SELECT seq FROM sqlite_sequence WHERE name = :name"
+        ), {"name": ChangeRecord.__tablename__}).scalar() or 0
+    # Mỗi bảng một truy vấn max() để SQLite chỉ đọc một mục của chỉ mục (table_name, seq)
+    return max(
+        db.query(func.max(ChangeRecord.seq)).filter(ChangeRecord.table_name == table).scalar() or 0
+        for table in tables
+    )
+
+
+def last_change_at(db, tables):
+    """Thời điểm thay đổi gần nhất của các bảng (None nếu outbox không còn dòng nào của chúng)"""
+    seq = latest_seq(db, tables)
+    if not seq:
+        return None
+    return db.query(ChangeRecord.changed_at).filter(ChangeRecord.seq == seq).scalar()
+
+
+def group_changes(changes):
+    """
+    Gộp các thay đổi theo bảng, mỗi dòng chỉ giữ thao tác cuối cùng
+
+    Returns:
+        dict: {tên bảng: (tập id còn tồn tại cần đọc lại, tập id đã bị xóa)}
+    """
+    last_ops = {}
+    for change in changes:
+        last_ops[(change.table, change.row_id)] = change.op
+    grouped = {}
+    for (table, row_id), op in last_ops.items():
+        upserted, deleted = grouped.setdefault(table, (set(), set()))
+        (deleted if op == DELETE else upserted).add(row_id)
+    return grouped
+
+
+class ChangeConsumer:
+    """Đọc outbox từ con trỏ riêng theo lô, ack sau khi xử lý xong"""
+
+    def __init__(self, name, tables=None, batch_size=DEFAULT_BATCH_SIZE):
+        self.name = name
+        self.tables = list(tables) if tables else None
+        self.batch_size = batch_size
+        self.watermark_name = CONSUMER_PREFIX + name
+
+    def _watermark(self, db):
+        """Con trỏ của consumer; lần đầu đăng ký tại cuối outbox"""
+        watermark = db.query(SyncWatermark).filter(SyncWatermark.name == self.watermark_name).first()
+        if watermark is None:
+            watermark = SyncWatermark(name=self.watermark_name, position=latest_seq(db), updated_at=datetime.now())
+            db.add(watermark)
+            db.commit()
+        return watermark
+
+    def position(self):
+        """seq cuối cùng đã xử lý"""
+        db = get_db()
+        try:
+            return self._watermark(db).position or 0
+        except SQLAlchemyError as e:
+            db.rollback()
+            print(f"Database error: {e}")
+            return None
+        finally:
+            db.close()
+
+    def read(self, limit=None):
+        """
+        Đọc tối đa limit thay đổi sau con trỏ (không tiến con trỏ)
+
+        Returns:
+            tuple: (danh sách Change, vị trí cần ack sau khi xử lý xong lô)
+                   hoặc (None, None) nếu lỗi cơ sở dữ liệu
+        """
+        limit = limit or self.batch_size
+        db = get_db()
+        try:
+            position = self._watermark(db).position or 0
+            # Chốt cận trên trước: các dòng của bảng khác đến sau cận trên sẽ được đọc ở lần sau
+            upper = latest_seq(db)
+            query = db.query(
+                ChangeRecord.seq, ChangeRecord.table_name, ChangeRecord.row_id,
+                ChangeRecord.op, ChangeRecord.changed_at
+            ).filter(ChangeRecord.seq > position, ChangeRecord.seq <= upper)
+            if self.tables:
+                query = query.filter(ChangeRecord.table_name.in_(self.tables))
+            changes = [Change(*row) for row in query.order_by(ChangeRecord.seq).limit(limit)]
+            # Lô chưa đầy: đã đọc hết đến cận trên, kể cả khi không có thay đổi của các bảng quan tâm
+            next_position = changes[-1].seq if len(changes) == limit else max(upper, position)
+            return changes, next_position
+        except SQLAlchemyError as e:
+            db.rollback()
+            print(f"Database error: {e}")
+            return None, None
+        finally:
+            db.close()
+
+    def pending_counts(self):
+        """
+        Số thay đổi chưa xử lý theo bảng, cho consumer chỉ cần biết bảng nào thay đổi nhiều
+
+        Returns:
+            tuple: ({tên bảng: số thay đổi}, vị trí cần ack) hoặc (None, None) nếu lỗi
+        """
+        db = get_db()
+        try:
+            position = self._watermark(db).position or 0
+            upper = latest_seq(db)
+            query = db.query(ChangeRecord.table_name, func.count()).filter(
+                ChangeRecord.seq > position, ChangeRecord.seq <= upper
+            )
+            if self.tables:
+                query = query.filter(ChangeRecord.table_name.in_(self.tables))
+            return dict(query.group_by(ChangeRecord.table_name).all()), max(upper, position)
+        except SQLAlchemyError as e:
+            db.rollback()
+            print(f"Database error: {e}")
+            return None, None
+        finally:
+            db.close()
+
+    def ack(self, position):
+        """Tiến con trỏ đến position (không bao giờ lùi)"""
+        db = get_db()
+        try:
+            watermark = self._watermark(db)
+            if position > (watermark.position or 0):
+                watermark.position = position
+                watermark.updated_at = datetime.now()
+                db.commit()
+            return True
+        except SQLAlchemyError as e:
+            db.rollback()
+            print(f"Database error: {e}")
+            return False
+        finally:
+            db.close()
+
+    def missed(self):
+        """Outbox đã bị dọn qua con trỏ (consumer chậm quá thời hạn giữ lại): cần quét lại toàn bộ"""
+        db = get_db()
+        try:
+            compacted = db.query(SyncWatermark.position).filter(
+                SyncWatermark.name == COMPACTED_WATERMARK
+            ).scalar() or 0
+            return (self._watermark(db).position or 0) < compacted
+        except SQLAlchemyError as e:
+            db.rollback()
+            print(f"Database error: {e}")
+            return False
+        finally:
+            db.close()
+
+    def skip_to_end(self):
+        """Đặt con trỏ tại cuối outbox, dùng ngay trước khi quét lại toàn bộ"""
+        db = get_db()
+        try:
+            watermark = self._watermark(db)
+            watermark.position = max(latest_seq(db), watermark.position or 0)
+            watermark.updated_at = datetime.now()
+            db.commit()
+            return watermark.position
+        except SQLAlchemyError as e:
+            db.rollback()
+            print(f"Database error: {e}")
+            return None
+        finally:
+            db.close()
+
+    def poll(self, handler, rescan=None, max_batches=None):
+        """
+        Xử lý các thay đổi mới theo lô: handler(changes) rồi ack; lỗi trong handler giữ nguyên con trỏ
+
+        Args:
+            handler: Hàm nhận danh sách Change của một lô
+            rescan: Hàm quét lại toàn bộ khi missed() (None: bỏ qua các thay đổi đã mất)
+            max_batches: Số lô tối đa mỗi lần gọi (None: đến hết outbox)
+
+        Returns:
+            int: Số thay đổi đã xử lý
+        """
+        if self.missed():
+            self.skip_to_end()
+            if rescan is not None:
+                rescan()
+
+        processed = batches = 0
+        while max_batches is None or batches < max_batches:
+            changes, position = self.read()
+            if changes is None:
+                break
+            if changes:
+                handler(changes)
+                processed += len(changes)
+            if not self.ack(position) or len(changes) < self.batch_size:
+                break
+            batches += 1
+        return processed
+
+
+def consumers():
+    """Con trỏ của các consumer đã đăng ký: {tên: seq đã xử lý}"""
+    db = get_db()
+    try:
+        rows = db.query(SyncWatermark.name, SyncWatermark.position).filter(
+            SyncWatermark.name.startswith(CONSUMER_PREFIX)
+        ).all()
+        return {name[len(CONSUMER_PREFIX):]: position or 0 for name, position in rows}
+    except SQLAlchemyError as e:
+        print(f"Database error: {e}")
+        return {}
+    finally:
+        db.close()
+
+
+def compact(retention_days=None):
+    """
+    Xóa các thay đổi mà mọi consumer đã xử lý
+
+    Args:
+        retention_days: Nếu có, chỉ xóa thay đổi cũ hơn số ngày này: dòng mới hơn được giữ lại dù
+                        mọi consumer đã ack, dòng cũ hơn bị xóa dù consumer chậm chưa đọc
+                        (consumer đó sẽ thấy missed() và phải quét lại)
+
+    Returns:
+        int: Số dòng đã xóa
+    """
+    db = get_db()
+    try:
+        if retention_days is not None:
+            upper = db.query(func.max(ChangeRecord.seq)).filter(
+                ChangeRecord.changed_at < datetime.now() - timedelta(days=retention_days)
+            ).scalar() or 0
+        else:
+            positions = [position or 0 for (position,) in db.query(SyncWatermark.position).filter(
+                SyncWatermark.name.startswith(CONSUMER_PREFIX)
+            )]
+            upper = min(positions) if positions else latest_seq(db)
+
+        deleted = db.query(ChangeRecord).filter(ChangeRecord.seq <= upper).delete(synchronize_session=False)
+
+        watermark = db.query(SyncWatermark).filter(SyncWatermark.name == COMPACTED_WATERMARK).first()
+        if watermark is None:
+            watermark = SyncWatermark(name=COMPACTED_WATERMARK, position=0)
+            db.add(watermark)
+        watermark.position = max(watermark.position or 0, upper)
+        watermark.updated_at = datetime.now()
+        db.commit()
+        return deleted
+    except SQLAlchemyError as e:
+        db.rollback()
+        print(f"Database error: {e}")
+        return 0
+    finally:
+        db.close()
@@ -0,0 +1,68 @@
+"""
+Optimistic Concurrency
+Phát hiện xung đột ghi bằng cột version của Order, OrderItem và Inventory
+
+Mỗi lần cập nhật, SQLAlchemy (version_id_col) tăng version và thêm điều kiện WHERE version = <bản đã đọc>;
+nếu máy khác đã ghi trước thì không dòng nào khớp và flush ném StaleDataError. Hàng đợi ghi tự chạy
+lại đơn vị công việc (đọc lại dữ liệu mới) tối đa MAX_CONFLICT_RETRIES lần.
+
+Khi người dùng sửa dựa trên dữ liệu đã hiển thị từ trước (expected_version), chạy lại không giúp
+được: controller trả về Conflict (giá trị falsy như False) để giao diện báo và tải lại.
+"""
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm.exc import StaleDataError
+
+MAX_CONFLICT_RETRIES = 5
+
+
+class Conflict:
+    """Kết quả ghi bị từ chối do dữ liệu đã bị thay đổi ở nơi khác"""
+
+    __slots__ = ("model", "object_id", "expected", "current", "message")
+
+    def __init__(self, message, model=None, object_id=None, expected=None, current=None):
+        self.message = message
+        self.model = model
+        self.object_id = object_id
+        self.expected = expected
+        self.current = current
+
+    def __bool__(self):
+        # Giữ tương thích với mã cũ chỉ kiểm tra True/False
+        return False
+
+    def __repr__(self):
+        return f"<Conflict {self.model or ''}#{self.object_id} {self.expected}->{self.current}: {self.message}>"
+
+
+class VersionConflict(SQLAlchemyError):
+    """
+    Phiên bản của đối tượng khác với phiên bản mà người gọi đã đọc
+    (lớp con của SQLAlchemyError nên nơi chỉ bắt SQLAlchemyError vẫn trả về False như trước)
+    """
+
+    def __init__(self, conflict):
+        super().__init__(conflict.message)
+        self.conflict = conflict
+
+
+def check_version(instance, expected_version):
+    """
+    Kiểm tra version hiện tại của đối tượng với version người gọi đã đọc (None: bỏ qua)
+
+    Raises:
+        VersionConflict: Đối tượng đã được ghi bởi máy khác
+    """
+    if expected_version is None or instance.version == expected_version:
+        return
+    model = type(instance).__name__
+    raise VersionConflict(Conflict(
+        f"{model} #{instance.id} đã được thay đổi ở nơi khác (phiên bản {expected_version} -> {instance.version})",
+        model, instance.id, expected_version, instance.version
+    ))
+
+
+def is_stale_error(error):
+    """Lỗi do UPDATE/DELETE theo version không khớp dòng nào"""
+    return isinstance(error, StaleDataError)
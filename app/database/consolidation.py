@@ -0,0 +1,445 @@
+"""
+Consolidation
+Hợp nhất dữ liệu của nhiều chi nhánh vào một kho phân tích chung (analytics.db)
+
+Mỗi chi nhánh có tệp coffee_management.db riêng, được đăng ký trong bảng branches của kho.
+Mỗi lần hợp nhất, một luồng đọc cho mỗi chi nhánh (tối đa DEFAULT_WORKERS luồng song song) mở
+tệp chi nhánh trong một giao dịch đọc (ảnh chụp nhất quán, không ghi gì vào tệp chi nhánh) và
+gửi dữ liệu theo lô CHUNK_ROWS dòng vào hàng đợi; một luồng ghi duy nhất chèn hàng loạt
+(executemany INSERT OR REPLACE) vào kho với khóa (branch_id, id):
+  - orders, order_items (gồm cả bảng lưu trữ), shifts: tăng dần theo change_outbox của chi nhánh.
+    Các id thay đổi sau mốc branches.last_seq được đọc lại; id không còn ở chi nhánh bị xóa khỏi
+    kho. Lần đầu, hoặc khi outbox của chi nhánh đã bị dọn qua mốc (hay tệp bị thay bằng bản cũ),
+    toàn bộ dữ liệu của chi nhánh được nạp lại; bảo trì chỉ dọn thay đổi cũ hơn
+    OUTBOX_RETENTION_DAYS ngày nên hợp nhất ít nhất một lần trong khoảng đó vẫn chạy tăng dần.
+  - inventories, menu_items, staffs: bảng nhỏ, chép lại toàn bộ mỗi lần. Chi nhánh chỉ lưu tồn kho
+    hiện tại nên biến động tồn kho (branch_inventory_movements) là chênh lệch số lượng giữa hai
+    lần hợp nhất.
+Mốc last_seq chỉ được tiến sau khi toàn bộ dữ liệu của chi nhánh đã được ghi; ghi đè theo khóa
+nên chạy lại sau lỗi không tạo dòng trùng.
+
+Chạy:
+    python -m app.database.consolidation add Q1 /duong/dan/q1/coffee_management.db --name "Quận 1"
+    python -m app.database.consolidation sync [--workers 4] [Q1 Q3 ...]
+    python -m app.database.consolidation list
+"""
+
+import argparse
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from app.database.db_config import analytics_engine, get_analytics_db, JOURNAL_MODE
+from app.models.models import (AnalyticsBase, Branch, BranchOrder, BranchOrderItem, BranchShift,
+                               BranchInventory, BranchInventoryMovement, BranchMenuItem, BranchStaff)
+
+# Số dòng mỗi lô gửi từ luồng đọc sang luồng ghi
+CHUNK_ROWS = 5000
+# Số lô tối đa chờ trong hàng đợi (giới hạn bộ nhớ khi luồng ghi chậm hơn luồng đọc)
+QUEUE_CHUNKS = 8
+# Số id mỗi câu SELECT ... WHERE id IN (...) khi đọc lại các dòng thay đổi
+IN_BATCH = 500
+# Số dòng ghi tối đa trong một giao dịch của kho
+COMMIT_ROWS = 100000
+DEFAULT_WORKERS = 4
+BUSY_TIMEOUT = 30
+
+# Giá trị branches của StatsController cho báo cáo toàn chuỗi
+ALL_BRANCHES = "all"
+
+OUTBOX_TABLE = "change_outbox"
+COMPACTED_WATERMARK = "change_outbox_compacted"
+
+# Bảng đích, các bảng nguồn ở chi nhánh (cũng là tên bảng trong change_outbox)
+Entity = namedtuple("Entity", ["name", "model", "sources"])
+
+INCREMENTAL = [
+    Entity("orders", BranchOrder, ("orders", "orders_archive")),
+    Entity("order_items", BranchOrderItem, ("order_items", "order_items_archive")),
+    Entity("shifts", BranchShift, ("shifts",)),
+]
+
+SNAPSHOT = [
+    Entity("inventories", BranchInventory, ("inventories",)),
+    Entity("menu_items", BranchMenuItem, ("menu_items",)),
+    Entity("staffs", BranchStaff, ("staffs",)),
+]
+
+ENTITIES = {entity.name: entity for entity in INCREMENTAL + SNAPSHOT}
+
+
+class ConsolidationError(Exception):
+    pass
+
+
+def columns(entity):
+    """Các cột lấy từ chi nhánh (mọi cột của bảng đích trừ branch_id), id đứng đầu"""
+    return [column.name for column in entity.model.__table__.columns if column.name != "branch_id"]
+
+
+def init_analytics_db():
+    """Tạo các bảng của kho phân tích (WAL để báo cáo đọc được trong lúc hợp nhất)"""
+    AnalyticsBase.metadata.create_all(bind=analytics_engine)
+    with analytics_engine.connect() as conn:
+        conn.exec_driver_sql(f"PRAGMA journal_mode={JOURNAL_MODE}")
+
+
+def register_branch(code, path, name=None):
+    """
+    Đăng ký (hoặc cập nhật đường dẫn) một chi nhánh
+
+    Returns:
+        tuple: (success, message)
+    """
+    path = os.path.abspath(path)
+    if not os.path.exists(path):
+        return False, f"Không tìm thấy tệp {path}"
+    init_analytics_db()
+    db = get_analytics_db()
+    try:
+        branch = db.query(Branch).filter(Branch.code == code).first()
+        if branch is None:
+            db.add(Branch(code=code, name=name or code, path=path))
+        else:
+            if branch.path != path:
+                # Tệp khác: seq của outbox không còn so sánh được
+                branch.last_seq = None
+            branch.path = path
+            branch.name = name or branch.name
+        db.commit()
+        return True, f"Đã đăng ký chi nhánh {code}"
+    except IntegrityError:
+        db.rollback()
+        return False, f"Mã chi nhánh {code} đã tồn tại"
+    except SQLAlchemyError as e:
+        db.rollback()
+        print(f"Database error: {e}")
+        return False, f"Lỗi cơ sở dữ liệu: {e}"
+    finally:
+        db.close()
+
+
+def analytics_exists():
+    """Kho đã được tạo (mở kết nối tới tệp chưa có sẽ tạo ra một tệp rỗng)"""
+    return os.path.exists(analytics_engine.url.database)
+
+
+def get_branches():
+    """Các chi nhánh đã đăng ký (danh sách rỗng nếu chưa có kho)"""
+    if not analytics_exists():
+        return []
+    db = get_analytics_db()
+    try:
+        return db.query(Branch).order_by(Branch.code).all()
+    except SQLAlchemyError:
+        # Kho chưa được tạo
+        return []
+    finally:
+        db.close()
+
+
+# ---------------------------------------------------------------------- #
+# Luồng đọc (một luồng mỗi chi nhánh)
+# ---------------------------------------------------------------------- #
+
+def _open_branch(path):
+    """Mở tệp chi nhánh có sẵn (mode=rw: không tạo tệp rỗng khi sai đường dẫn)"""
+    conn = sqlite3.connect(f"file:{path}?mode=rw", uri=True, timeout=BUSY_TIMEOUT, isolation_level=None)
+    # Một giao dịch đọc cho cả lần hợp nhất: mọi bảng cùng một ảnh chụp với seq đọc được
+    conn.execute("BEGIN")
+    return conn
+
+
+def _outbox_state(conn):
+    """(seq cuối cùng, seq đã bị dọn) của outbox chi nhánh; (None, None) nếu chi nhánh chưa có outbox"""
+    try:
+        upper = conn.execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = ?", (OUTBOX_TABLE,)
+        ).fetchone()
+        compacted = conn.execute(
+            "SELECT position FROM sync_watermarks WHERE name = ?", (COMPACTED_WATERMARK,)
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None, None
+    return (upper[0] if upper else 0), ((compacted[0] or 0) if compacted else 0)
+
+
+def _read_all(conn, entity, emit):
+    select_columns = ", ".join(columns(entity))
+    for source in entity.sources:
+        cursor = conn.execute(f"SELECT {select_columns} FROM {source}")
+        while True:
+            rows = cursor.fetchmany(CHUNK_ROWS)
+            if not rows:
+                break
+            emit("rows", entity.name, rows)
+
+
+def _changed_ids(conn, last_seq, upper):
+    """{tên bảng đích: tập id} của các dòng thay đổi trong (last_seq, upper]"""
+    owner = {source: entity.name for entity in INCREMENTAL for source in entity.sources}
+    placeholders = ", ".join("?" * len(owner))
+    changed = {entity.name: set() for entity in INCREMENTAL}
+    for table_name, row_id in conn.execute(
+        f"SELECT DISTINCT table_name, row_id FROM {OUTBOX_TABLE} "
+        f"WHERE seq > ? AND seq <= ? AND table_name IN ({placeholders})",
+        (last_seq, upper, *owner)
+    ):
+        changed[owner[table_name]].add(row_id)
+    return changed
+
+
+def _read_changed(conn, entity, ids, emit):
+    """Đọc lại các id thay đổi; id không còn ở bảng nguồn nào thì bị xóa khỏi kho"""
+    select_columns = ", ".join(columns(entity))
+    ids = sorted(ids)
+    for start in range(0, len(ids), IN_BATCH):
+        batch = ids[start:start + IN_BATCH]
+        placeholders = ", ".join("?" * len(batch))
+        rows = []
+        for source in entity.sources:
+            rows += conn.execute(f"SELECT {select_columns} FROM {source} WHERE id IN ({placeholders})", batch).fetchall()
+        if rows:
+            emit("rows", entity.name, rows)
+        missing = set(batch) - {row[0] for row in rows}
+        if missing:
+            emit("delete", entity.name, sorted(missing))
+
+
+def read_branch(branch_id, path, last_seq, emit):
+    """
+    Đọc một chi nhánh và gửi các thông điệp emit(kind, ...) cho luồng ghi:
+      ("reset",)                      nạp lại toàn bộ: xóa dữ liệu tăng dần cũ của chi nhánh
+      ("rows", entity, rows)          ghi đè các dòng
+      ("delete", entity, ids)         xóa các dòng không còn ở chi nhánh
+      ("snapshot", entity, rows)      thay toàn bộ bảng nhỏ
+      ("done", seq, mode)             kết thúc, tiến mốc đến seq
+    """
+    conn = _open_branch(path)
+    try:
+        upper, compacted = _outbox_state(conn)
+        full = (
+            last_seq is None or upper is None
+            or compacted > last_seq  # outbox đã bị dọn qua mốc: mất thay đổi
+            or upper < last_seq      # tệp được khôi phục từ bản cũ
+        )
+        if full:
+            emit("reset")
+            for entity in INCREMENTAL:
+                _read_all(conn, entity, emit)
+        else:
+            for name, ids in _changed_ids(conn, last_seq, upper).items():
+                _read_changed(conn, ENTITIES[name], ids, emit)
+
+        for entity in SNAPSHOT:
+            rows = conn.execute(f"SELECT {', '.join(columns(entity))} FROM {entity.sources[0]}").fetchall()
+            emit("snapshot", entity.name, rows)
+
+        emit("done", upper, "full" if full else "incremental")
+    finally:
+        conn.close()
+
+
+# ---------------------------------------------------------------------- #
+# Luồng ghi (một kết nối tới kho)
+# ---------------------------------------------------------------------- #
+
+def _upsert(conn, entity, branch_id, rows):
+    if not rows:
+        # executemany với danh sách rỗng bị driver hiểu là một lần chạy không có tham số
+        return
+    names = ["branch_id"] + columns(entity)
+    conn.exec_driver_sql(
+        f"INSERT OR REPLACE INTO {entity.model.__tablename__} ({', '.join(names)}) "
+        f"VALUES ({', '.join('?' * len(names))})",
+        [(branch_id, *row) for row in rows]
+    )
+
+
+def _inventory_movements(conn, branch_id, rows):
+    """Các dòng biến động tồn kho so với lần hợp nhất trước (mặt hàng mới không có biến động)"""
+    names = columns(ENTITIES["inventories"])
+    quantity_at, updated_at = names.index("quantity"), names.index("last_update")
+    previous = dict(conn.exec_driver_sql(
+        f"SELECT id, quantity FROM {BranchInventory.__tablename__} WHERE branch_id = ?", (branch_id,)
+    ).fetchall())
+    now = datetime.now()
+    movements = []
+    for row in rows:
+        before = previous.get(row[0])
+        if before is not None and row[quantity_at] is not None and row[quantity_at] != before:
+            movements.append((branch_id, row[0], row[quantity_at] - before, row[quantity_at],
+                              row[updated_at] or str(now), str(now)))
+    if movements:
+        conn.exec_driver_sql(
+            f"INSERT INTO {BranchInventoryMovement.__tablename__} "
+            f"(branch_id, inventory_id, delta, quantity, recorded_at, synced_at) VALUES (?, ?, ?, ?, ?, ?)",
+            movements
+        )
+    return len(movements)
+
+
+def _apply(conn, branch_id, message, result):
+    """Ghi một thông điệp của luồng đọc; trả về số dòng đã ghi"""
+    kind, args = message[0], message[1:]
+    if kind == "reset":
+        for entity in INCREMENTAL:
+            conn.exec_driver_sql(f"DELETE FROM {entity.model.__tablename__} WHERE branch_id = ?", (branch_id,))
+        return 0
+    if kind == "rows":
+        entity, rows = ENTITIES[args[0]], args[1]
+        _upsert(conn, entity, branch_id, rows)
+        result["rows"] += len(rows)
+        return len(rows)
+    if kind == "delete":
+        entity, ids = ENTITIES[args[0]], args[1]
+        conn.exec_driver_sql(
+            f"DELETE FROM {entity.model.__tablename__} WHERE branch_id = ? AND id = ?",
+            [(branch_id, row_id) for row_id in ids]
+        )
+        result["deleted"] += len(ids)
+        return len(ids)
+    if kind == "snapshot":
+        entity, rows = ENTITIES[args[0]], args[1]
+        if entity.name == "inventories":
+            result["movements"] += _inventory_movements(conn, branch_id, rows)
+        conn.exec_driver_sql(f"DELETE FROM {entity.model.__tablename__} WHERE branch_id = ?", (branch_id,))
+        _upsert(conn, entity, branch_id, rows)
+        return len(rows)
+    if kind == "done":
+        seq, result["mode"] = args
+        conn.exec_driver_sql(
+            f"UPDATE {Branch.__tablename__} SET last_seq = ?, last_sync_at = ?, last_error = NULL WHERE id = ?",
+            (seq, str(datetime.now()), branch_id)
+        )
+        return 0
+    raise ValueError(f"Thông điệp không hợp lệ: {kind}")
+
+
+def consolidate(codes=None, workers=DEFAULT_WORKERS):
+    """
+    Hợp nhất các chi nhánh (mặc định: tất cả) vào kho phân tích
+
+    Args:
+        codes: Danh sách mã chi nhánh cần hợp nhất
+        workers: Số chi nhánh được đọc song song
+
+    Returns:
+        dict: {mã chi nhánh: {"mode", "rows", "deleted", "movements", "seconds", "error"}}
+    """
+    init_analytics_db()
+    branches = [branch for branch in get_branches() if not codes or branch.code in codes]
+    if codes and len(branches) < len(set(codes)):
+        unknown = set(codes) - {branch.code for branch in branches}
+        raise ConsolidationError(f"Chưa đăng ký chi nhánh: {', '.join(sorted(unknown))}")
+
+    inbox = queue.Queue(maxsize=QUEUE_CHUNKS)
+    cancelled = threading.Event()
+    results = {branch.id: {"mode": None, "rows": 0, "deleted": 0, "movements": 0, "seconds": 0.0, "error": None}
+               for branch in branches}
+    began = time.perf_counter()
+
+    def reader(branch):
+        def emit(*message):
+            if cancelled.is_set():
+                raise ConsolidationError("Đã dừng do lỗi ghi kho")
+            inbox.put((branch.id, message))
+        try:
+            read_branch(branch.id, branch.path, branch.last_seq, emit)
+        except (sqlite3.Error, OSError, ConsolidationError) as e:
+            inbox.put((branch.id, ("error", str(e))))
+        except BaseException as e:
+            inbox.put((branch.id, ("error", repr(e))))
+            raise
+
+    pending = len(branches)
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="branch-reader") as pool:
+        for branch in branches:
+            pool.submit(reader, branch)
+
+        with analytics_engine.connect() as conn:
+            written = 0
+            try:
+                while pending:
+                    branch_id, message = inbox.get()
+                    result = results[branch_id]
+                    if message[0] == "error":
+                        # Các lô đã ghi của chi nhánh được giữ lại (ghi đè được), mốc không tiến
+                        result["error"] = message[1]
+                        conn.exec_driver_sql(
+                            f"UPDATE {Branch.__tablename__} SET last_error = ? WHERE id = ?", (message[1], branch_id)
+                        )
+                    else:
+                        written += _apply(conn, branch_id, message, result)
+                    if message[0] in ("done", "error"):
+                        pending -= 1
+                        result["seconds"] = round(time.perf_counter() - began, 2)
+                        conn.commit()
+                        written = 0
+                    elif written >= COMMIT_ROWS:
+                        conn.commit()
+                        written = 0
+            except SQLAlchemyError as e:
+                conn.rollback()
+                print(f"Database error: {e}")
+                cancelled.set()
+                for result in results.values():
+                    if result["mode"] is None and result["error"] is None:
+                        result["error"] = f"Lỗi ghi kho: {e}"
+                # Nhận hết thông điệp còn lại để các luồng đọc không bị chặn ở hàng đợi
+                while pending:
+                    _, message = inbox.get()
+                    if message[0] in ("done", "error"):
+                        pending -= 1
+
+    return {branch.code: results[branch.id] for branch in branches}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hợp nhất dữ liệu các chi nhánh vào kho phân tích")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="Đăng ký chi nhánh")
+    add.add_argument("code")
+    add.add_argument("path", help="Tệp coffee_management.db của chi nhánh")
+    add.add_argument("--name", default=None)
+
+    sync = commands.add_parser("sync", help="Hợp nhất dữ liệu mới")
+    sync.add_argument("codes", nargs="*", help="Mã chi nhánh (mặc định: tất cả)")
+    sync.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Số chi nhánh đọc song song")
+
+    commands.add_parser("list", help="Liệt kê chi nhánh")
+    args = parser.parse_args()
+
+    if args.command == "add":
+        success, message = register_branch(args.code, args.path, args.name)
+        print(message)
+        return 0 if success else 1
+
+    if args.command == "list":
+        for branch in get_branches():
+            print(f"{branch.code:<8} {branch.name or '':<20} seq={branch.last_seq} "
+                  f"lần cuối={branch.last_sync_at} {branch.path}" + (f" LỖI: {branch.last_error}" if branch.last_error else ""))
+        return 0
+
+    try:
+        results = consolidate(args.codes, args.workers)
+    except ConsolidationError as e:
+        print(e)
+        return 1
+    for code, result in results.items():
+        status = f"LỖI: {result['error']}" if result["error"] else result["mode"]
+        print(f"{code}: {status}, {result['rows']:,} dòng, xóa {result['deleted']:,}, "
+              f"{result['movements']} biến động kho, {result['seconds']}s")
+    return 0 if all(result["error"] is None for result in results.values()) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
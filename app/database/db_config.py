@@ -1,12 +1,24 @@
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from app.utils.instrumentation import install as install_instrumentation
 
 DATABASE_URL = "sqlite:///app/database/coffee_management.db"
 
+# Kho phân tích hợp nhất các chi nhánh (app.database.consolidation)
+ANALYTICS_DATABASE_URL = "sqlite:///app/database/analytics.db"
+
+# WAL: người đọc (kể cả bản sao lưu trực tuyến) không chặn người ghi; lưu trong tệp, đặt bởi init_db
+JOURNAL_MODE = "WAL"
+
 engine = create_engine(DATABASE_URL)
+install_instrumentation(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+analytics_engine = create_engine(ANALYTICS_DATABASE_URL)
+install_instrumentation(analytics_engine)
+AnalyticsSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=analytics_engine)
+
 Base = declarative_base()
 
 def get_db():
@@ -14,4 +26,7 @@ def get_db():
     try:
         return db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close() 
+
+def get_analytics_db():
+    return AnalyticsSessionLocal()
@@ -1,5 +1,7 @@
-from app.database.db_config import engine, get_db
-from app.models.models import Base, MenuItem, MenuCategory, Table, Staff, Feedback, Shift
+from app.database.db_config import engine, get_db, JOURNAL_MODE
+from app.database.migrations import upgrade_schema
+from app.models.models import Base, MenuItem, MenuCategory, Table, Staff, Feedback, Shift, ShiftTemplate
+from app.utils.csp_scheduler import STANDARD_SHIFTS
 import os
 import hashlib
 
@@ -8,13 +10,27 @@ def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
 def init_db():
+    # Tệp cơ sở dữ liệu mới dùng auto_vacuum=INCREMENTAL để bảo trì nền trả lại dung lượng trống
+    # (chỉ có tác dụng trước khi tạo bảng; tệp cũ được chuyển bởi app.database.maintenance)
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+
     # Tạo tất cả các bảng trong cơ sở dữ liệu
     Base.metadata.create_all(bind=engine)
     
+    # Bổ sung các cột/chỉ mục mới cho cơ sở dữ liệu cũ
+    upgrade_schema(engine)
+    
+    # Chế độ nhật ký được lưu trong tệp cơ sở dữ liệu, chỉ cần đặt một lần
+    with engine.connect() as conn:
+        conn.exec_driver_sql(f"PRAGMA journal_mode={JOURNAL_MODE}")
+    
     # Kiểm tra xem đã có dữ liệu mẫu chưa
     db = get_db()
     if db.query(MenuCategory).count() == 0:
         populate_sample_data(db)
+    if db.query(ShiftTemplate).count() == 0:
+        populate_shift_templates(db)
     db.close()
 
 def populate_sample_data(db):
@@ -69,5 +85,10 @@ def populate_sample_data(db):
     db.add_all(staffs)
     db.commit()
 
+def populate_shift_templates(db):
+    # Thêm các ca mẫu cho lập lịch tự động
+    db.add_all([ShiftTemplate(**shift) for shift in STANDARD_SHIFTS])
+    db.commit()
+
 if __name__ == "__main__":
     init_db() 
\ No newline at end of file
@@ -0,0 +1,298 @@
+"""
+Maintenance
+Bảo trì cơ sở dữ liệu SQLite định kỳ khi quán vắng
+
+Sau nhiều tháng thêm đơn và cập nhật kho, thống kê của bộ lập kế hoạch truy vấn bị cũ và tệp bị
+phân mảnh. Mỗi lần bảo trì:
+  1. ANALYZE các bảng có từ ANALYZE_MIN_CHANGES thay đổi trở lên kể từ lần trước (đếm từ
+     change_outbox), lấy mẫu theo ANALYSIS_LIMIT để không giữ khóa ghi lâu;
+  2. PRAGMA optimize cho các bảng/chỉ mục còn lại;
+  3. dọn change_outbox, giữ lại OUTBOX_RETENTION_DAYS ngày gần nhất cho consolidation;
+  4. incremental vacuum từng VACUUM_PAGES_PER_STEP trang (auto_vacuum=INCREMENTAL; cơ sở dữ liệu
+     cũ được chuyển bằng một lần VACUUM nếu nhỏ hơn CONVERT_MAX_BYTES, lớn hơn thì phải chạy tay);
+  5. PRAGMA wal_checkpoint(TRUNCATE) để thu nhỏ tệp -wal.
+Thời gian từng bước và dung lượng thu hồi được ghi vào bảng maintenance_runs.
+
+MaintenanceScheduler kiểm tra mỗi CHECK_INTERVAL_SECONDS: quán được coi là vắng khi orders và
+order_items không thay đổi trong IDLE_MINUTES phút. Mốc "maintenance" trong sync_watermarks được
+giành bằng một câu UPDATE có điều kiện, nên nhiều máy POS cùng chạy bộ lập lịch cũng chỉ có một
+máy bảo trì trong mỗi MIN_INTERVAL_HOURS giờ.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from app.database.backup import database_path
+from app.database.change_log import ChangeConsumer, compact, last_change_at
+from app.database.db_config import get_db
+from app.models.models import MaintenanceRun, SyncWatermark
+from app.utils.instrumentation import registry as instrumentation
+
+logger = logging.getLogger(__name__)
+
+# Phát hiện quán vắng qua hoạt động đơn hàng
+ACTIVITY_TABLES = ("orders", "order_items")
+IDLE_MINUTES = 15
+CHECK_INTERVAL_SECONDS = 60
+MIN_INTERVAL_HOURS = 24
+
+ANALYZE_MIN_CHANGES = 500
+# Số dòng mỗi chỉ mục được đọc khi ANALYZE (0: đọc toàn bộ)
+ANALYSIS_LIMIT = 1000
+
+VACUUM_PAGES_PER_STEP = 2048
+MAX_VACUUM_SECONDS = 60
+CONVERT_MAX_BYTES = 512 * 1024 * 1024
+
+OUTBOX_RETENTION_DAYS = 7
+
+BUSY_TIMEOUT = 30
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+WATERMARK_NAME = "maintenance"
+CONSUMER_NAME = "maintenance"
+
+
+def database_size(path=None):
+    """Dung lượng tệp cơ sở dữ liệu kèm tệp -wal (byte)"""
+    path = path or database_path()
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+
+
+def is_idle(idle_minutes=IDLE_MINUTES):
+    """Không có đơn/món nào được thêm hoặc sửa trong idle_minutes phút gần nhất"""
+    db = get_db()
+    try:
+        changed_at = last_change_at(db, ACTIVITY_TABLES)
+    except SQLAlchemyError as e:
+        print(f"Database error: {e}")
+        return False
+    finally:
+        db.close()
+    return changed_at is None or changed_at < datetime.now() - timedelta(minutes=idle_minutes)
+
+
+def claim_run(min_interval_hours=MIN_INTERVAL_HOURS):
+    """
+    Giành lượt bảo trì: chỉ thành công nếu lần bảo trì trước cách đây hơn min_interval_hours giờ
+    (một câu UPDATE có điều kiện, an toàn khi nhiều tiến trình cùng kiểm tra)
+    """
+    now = datetime.now()
+    db = get_db()
+    try:
+        claimed = db.execute(
+            update(SyncWatermark).where(
+                SyncWatermark.name == WATERMARK_NAME,
+                or_(SyncWatermark.timestamp.is_(None),
+                    SyncWatermark.timestamp < now - timedelta(hours=min_interval_hours))
+            ).values(timestamp=now, updated_at=now)
+        ).rowcount == 1
+        if not claimed and db.query(SyncWatermark.name).filter(SyncWatermark.name == WATERMARK_NAME).first() is None:
+            db.add(SyncWatermark(name=WATERMARK_NAME, timestamp=now, updated_at=now))
+            claimed = True
+        db.commit()
+        return claimed
+    except IntegrityError:
+        # Tiến trình khác vừa tạo mốc trước
+        db.rollback()
+        return False
+    except SQLAlchemyError as e:
+        db.rollback()
+        print(f"Database error: {e}")
+        return False
+    finally:
+        db.close()
+
+
+def _execute(conn, sql):
+    """Chạy một câu lệnh bảo trì đến hết (executescript không dừng sau bước đầu như conn.execute)"""
+    conn.executescript(sql + ";")
+
+
+def _incremental_vacuum(conn, max_seconds):
+    """Trả các trang trống về hệ điều hành theo từng đợt nhỏ, mỗi đợt một giao dịch ngắn"""
+    began = time.perf_counter()
+    free_before = free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    while free_pages and time.perf_counter() - began < max_seconds:
+        # conn.execute() chỉ chạy một bước của câu lệnh (giải phóng một trang)
+        _execute(conn, f"PRAGMA incremental_vacuum({VACUUM_PAGES_PER_STEP})")
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return {"freed_pages": free_before - free_pages, "free_pages_left": free_pages}
+
+
+def run_maintenance(trigger="manual", convert=False, path=None):
+    """
+    Chạy một lần bảo trì và ghi kết quả vào maintenance_runs
+
+    Args:
+        trigger: "idle" (bộ lập lịch) hoặc "manual"
+        convert: Cho phép VACUUM toàn bộ để bật auto_vacuum=INCREMENTAL với cơ sở dữ liệu lớn
+
+    Returns:
+        dict: started_at, duration_ms, size_before, size_after, reclaimed_bytes, analyzed_tables,
+              details (thời gian/kết quả từng bước), error
+    """
+    path = path or database_path()
+    started_at = datetime.now()
+    began = time.perf_counter()
+    size_before = database_size(path)
+    details = {}
+    analyzed = []
+    error = None
+
+    def timed(name, func):
+        step_began = time.perf_counter()
+        result = func()
+        details[name] = {"ms": round((time.perf_counter() - step_began) * 1000, 1), "result": result}
+        return result
+
+    consumer = ChangeConsumer(CONSUMER_NAME)
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None)
+    try:
+        tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        counts, position = consumer.pending_counts()
+        analyzed = sorted(table for table, count in (counts or {}).items()
+                          if count >= ANALYZE_MIN_CHANGES and table in tables)
+        conn.execute(f"PRAGMA analysis_limit={ANALYSIS_LIMIT}")
+        for table in analyzed:
+            timed(f"analyze {table}", lambda: _execute(conn, f'ANALYZE "{table}"'))
+
+        timed("optimize", lambda: _execute(conn, "PRAGMA optimize"))
+
+        if position is not None:
+            consumer.ack(position)
+        timed("compact_outbox", lambda: compact(OUTBOX_RETENTION_DAYS))
+
+        auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        if auto_vacuum == AUTO_VACUUM_INCREMENTAL:
+            timed("incremental_vacuum", lambda: _incremental_vacuum(conn, MAX_VACUUM_SECONDS))
+        elif convert or size_before <= CONVERT_MAX_BYTES:
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            timed("vacuum", lambda: _execute(conn, "VACUUM"))
+        else:
+            details["vacuum"] = {"ms": 0, "result": "bỏ qua: cơ sở dữ liệu lớn, cần chạy với convert=True"}
+
+        timed("wal_checkpoint", lambda: dict(zip(
+            ("busy", "log_pages", "checkpointed_pages"),
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        )))
+    except sqlite3.Error as e:
+        error = str(e)
+        logger.error("Bảo trì cơ sở dữ liệu lỗi: %s", e)
+    finally:
+        conn.close()
+
+    size_after = database_size(path)
+    run = {
+        "started_at": started_at,
+        "trigger": trigger,
+        "duration_ms": round((time.perf_counter() - began) * 1000, 1),
+        "size_before": size_before,
+        "size_after": size_after,
+        "reclaimed_bytes": size_before - size_after,
+        "analyzed_tables": analyzed,
+        "details": details,
+        "error": error,
+    }
+
+    db = get_db()
+    try:
+        db.add(MaintenanceRun(
+            **{**run, "analyzed_tables": ",".join(analyzed), "details": json.dumps(details, ensure_ascii=False)}
+        ))
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        print(f"Database error: {e}")
+    finally:
+        db.close()
+
+    logger.info("Bảo trì cơ sở dữ liệu (%s) xong trong %.0f ms, thu hồi %.1f MB, ANALYZE: %s",
+                trigger, run["duration_ms"], run["reclaimed_bytes"] / 1024 / 1024, ", ".join(analyzed) or "-")
+    return run
+
+
+def recent_runs(limit=10):
+    """Các lần bảo trì gần nhất, mới nhất trước"""
+    db = get_db()
+    try:
+        return db.query(MaintenanceRun).order_by(MaintenanceRun.started_at.desc()).limit(limit).all()
+    except SQLAlchemyError as e:
+        print(f"Database error: {e}")
+        return []
+    finally:
+        db.close()
+
+
+class MaintenanceScheduler:
+    """Luồng nền chạy run_maintenance() khi quán vắng, tối đa một lần mỗi MIN_INTERVAL_HOURS giờ"""
+
+    def __init__(self, check_interval=CHECK_INTERVAL_SECONDS, idle_minutes=IDLE_MINUTES,
+                 min_interval_hours=MIN_INTERVAL_HOURS):
+        self.check_interval = check_interval
+        self.idle_minutes = idle_minutes
+        self.min_interval_hours = min_interval_hours
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.running = False
+        self.last_run = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="db-maintenance", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+
+    def check(self):
+        """Một lần kiểm tra: bảo trì nếu quán vắng và đã đến hạn; trả về kết quả hoặc None"""
+        if not is_idle(self.idle_minutes) or not claim_run(self.min_interval_hours):
+            return None
+        self.running = True
+        try:
+            self.last_run = run_maintenance("idle")
+        finally:
+            self.running = False
+        return self.last_run
+
+    def _loop(self):
+        while not self._stop.wait(self.check_interval):
+            try:
+                self.check()
+            except Exception:
+                logger.exception("Lỗi bộ lập lịch bảo trì")
+
+    def stats(self):
+        last = self.last_run
+        return {
+            "running": self.running,
+            "last_run": None if last is None else {
+                "started_at": last["started_at"].isoformat(timespec="seconds"),
+                "duration_ms": last["duration_ms"],
+                "reclaimed_bytes": last["reclaimed_bytes"],
+                "analyzed_tables": last["analyzed_tables"],
+                "error": last["error"],
+            },
+        }
+
+
+# Bộ lập lịch dùng chung trong tiến trình
+maintenance_scheduler = MaintenanceScheduler()
+instrumentation.add_section("maintenance", maintenance_scheduler.stats)
@@ -0,0 +1,144 @@
+"""
+Nâng cấp lược đồ cho cơ sở dữ liệu đã tồn tại.
+
+Base.metadata.create_all() chỉ tạo các bảng còn thiếu, không thêm cột hay chỉ mục
+vào bảng đã có. Các cột/chỉ mục được bổ sung sau phiên bản đầu tiên khai báo ở đây
+và được thêm vào bằng ALTER TABLE khi khởi động.
+"""
+
+from sqlalchemy import inspect, text
+
+from app.models.status import OrderStatus, ItemStatus
+from app.database.change_log import create_change_triggers
+
+# Các cột bổ sung: (bảng, cột, kiểu SQL)
+ADDED_COLUMNS = [
+    ("orders", "paid_at", "DATETIME"),
+    ("order_items", "unit_price", "FLOAT"),
+    ("order_items", "line_total", "FLOAT"),
+    ("order_items_archive", "unit_price", "FLOAT"),
+    ("order_items_archive", "line_total", "FLOAT"),
+    ("orders", "version", "INTEGER NOT NULL DEFAULT 1"),
+    ("order_items", "version", "INTEGER NOT NULL DEFAULT 1"),
+    ("inventories", "version", "INTEGER NOT NULL DEFAULT 1"),
+    ("orders_archive", "version", "INTEGER NOT NULL DEFAULT 1"),
+    ("order_items_archive", "version", "INTEGER NOT NULL DEFAULT 1"),
+]
+
+# Điền dữ liệu một lần cho cột vừa được thêm: (bảng, cột) -> câu lệnh SQL
+# Giá của các món đã gọi trước khi có unit_price lấy theo giá thực đơn hiện tại
+BACKFILLS = {
+    ("order_items", "unit_price"):
+        "UPDATE order_items SET unit_price = "
+        "(SELECT price FROM menu_items WHERE menu_items.id = order_items.menu_item_id)",
+    ("order_items", "line_total"):
+        "UPDATE order_items SET line_total = unit_price * quantity",
+    ("order_items_archive", "unit_price"):
+        "UPDATE order_items_archive SET unit_price = "
+        "(SELECT price FROM menu_items WHERE menu_items.id = order_items_archive.menu_item_id)",
+    ("order_items_archive", "line_total"):
+        "UPDATE order_items_archive SET line_total = unit_price * quantity",
+}
+
+# Các chỉ mục bổ sung: (tên chỉ mục, bảng, danh sách cột)
+ADDED_INDEXES = [
+    ("ix_orders_paid_at", "orders", "paid_at"),
+    ("ix_reservations_table_time", "reservations", "table_id, reservation_time"),
+    ("ix_shifts_staff_start", "shifts", "staff_id, start_time"),
+    ("ix_feedbacks_created_at_id", "feedbacks", "created_at, id"),
+    ("ix_orders_status_id", "orders", "status, id"),
+    ("ix_order_items_order_menu_total", "order_items", "order_id, menu_item_id, quantity, line_total"),
+    ("ix_order_items_archive_order_menu_total", "order_items_archive", "order_id, menu_item_id, quantity, line_total"),
+    ("ix_order_items_status_id", "order_items", "status, id"),
+]
+
+# Cột trạng thái chuyển từ chuỗi tiếng Việt sang mã số nguyên nhỏ: (bảng, enum trạng thái)
+STATUS_COLUMNS = [
+    ("orders", OrderStatus),
+    ("orders_archive", OrderStatus),
+    ("order_items", ItemStatus),
+    ("order_items_archive", ItemStatus),
+]
+
+# View hợp nhất dữ liệu đang dùng và dữ liệu lưu trữ: (tên view, bảng đang dùng, bảng lưu trữ)
+HISTORY_VIEWS = [
+    ("orders_all", "orders", "orders_archive"),
+    ("order_items_all", "order_items", "order_items_archive"),
+]
+
+def upgrade_schema(engine):
+    """Thêm các cột, chỉ mục, view và trigger còn thiếu vào cơ sở dữ liệu hiện có"""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    
+    with engine.begin() as conn:
+        for table, column, column_type in ADDED_COLUMNS:
+            if table not in existing_tables:
+                continue
+            existing_columns = {c["name"] for c in inspector.get_columns(table)}
+            if column not in existing_columns:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}"))
+                if (table, column) in BACKFILLS:
+                    conn.execute(text(BACKFILLS[(table, column)]))
+        
+        convert_status_columns(conn)
+        
+        for index_name, table, columns in ADDED_INDEXES:
+            if table in existing_tables:
+                conn.execute(text(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({columns})"))
+        
+        create_history_views(conn)
+        
+        # Trigger ghi outbox thay đổi (tạo sau khi các bảng đã được nâng cấp)
+        create_change_triggers(conn)
+
+def convert_status_columns(conn):
+    """
+    Đổi các cột trạng thái dạng chuỗi thành SMALLINT chứa mã trạng thái (cần SQLite >= 3.35).
+    View và chỉ mục dùng cột trạng thái bị xóa trước, sau đó được tạo lại bởi upgrade_schema.
+    """
+    inspector = inspect(conn)
+    existing_tables = set(inspector.get_table_names())
+    
+    for table, status_enum in STATUS_COLUMNS:
+        if table not in existing_tables:
+            continue
+        column = next((c for c in inspector.get_columns(table) if c["name"] == "status"), None)
+        if column is None or "INT" in str(column["type"]).upper():
+            continue
+        
+        for view_name, _, _ in HISTORY_VIEWS:
+            conn.execute(text(f"DROP VIEW IF EXISTS {view_name}"))
+        for index in inspector.get_indexes(table):
+            if "status" in index["column_names"]:
+                conn.execute(text(f"DROP INDEX IF EXISTS {index['name']}"))
+        
+        # Nhãn không thuộc enum (dữ liệu nhập tự do trước đây) nhận NULL
+        cases = " ".join(f"WHEN '{member.label}' THEN {int(member)}" for member in status_enum)
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN status_code SMALLINT"))
+        conn.execute(text(f"UPDATE {table} SET status_code = CASE status {cases} END"))
+        conn.execute(text(f"ALTER TABLE {table} DROP COLUMN status"))
+        conn.execute(text(f"ALTER TABLE {table} RENAME COLUMN status_code TO status"))
+
+def create_history_views(conn):
+    """
+    Tạo lại các view UNION ALL giữa bảng đang dùng và bảng lưu trữ.
+    Cột của view lấy theo bảng đang dùng; cột chưa có trong bảng lưu trữ nhận NULL.
+    """
+    inspector = inspect(conn)
+    existing_tables = set(inspector.get_table_names())
+    
+    for view_name, live_table, archive_table in HISTORY_VIEWS:
+        if live_table not in existing_tables or archive_table not in existing_tables:
+            continue
+        live_columns = [c["name"] for c in inspector.get_columns(live_table)]
+        archive_columns = {c["name"] for c in inspector.get_columns(archive_table)}
+        archive_select = ", ".join(
+            column if column in archive_columns else f"NULL AS {column}" for column in live_columns
+        )
+        conn.execute(text(f"DROP VIEW IF EXISTS {view_name}"))
+        conn.execute(text(
+            f"CREATE VIEW {view_name} AS "
+            f"SELECT {', '.join(live_columns)} FROM {live_table} "
+            f"UNION ALL SELECT {archive_select} FROM {archive_table}"
+        ))
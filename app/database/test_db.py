@@ -2,6 +2,7 @@ import os
 import sys
 import hashlib
 import random
+import argparse
 from datetime import datetime, timedelta
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
@@ -10,17 +11,27 @@ from sqlalchemy.orm import sessionmaker
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
 from app.database.db_config import Base
-from app.models.models import (MenuCategory, MenuItem, Table, Staff, Customer, 
-                             Order, OrderItem, Inventory, Reservation, Shift)
+from app.models.models import MenuCategory, MenuItem, Table, Staff, Customer
+from app.database.bulk_generator import BulkHistoryGenerator
 
 def hash_password(password):
     """Hashes the password using SHA-256"""
     return hashlib.sha256(password.encode()).hexdigest()
 
-def create_test_database():
-    """Tạo cơ sở dữ liệu thử nghiệm với dữ liệu mẫu cho 1 năm"""
+def create_test_database(scale=1.0, seed=None, years=1):
+    """
+    Tạo cơ sở dữ liệu thử nghiệm với dữ liệu mẫu
+    
+    Args:
+        scale: Hệ số nhân số đơn mỗi ngày (ví dụ 500 cho khoảng 10 triệu món/năm)
+        seed: Hạt giống ngẫu nhiên để tái lập dữ liệu
+        years: Số năm dữ liệu lịch sử
+    """
     from app.database.db_config import DATABASE_URL
     
+    if seed is not None:
+        random.seed(seed)
+    
     # Kết nối tới cơ sở dữ liệu
     engine = create_engine(DATABASE_URL)
     Base.metadata.drop_all(engine)  # Xóa tất cả bảng hiện có
@@ -184,183 +195,22 @@ def create_test_database():
         
         session.commit()
         
-        # 6. Tạo lịch làm việc
-        shifts = []
-        # Ngày bắt đầu là 1 năm trước
-        start_date = datetime.now() - timedelta(days=365)
-        
-        # Cho mỗi ngày trong năm
-        for day in range(365):
-            current_date = start_date + timedelta(days=day)
-            
-            # Ca sáng: 8h-15h
-            for staff in staff_objects:
-                if staff.shift in ["Sáng", "Toàn thời gian"]:
-                    shift_start = datetime.combine(current_date.date(), datetime.min.time()) + timedelta(hours=8)
-                    shift_end = datetime.combine(current_date.date(), datetime.min.time()) + timedelta(hours=15)
-                    shift = Shift(
-                        staff_id=staff.id,
-                        date=current_date,
-                        start_time=shift_start,
-                        end_time=shift_end,
-                        status="đã làm" if current_date < datetime.now() else "lịch"
-                    )
-                    session.add(shift)
-            
-            # Ca chiều: 15h-22h
-            for staff in staff_objects:
-                if staff.shift in ["Chiều", "Toàn thời gian"]:
-                    shift_start = datetime.combine(current_date.date(), datetime.min.time()) + timedelta(hours=15)
-                    shift_end = datetime.combine(current_date.date(), datetime.min.time()) + timedelta(hours=22)
-                    shift = Shift(
-                        staff_id=staff.id,
-                        date=current_date,
-                        start_time=shift_start,
-                        end_time=shift_end,
-                        status="đã làm" if current_date < datetime.now() else "lịch"
-                    )
-                    session.add(shift)
-        
-        session.commit()
-        
-        # 7. Tạo đơn hàng trong 1 năm
-        orders = []
-        # Số đơn trung bình mỗi ngày
-        orders_per_day = 15
-        
-        # Phân bố số đơn theo ngày trong tuần (cuối tuần sẽ nhiều đơn hơn)
-        day_distribution = {
-            0: 0.8,  # Thứ 2: 80% so với trung bình
-            1: 0.9,  # Thứ 3: 90% so với trung bình
-            2: 1.0,  # Thứ 4: 100% so với trung bình
-            3: 1.1,  # Thứ 5: 110% so với trung bình
-            4: 1.2,  # Thứ 6: 120% so với trung bình
-            5: 1.5,  # Thứ 7: 150% so với trung bình
-            6: 1.5,  # Chủ nhật: 150% so với trung bình
-        }
-        
-        # Phân bố số đơn theo giờ trong ngày
-        hour_distribution = {
-            8: 0.5,   # 8h: 50% so với trung bình
-            9: 0.8,   # 9h: 80% so với trung bình
-            10: 1.0,  # 10h: 100% so với trung bình
-            11: 1.2,  # 11h: 120% so với trung bình
-            12: 1.5,  # 12h: 150% so với trung bình
-            13: 1.2,  # 13h: 120% so với trung bình
-            14: 1.0,  # 14h: 100% so với trung bình
-            15: 0.8,  # 15h: 80% so với trung bình
-            16: 1.0,  # 16h: 100% so với trung bình
-            17: 1.2,  # 17h: 120% so với trung bình
-            18: 1.5,  # 18h: 150% so với trung bình
-            19: 1.3,  # 19h: 130% so với trung bình
-            20: 1.0,  # 20h: 100% so với trung bình
-            21: 0.7,  # 21h: 70% so với trung bình
-        }
-        
-        # Tỷ lệ đặt hàng online
-        online_order_rate = 0.3
-        
-        # Cho mỗi ngày trong năm
-        for day in range(365):
-            current_date = start_date + timedelta(days=day)
-            
-            # Đảm bảo đơn hàng trong quá khứ
-            if current_date >= datetime.now():
-                continue
-            
-            # Số đơn trong ngày dựa trên ngày trong tuần
-            day_of_week = current_date.weekday()
-            orders_today = int(orders_per_day * day_distribution.get(day_of_week, 1.0))
-            
-            # Tạo đơn hàng cho mỗi giờ trong ngày
-            for hour in range(8, 22):
-                # Số đơn trong giờ này
-                hour_factor = hour_distribution.get(hour, 1.0)
-                orders_this_hour = max(1, int(orders_today / 14 * hour_factor))
-                
-                for i in range(orders_this_hour):
-                    # Thời gian đơn hàng
-                    minutes = random.randint(0, 59)
-                    order_time = datetime.combine(current_date.date(), datetime.min.time()) + timedelta(hours=hour, minutes=minutes)
-                    
-                    # Xác định xem đơn hàng này là tại chỗ hay mang đi
-                    is_online = random.random() < online_order_rate
-                    
-                    if is_online:
-                        # Đơn online không cần bàn
-                        table_id = None
-                    else:
-                        # Chọn một bàn ngẫu nhiên
-                        table_id = random.choice(table_objects).id
-                    
-                    # Chọn nhân viên phù hợp với ca làm việc
-                    if hour < 15:
-                        staff = random.choice([s for s in staff_objects if s.shift in ["Sáng", "Toàn thời gian"]])
-                    else:
-                        staff = random.choice([s for s in staff_objects if s.shift in ["Chiều", "Toàn thời gian"]])
-                    
-                    # Khách hàng (có thể là khách vãng lai)
-                    customer = None
-                    if random.random() < 0.3:  # 30% khả năng có khách hàng đăng ký
-                        customer = random.choice(customers)
-                    
-                    # Tạo đơn hàng
-                    order = Order(
-                        table_id=table_id,
-                        staff_id=staff.id,
-                        customer_id=customer.id if customer else None,
-                        order_time=order_time,
-                        status="đã thanh toán",
-                        total_amount=0,
-                        discount=0,
-                        final_amount=0,
-                        payment_method=random.choice(["tiền mặt", "thẻ", "ví điện tử"]),
-                        note="Đơn hàng mang đi" if is_online else None
-                    )
-                    session.add(order)
-                    session.flush()  # Để lấy ID của order
-                    
-                    # Số lượng món trong đơn
-                    num_items = random.randint(1, 5)
-                    total_amount = 0
-                    
-                    # Thêm các món vào đơn hàng
-                    selected_items = random.sample(menu_item_objects, num_items)
-                    for menu_item in selected_items:
-                        quantity = random.randint(1, 3)
-                        
-                        # Thêm OrderItem
-                        order_item = OrderItem(
-                            order_id=order.id,
-                            menu_item_id=menu_item.id,
-                            quantity=quantity,
-                            note=None,
-                            status="đã hoàn thành",
-                            created_at=order_time,
-                            completed_at=order_time + timedelta(minutes=random.randint(5, 15)),
-                            completed_by=random.choice([s.id for s in staff_objects if s.role == "Pha chế"])
-                        )
-                        session.add(order_item)
-                        
-                        # Cập nhật tổng tiền
-                        item_total = menu_item.price * quantity
-                        total_amount += item_total
-                    
-                    # Áp dụng giảm giá cho khách hàng thân thiết
-                    discount = 0
-                    if customer and customer.points > 50:
-                        discount = total_amount * 0.1  # Giảm 10% cho khách hàng thân thiết
-                    
-                    # Cập nhật thông tin đơn hàng
-                    order.total_amount = total_amount
-                    order.discount = discount
-                    order.final_amount = total_amount - discount
-            
-            # Commit sau mỗi ngày để tránh quá nhiều dữ liệu trong bộ nhớ
-            session.commit()
-            print(f"Đã tạo dữ liệu cho ngày {current_date.date()}")
-        
-        print("Đã tạo xong dữ liệu mẫu cho 1 năm!")
+        # 6-7. Tạo lịch làm việc và đơn hàng bằng bộ sinh dữ liệu hàng loạt
+        generator = BulkHistoryGenerator(
+            engine,
+            tables=[t.id for t in table_objects],
+            staff=[(s.id, s.role, s.shift) for s in staff_objects],
+            customers=[(c.id, c.points) for c in customers],
+            menu_items=[(m.id, m.price) for m in menu_item_objects],
+            scale=scale,
+            seed=seed
+        )
+        days = int(365 * years)
+        start_date = datetime.now() - timedelta(days=days)
+        totals = generator.generate(start_date, days)
+        
+        print(f"Đã tạo xong dữ liệu mẫu cho {years} năm: {totals['orders']} đơn, "
+              f"{totals['order_items']} món, {totals['shifts']} ca trong {totals['seconds']:.1f}s")
         
     except Exception as e:
         session.rollback()
@@ -369,4 +219,9 @@ def create_test_database():
         session.close()
 
 if __name__ == "__main__":
-    create_test_database() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Tạo cơ sở dữ liệu thử nghiệm")
+    parser.add_argument("--scale", type=float, default=1.0, help="Hệ số nhân số đơn mỗi ngày")
+    parser.add_argument("--seed", type=int, default=None, help="Hạt giống ngẫu nhiên")
+    parser.add_argument("--years", type=float, default=1, help="Số năm dữ liệu")
+    args = parser.parse_args()
+    create_test_database(scale=args.scale, seed=args.seed, years=args.years)
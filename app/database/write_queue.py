@@ -0,0 +1,256 @@
+"""
+Write Queue
+Một luồng ghi duy nhất cho SQLite, gom các lần ghi thành một giao dịch (group commit)
+
+Controller gửi một đơn vị công việc work(db) và chờ Future: luồng ghi gom các đơn vị đến trong
+GROUP_COMMIT_WINDOW_MS mili giây (tối đa MAX_BATCH_SIZE) vào cùng một giao dịch, nên nhiều lần
+ghi chỉ tốn một lần commit/fsync. Lỗi SQLITE_BUSY ("database is locked") được thử lại tập trung
+với thời gian chờ tăng dần; xung đột phiên bản (StaleDataError, xem app.database.concurrency)
+được thử lại bằng cách chạy lại đơn vị công việc với dữ liệu mới.
+
+Quy ước cho work(db):
+- chỉ đọc/ghi qua phiên db được truyền vào, không tự commit/rollback;
+- trả về giá trị thuần (id, bool...), không trả đối tượng ORM;
+- có thể bị chạy lại (khi SQLITE_BUSY, xung đột phiên bản hoặc một đơn vị khác trong lô lỗi), vì vậy các tác dụng
+  phụ ngoài cơ sở dữ liệu (cập nhật cache, thông báo) phải làm sau khi run() trả về.
+"""
+
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from sqlalchemy.exc import OperationalError
+
+from app.database.concurrency import MAX_CONFLICT_RETRIES, Conflict, VersionConflict, is_stale_error
+from app.database.db_config import SessionLocal
+from app.utils.instrumentation import LatencyStats, registry as instrumentation
+
+GROUP_COMMIT_WINDOW_MS = 5
+MAX_BATCH_SIZE = 64
+
+# Thử lại khi SQLite báo khóa: 10ms, 20ms, 40ms... tối đa BUSY_BACKOFF_MAX_MS
+MAX_BUSY_RETRIES = 8
+BUSY_BACKOFF_MS = 10
+BUSY_BACKOFF_MAX_MS = 500
+
+_STOP = object()
+
+
+def is_busy_error(error):
+    """Lỗi do cơ sở dữ liệu đang bị khóa bởi kết nối khác"""
+    if not isinstance(error, OperationalError):
+        return False
+    message = str(error.orig).lower()
+    return "database is locked" in message or "database is busy" in message
+
+
+class _Unit:
+    __slots__ = ("work", "future", "submitted_at", "conflicts", "frames")
+
+    def __init__(self, work):
+        self.work = work
+        self.future = Future()
+        self.submitted_at = time.perf_counter()
+        self.conflicts = 0
+        # Phương thức controller đã gửi việc: truy vấn trên luồng ghi được tính cho nó
+        self.frames = instrumentation.current_frames()
+
+
+class WriteQueue:
+    """Hàng đợi ghi với một luồng ghi duy nhất"""
+
+    def __init__(self, session_factory=SessionLocal, window_ms=GROUP_COMMIT_WINDOW_MS,
+                 max_batch=MAX_BATCH_SIZE, max_retries=MAX_BUSY_RETRIES, max_conflict_retries=MAX_CONFLICT_RETRIES):
+        self.session_factory = session_factory
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.max_retries = max_retries
+        self.max_conflict_retries = max_conflict_retries
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+
+    # ------------------------------------------------------------------ #
+    # Gửi công việc
+    # ------------------------------------------------------------------ #
+    def submit(self, work):
+        """
+        Gửi một đơn vị công việc work(db)
+
+        Returns:
+            concurrent.futures.Future: kết quả của work sau khi giao dịch chứa nó được commit
+            (dùng asyncio.wrap_future để chờ trong asyncio)
+        """
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            # Gọi lồng từ chính luồng ghi: chạy ngay trong giao dịch hiện tại
+            future = Future()
+            future.set_result(work(db))
+            return future
+
+        self._ensure_started()
+        unit = _Unit(work)
+        with self._stats_lock:
+            self._stats["submitted"] += 1
+        self._queue.put(unit)
+        return unit.future
+
+    def run(self, work, timeout=None):
+        """Gửi work(db) và chờ kết quả; ném lại lỗi của work hoặc của commit"""
+        return self.submit(work).result(timeout)
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="sqlite-writer", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=None):
+        """Ghi hết các công việc đang chờ rồi dừng luồng ghi"""
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    # ------------------------------------------------------------------ #
+    # Luồng ghi
+    # ------------------------------------------------------------------ #
+    def _loop(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch = [first]
+            stop = False
+            deadline = time.perf_counter() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    unit = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if unit is _STOP:
+                    stop = True
+                    break
+                batch.append(unit)
+            self._execute(batch)
+            if stop:
+                return
+
+    def _execute(self, batch):
+        pending = [unit for unit in batch if unit.future.set_running_or_notify_cancel()]
+        started = time.perf_counter()
+        with self._stats_lock:
+            self._stats["batches"] += 1
+            self._stats["max_batch"] = max(self._stats["max_batch"], len(pending))
+            for unit in pending:
+                self.queue_wait.add((started - unit.submitted_at) * 1000)
+
+        retries = 0
+        while pending:
+            db = self.session_factory()
+            self._local.db = db
+            try:
+                results = []
+                failed = None
+                stale = None
+                for unit in pending:
+                    try:
+                        with instrumentation.attach(unit.frames):
+                            results.append(unit.work(db))
+                            db.flush()
+                    except Exception as e:
+                        if is_busy_error(e):
+                            raise
+                        if is_stale_error(e) and unit.conflicts < self.max_conflict_retries:
+                            stale = unit
+                        else:
+                            failed = (unit, self._conflict_error(e))
+                        break
+
+                if stale is not None:
+                    # Dòng đã bị tiến trình khác ghi sau khi đọc: chạy lại lô với dữ liệu mới
+                    db.rollback()
+                    stale.conflicts += 1
+                    with self._stats_lock:
+                        self._stats["conflict_retries"] += 1
+                    continue
+
+                if failed is not None:
+                    # Bỏ riêng đơn vị lỗi, chạy lại các đơn vị còn lại trong giao dịch mới
+                    db.rollback()
+                    unit, error = failed
+                    pending.remove(unit)
+                    unit.future.set_exception(error)
+                    with self._stats_lock:
+                        self._stats["conflicts" if isinstance(error, VersionConflict) else "failed"] += 1
+                    continue
+
+                commit_began = time.perf_counter()
+                db.commit()
+                with self._stats_lock:
+                    self.commit_latency.add((time.perf_counter() - commit_began) * 1000)
+                    self._stats["commits"] += 1
+                    self._stats["committed"] += len(pending)
+                for unit, result in zip(pending, results):
+                    unit.future.set_result(result)
+                pending = []
+            except Exception as e:
+                db.rollback()
+                if is_busy_error(e) and retries < self.max_retries:
+                    retries += 1
+                    with self._stats_lock:
+                        self._stats["busy_retries"] += 1
+                    time.sleep(min(BUSY_BACKOFF_MS * 2 ** (retries - 1), BUSY_BACKOFF_MAX_MS) / 1000)
+                    continue
+                with self._stats_lock:
+                    self._stats["busy_failures" if is_busy_error(e) else "failed"] += len(pending)
+                for unit in pending:
+                    unit.future.set_exception(e)
+                pending = []
+            finally:
+                self._local.db = None
+                db.close()
+
+    @staticmethod
+    def _conflict_error(error):
+        """Xung đột phiên bản đã hết lượt thử lại được báo như VersionConflict"""
+        if is_stale_error(error):
+            conflict = VersionConflict(Conflict(f"Dữ liệu liên tục bị thay đổi ở nơi khác: {error}"))
+            conflict.__cause__ = error
+            return conflict
+        return error
+
+    # ------------------------------------------------------------------ #
+    # Số liệu
+    # ------------------------------------------------------------------ #
+    def reset_stats(self):
+        with self._stats_lock:
+            self._stats = {"submitted": 0, "committed": 0, "failed": 0, "batches": 0, "commits": 0,
+                           "max_batch": 0, "busy_retries": 0, "busy_failures": 0,
+                           "conflict_retries": 0, "conflicts": 0}
+            self.queue_wait = LatencyStats()
+            self.commit_latency = LatencyStats()
+
+    def stats(self):
+        """Số liệu tranh chấp ghi: kích thước lô, số lần thử lại khi bị khóa/xung đột, thời gian chờ/commit"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+            stats["queued"] = self._queue.qsize()
+            stats["units_per_commit"] = round(stats["committed"] / stats["commits"], 2) if stats["commits"] else 0.0
+            stats["queue_wait"] = self.queue_wait.to_dict()
+            stats["commit"] = self.commit_latency.to_dict()
+        return stats
+
+
+# Hàng đợi ghi dùng chung trong tiến trình
+write_queue = WriteQueue()
+atexit.register(write_queue.stop, 5)
+instrumentation.add_section("write_queue", write_queue.stats)
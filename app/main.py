@@ -1,16 +1,24 @@
 import sys
 import os
+import logging
 from PyQt5.QtWidgets import QApplication
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QFontDatabase, QFont
 
 from app.views.login_view import LoginView
 from app.database.init_db import init_db
+from app.database.maintenance import maintenance_scheduler
 
 def main():
     # Set environment variables
     os.environ["QT_AUTO_SCREEN_SCALE_FACTOR"] = "1"
     
+    # Configure logging (solver statistics, background tasks)
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+    )
+    
     # Create application
     app = QApplication(sys.argv)
     app.setStyle("Fusion")
@@ -33,6 +41,9 @@ def main():
         print(f"Error initializing database: {e}")
         return 1
     
+    # Bảo trì cơ sở dữ liệu nền khi quán vắng
+    maintenance_scheduler.start()
+    
     # Show login screen
     login = LoginView()
     login.show()
@@ -1,7 +1,26 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Text, Boolean, Table
-from sqlalchemy.orm import relationship
+from sqlalchemy import (Column, Integer, SmallInteger, String, Float, ForeignKey, DateTime, Date, Text, Boolean,
+                        Table, Index, text)
+from sqlalchemy.orm import relationship, declarative_base
+from sqlalchemy.types import TypeDecorator
 from datetime import datetime
 from app.database.db_config import Base
+from app.models.status import OrderStatus, ItemStatus
+
+class StatusCode(TypeDecorator):
+    """Cột trạng thái lưu mã số nguyên nhỏ, đọc ra thành viên enum (OrderStatus/ItemStatus)"""
+    impl = SmallInteger
+    cache_ok = True
+
+    def __init__(self, enum_cls):
+        super().__init__()
+        self.enum_cls = enum_cls
+
+    def process_bind_param(self, value, dialect):
+        # Nhận enum, mã số hoặc nhãn tiếng Việt; giá trị lạ bị từ chối (ValueError)
+        return None if value is None else int(self.enum_cls.parse(value))
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else self.enum_cls(value)
 
 # Bảng Recipe để lưu công thức món ăn
 class Recipe(Base):
@@ -83,24 +102,31 @@ class Customer(Base):
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        Index("ix_orders_status_id", "status", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     table_id = Column(Integer, ForeignKey("tables.id"))
     staff_id = Column(Integer, ForeignKey("staffs.id"))
     customer_id = Column(Integer, ForeignKey("customers.id"), nullable=True)
     order_time = Column(DateTime, default=datetime.now)
-    status = Column(String(20), default="chờ xử lý")  # chờ xử lý, đang phục vụ, đã thanh toán, hủy
+    status = Column(StatusCode(OrderStatus), default=OrderStatus.PENDING)
     total_amount = Column(Float, default=0)
     discount = Column(Float, default=0)
     final_amount = Column(Float, default=0)
     payment_method = Column(String(50), nullable=True)
     note = Column(Text, nullable=True)
+    paid_at = Column(DateTime, nullable=True, index=True)  # thời điểm thanh toán
+    version = Column(Integer, nullable=False, server_default=text("1"))  # khóa lạc quan
     
     table = relationship("Table", back_populates="orders")
     staff = relationship("Staff", back_populates="orders")
     customer = relationship("Customer", back_populates="orders")
     order_items = relationship("OrderItem", back_populates="order")
     feedbacks = relationship("Feedback", back_populates="order")
+    
+    __mapper_args__ = {"version_id_col": version}
 
 class Inventory(Base):
     __tablename__ = "inventories"
@@ -112,11 +138,17 @@ class Inventory(Base):
     supplier = Column(String(100), nullable=True)
     last_update = Column(DateTime, default=datetime.now)
     min_quantity = Column(Float, default=0)  # số lượng tối thiểu cần có
+    version = Column(Integer, nullable=False, server_default=text("1"))  # khóa lạc quan
     
     used_in_recipes = relationship("Recipe", back_populates="inventory")
+    
+    __mapper_args__ = {"version_id_col": version}
 
 class Reservation(Base):
     __tablename__ = "reservations"
+    __table_args__ = (
+        Index("ix_reservations_table_time", "table_id", "reservation_time"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     customer_id = Column(Integer, ForeignKey("customers.id"))
@@ -132,6 +164,9 @@ class Reservation(Base):
 
 class Shift(Base):
     __tablename__ = "shifts"
+    __table_args__ = (
+        Index("ix_shifts_staff_start", "staff_id", "start_time"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     staff_id = Column(Integer, ForeignKey("staffs.id"))
@@ -142,26 +177,52 @@ class Shift(Base):
     
     staff = relationship("Staff", back_populates="shifts")
 
+class ShiftTemplate(Base):
+    """Ca mẫu dùng cho lập lịch tự động"""
+    __tablename__ = "shift_templates"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(50), nullable=False)
+    start_hour = Column(Integer, nullable=False)
+    start_minute = Column(Integer, default=0)
+    end_hour = Column(Integer, nullable=False)
+    end_minute = Column(Integer, default=0)
+    min_per_role = Column(Integer, default=1)  # số người tối thiểu của mỗi vai trò bắt buộc (pha chế, thu ngân)
+    is_active = Column(Boolean, default=True)
+
 # Chuyển đổi order_item từ Table sang class đầy đủ
 class OrderItem(Base):
     __tablename__ = "order_items"
+    __table_args__ = (
+        # Chỉ mục phủ cho thống kê doanh thu theo món (không cần đọc bảng hay menu_items)
+        Index("ix_order_items_order_menu_total", "order_id", "menu_item_id", "quantity", "line_total"),
+        Index("ix_order_items_status_id", "status", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     order_id = Column(Integer, ForeignKey("orders.id"))
     menu_item_id = Column(Integer, ForeignKey("menu_items.id"))
     quantity = Column(Integer, default=1)
+    unit_price = Column(Float, nullable=True)  # giá món tại thời điểm gọi
+    line_total = Column(Float, nullable=True)  # unit_price * quantity
     note = Column(String(255), nullable=True)
-    status = Column(String(20), default="chờ pha chế")  # chờ pha chế, đang pha chế, đã hoàn thành, hủy
+    status = Column(StatusCode(ItemStatus), default=ItemStatus.WAITING)
     created_at = Column(DateTime, default=datetime.now)
     completed_at = Column(DateTime, nullable=True)
     completed_by = Column(Integer, ForeignKey("staffs.id"), nullable=True)
+    version = Column(Integer, nullable=False, server_default=text("1"))  # khóa lạc quan
     
     order = relationship("Order", back_populates="order_items")
     menu_item = relationship("MenuItem", back_populates="order_items")
     completed_by_staff = relationship("Staff", foreign_keys=[completed_by])
+    
+    __mapper_args__ = {"version_id_col": version}
 
 class Feedback(Base):
     __tablename__ = "feedbacks"
+    __table_args__ = (
+        Index("ix_feedbacks_created_at_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     order_id = Column(Integer, ForeignKey("orders.id"))
@@ -174,4 +235,237 @@ class Feedback(Base):
     created_at = Column(DateTime, default=datetime.now)
     
     order = relationship("Order")
-    customer = relationship("Customer") 
\ No newline at end of file
+    customer = relationship("Customer") 
+
+class TableTurnoverDaily(Base):
+    """Bảng tổng hợp luân chuyển bàn theo ngày, cập nhật tăng dần từ đơn đã thanh toán"""
+    __tablename__ = "table_turnover_daily"
+    __table_args__ = (
+        Index("ix_table_turnover_daily_day_table", "day", "table_id", unique=True),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, nullable=False, index=True)
+    table_id = Column(Integer, ForeignKey("tables.id"), nullable=False)
+    turns = Column(Integer, default=0)  # số lượt khách
+    dwell_minutes = Column(Float, default=0)  # tổng thời gian ngồi (phút)
+    dwell_under_30 = Column(Integer, default=0)  # số lượt ngồi dưới 30 phút
+    dwell_30_60 = Column(Integer, default=0)
+    dwell_60_90 = Column(Integer, default=0)
+    dwell_over_90 = Column(Integer, default=0)
+    revenue = Column(Float, default=0)
+
+class SyncWatermark(Base):
+    """Mốc xử lý của các tác vụ chạy tăng dần (tổng hợp, xuất dữ liệu, ...)"""
+    __tablename__ = "sync_watermarks"
+    
+    name = Column(String(100), primary_key=True)
+    position = Column(Integer, nullable=True)  # mốc theo id/sequence
+    timestamp = Column(DateTime, nullable=True)  # mốc theo thời gian
+    updated_at = Column(DateTime, default=datetime.now)
+
+class ChangeRecord(Base):
+    """Outbox ghi nhận thay đổi (CDC): mỗi dòng thêm/sửa/xóa ở các bảng được theo dõi, ghi bởi trigger"""
+    __tablename__ = "change_outbox"
+    __table_args__ = (
+        Index("ix_change_outbox_table_seq", "table_name", "seq"),
+        {"sqlite_autoincrement": True},  # seq không bị dùng lại sau khi dọn outbox
+    )
+
+    seq = Column(Integer, primary_key=True)
+    table_name = Column(String(50), nullable=False)
+    row_id = Column(Integer, nullable=False)
+    op = Column(String(1), nullable=False)  # I: thêm, U: sửa, D: xóa
+    changed_at = Column(DateTime, nullable=True)
+
+class MaintenanceRun(Base):
+    """Nhật ký các lần bảo trì cơ sở dữ liệu (ANALYZE, PRAGMA optimize, incremental vacuum, checkpoint)"""
+    __tablename__ = "maintenance_runs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    started_at = Column(DateTime, default=datetime.now, index=True)
+    trigger = Column(String(20), default="idle")  # idle: tự động khi quán vắng, manual: chạy tay
+    duration_ms = Column(Float, default=0)
+    size_before = Column(Integer, default=0)  # byte, gồm cả tệp -wal
+    size_after = Column(Integer, default=0)
+    reclaimed_bytes = Column(Integer, default=0)
+    analyzed_tables = Column(Text, nullable=True)  # danh sách bảng, cách nhau bởi dấu phẩy
+    details = Column(Text, nullable=True)  # JSON: thời gian và kết quả từng bước
+    error = Column(Text, nullable=True)
+
+class OrderArchive(Base):
+    """Đơn hàng cũ đã thanh toán/hủy được chuyển khỏi bảng orders (dữ liệu lạnh)"""
+    __tablename__ = "orders_archive"
+    
+    id = Column(Integer, primary_key=True)  # giữ nguyên id của đơn gốc
+    table_id = Column(Integer)
+    staff_id = Column(Integer)
+    customer_id = Column(Integer, nullable=True)
+    order_time = Column(DateTime, index=True)
+    status = Column(StatusCode(OrderStatus))
+    total_amount = Column(Float, default=0)
+    discount = Column(Float, default=0)
+    final_amount = Column(Float, default=0)
+    payment_method = Column(String(50), nullable=True)
+    note = Column(Text, nullable=True)
+    paid_at = Column(DateTime, nullable=True)
+    version = Column(Integer, nullable=False, server_default=text("1"))
+    archived_at = Column(DateTime, default=datetime.now)
+
+class OrderItemArchive(Base):
+    """Các món của đơn hàng đã lưu trữ"""
+    __tablename__ = "order_items_archive"
+    __table_args__ = (
+        Index("ix_order_items_archive_order_menu_total", "order_id", "menu_item_id", "quantity", "line_total"),
+    )
+    
+    id = Column(Integer, primary_key=True)  # giữ nguyên id của món gốc
+    order_id = Column(Integer, index=True)
+    menu_item_id = Column(Integer)
+    quantity = Column(Integer, default=1)
+    unit_price = Column(Float, nullable=True)
+    line_total = Column(Float, nullable=True)
+    note = Column(String(255), nullable=True)
+    status = Column(StatusCode(ItemStatus))
+    created_at = Column(DateTime)
+    completed_at = Column(DateTime, nullable=True)
+    completed_by = Column(Integer, nullable=True)
+    version = Column(Integer, nullable=False, server_default=text("1"))
+
+class DailySalesSummary(Base):
+    """Bảng tổng hợp doanh thu theo ngày của các đơn đã thanh toán, cập nhật khi lưu trữ"""
+    __tablename__ = "daily_sales_summary"
+    
+    day = Column(Date, primary_key=True)
+    orders_count = Column(Integer, default=0)
+    items_sold = Column(Integer, default=0)
+    total_amount = Column(Float, default=0)
+    discount = Column(Float, default=0)
+    revenue = Column(Float, default=0)  # tổng final_amount
+    updated_at = Column(DateTime, default=datetime.now)
+
+# View hợp nhất dữ liệu đang dùng và dữ liệu lưu trữ (tạo trong migrations.create_history_views).
+# Khai báo trên metadata riêng để create_all() không tạo bảng cho chúng.
+HistoryBase = declarative_base()
+
+def _history_model(name, view_name, model, doc):
+    attrs = {"__tablename__": view_name, "__doc__": doc}
+    for column in model.__table__.columns:
+        attrs[column.key] = Column(column.type, primary_key=column.primary_key)
+    return type(name, (HistoryBase,), attrs)
+
+OrderHistory = _history_model(
+    "OrderHistory", "orders_all", Order,
+    "Toàn bộ đơn hàng (orders UNION ALL orders_archive), chỉ đọc"
+)
+OrderItemHistory = _history_model(
+    "OrderItemHistory", "order_items_all", OrderItem,
+    "Toàn bộ món đã gọi (order_items UNION ALL order_items_archive), chỉ đọc"
+)
+
+# Kho phân tích hợp nhất nhiều chi nhánh (tệp riêng, xem app.database.consolidation).
+# Khóa chính (branch_id, id) giữ nguyên id của dòng ở chi nhánh.
+AnalyticsBase = declarative_base()
+
+class Branch(AnalyticsBase):
+    """Chi nhánh và mốc hợp nhất từ tệp cơ sở dữ liệu của chi nhánh"""
+    __tablename__ = "branches"
+    
+    id = Column(Integer, primary_key=True)
+    code = Column(String(20), unique=True, nullable=False)
+    name = Column(String(100), nullable=True)
+    path = Column(String(500), nullable=False)  # đường dẫn tệp coffee_management.db của chi nhánh
+    last_seq = Column(Integer, nullable=True)  # seq change_outbox đã hợp nhất (NULL: cần nạp toàn bộ)
+    last_sync_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+
+class BranchOrder(AnalyticsBase):
+    __tablename__ = "branch_orders"
+    __table_args__ = (
+        Index("ix_branch_orders_time_branch", "order_time", "branch_id"),
+    )
+    
+    branch_id = Column(Integer, ForeignKey("branches.id"), primary_key=True)
+    id = Column(Integer, primary_key=True)
+    table_id = Column(Integer)
+    staff_id = Column(Integer)
+    customer_id = Column(Integer, nullable=True)
+    order_time = Column(DateTime)
+    status = Column(StatusCode(OrderStatus))
+    total_amount = Column(Float, default=0)
+    discount = Column(Float, default=0)
+    final_amount = Column(Float, default=0)
+    payment_method = Column(String(50), nullable=True)
+    paid_at = Column(DateTime, nullable=True)
+
+class BranchOrderItem(AnalyticsBase):
+    __tablename__ = "branch_order_items"
+    __table_args__ = (
+        Index("ix_branch_order_items_order_menu_total", "branch_id", "order_id", "menu_item_id", "quantity", "line_total"),
+    )
+    
+    branch_id = Column(Integer, ForeignKey("branches.id"), primary_key=True)
+    id = Column(Integer, primary_key=True)
+    order_id = Column(Integer)
+    menu_item_id = Column(Integer)
+    quantity = Column(Integer, default=1)
+    unit_price = Column(Float, nullable=True)
+    line_total = Column(Float, nullable=True)
+    status = Column(StatusCode(ItemStatus))
+    created_at = Column(DateTime)
+    completed_at = Column(DateTime, nullable=True)
+
+class BranchShift(AnalyticsBase):
+    __tablename__ = "branch_shifts"
+    
+    branch_id = Column(Integer, ForeignKey("branches.id"), primary_key=True)
+    id = Column(Integer, primary_key=True)
+    staff_id = Column(Integer)
+    date = Column(DateTime)
+    start_time = Column(DateTime)
+    end_time = Column(DateTime)
+    status = Column(String(20))
+
+class BranchInventory(AnalyticsBase):
+    """Tồn kho hiện tại của chi nhánh (lần hợp nhất gần nhất)"""
+    __tablename__ = "branch_inventories"
+    
+    branch_id = Column(Integer, ForeignKey("branches.id"), primary_key=True)
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100))
+    quantity = Column(Float)
+    unit = Column(String(20))
+    min_quantity = Column(Float, default=0)
+    last_update = Column(DateTime)
+
+class BranchInventoryMovement(AnalyticsBase):
+    """Biến động tồn kho: chênh lệch số lượng giữa hai lần hợp nhất liên tiếp"""
+    __tablename__ = "branch_inventory_movements"
+    __table_args__ = (
+        Index("ix_branch_inventory_movements_item_time", "branch_id", "inventory_id", "recorded_at"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    branch_id = Column(Integer, ForeignKey("branches.id"), nullable=False)
+    inventory_id = Column(Integer, nullable=False)
+    delta = Column(Float, nullable=False)  # dương: nhập thêm, âm: tiêu hao
+    quantity = Column(Float)  # số lượng sau biến động
+    recorded_at = Column(DateTime)  # last_update của dòng tồn kho ở chi nhánh
+    synced_at = Column(DateTime, default=datetime.now)
+
+class BranchMenuItem(AnalyticsBase):
+    __tablename__ = "branch_menu_items"
+    
+    branch_id = Column(Integer, ForeignKey("branches.id"), primary_key=True)
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100))
+    price = Column(Float)
+    category_id = Column(Integer)
+
+class BranchStaff(AnalyticsBase):
+    __tablename__ = "branch_staffs"
+    
+    branch_id = Column(Integer, ForeignKey("branches.id"), primary_key=True)
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100))
+    role = Column(String(50))
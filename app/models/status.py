@@ -0,0 +1,89 @@
+"""
+Mã trạng thái của đơn hàng và món trong đơn
+
+Trạng thái được lưu dạng số nguyên nhỏ (SmallInteger) thay cho chuỗi tiếng Việt; nhãn hiển thị
+lấy qua .label hoặc status_label(). Bảng chuyển trạng thái quy định các bước hợp lệ và được
+OrderController kiểm tra trước khi đổi trạng thái.
+
+Module này không phụ thuộc SQLAlchemy để kho dạng cột và giao diện có thể dùng chung.
+"""
+
+from enum import IntEnum
+
+
+class _Status(IntEnum):
+    """Mã trạng thái kèm nhãn tiếng Việt"""
+
+    def __new__(cls, code, label):
+        member = int.__new__(cls, code)
+        member._value_ = code
+        member.label = label
+        return member
+
+    @classmethod
+    def parse(cls, value):
+        """
+        Chuyển mã số, thành viên enum hoặc nhãn tiếng Việt thành thành viên enum
+
+        Raises:
+            ValueError: Giá trị không phải trạng thái hợp lệ
+        """
+        if isinstance(value, cls):
+            return value
+        if isinstance(value, str):
+            for member in cls:
+                if member.label == value:
+                    return member
+            raise ValueError(f"Trạng thái không hợp lệ: {value!r}")
+        return cls(value)
+
+    def __str__(self):
+        return self.label
+
+
+class OrderStatus(_Status):
+    PENDING = (0, "chờ xử lý")
+    SERVING = (1, "đang phục vụ")
+    PAID = (2, "đã thanh toán")
+    CANCELLED = (3, "hủy")
+
+
+class ItemStatus(_Status):
+    WAITING = (0, "chờ pha chế")
+    PREPARING = (1, "đang pha chế")
+    DONE = (2, "đã hoàn thành")
+    CANCELLED = (3, "hủy")
+
+
+# Bảng chuyển trạng thái: trạng thái hiện tại -> các trạng thái được phép chuyển sang
+ORDER_TRANSITIONS = {
+    OrderStatus.PENDING: {OrderStatus.SERVING, OrderStatus.PAID, OrderStatus.CANCELLED},
+    OrderStatus.SERVING: {OrderStatus.PAID, OrderStatus.CANCELLED},
+    OrderStatus.PAID: set(),
+    OrderStatus.CANCELLED: set(),
+}
+
+ITEM_TRANSITIONS = {
+    ItemStatus.WAITING: {ItemStatus.PREPARING, ItemStatus.DONE, ItemStatus.CANCELLED},
+    ItemStatus.PREPARING: {ItemStatus.DONE, ItemStatus.CANCELLED},
+    ItemStatus.DONE: set(),
+    ItemStatus.CANCELLED: set(),
+}
+
+# Đơn còn mở (đang chiếm bàn, còn thêm/sửa món được)
+ACTIVE_ORDER_STATUSES = [OrderStatus.PENDING, OrderStatus.SERVING]
+
+
+def can_transition(current, new, transitions):
+    """Kiểm tra bước chuyển trạng thái có nằm trong bảng chuyển trạng thái không"""
+    return new in transitions.get(current, ())
+
+
+def status_label(status, enum_cls=OrderStatus):
+    """Nhãn hiển thị của một mã trạng thái (giá trị từ dịch vụ có thể là số nguyên thuần)"""
+    if status is None:
+        return ""
+    try:
+        return enum_cls.parse(status).label
+    except ValueError:
+        return str(status)
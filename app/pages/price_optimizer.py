@@ -13,6 +13,10 @@ import time
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.local_search import MenuPriceOptimizer
 from utils.genetic_algorithm import MenuPriceGeneticOptimizer
+from utils.columnar_store import ColumnarStore, DEFAULT_STORE_DIR, load_sales_data
+
+# Kho dạng cột do scripts/export_columnar.py tạo ra
+STORE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), DEFAULT_STORE_DIR)
 
 def generate_sample_data():
     # Tạo dữ liệu mẫu về menu
@@ -65,6 +69,30 @@ def generate_sample_data():
     
     return menu_items, sales_data, elasticity_data
 
+def load_exported_data():
+    """
+    Dữ liệu thật từ kho dạng cột (đọc ánh xạ bộ nhớ, không truy vấn SQLite)
+
+    Returns:
+        tuple: (menu_items, sales_data, elasticity_data), hoặc None nếu chưa xuất dữ liệu
+    """
+    store = ColumnarStore(STORE_DIR)
+    if not store.partitions("order_items") or not store.partitions("menu_items"):
+        return None
+    
+    menu = store.read_table("menu_items")
+    menu_items = [
+        {"id": int(item_id), "name": str(name), "price": float(price), "category_id": int(category_id)}
+        for item_id, name, price, category_id in zip(menu["id"], menu["name"], menu["price"], menu["category_id"])
+    ]
+    sales_data = load_sales_data(STORE_DIR)
+    if not menu_items or not sales_data:
+        return None
+    
+    # Chưa có dữ liệu độ co giãn thực tế: dùng mức mặc định của đồ uống
+    elasticity_data = {item["id"]: -1.3 for item in menu_items}
+    return menu_items, sales_data, elasticity_data
+
 def display_algorithm_info(algorithm):
     """Hiển thị thông tin về thuật toán được chọn"""
     if algorithm == "hill_climbing":
@@ -115,7 +143,7 @@ def run_price_optimization():
     
     # Tạo hoặc lấy dữ liệu mẫu
     if 'menu_items' not in st.session_state:
-        menu_items, sales_data, elasticity_data = generate_sample_data()
+        menu_items, sales_data, elasticity_data = load_exported_data() or generate_sample_data()
         st.session_state['menu_items'] = menu_items
         st.session_state['sales_data'] = sales_data
         st.session_state['elasticity_data'] = elasticity_data
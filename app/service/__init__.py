@@ -0,0 +1,6 @@
+"""
+Dịch vụ đơn hàng cục bộ cho nhiều máy POS
+
+server: tiến trình asyncio giữ các controller (một cache, một pool kết nối, một luồng ghi)
+client: bộ chuyển cho giao diện, gọi controller trực tiếp hoặc qua dịch vụ
+"""
@@ -0,0 +1,231 @@
+"""
+Service Client
+Bộ chuyển cho giao diện: gọi controller trực tiếp (mặc định) hoặc qua dịch vụ đơn hàng
+
+Giao diện import các controller từ module này thay vì app.controllers:
+
+    from app.service.client import OrderController
+    OrderController.create_order(table_id, staff_id)
+
+Chế độ dịch vụ được bật bằng biến môi trường COFFEE_SERVICE_URL (ví dụ http://127.0.0.1:8765)
+hoặc configure(url) lúc chạy; configure(None) quay về gọi trực tiếp. Ở chế độ dịch vụ, kết quả
+là Record (bản sao chỉ đọc có thuộc tính giống đối tượng ORM) và table_state_store được làm mới
+khi dịch vụ báo có thay đổi từ bất kỳ máy POS nào.
+"""
+
+import http.client
+import importlib
+import json
+import logging
+import os
+import threading
+from urllib.parse import urlsplit
+
+from app.service.protocol import SERVICE_CONTROLLERS, loads, to_wire
+
+logger = logging.getLogger(__name__)
+
+SERVICE_URL_ENV = "COFFEE_SERVICE_URL"
+REQUEST_TIMEOUT = 30
+RECONNECT_DELAY = 2
+
+# Sự kiện từ các controller này làm thay đổi trạng thái bàn
+TABLE_EVENT_CONTROLLERS = ("OrderController", "TableController")
+
+
+class ServiceError(Exception):
+    """Dịch vụ trả về lỗi hoặc không kết nối được"""
+
+
+class ServiceClient:
+    """Client HTTP/JSON của dịch vụ đơn hàng; mỗi luồng giữ một kết nối keep-alive riêng"""
+
+    def __init__(self, url, timeout=REQUEST_TIMEOUT):
+        parts = urlsplit(url)
+        self.url = url
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self._local = threading.local()
+        self._listeners = []
+        self._listener_lock = threading.Lock()
+        self._events_thread = None
+        self._closed = threading.Event()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return connection
+
+    def _request(self, verb, path, payload=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        # Kết nối keep-alive có thể đã bị dịch vụ đóng: thử lại một lần với kết nối mới
+        for attempt in range(2):
+            connection = self._connection()
+            try:
+                connection.request(verb, path, body=body, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+                break
+            except (ConnectionError, http.client.HTTPException, OSError) as e:
+                connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise ServiceError(f"Không kết nối được dịch vụ {self.url}: {e}") from e
+        if response.status != 200:
+            try:
+                message = json.loads(data).get("error")
+            except ValueError:
+                message = data[:200]
+            raise ServiceError(f"Dịch vụ trả về lỗi {response.status}: {message}")
+        return data
+
+    def call(self, controller, method, *args, **kwargs):
+        data = self._request("POST", "/call", {
+            "controller": controller, "method": method,
+            "args": to_wire(list(args)), "kwargs": to_wire(kwargs),
+        })
+        return loads(data)["result"]
+
+    def health(self):
+        return json.loads(self._request("GET", "/health"))
+
+    # ------------------------------------------------------------------ #
+    # Thông báo thay đổi
+    # ------------------------------------------------------------------ #
+    def subscribe(self, callback):
+        """Nhận sự kiện ghi từ dịch vụ (callback(event) chạy trên luồng nền)"""
+        with self._listener_lock:
+            if callback not in self._listeners:
+                self._listeners.append(callback)
+            if self._events_thread is None:
+                self._events_thread = threading.Thread(target=self._read_events, daemon=True,
+                                                       name="service-events")
+                self._events_thread.start()
+
+    def unsubscribe(self, callback):
+        with self._listener_lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def _read_events(self):
+        while not self._closed.is_set():
+            connection = http.client.HTTPConnection(self.host, self.port)
+            try:
+                connection.request("GET", "/events")
+                response = connection.getresponse()
+                while not self._closed.is_set():
+                    line = response.readline()
+                    if not line:
+                        break
+                    if line.startswith(b"data: "):
+                        self._dispatch(json.loads(line[len(b"data: "):]))
+            except (ConnectionError, http.client.HTTPException, OSError) as e:
+                logger.warning("Mất kết nối sự kiện từ dịch vụ %s: %s", self.url, e)
+            finally:
+                connection.close()
+            self._closed.wait(RECONNECT_DELAY)
+
+    def _dispatch(self, event):
+        with self._listener_lock:
+            listeners = list(self._listeners)
+        for callback in listeners:
+            try:
+                callback(event)
+            except Exception:
+                logger.exception("Lỗi khi xử lý sự kiện %s", event)
+
+    def close(self):
+        self._closed.set()
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+
+
+class ControllerProxy:
+    """Đại diện cho một controller; mỗi lần gọi chọn gọi trực tiếp hoặc qua dịch vụ"""
+
+    def __init__(self, name):
+        self._name = name
+        self._direct = None
+
+    def _direct_controller(self):
+        if self._direct is None:
+            module = importlib.import_module(SERVICE_CONTROLLERS[self._name])
+            self._direct = getattr(module, self._name)
+        return self._direct
+
+    def __getattr__(self, method):
+        if method.startswith("_"):
+            raise AttributeError(method)
+        client = current_client()
+        if client is None:
+            return getattr(self._direct_controller(), method)
+
+        def remote(*args, **kwargs):
+            return client.call(self._name, method, *args, **kwargs)
+        remote.__name__ = method
+        return remote
+
+    def __repr__(self):
+        return f"<ControllerProxy {self._name} ({'dịch vụ' if current_client() else 'trực tiếp'})>"
+
+
+_client = None
+_configured = False
+_lock = threading.Lock()
+
+
+def _refresh_table_states(event):
+    if event.get("controller") in TABLE_EVENT_CONTROLLERS:
+        from app.controllers.table_state_store import table_state_store
+        table_state_store.refresh()
+
+
+def configure(url):
+    """
+    Chọn chế độ gọi controller
+
+    Args:
+        url: Địa chỉ dịch vụ (http://host:port), None để gọi trực tiếp
+
+    Returns:
+        ServiceClient hoặc None
+    """
+    global _client, _configured
+    with _lock:
+        if _client is not None:
+            _client.close()
+        _client = ServiceClient(url) if url else None
+        _configured = True
+        if _client is not None:
+            _client.subscribe(_refresh_table_states)
+        return _client
+
+
+def current_client():
+    """ServiceClient đang dùng (None: gọi trực tiếp); lần đầu đọc từ COFFEE_SERVICE_URL"""
+    if not _configured:
+        configure(os.environ.get(SERVICE_URL_ENV) or None)
+    return _client
+
+
+def subscribe(callback):
+    """Nhận sự kiện thay đổi từ dịch vụ; không làm gì khi gọi trực tiếp"""
+    client = current_client()
+    if client is not None:
+        client.subscribe(callback)
+
+
+def unsubscribe(callback):
+    client = current_client()
+    if client is not None:
+        client.unsubscribe(callback)
+
+
+OrderController = ControllerProxy("OrderController")
+TableController = ControllerProxy("TableController")
+MenuController = ControllerProxy("MenuController")
+InventoryController = ControllerProxy("InventoryController")
@@ -0,0 +1,142 @@
+"""
+Giao thức JSON giữa dịch vụ đơn hàng và các máy POS
+
+Kết quả của controller (đối tượng ORM, Row, datetime, dict khóa số...) được mã hóa thành JSON
+có đánh dấu kiểu; phía client giải mã thành Record có truy cập thuộc tính giống đối tượng ORM
+(chỉ gồm các cột và quan hệ đã được nạp sẵn, không có lazy load).
+"""
+
+import json
+from datetime import date, datetime, time
+from types import SimpleNamespace
+
+from sqlalchemy import inspect
+from sqlalchemy.engine import Row
+
+from app.database.concurrency import Conflict
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Controller được dịch vụ phục vụ: tên -> module
+SERVICE_CONTROLLERS = {
+    "OrderController": "app.controllers.order_controller",
+    "TableController": "app.controllers.table_controller",
+    "MenuController": "app.controllers.menu_controller",
+    "InventoryController": "app.controllers.inventory_controller",
+}
+
+# Phương thức có tiền tố này chỉ đọc dữ liệu (được cache, chạy song song);
+# các phương thức còn lại là ghi và chạy tuần tự trên luồng ghi
+READ_PREFIXES = ("get_", "search_", "count_", "calculate_", "find_", "check_")
+
+TYPE_KEY = "__type__"
+
+
+def is_read_method(method):
+    return method.startswith(READ_PREFIXES)
+
+
+class Record(SimpleNamespace):
+    """Bản sao chỉ đọc của một dòng/đối tượng ORM nhận từ dịch vụ"""
+
+    def __init__(self, _model=None, /, **fields):
+        super().__init__(**fields)
+        self.__dict__["_model"] = _model
+
+    def __repr__(self):
+        fields = ", ".join(f"{k}={v!r}" for k, v in self.__dict__.items()
+                           if not k.startswith("_") and not isinstance(v, (Record, list)))
+        return f"<{self._model or 'Record'} {fields}>"
+
+
+def _is_orm_instance(value):
+    return hasattr(value, "_sa_instance_state")
+
+
+def to_wire(value, _path=None):
+    """Chuyển giá trị trả về của controller thành cấu trúc JSON"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, datetime):
+        return {TYPE_KEY: "datetime", "value": value.isoformat()}
+    if isinstance(value, date):
+        return {TYPE_KEY: "date", "value": value.isoformat()}
+    if isinstance(value, time):
+        return {TYPE_KEY: "time", "value": value.isoformat()}
+    if isinstance(value, (list, tuple, set)):
+        return [to_wire(item, _path) for item in value]
+    if isinstance(value, dict):
+        if all(isinstance(key, str) and key != TYPE_KEY for key in value):
+            return {key: to_wire(item, _path) for key, item in value.items()}
+        return {TYPE_KEY: "dict", "items": [[to_wire(k, _path), to_wire(v, _path)] for k, v in value.items()]}
+    if isinstance(value, Row):
+        return {TYPE_KEY: "record", "model": None,
+                "fields": {key: to_wire(item, _path) for key, item in value._mapping.items()}}
+    if isinstance(value, Conflict):
+        return {TYPE_KEY: "conflict", **{key: to_wire(getattr(value, key), _path) for key in Conflict.__slots__}}
+    if isinstance(value, Record):
+        return {TYPE_KEY: "record", "model": value._model,
+                "fields": {k: to_wire(v, _path) for k, v in value.__dict__.items() if not k.startswith("_")}}
+    if _is_orm_instance(value):
+        return _orm_to_wire(value, _path or set())
+    if hasattr(value, "item"):  # số NumPy
+        return value.item()
+    raise TypeError(f"Không mã hóa được kiểu {type(value).__name__}")
+
+
+def _orm_to_wire(instance, path):
+    state = inspect(instance)
+    loaded = state.dict
+    fields = {}
+    path = path | {id(instance)}
+    for attribute in state.mapper.column_attrs:
+        if attribute.key in loaded:
+            fields[attribute.key] = to_wire(loaded[attribute.key], path)
+    for relationship in state.mapper.relationships:
+        if relationship.key not in loaded:
+            continue  # chưa nạp: không kích hoạt lazy load trên đối tượng đã tách phiên
+        related = loaded[relationship.key]
+        if related is None:
+            fields[relationship.key] = None
+        elif isinstance(related, (list, tuple, set)):
+            fields[relationship.key] = [_orm_to_wire(item, path) for item in related if id(item) not in path]
+        elif id(related) not in path:
+            fields[relationship.key] = _orm_to_wire(related, path)
+    return {TYPE_KEY: "record", "model": type(instance).__name__, "fields": fields}
+
+
+def from_wire(value):
+    """Giải mã cấu trúc JSON từ to_wire"""
+    if isinstance(value, list):
+        return [from_wire(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+    kind = value.get(TYPE_KEY)
+    if kind is None:
+        return {key: from_wire(item) for key, item in value.items()}
+    if kind == "datetime":
+        return datetime.fromisoformat(value["value"])
+    if kind == "date":
+        return date.fromisoformat(value["value"])
+    if kind == "time":
+        return time.fromisoformat(value["value"])
+    if kind == "dict":
+        return {_hashable(from_wire(k)): from_wire(v) for k, v in value["items"]}
+    if kind == "conflict":
+        return Conflict(**{key: from_wire(value[key]) for key in Conflict.__slots__})
+    if kind == "record":
+        return Record(value.get("model"), **{key: from_wire(item) for key, item in value["fields"].items()})
+    raise ValueError(f"Kiểu không hỗ trợ: {kind}")
+
+
+def _hashable(key):
+    return tuple(key) if isinstance(key, list) else key
+
+
+def dumps(value):
+    return json.dumps(to_wire(value), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data):
+    return from_wire(json.loads(data))
@@ -0,0 +1,274 @@
+"""
+Order Service
+Dịch vụ HTTP/JSON cục bộ (asyncio) giữ OrderController, TableController, MenuController và
+InventoryController cho nhiều máy POS dùng chung một tiến trình
+
+- POST /call   {"controller", "method", "args", "kwargs"} -> {"result"} hoặc {"error"}
+- GET  /events luồng Server-Sent Events: một sự kiện sau mỗi lần ghi thành công
+- GET  /health trạng thái dịch vụ và cache
+
+Các phương thức đọc chạy song song trên một pool luồng và được cache (xóa khi có ghi, hết hạn
+sau CACHE_TTL_SECONDS để thấy thay đổi từ tiến trình khác); các phương thức ghi được controller
+chuyển vào hàng đợi ghi (app.database.write_queue) nên các máy POS không còn tranh khóa tệp SQLite
+và các lần ghi đồng thời được gom chung một lần commit.
+
+Chạy: python -m app.service.server [--host 127.0.0.1] [--port 8765]
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from app.database.write_queue import write_queue
+from app.service.protocol import (DEFAULT_HOST, DEFAULT_PORT, SERVICE_CONTROLLERS, dumps, from_wire,
+                                  is_read_method)
+
+logger = logging.getLogger(__name__)
+
+CACHE_TTL_SECONDS = 5
+READ_WORKERS = 4
+# Số lời gọi ghi chờ hàng đợi ghi cùng lúc (càng nhiều càng dễ gom chung một commit)
+WRITE_WORKERS = 8
+HEARTBEAT_SECONDS = 15
+MAX_BODY_BYTES = 1024 * 1024
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class OrderService:
+    """Dịch vụ đơn hàng chạy trên một event loop asyncio"""
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, cache_ttl=CACHE_TTL_SECONDS):
+        self.host = host
+        self.port = port
+        self.cache_ttl = cache_ttl
+        self.controllers = {
+            name: getattr(importlib.import_module(module), name) for name, module in SERVICE_CONTROLLERS.items()
+        }
+        self._readers = ThreadPoolExecutor(READ_WORKERS, thread_name_prefix="service-read")
+        self._writer = ThreadPoolExecutor(WRITE_WORKERS, thread_name_prefix="service-write")
+        self._cache = {}
+        self._generation = 0  # tăng sau mỗi lần ghi, kết quả đọc cũ hơn không được cache
+        self._subscribers = set()
+        self._sequence = 0
+        self._server = None
+        self.stats = {"calls": 0, "reads": 0, "writes": 0, "cache_hits": 0, "errors": 0}
+
+    # ------------------------------------------------------------------ #
+    # Vòng đời
+    # ------------------------------------------------------------------ #
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("Dịch vụ đơn hàng đang chạy tại http://%s:%d", self.host, self.port)
+        return self
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for queue in list(self._subscribers):
+            queue.put_nowait(None)
+        self._readers.shutdown(wait=False)
+        self._writer.shutdown(wait=True)
+
+    # ------------------------------------------------------------------ #
+    # Gọi controller
+    # ------------------------------------------------------------------ #
+    def _resolve(self, controller, method):
+        cls = self.controllers.get(controller)
+        if cls is None or method.startswith("_") or not callable(getattr(cls, method, None)):
+            return None
+        return getattr(cls, method)
+
+    async def call(self, controller, method, args, kwargs):
+        """
+        Gọi một phương thức controller
+
+        Returns:
+            bytes: Kết quả đã mã hóa JSON
+        """
+        func = self._resolve(controller, method)
+        if func is None:
+            raise LookupError(f"Không có phương thức {controller}.{method}")
+
+        self.stats["calls"] += 1
+        loop = asyncio.get_running_loop()
+        if is_read_method(method):
+            self.stats["reads"] += 1
+            key = (controller, method, json.dumps([args, kwargs], sort_keys=True, default=str))
+            cached = self._cache.get(key)
+            if cached and cached[0] > time.monotonic():
+                self.stats["cache_hits"] += 1
+                return cached[1]
+            generation = self._generation
+            encoded = await loop.run_in_executor(self._readers, lambda: dumps(func(*args, **kwargs)))
+            if generation == self._generation:
+                self._cache[key] = (time.monotonic() + self.cache_ttl, encoded)
+            return encoded
+
+        self.stats["writes"] += 1
+        encoded = await loop.run_in_executor(self._writer, lambda: dumps(func(*args, **kwargs)))
+        self._generation += 1
+        self._cache.clear()
+        self._publish({"controller": controller, "method": method, "args": args})
+        return encoded
+
+    # ------------------------------------------------------------------ #
+    # Thông báo thay đổi
+    # ------------------------------------------------------------------ #
+    def _publish(self, event):
+        self._sequence += 1
+        event = dict(event, seq=self._sequence, time=datetime.now().isoformat(timespec="seconds"))
+        data = json.dumps(event, ensure_ascii=False, default=str)
+        for queue in list(self._subscribers):
+            queue.put_nowait(data)
+
+    async def _stream_events(self, writer):
+        queue = asyncio.Queue()
+        self._subscribers.add(queue)
+        try:
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                         b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n")
+            writer.write(f": seq {self._sequence}\n\n".encode())
+            await writer.drain()
+            while True:
+                try:
+                    data = await asyncio.wait_for(queue.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    writer.write(b": ping\n\n")
+                else:
+                    if data is None:
+                        return
+                    writer.write(f"data: {data}\n\n".encode("utf-8"))
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._subscribers.discard(queue)
+
+    # ------------------------------------------------------------------ #
+    # HTTP
+    # ------------------------------------------------------------------ #
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    return
+                try:
+                    verb, path, _ = request_line.decode("latin-1").split(" ", 2)
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "Yêu cầu không hợp lệ"}, keep_alive=False)
+                    return
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, {"error": "Yêu cầu quá lớn"}, keep_alive=False)
+                    return
+                body = await reader.readexactly(length) if length else b""
+                keep_alive = headers.get("connection", "").lower() != "close"
+
+                if path == "/events" and verb == "GET":
+                    await self._stream_events(writer)
+                    return
+                status, payload = await self._route(verb, path, body)
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, verb, path, body):
+        if path == "/health" and verb == "GET":
+            return 200, {"status": "ok", "port": self.port, "subscribers": len(self._subscribers),
+                         "cached": len(self._cache), **self.stats, "write_queue": write_queue.stats()}
+        if path != "/call":
+            return 404, {"error": f"Không có đường dẫn {path}"}
+        if verb != "POST":
+            return 405, {"error": "Chỉ hỗ trợ POST"}
+
+        try:
+            request = json.loads(body)
+            controller, method = request["controller"], request["method"]
+            args = from_wire(request.get("args") or [])
+            kwargs = from_wire(request.get("kwargs") or {})
+        except (ValueError, KeyError, TypeError) as e:
+            return 400, {"error": f"Yêu cầu không hợp lệ: {e}"}
+
+        try:
+            return 200, await self.call(controller, method, args, kwargs)
+        except LookupError as e:
+            return 404, {"error": str(e)}
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.exception("Lỗi khi gọi %s.%s", controller, method)
+            return 500, {"error": f"{type(e).__name__}: {e}"}
+
+    async def _respond(self, writer, status, payload, keep_alive=True):
+        # Kết quả controller đã được mã hóa sẵn (bytes), các phản hồi khác là dict
+        if isinstance(payload, bytes):
+            body = b'{"result":' + payload + b"}"
+        else:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+
+
+async def run(host=DEFAULT_HOST, port=DEFAULT_PORT):
+    service = await OrderService(host, port).start()
+    try:
+        await service.serve_forever()
+    finally:
+        await service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dịch vụ đơn hàng cục bộ cho nhiều máy POS")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    # Đảm bảo lược đồ đã được nâng cấp trước khi phục vụ
+    from app.database.init_db import init_db
+    init_db()
+
+    # Bảo trì cơ sở dữ liệu nền khi quán vắng
+    from app.database.maintenance import maintenance_scheduler
+    maintenance_scheduler.start()
+
+    try:
+        asyncio.run(run(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Columnar Store
+Lưu lịch sử đơn hàng dạng cột, phân vùng theo tháng, cho phân tích dài hạn
+
+Mỗi bảng được lưu theo tháng: <thư mục>/<bảng>/<YYYY-MM>.parquet nếu có pyarrow,
+ngược lại <thư mục>/<bảng>/<YYYY-MM>/<cột>.npy để đọc bằng np.load(mmap_mode='r').
+Bảng thực đơn chỉ có một phân vùng ảnh chụp ("snapshot").
+Module này chỉ đọc/ghi tệp, không phụ thuộc cơ sở dữ liệu và không import app.*: trang
+Streamlit (app/pages) import nó dưới tên utils.columnar_store, chỉ có thư mục app/ trên sys.path.
+"""
+
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow là phụ thuộc tùy chọn
+    pa = None
+    pq = None
+
+DEFAULT_STORE_DIR = os.path.join("app", "database", "columnar")
+
+# Giá trị thay cho NULL ở các cột số nguyên
+MISSING_ID = -1
+
+# Kiểu dữ liệu của từng cột trong các bảng được xuất
+SCHEMAS = {
+    "orders": {
+        "id": "int64",
+        "table_id": "int64",
+        "staff_id": "int64",
+        "customer_id": "int64",
+        "order_time": "datetime64[us]",
+        "paid_at": "datetime64[us]",
+        "status": "int8",
+        "total_amount": "float64",
+        "discount": "float64",
+        "final_amount": "float64",
+    },
+    "order_items": {
+        "id": "int64",
+        "order_id": "int64",
+        "menu_item_id": "int64",
+        "quantity": "int64",
+        "unit_price": "float64",
+        "line_total": "float64",
+        "status": "int8",
+        "order_time": "datetime64[us]",
+        "order_status": "int8",
+    },
+    "menu_items": {
+        "id": "int64",
+        "name": "U100",
+        "price": "float64",
+        "category_id": "int64",
+    },
+}
+
+# Mã trạng thái lưu trong tệp (trùng với OrderStatus/ItemStatus của app.models.status)
+PAID_ORDER_STATUS = 2
+ORDER_STATUS_CODES = {"chờ xử lý": 0, "đang phục vụ": 1, "đã thanh toán": PAID_ORDER_STATUS, "hủy": 3}
+ITEM_STATUS_CODES = {"chờ pha chế": 0, "đang pha chế": 1, "đã hoàn thành": 2, "hủy": 3}
+
+# Cột mã trạng thái: phân vùng ghi trước khi có mã số lưu nhãn tiếng Việt
+STATUS_COLUMNS = {
+    ("orders", "status"): ORDER_STATUS_CODES,
+    ("order_items", "status"): ITEM_STATUS_CODES,
+    ("order_items", "order_status"): ORDER_STATUS_CODES,
+}
+
+def parquet_available() -> bool:
+    return pq is not None
+
+def to_columns(table: str, rows: List[tuple]) -> Dict[str, np.ndarray]:
+    """Chuyển một khối dòng (theo thứ tự cột của SCHEMAS[table]) thành các mảng NumPy"""
+    schema = SCHEMAS[table]
+    columns = {}
+    for position, (name, dtype) in enumerate(schema.items()):
+        values = [row[position] for row in rows]
+        if dtype.startswith("int"):
+            values = [MISSING_ID if value is None else value for value in values]
+        elif dtype == "float64":
+            values = [np.nan if value is None else value for value in values]
+        elif dtype.startswith("U"):
+            values = ["" if value is None else value for value in values]
+        else:  # datetime64: None -> NaT
+            values = [np.datetime64("NaT") if value is None else value for value in values]
+        columns[name] = np.asarray(values, dtype=dtype)
+    return columns
+
+def missing_column(table: str, name: str, length: int) -> np.ndarray:
+    """Cột chưa có trong phân vùng ghi bởi phiên bản cũ: điền giá trị thay cho NULL"""
+    dtype = SCHEMAS[table][name]
+    if dtype.startswith("int"):
+        return np.full(length, MISSING_ID, dtype=dtype)
+    if dtype == "float64":
+        return np.full(length, np.nan)
+    if dtype.startswith("U"):
+        return np.full(length, "", dtype=dtype)
+    return np.full(length, np.datetime64("NaT"), dtype=dtype)
+
+def _status_codes(table: str, name: str, values: np.ndarray) -> np.ndarray:
+    """Đổi cột trạng thái dạng nhãn của phân vùng cũ sang mã số"""
+    codes = STATUS_COLUMNS.get((table, name))
+    if codes is None or values.dtype.kind not in "UO":
+        return values
+    return np.array([codes.get(value, MISSING_ID) for value in values], dtype=SCHEMAS[table][name])
+
+def concat_columns(chunks: List[Dict[str, np.ndarray]], table: str) -> Dict[str, np.ndarray]:
+    """Nối các khối cột; trả về các mảng rỗng đúng kiểu nếu không có khối nào"""
+    if not chunks:
+        return {name: np.empty(0, dtype=dtype) for name, dtype in SCHEMAS[table].items()}
+    return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in SCHEMAS[table]}
+
+class ColumnarStore:
+    """Kho dữ liệu dạng cột phân vùng theo tháng"""
+
+    def __init__(self, root: str = DEFAULT_STORE_DIR, use_parquet: Optional[bool] = None):
+        """
+        Args:
+            root: Thư mục gốc của kho
+            use_parquet: Ghi Parquet (mặc định: khi có pyarrow)
+        """
+        self.root = root
+        self.use_parquet = parquet_available() if use_parquet is None else use_parquet
+        if self.use_parquet and not parquet_available():
+            raise ImportError("Cần cài đặt pyarrow để ghi Parquet")
+
+    def _table_dir(self, table: str) -> str:
+        return os.path.join(self.root, table)
+
+    # ------------------------------------------------------------------ #
+    # Phân vùng
+    # ------------------------------------------------------------------ #
+    def partitions(self, table: str) -> List[str]:
+        """Các tháng (YYYY-MM) đã có dữ liệu của bảng, tăng dần"""
+        table_dir = self._table_dir(table)
+        if not os.path.isdir(table_dir):
+            return []
+        months = set()
+        for entry in os.listdir(table_dir):
+            path = os.path.join(table_dir, entry)
+            if entry.endswith(".parquet"):
+                months.add(entry[:-len(".parquet")])
+            elif os.path.isdir(path) and not entry.startswith("."):
+                months.add(entry)
+        return sorted(months)
+
+    def write_partition(self, table: str, month: str, columns: Dict[str, np.ndarray]):
+        """
+        Ghi (thay thế) phân vùng một tháng. Dữ liệu được ghi vào thư mục tạm rồi đổi tên
+        để người đọc không bao giờ thấy phân vùng ghi dở.
+        """
+        table_dir = self._table_dir(table)
+        os.makedirs(table_dir, exist_ok=True)
+        self.remove_partition(table, month)
+
+        if self.use_parquet:
+            temp_path = os.path.join(table_dir, f".{month}.parquet.tmp")
+            pq.write_table(pa.table({name: columns[name] for name in SCHEMAS[table]}), temp_path)
+            os.replace(temp_path, os.path.join(table_dir, f"{month}.parquet"))
+        else:
+            temp_dir = os.path.join(table_dir, f".{month}.tmp")
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            os.makedirs(temp_dir)
+            for name in SCHEMAS[table]:
+                np.save(os.path.join(temp_dir, f"{name}.npy"), columns[name])
+            os.replace(temp_dir, os.path.join(table_dir, month))
+
+    def remove_partition(self, table: str, month: str):
+        table_dir = self._table_dir(table)
+        parquet_path = os.path.join(table_dir, f"{month}.parquet")
+        if os.path.exists(parquet_path):
+            os.remove(parquet_path)
+        shutil.rmtree(os.path.join(table_dir, month), ignore_errors=True)
+
+    # ------------------------------------------------------------------ #
+    # Đọc dữ liệu
+    # ------------------------------------------------------------------ #
+    def read_partition(self, table: str, month: str, columns: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+        """
+        Đọc một phân vùng; với .npy các mảng được ánh xạ bộ nhớ (chỉ đọc).
+        Cột chưa có trong phân vùng cũ được điền bằng giá trị thay cho NULL.
+        """
+        names = columns or list(SCHEMAS[table])
+        table_dir = self._table_dir(table)
+        parquet_path = os.path.join(table_dir, f"{month}.parquet")
+        if os.path.exists(parquet_path):
+            if not parquet_available():
+                raise ImportError("Cần cài đặt pyarrow để đọc Parquet")
+            stored = set(pq.read_schema(parquet_path).names)
+            data = pq.read_table(parquet_path, columns=[name for name in names if name in stored], memory_map=True)
+            return {
+                name: _status_codes(table, name, data.column(name).to_numpy()) if name in stored
+                else missing_column(table, name, data.num_rows)
+                for name in names
+            }
+        month_dir = os.path.join(table_dir, month)
+        result = {}
+        length = None
+        for name in names:
+            path = os.path.join(month_dir, f"{name}.npy")
+            if os.path.exists(path):
+                result[name] = np.load(path, mmap_mode="r")
+                length = len(result[name])
+        if length is None:
+            length = len(np.load(os.path.join(month_dir, "id.npy"), mmap_mode="r"))
+        for name in names:
+            if name not in result:
+                result[name] = missing_column(table, name, length)
+        return {name: _status_codes(table, name, result[name]) for name in names}
+
+    def read_table(self, table: str, start_month: Optional[str] = None, end_month: Optional[str] = None,
+                   columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Đọc các phân vùng trong khoảng [start_month, end_month] thành một DataFrame
+
+        Args:
+            table: "orders", "order_items" hoặc "menu_items"
+            start_month, end_month: Tháng dạng YYYY-MM (None: không giới hạn)
+            columns: Chỉ đọc các cột này
+        """
+        names = columns or list(SCHEMAS[table])
+        months = [
+            month for month in self.partitions(table)
+            if (start_month is None or month >= start_month) and (end_month is None or month <= end_month)
+        ]
+        parts = [self.read_partition(table, month, names) for month in months]
+        if not parts:
+            return pd.DataFrame({name: np.empty(0, dtype=SCHEMAS[table][name]) for name in names})
+        return pd.DataFrame({name: np.concatenate([part[name] for part in parts]) for name in names})
+
+def load_sales_data(root: str = DEFAULT_STORE_DIR, start_month: Optional[str] = None,
+                    end_month: Optional[str] = None) -> List[Dict]:
+    """
+    Dữ liệu bán hàng cho các bộ tối ưu giá menu, đọc từ kho dạng cột
+    (chỉ các món của đơn đã thanh toán)
+
+    Returns:
+        list: [{'menu_item_id': id, 'quantity': qty, 'price': đơn giá lúc bán (None nếu chưa có),
+                'date': 'YYYY-MM-DD', 'order_id': id}]
+    """
+    items = ColumnarStore(root).read_table(
+        "order_items", start_month, end_month,
+        columns=["order_id", "menu_item_id", "quantity", "unit_price", "order_time", "order_status"]
+    )
+    items = items[items["order_status"] == PAID_ORDER_STATUS]
+    dates = items["order_time"].dt.strftime("%Y-%m-%d")
+    return [
+        {"menu_item_id": int(menu_item_id), "quantity": int(quantity),
+         "price": None if np.isnan(price) else float(price), "date": date, "order_id": int(order_id)}
+        for menu_item_id, quantity, price, date, order_id in zip(
+            items["menu_item_id"], items["quantity"], items["unit_price"], dates, items["order_id"]
+        )
+    ]
@@ -4,23 +4,144 @@ Triển khai thuật toán CSP cho việc lập lịch ca làm việc tự độ
 """
 
 import random
+import time as timer
+from contextlib import contextmanager
 from datetime import datetime, timedelta, time
 from collections import defaultdict
 
-# Định nghĩa các ca làm việc chuẩn
+# Định nghĩa các ca làm việc chuẩn (dùng khi chưa cấu hình ca mẫu trong cơ sở dữ liệu)
+# min_per_role: số nhân viên tối thiểu của mỗi vai trò bắt buộc trong ca
 STANDARD_SHIFTS = [
-    {"name": "Ca sáng", "start_hour": 8, "start_minute": 0, "end_hour": 14, "end_minute": 0},
-    {"name": "Ca chiều", "start_hour": 14, "start_minute": 0, "end_hour": 20, "end_minute": 0},
-    {"name": "Ca tối", "start_hour": 16, "start_minute": 0, "end_hour": 22, "end_minute": 0},
-    {"name": "Ca toàn thời gian", "start_hour": 8, "start_minute": 0, "end_hour": 17, "end_minute": 0},
+    {"name": "Ca sáng", "start_hour": 8, "start_minute": 0, "end_hour": 14, "end_minute": 0, "min_per_role": 1},
+    {"name": "Ca chiều", "start_hour": 14, "start_minute": 0, "end_hour": 20, "end_minute": 0, "min_per_role": 1},
+    {"name": "Ca tối", "start_hour": 16, "start_minute": 0, "end_hour": 22, "end_minute": 0, "min_per_role": 1},
+    {"name": "Ca toàn thời gian", "start_hour": 8, "start_minute": 0, "end_hour": 17, "end_minute": 0, "min_per_role": 0},
 ]
 
+# Số giờ nghỉ tối thiểu giữa hai ca ở hai ngày liên tiếp (ca tối 22:00 -> ca sáng 8:00 bị cấm)
+MIN_REST_HOURS = 11
+
+def shift_minutes(shift):
+    """Giờ bắt đầu và kết thúc của ca mẫu tính bằng phút từ 0:00"""
+    start = shift["start_hour"] * 60 + shift["start_minute"]
+    end = shift["end_hour"] * 60 + shift["end_minute"]
+    return start, end
+
+def rest_conflict(shift_today, shift_next_day):
+    """Ca hôm nay và ca hôm sau không đủ giờ nghỉ tối thiểu"""
+    _, end = shift_minutes(shift_today)
+    start, _ = shift_minutes(shift_next_day)
+    return (24 * 60 + start) - end < MIN_REST_HOURS * 60
+
+# Trạng thái kết thúc của bộ giải
+STATUS_SOLVED = "solved"          # tìm được lời giải
+STATUS_INFEASIBLE = "infeasible"  # đã duyệt hết, không có lời giải
+STATUS_TIMEOUT = "timeout"        # hết thời gian
+STATUS_NODE_LIMIT = "node_limit"  # vượt giới hạn số nút
+
+class SearchLimitReached(Exception):
+    """Tìm kiếm bị dừng do hết thời gian hoặc vượt giới hạn số nút"""
+    
+    def __init__(self, status):
+        super().__init__(status)
+        self.status = status
+
+class SolverStats:
+    """
+    Thống kê quá trình tìm kiếm: số nút đã mở rộng, số lần quay lui, số lần kiểm tra
+    ràng buộc, độ sâu lớn nhất và thời gian từng pha; đồng thời áp dụng giới hạn
+    thời gian/số nút (nếu có)
+    """
+    
+    # Số nút giữa hai lần đọc đồng hồ
+    CLOCK_INTERVAL = 64
+    
+    def __init__(self, timeout=None, max_nodes=None):
+        self.timeout = timeout
+        self.max_nodes = max_nodes
+        self.nodes = 0
+        self.backtracks = 0
+        self.constraint_checks = 0
+        self.max_depth = 0
+        self.status = None
+        self.phases = {}
+        self._deadline = None
+    
+    def start(self):
+        """Bắt đầu tính giới hạn thời gian"""
+        self._deadline = timer.perf_counter() + self.timeout if self.timeout else None
+    
+    def expand(self, depth):
+        """
+        Ghi nhận một nút tìm kiếm ở độ sâu depth
+        
+        Returns:
+            bool: True nếu đây là độ sâu lớn nhất từ trước tới nay
+        
+        Raises:
+            SearchLimitReached: Khi vượt giới hạn số nút hoặc thời gian
+        """
+        self.nodes += 1
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            raise SearchLimitReached(STATUS_NODE_LIMIT)
+        if self._deadline is not None and self.nodes % self.CLOCK_INTERVAL == 0:
+            if timer.perf_counter() > self._deadline:
+                raise SearchLimitReached(STATUS_TIMEOUT)
+        if depth > self.max_depth:
+            self.max_depth = depth
+            return True
+        return False
+    
+    @contextmanager
+    def phase(self, name):
+        """Đo thời gian một pha (cộng dồn nếu gọi nhiều lần)"""
+        began = timer.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + timer.perf_counter() - began
+    
+    def merge(self, other):
+        """Cộng dồn thống kê của một bộ giải con (dict từ to_dict)"""
+        self.nodes += other["nodes"]
+        self.backtracks += other["backtracks"]
+        self.constraint_checks += other["constraint_checks"]
+        self.max_depth = max(self.max_depth, other["max_depth"])
+    
+    def to_dict(self):
+        return {
+            "status": self.status,
+            "nodes": self.nodes,
+            "backtracks": self.backtracks,
+            "constraint_checks": self.constraint_checks,
+            "max_depth": self.max_depth,
+            "phases": dict(self.phases)
+        }
+
+def describe_stats(stats):
+    """Mô tả ngắn gọn một dict thống kê (SolverStats.to_dict) để ghi log"""
+    phases = " ".join(f"{name}={seconds:.3f}s" for name, seconds in stats.get("phases", {}).items())
+    return (f"status={stats.get('status')} nodes={stats.get('nodes', 0)} "
+            f"backtracks={stats.get('backtracks', 0)} checks={stats.get('constraint_checks', 0)} "
+            f"max_depth={stats.get('max_depth', 0)} {phases}").strip()
+
+def build_shift(staff_id, shift_date, shift):
+    """Tạo bản ghi ca làm việc (dict) từ ca mẫu"""
+    return {
+        "staff_id": staff_id,
+        "date": shift_date,
+        "start_time": datetime.combine(shift_date, time(shift["start_hour"], shift["start_minute"])),
+        "end_time": datetime.combine(shift_date, time(shift["end_hour"], shift["end_minute"])),
+        "status": "lịch"
+    }
+
 class StaffShiftCSP:
     """
     Giải quyết bài toán lập lịch ca làm việc sử dụng CSP
     """
     
-    def __init__(self, staff_list, week_start_date, min_staff_per_day=2, max_shifts_per_week=5):
+    def __init__(self, staff_list, week_start_date, min_staff_per_day=2, max_shifts_per_week=5,
+                 shifts=None, weeks=1, timeout=None, max_nodes=None):
         """
         Khởi tạo bài toán CSP
         
@@ -29,13 +150,17 @@ class StaffShiftCSP:
             week_start_date: Ngày bắt đầu tuần
             min_staff_per_day: Số nhân viên tối thiểu mỗi ngày
             max_shifts_per_week: Số ca tối đa mỗi nhân viên một tuần
+            shifts: Các ca mẫu (mặc định STANDARD_SHIFTS)
+            weeks: Số tuần cần xếp lịch
+            timeout: Thời gian tìm kiếm tối đa (giây), None là không giới hạn
+            max_nodes: Số nút tìm kiếm tối đa, None là không giới hạn
         """
         self.staff_list = staff_list
         self.week_start_date = week_start_date
         self.min_staff_per_day = min_staff_per_day
         self.max_shifts_per_week = max_shifts_per_week
-        self.days = 7  # Số ngày trong tuần
-        self.shifts = STANDARD_SHIFTS  # Các ca chuẩn
+        self.days = 7 * weeks  # Số ngày trong khoảng lập lịch
+        self.shifts = shifts or STANDARD_SHIFTS  # Các ca mẫu
         
         # Khởi tạo các biến domain và assignment
         self.variables = [(staff.id, day, shift_idx) 
@@ -45,6 +170,10 @@ class StaffShiftCSP:
         
         self.domains = {var: [0, 1] for var in self.variables}  # 0: không làm, 1: làm
         self.assignment = {}
+        
+        # Thống kê tìm kiếm và lời giải một phần sâu nhất (dùng khi bị dừng giữa chừng)
+        self.stats = SolverStats(timeout, max_nodes)
+        self.best_partial = {}
     
     def is_consistent(self, var, value):
         """
@@ -57,6 +186,7 @@ class StaffShiftCSP:
         Returns:
             bool: True nếu thỏa mãn ràng buộc, False nếu không
         """
+        self.stats.constraint_checks += 1
         if value == 0:  # Nếu không làm việc, luôn thỏa mãn
             return True
         
@@ -76,33 +206,33 @@ class StaffShiftCSP:
                         return False
         
         # Kiểm tra số ca làm việc tối đa trong tuần
-        if self._count_weekly_shifts(staff_id) >= self.max_shifts_per_week:
+        if self._count_weekly_shifts(staff_id, day // 7) >= self.max_shifts_per_week:
             return False
         
-        # Kiểm tra nhân viên không làm hai ngày liên tiếp với ca tối và ca sáng
-        if shift_idx == 2:  # Ca tối
-            next_day_morning = (staff_id, (day + 1) % self.days, 0)  # Ca sáng ngày kế
-            if next_day_morning in self.assignment and self.assignment[next_day_morning] == 1:
-                return False
+        # Kiểm tra giờ nghỉ giữa ca này và các ca của ngày trước/ngày sau (không vòng về đầu tuần)
+        for other_shift_idx in range(len(self.shifts)):
+            previous_var = (staff_id, day - 1, other_shift_idx)
+            if day > 0 and self.assignment.get(previous_var) == 1:
+                if rest_conflict(self.shifts[other_shift_idx], self.shifts[shift_idx]):
+                    return False
+            next_var = (staff_id, day + 1, other_shift_idx)
+            if day + 1 < self.days and self.assignment.get(next_var) == 1:
+                if rest_conflict(self.shifts[shift_idx], self.shifts[other_shift_idx]):
+                    return False
         
         return True
     
     def _shifts_overlap(self, shift1_idx, shift2_idx):
         """Kiểm tra hai ca làm việc có chồng chéo nhau không"""
-        shift1 = self.shifts[shift1_idx]
-        shift2 = self.shifts[shift2_idx]
-        
-        start1 = time(shift1["start_hour"], shift1["start_minute"])
-        end1 = time(shift1["end_hour"], shift1["end_minute"])
-        start2 = time(shift2["start_hour"], shift2["start_minute"])
-        end2 = time(shift2["end_hour"], shift2["end_minute"])
+        start1, end1 = shift_minutes(self.shifts[shift1_idx])
+        start2, end2 = shift_minutes(self.shifts[shift2_idx])
         
-        return (start1 <= start2 < end1) or (start1 < end2 <= end1) or (start2 <= start1 < end2)
+        return start1 < end2 and start2 < end1
     
-    def _count_weekly_shifts(self, staff_id):
-        """Đếm số ca làm việc của nhân viên trong tuần hiện tại"""
+    def _count_weekly_shifts(self, staff_id, week=0):
+        """Đếm số ca làm việc của nhân viên trong một tuần của khoảng lập lịch"""
         count = 0
-        for day in range(self.days):
+        for day in range(7 * week, min(7 * week + 7, self.days)):
             for shift_idx in range(len(self.shifts)):
                 var = (staff_id, day, shift_idx)
                 if var in self.assignment and self.assignment[var] == 1:
@@ -125,8 +255,21 @@ class StaffShiftCSP:
         return True
     
     def backtracking_search(self):
-        """Thuật toán Backtracking Search để giải bài toán CSP"""
-        return self._backtrack({})
+        """
+        Thuật toán Backtracking Search để giải bài toán CSP
+        
+        Kết quả tìm kiếm được ghi vào self.stats.status (solved, infeasible, timeout,
+        node_limit); khi bị dừng giữa chừng, self.best_partial giữ assignment sâu nhất.
+        """
+        self.stats.start()
+        with self.stats.phase("search"):
+            try:
+                result = self._backtrack({})
+            except SearchLimitReached as e:
+                self.stats.status = e.status
+                return None
+        self.stats.status = STATUS_SOLVED if result is not None else STATUS_INFEASIBLE
+        return result
     
     def _backtrack(self, assignment):
         """
@@ -139,6 +282,8 @@ class StaffShiftCSP:
             dict: Assignment đầy đủ hoặc None nếu không tìm được
         """
         self.assignment = assignment
+        if self.stats.expand(len(assignment)):
+            self.best_partial = dict(assignment)
         
         # Nếu assignment đầy đủ
         if len(assignment) == len(self.variables):
@@ -161,6 +306,7 @@ class StaffShiftCSP:
                 
                 # Backtrack
                 del assignment[var]
+                self.stats.backtracks += 1
         
         return None
     
@@ -193,7 +339,7 @@ class StaffShiftCSP:
         staff_id, day, _ = var
         
         # Nếu nhân viên đã làm nhiều ca, ưu tiên không phân công (0)
-        if self._count_weekly_shifts(staff_id) >= self.max_shifts_per_week - 1:
+        if self._count_weekly_shifts(staff_id, day // 7) >= self.max_shifts_per_week - 1:
             return [0, 1]
         
         # Nếu ngày này đã có đủ nhân viên tối thiểu, ưu tiên không phân công (0)
@@ -205,47 +351,36 @@ class StaffShiftCSP:
         # Ngược lại, ưu tiên phân công (1)
         return [1, 0]
     
-    def generate_shifts(self):
+    def generate_shifts(self, allow_partial=False):
         """
         Tạo lịch làm việc cho cả tuần
         
+        Args:
+            allow_partial: Trả về lời giải một phần sâu nhất khi bị dừng do giới hạn
+        
         Returns:
             list: Danh sách ca làm việc [(staff_id, date, start_time, end_time)]
         """
         result = self.backtracking_search()
         if not result:
-            return []
+            if not (allow_partial and self.stats.status in (STATUS_TIMEOUT, STATUS_NODE_LIMIT)):
+                return []
+            result = self.best_partial
         
         shifts = []
-        for var, value in result.items():
-            if value == 1:  # Nếu được phân công ca này
-                staff_id, day, shift_idx = var
-                shift = self.shifts[shift_idx]
-                
-                # Tính toán ngày và giờ làm việc
-                shift_date = self.week_start_date + timedelta(days=day)
-                
-                start_datetime = datetime.combine(
-                    shift_date, 
-                    time(shift["start_hour"], shift["start_minute"])
-                )
-                
-                end_datetime = datetime.combine(
-                    shift_date, 
-                    time(shift["end_hour"], shift["end_minute"])
-                )
-                
-                shifts.append({
-                    "staff_id": staff_id,
-                    "date": shift_date,
-                    "start_time": start_datetime,
-                    "end_time": end_datetime,
-                    "status": "lịch"
-                })
+        with self.stats.phase("build"):
+            for var, value in result.items():
+                if value == 1:  # Nếu được phân công ca này
+                    staff_id, day, shift_idx = var
+                    
+                    # Tính toán ngày và giờ làm việc
+                    shift_date = self.week_start_date + timedelta(days=day)
+                    shifts.append(build_shift(staff_id, shift_date, self.shifts[shift_idx]))
         
         return shifts
 
-def generate_optimal_shifts(staff_list, week_start_date, min_staff_per_day=2, max_shifts_per_week=5):
+def generate_optimal_shifts(staff_list, week_start_date, min_staff_per_day=2, max_shifts_per_week=5,
+                            timeout=None, max_nodes=None, with_stats=False, allow_partial=False):
     """
     Hàm tiện ích để tạo lịch làm việc tối ưu
     
@@ -254,9 +389,19 @@ def generate_optimal_shifts(staff_list, week_start_date, min_staff_per_day=2, ma
         week_start_date: Ngày bắt đầu tuần
         min_staff_per_day: Số nhân viên tối thiểu mỗi ngày
         max_shifts_per_week: Số ca tối đa mỗi nhân viên một tuần
+        timeout: Thời gian tìm kiếm tối đa (giây)
+        max_nodes: Số nút tìm kiếm tối đa
+        with_stats: Trả thêm thống kê tìm kiếm (SolverStats.to_dict)
+        allow_partial: Trả về lời giải một phần sâu nhất khi bị dừng do hết thời gian/số nút
+            (stats["status"] cho biết lời giải có đầy đủ hay không)
     
     Returns:
-        list: Danh sách ca làm việc hoặc rỗng nếu không tìm được lịch thỏa mãn
+        list: Danh sách ca làm việc hoặc rỗng nếu không tìm được lịch thỏa mãn;
+        (list, dict) nếu with_stats
     """
-    csp = StaffShiftCSP(staff_list, week_start_date, min_staff_per_day, max_shifts_per_week)
-    return csp.generate_shifts() 
\ No newline at end of file
+    csp = StaffShiftCSP(staff_list, week_start_date, min_staff_per_day, max_shifts_per_week,
+                        timeout=timeout, max_nodes=max_nodes)
+    shifts = csp.generate_shifts(allow_partial)
+    if with_stats:
+        return shifts, csp.stats.to_dict()
+    return shifts
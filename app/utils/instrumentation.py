@@ -0,0 +1,403 @@
+"""
+Instrumentation
+Đo truy vấn SQL và các phương thức controller
+
+Với mỗi phương thức controller: số lần gọi, số truy vấn và số dòng mỗi lần gọi (để phát hiện
+N+1), số lỗi cơ sở dữ liệu (kể cả lỗi bị controller nuốt) và histogram độ trễ. Với mỗi câu SQL:
+số lần chạy, số dòng và histogram độ trễ. Truy vấn chậm hơn ngưỡng được ghi vào tệp nhật ký.
+
+Bật khi khởi động bằng biến môi trường COFFEE_INSTRUMENT=1 (ngưỡng truy vấn chậm
+COFFEE_SLOW_QUERY_MS, mặc định 100 ms), hoặc lúc chạy bằng registry.enable()/disable().
+Khi tắt, các hook chỉ kiểm tra một cờ rồi gọi thẳng hàm gốc.
+"""
+
+import contextlib
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime
+
+from sqlalchemy import event
+from sqlalchemy.orm import Mapper
+
+# Cận trên (ms) của các ô histogram độ trễ; ô cuối chứa mọi giá trị lớn hơn
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+DEFAULT_SLOW_QUERY_MS = 100
+SLOW_QUERY_LOG = os.path.join("app", "database", "slow_queries.log")
+DEFAULT_REPORT_PATH = os.path.join("app", "database", "query_report.json")
+
+# Số truy vấn trung bình mỗi lần gọi vượt mức này bị đánh dấu nghi N+1
+N_PLUS_ONE_QUERIES = 10
+
+# Độ dài tối đa của tham số ghi vào nhật ký truy vấn chậm
+MAX_LOGGED_PARAMS = 200
+
+slow_query_logger = logging.getLogger("app.slow_queries")
+
+
+class LatencyStats:
+    """Histogram độ trễ với các ô cố định LATENCY_BUCKETS_MS"""
+
+    __slots__ = ("count", "total_ms", "max_ms", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def add(self, ms):
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.buckets[bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+
+    def percentile(self, q):
+        """Ước lượng phân vị từ histogram (cận trên của ô chứa phân vị)"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= target:
+                bound = LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else self.max_ms
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def to_dict(self):
+        labels = [f"<={bound}ms" for bound in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        return {
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "p50_ms": round(self.percentile(0.50), 3),
+            "p95_ms": round(self.percentile(0.95), 3),
+            "p99_ms": round(self.percentile(0.99), 3),
+            "histogram": {label: count for label, count in zip(labels, self.buckets) if count},
+        }
+
+
+class _Frame:
+    """Một lần gọi phương thức đang chạy trên luồng hiện tại"""
+
+    __slots__ = ("name", "queries", "rows", "errors")
+
+    def __init__(self, name):
+        self.name = name
+        self.queries = 0
+        self.rows = 0
+        self.errors = 0
+
+
+class InstrumentationRegistry:
+    """Lưu số liệu đo trong bộ nhớ; an toàn khi nhiều luồng cùng ghi"""
+
+    def __init__(self):
+        self.enabled = False
+        self.slow_query_ms = DEFAULT_SLOW_QUERY_MS
+        self.started_at = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._log_handler = None
+        self.methods = {}
+        self.queries = {}
+        self.sections = {}
+
+    def add_section(self, name, provider):
+        """Thêm số liệu của hệ thống con khác vào snapshot/báo cáo (provider() -> dict)"""
+        self.sections[name] = provider
+
+    # ------------------------------------------------------------------ #
+    # Bật / tắt
+    # ------------------------------------------------------------------ #
+    def enable(self, slow_query_ms=None, log_path=SLOW_QUERY_LOG):
+        """
+        Bật đo đạc
+
+        Args:
+            slow_query_ms: Ngưỡng truy vấn chậm (ms), None giữ ngưỡng hiện tại
+            log_path: Tệp nhật ký truy vấn chậm (None: chỉ ghi qua logging)
+        """
+        if slow_query_ms is not None:
+            self.slow_query_ms = slow_query_ms
+        if log_path and self._log_handler is None:
+            directory = os.path.dirname(log_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._log_handler = logging.FileHandler(log_path, encoding="utf-8")
+            self._log_handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            slow_query_logger.addHandler(self._log_handler)
+        self.started_at = self.started_at or datetime.now()
+        self.enabled = True
+
+    def disable(self):
+        """Tắt đo đạc (giữ số liệu đã ghi)"""
+        self.enabled = False
+        if self._log_handler is not None:
+            slow_query_logger.removeHandler(self._log_handler)
+            self._log_handler.close()
+            self._log_handler = None
+
+    def reset(self):
+        with self._lock:
+            self.methods = {}
+            self.queries = {}
+            self.started_at = datetime.now() if self.enabled else None
+
+    # ------------------------------------------------------------------ #
+    # Ghi số liệu
+    # ------------------------------------------------------------------ #
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def method_started(self, name):
+        frame = _Frame(name)
+        self._stack().append(frame)
+        return frame
+
+    def method_finished(self, frame, elapsed_ms, failed):
+        stack = self._stack()
+        if stack and stack[-1] is frame:
+            stack.pop()
+        with self._lock:
+            stats = self.methods.get(frame.name)
+            if stats is None:
+                stats = self.methods[frame.name] = {
+                    "calls": 0, "errors": 0, "queries": 0, "max_queries": 0, "rows": 0,
+                    "latency": LatencyStats()
+                }
+            stats["calls"] += 1
+            stats["errors"] += frame.errors + (1 if failed else 0)
+            stats["queries"] += frame.queries
+            stats["max_queries"] = max(stats["max_queries"], frame.queries)
+            stats["rows"] += frame.rows
+            stats["latency"].add(elapsed_ms)
+
+    def current_frames(self):
+        """Các lần gọi đang chạy trên luồng hiện tại, để ghi công cho truy vấn chạy ở luồng khác"""
+        if not self.enabled:
+            return ()
+        return tuple(self._stack())
+
+    @contextlib.contextmanager
+    def attach(self, frames):
+        """
+        Tính truy vấn/lỗi chạy trong khối with cho các lần gọi frames (lấy từ current_frames()
+        ở luồng gửi việc, ví dụ luồng ghi của app.database.write_queue)
+        """
+        if not frames:
+            yield
+            return
+        stack = self._stack()
+        depth = len(stack)
+        stack.extend(frames)
+        try:
+            yield
+        finally:
+            del stack[depth:]
+
+    def _query_stats(self, statement):
+        stats = self.queries.get(statement)
+        if stats is None:
+            stats = self.queries[statement] = {"errors": 0, "rows": 0, "latency": LatencyStats()}
+        return stats
+
+    def query_finished(self, statement, parameters, elapsed_ms, rows):
+        stack = self._stack()
+        for frame in stack:
+            frame.queries += 1
+            frame.rows += rows
+        self._local.last_statement = statement
+        with self._lock:
+            stats = self._query_stats(statement)
+            stats["rows"] += rows
+            stats["latency"].add(elapsed_ms)
+
+        if elapsed_ms >= self.slow_query_ms:
+            method = stack[-1].name if stack else "-"
+            params = repr(parameters)
+            if len(params) > MAX_LOGGED_PARAMS:
+                params = params[:MAX_LOGGED_PARAMS] + "..."
+            slow_query_logger.warning("%.1f ms [%s] %s | %s", elapsed_ms, method, " ".join(statement.split()), params)
+
+    def query_failed(self, statement, error):
+        stack = self._stack()
+        for frame in stack:
+            frame.errors += 1
+        with self._lock:
+            self._query_stats(statement)["errors"] += 1
+        method = stack[-1].name if stack else "-"
+        slow_query_logger.warning("LỖI [%s] %s | %s", method, " ".join(statement.split()), error)
+
+    def rows_loaded(self, count=1):
+        """Đối tượng ORM được nạp từ kết quả SELECT (cursor không cho biết số dòng đã đọc)"""
+        for frame in self._stack():
+            frame.rows += count
+        statement = getattr(self._local, "last_statement", None)
+        if statement is not None:
+            with self._lock:
+                self._query_stats(statement)["rows"] += count
+
+    # ------------------------------------------------------------------ #
+    # Báo cáo
+    # ------------------------------------------------------------------ #
+    def snapshot(self):
+        """Số liệu hiện tại dạng dict (có thể ghi JSON)"""
+        with self._lock:
+            methods = {
+                name: {
+                    "calls": stats["calls"],
+                    "errors": stats["errors"],
+                    "queries": stats["queries"],
+                    "queries_per_call": round(stats["queries"] / stats["calls"], 2),
+                    "max_queries": stats["max_queries"],
+                    "rows": stats["rows"],
+                    "latency": stats["latency"].to_dict(),
+                }
+                for name, stats in self.methods.items()
+            }
+            queries = {
+                statement: {"errors": stats["errors"], "rows": stats["rows"], "latency": stats["latency"].to_dict()}
+                for statement, stats in self.queries.items()
+            }
+        return {
+            "enabled": self.enabled,
+            "started_at": self.started_at.isoformat(timespec="seconds") if self.started_at else None,
+            "generated_at": datetime.now().isoformat(timespec="seconds"),
+            "slow_query_ms": self.slow_query_ms,
+            "methods": methods,
+            "queries": queries,
+            "sections": {name: provider() for name, provider in self.sections.items()},
+        }
+
+    def dump(self, path=DEFAULT_REPORT_PATH):
+        """Ghi snapshot ra tệp JSON, trả về đường dẫn"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+        return path
+
+    def report(self, limit=15):
+        return format_report(self.snapshot(), limit)
+
+
+def format_report(snapshot, limit=15):
+    """Báo cáo dạng văn bản từ một snapshot (registry.snapshot() hoặc tệp JSON đã dump)"""
+    methods = sorted(snapshot["methods"].items(), key=lambda item: item[1]["latency"]["total_ms"], reverse=True)
+    queries = sorted(snapshot["queries"].items(), key=lambda item: item[1]["latency"]["total_ms"], reverse=True)
+
+    lines = [f"Số liệu từ {snapshot['started_at'] or '-'} đến {snapshot['generated_at']}", ""]
+    lines.append(f"{'Phương thức':<52} {'gọi':>6} {'lỗi':>4} {'truy vấn/gọi':>12} {'dòng':>8} "
+                 f"{'p50 ms':>8} {'p95 ms':>8} {'tổng ms':>10}")
+    for name, stats in methods[:limit]:
+        latency = stats["latency"]
+        flag = "  <-- nghi N+1" if stats["queries_per_call"] > N_PLUS_ONE_QUERIES else ""
+        lines.append(f"{name:<52} {stats['calls']:>6} {stats['errors']:>4} {stats['queries_per_call']:>12.1f} "
+                     f"{stats['rows']:>8} {latency['p50_ms']:>8.1f} {latency['p95_ms']:>8.1f} "
+                     f"{latency['total_ms']:>10.1f}{flag}")
+
+    lines += ["", f"{'Truy vấn':<70} {'lần':>6} {'dòng':>8} {'p95 ms':>8} {'tổng ms':>10}"]
+    for statement, stats in queries[:limit]:
+        text = " ".join(statement.split())
+        text = text if len(text) <= 70 else text[:67] + "..."
+        latency = stats["latency"]
+        lines.append(f"{text:<70} {latency['count']:>6} {stats['rows']:>8} {latency['p95_ms']:>8.1f} "
+                     f"{latency['total_ms']:>10.1f}")
+
+    for name, values in snapshot.get("sections", {}).items():
+        lines += ["", f"[{name}]"]
+        for key, value in values.items():
+            if isinstance(value, dict) and "p95_ms" in value:
+                value = f"n={value['count']} p50={value['p50_ms']}ms p95={value['p95_ms']}ms max={value['max_ms']}ms"
+            lines.append(f"  {key}: {value}")
+    return "\n".join(lines)
+
+
+registry = InstrumentationRegistry()
+
+
+# ---------------------------------------------------------------------- #
+# Hook SQLAlchemy
+# ---------------------------------------------------------------------- #
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if registry.enabled:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_started")
+    if not started:
+        return
+    elapsed_ms = (time.perf_counter() - started.pop()) * 1000
+    # SQLite chỉ báo rowcount cho lệnh ghi; số dòng SELECT được đếm qua rows_loaded
+    rows = cursor.rowcount if cursor.rowcount and cursor.rowcount > 0 else 0
+    registry.query_finished(statement, parameters, elapsed_ms, rows)
+
+
+def _handle_error(context):
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    if started:
+        started.pop()
+    if registry.enabled and context.statement:
+        registry.query_failed(context.statement, context.original_exception)
+
+
+def _on_load(target, context):
+    if registry.enabled:
+        registry.rows_loaded()
+
+
+def install(engine):
+    """Gắn hook đo vào engine (gọi nhiều lần không sao); bật ngay nếu có COFFEE_INSTRUMENT"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+    if not event.contains(Mapper, "load", _on_load):
+        event.listen(Mapper, "load", _on_load)
+
+    if os.environ.get("COFFEE_INSTRUMENT", "").lower() in ("1", "true", "yes", "on") and not registry.enabled:
+        registry.enable(float(os.environ.get("COFFEE_SLOW_QUERY_MS", DEFAULT_SLOW_QUERY_MS)))
+
+
+# ---------------------------------------------------------------------- #
+# Decorator cho controller
+# ---------------------------------------------------------------------- #
+def instrumented(name):
+    """Decorator đo một hàm dưới tên `name`"""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not registry.enabled:
+                return func(*args, **kwargs)
+            frame = registry.method_started(name)
+            began = time.perf_counter()
+            failed = True
+            try:
+                result = func(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                registry.method_finished(frame, (time.perf_counter() - began) * 1000, failed)
+        return wrapper
+    return decorate
+
+
+def instrument_controller(cls):
+    """Decorator lớp: đo mọi staticmethod của controller dưới tên <Lớp>.<phương thức>"""
+    for attribute, value in list(vars(cls).items()):
+        if isinstance(value, staticmethod) and not attribute.startswith("__"):
+            setattr(cls, attribute, staticmethod(instrumented(f"{cls.__name__}.{attribute}")(value.__func__)))
+    return cls
@@ -0,0 +1,130 @@
+"""
+Interval Index
+Chỉ mục khoảng thời gian [start, end) đã sắp xếp theo thời điểm bắt đầu,
+dùng để kiểm tra trùng lịch (đặt bàn, ca làm việc) trong O(log n)
+"""
+
+from bisect import bisect_left, bisect_right, insort
+
+
+class IntervalIndex:
+    """
+    Danh sách khoảng thời gian sắp xếp theo start, kèm độ dài lớn nhất đã gặp.
+
+    Một khoảng [s, e) chỉ có thể giao với [start, end) khi start - max_length < s < end,
+    nên truy vấn chỉ cần duyệt đoạn này bằng tìm kiếm nhị phân: O(log n + k) với k là
+    số khoảng nằm trong cửa sổ. Khi các khoảng không chồng nhau (trường hợp thông
+    thường của một bàn hay một nhân viên) thì k rất nhỏ.
+    """
+
+    def __init__(self, intervals=None):
+        self._entries = []  # (start, seq, end, payload) sắp xếp theo start
+        self._by_payload = {}  # payload -> entry
+        self._max_length = None
+        self._seq = 0
+        for start, end, payload in intervals or []:
+            self.add(start, end, payload)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        for start, _, end, payload in self._entries:
+            yield start, end, payload
+
+    def __contains__(self, payload):
+        return payload in self._by_payload
+
+    def add(self, start, end, payload):
+        """Thêm một khoảng, payload phải là duy nhất (ví dụ id bản ghi)"""
+        if payload in self._by_payload:
+            self.remove(payload)
+        self._seq += 1
+        entry = (start, self._seq, end, payload)
+        insort(self._entries, entry)
+        self._by_payload[payload] = entry
+        length = end - start
+        if self._max_length is None or length > self._max_length:
+            self._max_length = length
+
+    def remove(self, payload):
+        """Xóa khoảng theo payload, trả về False nếu không tồn tại"""
+        entry = self._by_payload.pop(payload, None)
+        if entry is None:
+            return False
+        pos = bisect_left(self._entries, entry)
+        del self._entries[pos]
+        return True
+
+    def get(self, payload):
+        """Trả về (start, end) của payload hoặc None"""
+        entry = self._by_payload.get(payload)
+        return (entry[0], entry[2]) if entry else None
+
+    def _window(self, start, end):
+        if not self._entries:
+            return 0, 0
+        hi = bisect_left(self._entries, (end,))
+        lo = bisect_right(self._entries, (start - self._max_length, float("inf")))
+        return lo, hi
+
+    def overlapping(self, start, end, exclude=None):
+        """Danh sách (start, end, payload) giao với [start, end)"""
+        lo, hi = self._window(start, end)
+        return [(s, e, payload) for s, _, e, payload in self._entries[lo:hi]
+                if e > start and payload != exclude]
+
+    def overlaps(self, start, end, exclude=None):
+        """Kiểm tra [start, end) có giao với khoảng nào không"""
+        lo, hi = self._window(start, end)
+        for s, _, e, payload in reversed(self._entries[lo:hi]):
+            if e > start and payload != exclude:
+                return True
+        return False
+
+    def next_start(self, after):
+        """Thời điểm bắt đầu sớm nhất >= after, None nếu không có"""
+        pos = bisect_left(self._entries, (after,))
+        return self._entries[pos][0] if pos < len(self._entries) else None
+
+
+class KeyedIntervalIndex:
+    """Tập các IntervalIndex theo khóa (table_id, staff_id, ...)"""
+
+    def __init__(self):
+        self._indexes = {}
+
+    def __len__(self):
+        return sum(len(index) for index in self._indexes.values())
+
+    def keys(self):
+        return self._indexes.keys()
+
+    def index_for(self, key):
+        index = self._indexes.get(key)
+        if index is None:
+            index = self._indexes[key] = IntervalIndex()
+        return index
+
+    def add(self, key, start, end, payload):
+        self.index_for(key).add(start, end, payload)
+
+    def remove(self, key, payload):
+        index = self._indexes.get(key)
+        return index.remove(payload) if index else False
+
+    def overlaps(self, key, start, end, exclude=None):
+        index = self._indexes.get(key)
+        return index.overlaps(start, end, exclude) if index else False
+
+    def overlapping(self, key, start, end, exclude=None):
+        index = self._indexes.get(key)
+        return index.overlapping(start, end, exclude) if index else []
+
+    def next_start(self, key, after):
+        index = self._indexes.get(key)
+        return index.next_start(after) if index else None
+
+    def free_keys(self, keys, start, end):
+        """Lọc các khóa không có khoảng nào giao với [start, end)"""
+        return [key for key in keys if not self.overlaps(key, start, end)]
@@ -0,0 +1,295 @@
+"""
+Roster Scheduler
+Lập lịch ca nhiều tuần theo vai trò: mỗi ca mẫu cần đủ nhân viên của từng vai trò
+bắt buộc (pha chế, thu ngân). Ràng buộc phủ ca của mỗi vai trò chỉ liên quan đến
+nhân viên của vai trò đó, nên bài toán được tách thành các bài toán con độc lập và
+giải song song; sau đó một bài toán con cuối bổ sung người để đủ số nhân viên mỗi ngày.
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app.utils.csp_scheduler import (STANDARD_SHIFTS, shift_minutes, rest_conflict, SolverStats,
+                                     SearchLimitReached, STATUS_SOLVED, STATUS_INFEASIBLE, STATUS_TIMEOUT)
+
+# Các vai trò phải có mặt trong mỗi ca (số người lấy theo min_per_role của ca mẫu)
+COVERAGE_ROLES = ["Pha chế", "Thu ngân"]
+
+# Giới hạn số nút tìm kiếm của mỗi bài toán con
+MAX_SEARCH_NODES = 200000
+
+# Chỉ giải song song khi tổng số ghế đủ lớn để bù chi phí khởi tạo tiến trình con
+PARALLEL_MIN_SEATS = 500
+
+
+class RosterSubproblem:
+    """
+    Bài toán con: lấp đầy các "ghế" (ngày, các ca được phép) bằng nhân viên
+
+    Backtracking chọn ghế theo MRV (ít ứng viên nhất) và thử nhân viên ít giờ làm
+    nhất trước để lịch cân bằng. Ghế không còn ứng viên nào sẽ bị phát hiện ngay ở
+    bước chọn ghế (forward checking).
+    """
+
+    def __init__(self, staff_ids, num_days, shifts, seats, max_shifts_per_week,
+                 busy=(), max_nodes=MAX_SEARCH_NODES, timeout=None):
+        """
+        Args:
+            staff_ids: Danh sách id nhân viên tham gia bài toán con
+            num_days: Số ngày của khoảng lập lịch
+            shifts: Các ca mẫu
+            seats: Danh sách ghế [(day, (shift_idx, ...), new_staff_only)]; new_staff_only
+                yêu cầu người chưa có ca nào trong ngày đó
+            max_shifts_per_week: Số ca tối đa mỗi nhân viên một tuần
+            busy: Các ca đã xếp trước [(staff_id, day, shift_idx)]
+            max_nodes: Giới hạn số nút tìm kiếm
+            timeout: Thời gian tìm kiếm tối đa (giây)
+        """
+        self.staff_ids = list(staff_ids)
+        self.num_days = num_days
+        self.shifts = shifts
+        self.seats = seats
+        self.max_shifts_per_week = max_shifts_per_week
+        self.stats = SolverStats(timeout, max_nodes)
+        self.best_partial = []
+
+        minutes = [shift_minutes(shift) for shift in shifts]
+        self._hours = [(end - start) / 60 for start, end in minutes]
+        self._overlap = [[s1 < e2 and s2 < e1 for s2, e2 in minutes] for s1, e1 in minutes]
+        self._rest_conflict = [[rest_conflict(a, b) for b in shifts] for a in shifts]
+
+        num_staff = len(self.staff_ids)
+        self.day_shifts = [[[] for _ in range(num_days)] for _ in range(num_staff)]
+        self.weekly_count = [[0] * ((num_days + 6) // 7) for _ in range(num_staff)]
+        self.hours = [0.0] * num_staff
+
+        staff_index = {staff_id: i for i, staff_id in enumerate(self.staff_ids)}
+        for staff_id, day, shift_idx in busy:
+            if staff_id in staff_index:
+                self._place(staff_index[staff_id], day, shift_idx)
+
+    def _can_place(self, s, d, k):
+        self.stats.constraint_checks += 1
+        if self.weekly_count[s][d // 7] >= self.max_shifts_per_week:
+            return False
+        for other in self.day_shifts[s][d]:
+            if self._overlap[k][other]:
+                return False
+        if d > 0:
+            for other in self.day_shifts[s][d - 1]:
+                if self._rest_conflict[other][k]:
+                    return False
+        if d + 1 < self.num_days:
+            for other in self.day_shifts[s][d + 1]:
+                if self._rest_conflict[k][other]:
+                    return False
+        return True
+
+    def _place(self, s, d, k):
+        self.day_shifts[s][d].append(k)
+        self.weekly_count[s][d // 7] += 1
+        self.hours[s] += self._hours[k]
+
+    def _unplace(self, s, d, k):
+        self.day_shifts[s][d].remove(k)
+        self.weekly_count[s][d // 7] -= 1
+        self.hours[s] -= self._hours[k]
+
+    def _candidates(self, seat):
+        day, shift_idxs, new_staff_only = seat
+        return [(s, k) for s in range(len(self.staff_ids))
+                if not (new_staff_only and self.day_shifts[s][day])
+                for k in shift_idxs if self._can_place(s, day, k)]
+
+    def _search(self, remaining, assigned):
+        if self.stats.expand(len(assigned)):
+            self.best_partial = list(assigned)
+        if not remaining:
+            return True
+
+        # MRV: chọn ghế có ít ứng viên nhất, dừng sớm khi có ghế không còn ứng viên
+        best_pos, best_candidates = None, None
+        for pos, seat_idx in enumerate(remaining):
+            candidates = self._candidates(self.seats[seat_idx])
+            if best_candidates is None or len(candidates) < len(best_candidates):
+                best_pos, best_candidates = pos, candidates
+                if not candidates:
+                    return False
+
+        seat_idx = remaining.pop(best_pos)
+        day = self.seats[seat_idx][0]
+        # Thử nhân viên ít ca trong tuần và ít giờ làm nhất trước
+        best_candidates.sort(key=lambda c: (self.weekly_count[c[0]][day // 7], self.hours[c[0]], c[0], c[1]))
+        for s, k in best_candidates:
+            self._place(s, day, k)
+            assigned.append((self.staff_ids[s], day, k))
+            if self._search(remaining, assigned):
+                return True
+            assigned.pop()
+            self._unplace(s, day, k)
+            self.stats.backtracks += 1
+
+        remaining.insert(best_pos, seat_idx)
+        return False
+
+    def solve(self, allow_partial=False):
+        """
+        Args:
+            allow_partial: Trả về lời giải một phần sâu nhất khi bị dừng do giới hạn
+
+        Returns:
+            list: Các ca đã xếp [(staff_id, day, shift_idx)], hoặc None nếu không có lời giải
+        """
+        assigned = []
+        self.stats.start()
+        with self.stats.phase("search"):
+            try:
+                found = self._search(list(range(len(self.seats))), assigned)
+            except SearchLimitReached as e:
+                self.stats.status = e.status
+                return list(self.best_partial) if allow_partial else None
+        self.stats.status = STATUS_SOLVED if found else STATUS_INFEASIBLE
+        return assigned if found else None
+
+
+def _solve_subproblem(problem, allow_partial=False):
+    """
+    Giải một bài toán con (hàm cấp module để chạy được trong tiến trình con)
+
+    Returns:
+        tuple: (kết quả của RosterSubproblem.solve, thống kê dạng dict)
+    """
+    solver = RosterSubproblem(**problem)
+    result = solver.solve(allow_partial)
+    return result, solver.stats.to_dict()
+
+
+def _solve_all(problems, parallel, allow_partial):
+    total_seats = sum(len(problem["seats"]) for problem in problems)
+    if parallel and len(problems) > 1 and total_seats >= PARALLEL_MIN_SEATS:
+        try:
+            context = multiprocessing.get_context("spawn")
+            workers = min(len(problems), os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                return list(pool.map(_solve_subproblem, problems, [allow_partial] * len(problems)))
+        except (OSError, RuntimeError, BrokenProcessPool) as e:
+            print(f"Parallel solve error: {e}")
+    return [_solve_subproblem(problem, allow_partial) for problem in problems]
+
+
+def _failure_message(status, subject):
+    if status == STATUS_TIMEOUT:
+        return f"Hết thời gian tìm kiếm trước khi xếp xong {subject}"
+    if status == STATUS_INFEASIBLE:
+        return f"Không thể xếp {subject} thỏa mãn tất cả ràng buộc"
+    return f"Vượt giới hạn số bước tìm kiếm khi xếp {subject}"
+
+
+def solve_roster(staff, weeks=1, shifts=None, min_staff_per_day=2, max_shifts_per_week=5,
+                 coverage_roles=COVERAGE_ROLES, parallel=True, timeout=None,
+                 max_nodes=MAX_SEARCH_NODES, allow_partial=False):
+    """
+    Lập lịch ca cho nhiều tuần với ràng buộc phủ ca theo vai trò
+
+    Args:
+        staff: Danh sách (staff_id, role) của nhân viên đang hoạt động
+        weeks: Số tuần cần xếp lịch
+        shifts: Các ca mẫu (mặc định STANDARD_SHIFTS), min_per_role là số người tối
+            thiểu của mỗi vai trò bắt buộc trong ca
+        min_staff_per_day: Số nhân viên tối thiểu mỗi ngày
+        max_shifts_per_week: Số ca tối đa mỗi nhân viên một tuần
+        coverage_roles: Các vai trò bắt buộc trong mỗi ca
+        parallel: Giải các bài toán con theo vai trò song song
+        timeout: Thời gian tìm kiếm tối đa (giây) cho mỗi bài toán con
+        max_nodes: Số nút tìm kiếm tối đa cho mỗi bài toán con
+        allow_partial: Dùng lời giải một phần khi bài toán con bị dừng do giới hạn
+
+    Returns:
+        tuple: (danh sách ca [(staff_id, day, shift_idx)] hoặc None, thông báo lỗi,
+                thống kê dạng dict với thống kê từng bài toán con trong "subproblems")
+    """
+    shifts = shifts or STANDARD_SHIFTS
+    num_days = 7 * weeks
+    stats = SolverStats(timeout, max_nodes)
+    subproblem_stats = {}
+
+    def finish(slots, message, status):
+        stats.status = status
+        result = stats.to_dict()
+        result["subproblems"] = subproblem_stats
+        return slots, message, result
+
+    # Mỗi vai trò bắt buộc là một bài toán con độc lập
+    problems = []
+    for role in coverage_roles:
+        role_staff = [staff_id for staff_id, staff_role in staff if staff_role == role]
+        seats = [(day, (shift_idx,), False)
+                 for day in range(num_days)
+                 for shift_idx, shift in enumerate(shifts)
+                 for _ in range(shift.get("min_per_role", 0))]
+        if not seats:
+            continue
+        capacity = len(role_staff) * max_shifts_per_week * weeks
+        if len(seats) > capacity:
+            shortfall = -(-len(seats) // (max_shifts_per_week * weeks)) - len(role_staff)
+            return finish(None, (f"Không đủ nhân viên {role}: cần {len(seats)} ca nhưng "
+                                 f"{len(role_staff)} nhân viên chỉ làm tối đa {capacity} ca "
+                                 f"(thiếu ít nhất {shortfall} nhân viên {role})"),
+                          STATUS_INFEASIBLE)
+        problems.append((role, {
+            "staff_ids": role_staff,
+            "num_days": num_days,
+            "shifts": shifts,
+            "seats": seats,
+            "max_shifts_per_week": max_shifts_per_week,
+            "max_nodes": max_nodes,
+            "timeout": timeout
+        }))
+
+    slots = []
+    status = STATUS_SOLVED
+    with stats.phase("roles"):
+        results = _solve_all([problem for _, problem in problems], parallel, allow_partial)
+    for (role, _), (result, result_stats) in zip(problems, results):
+        subproblem_stats[role] = result_stats
+        stats.merge(result_stats)
+        if result_stats["status"] != STATUS_SOLVED:
+            if result is None:
+                return finish(None, _failure_message(result_stats["status"], f"nhân viên {role} cho tất cả các ca"),
+                              result_stats["status"])
+            status = result_stats["status"]
+        slots.extend(result)
+
+    # Bổ sung nhân viên (mọi vai trò) cho những ngày chưa đủ số người tối thiểu
+    staff_per_day = [set() for _ in range(num_days)]
+    for staff_id, day, _ in slots:
+        staff_per_day[day].add(staff_id)
+    all_shift_idxs = tuple(range(len(shifts)))
+    seats = [(day, all_shift_idxs, True)
+             for day in range(num_days)
+             for _ in range(max(0, min_staff_per_day - len(staff_per_day[day])))]
+    if seats:
+        with stats.phase("fill_days"):
+            extra, extra_stats = _solve_subproblem({
+                "staff_ids": [staff_id for staff_id, _ in staff],
+                "num_days": num_days,
+                "shifts": shifts,
+                "seats": seats,
+                "max_shifts_per_week": max_shifts_per_week,
+                "busy": slots,
+                "max_nodes": max_nodes,
+                "timeout": timeout
+            }, allow_partial)
+        subproblem_stats["fill_days"] = extra_stats
+        stats.merge(extra_stats)
+        if extra_stats["status"] != STATUS_SOLVED:
+            if extra is None:
+                return finish(None, _failure_message(extra_stats["status"], "đủ số nhân viên tối thiểu mỗi ngày"),
+                              extra_stats["status"])
+            status = extra_stats["status"]
+        slots.extend(extra)
+
+    message = "" if status == STATUS_SOLVED else _failure_message(status, "toàn bộ lịch") + " (đã dùng lịch một phần)"
+    return finish(slots, message, status)
@@ -0,0 +1,463 @@
+"""
+Shift Schedule Optimizer
+Tối ưu lịch ca làm việc theo nhu cầu dự báo từng giờ và độ cân bằng giờ làm giữa
+các nhân viên: xuất phát từ lời giải CSP rồi cải thiện bằng simulated annealing
+"""
+
+import math
+import random
+import time as timer
+from datetime import timedelta
+
+from app.utils.csp_scheduler import STANDARD_SHIFTS, shift_minutes, rest_conflict, build_shift
+from app.utils.roster_scheduler import solve_roster
+
+# Trọng số hàm mục tiêu (càng nhỏ càng tốt)
+UNDERSTAFF_WEIGHT = 10.0  # mỗi giờ thiếu một nhân viên so với nhu cầu
+OVERSTAFF_WEIGHT = 0.5    # mỗi giờ thừa một nhân viên
+FAIRNESS_WEIGHT = 1.0     # tổng bình phương độ lệch giờ làm so với trung bình
+
+# Thời gian tối đa cho pha tối ưu (giây)
+DEFAULT_TIME_BUDGET = 2.0
+
+# Số đơn một nhân viên phục vụ được trong một giờ, dùng để quy đổi nhu cầu
+ORDERS_PER_STAFF_HOUR = 8
+
+# Các loại bước di chuyển và tỷ lệ chọn
+MOVE_WEIGHTS = [("move", 4), ("transfer", 3), ("swap", 3), ("add", 1), ("drop", 1)]
+
+
+def demand_from_hourly_orders(hourly_orders, days, orders_per_staff_hour=ORDERS_PER_STAFF_HOUR,
+                              min_staff=1, shifts=STANDARD_SHIFTS):
+    """
+    Ước lượng số nhân viên cần có mỗi giờ từ phân bố đơn hàng theo giờ
+    (kết quả của StatsController.get_hourly_distribution)
+
+    Args:
+        hourly_orders: Số đơn theo từng giờ trong ngày (24 phần tử)
+        days: Số ngày dữ liệu dùng để tính hourly_orders
+        orders_per_staff_hour: Số đơn một nhân viên xử lý được mỗi giờ
+        min_staff: Số nhân viên tối thiểu trong giờ mở cửa
+        shifts: Các ca chuẩn, dùng để xác định giờ mở cửa
+
+    Returns:
+        list: Số nhân viên cần có cho từng giờ (24 phần tử)
+    """
+    open_hours = set()
+    for shift in shifts:
+        start, end = shift_minutes(shift)
+        open_hours.update(range(start // 60, (end + 59) // 60))
+
+    demand = []
+    for hour in range(24):
+        if hour not in open_hours:
+            demand.append(0)
+            continue
+        orders_per_day = hourly_orders[hour] / max(days, 1)
+        demand.append(max(min_staff, math.ceil(orders_per_day / orders_per_staff_hour)))
+    return demand
+
+
+class ShiftScheduleOptimizer:
+    """
+    Tối ưu lịch ca trên nhiều ngày liên tiếp (ví dụ một tháng)
+
+    Trạng thái là tập các ô (nhân viên, ngày, ca). Mỗi bước di chuyển chỉ thêm hoặc
+    bớt vài ô, và chi phí được cập nhật tăng dần: độ phủ chỉ tính lại trên các giờ
+    của ca bị thay đổi, độ cân bằng dùng tổng và tổng bình phương giờ làm. Vì vậy
+    mỗi bước có chi phí O(1) theo số nhân viên và số ngày.
+    """
+
+    def __init__(self, staff_ids, start_date, num_days, demand, shifts=STANDARD_SHIFTS,
+                 min_staff_per_day=2, max_shifts_per_week=5, understaff_weight=UNDERSTAFF_WEIGHT,
+                 overstaff_weight=OVERSTAFF_WEIGHT, fairness_weight=FAIRNESS_WEIGHT, seed=None,
+                 staff_roles=None, coverage_roles=()):
+        """
+        Args:
+            staff_ids: Danh sách id nhân viên
+            start_date: Ngày đầu tiên (đầu tuần)
+            num_days: Số ngày cần xếp lịch
+            demand: Nhu cầu nhân viên theo giờ: 24 phần tử (mọi ngày như nhau),
+                7 x 24 (theo thứ trong tuần) hoặc num_days x 24
+            shifts: Các ca chuẩn
+            min_staff_per_day: Số nhân viên tối thiểu mỗi ngày
+            max_shifts_per_week: Số ca tối đa mỗi nhân viên một tuần
+            seed: Hạt giống ngẫu nhiên
+            staff_roles: Vai trò của từng nhân viên (cùng thứ tự với staff_ids)
+            coverage_roles: Các vai trò phải có đủ min_per_role người trong mỗi ca
+        """
+        self.staff_ids = list(staff_ids)
+        self.start_date = start_date
+        self.num_days = num_days
+        self.shifts = shifts
+        self.min_staff_per_day = min_staff_per_day
+        self.max_shifts_per_week = max_shifts_per_week
+        self.understaff_weight = understaff_weight
+        self.overstaff_weight = overstaff_weight
+        self.fairness_weight = fairness_weight
+        self.rng = random.Random(seed)
+        self.demand = self._expand_demand(demand)
+        self.stats = {}
+
+        # Thông tin tính trước cho từng ca
+        minutes = [shift_minutes(shift) for shift in shifts]
+        self._cells = [list(range(start // 60, (end + 59) // 60)) for start, end in minutes]
+        self._hours = [(end - start) / 60 for start, end in minutes]
+        self._overlap = [[s1 < e2 and s2 < e1 for s2, e2 in minutes] for s1, e1 in minutes]
+        # _rest_conflict[a][b]: ca a hôm nay rồi ca b hôm sau không đủ giờ nghỉ
+        self._rest_conflict = [[rest_conflict(a, b) for b in shifts] for a in shifts]
+
+        # Vai trò bắt buộc: _staff_role[s] là chỉ số vai trò (None nếu không bắt buộc)
+        role_index = {role: i for i, role in enumerate(coverage_roles)}
+        self._staff_role = [role_index.get(role) for role in (staff_roles or [None] * len(self.staff_ids))]
+        self._role_required = [shift.get("min_per_role", 0) for shift in shifts]
+        self.role_count = [[[0] * len(coverage_roles) for _ in shifts] for _ in range(num_days)]
+
+        num_staff = len(self.staff_ids)
+        num_weeks = (num_days + 6) // 7
+        self.coverage = [[0] * 24 for _ in range(num_days)]
+        self.day_shifts = [[[] for _ in range(num_days)] for _ in range(num_staff)]
+        self.weekly_count = [[0] * num_weeks for _ in range(num_staff)]
+        self.day_staff = [0] * num_days
+        self.staff_hours = [0.0] * num_staff
+        self.sum_hours = 0.0
+        self.sum_sq_hours = 0.0
+        self.slots = []
+        self.slot_pos = {}
+
+        # Chi phí ban đầu khi chưa có ca nào: thiếu toàn bộ nhu cầu
+        self.coverage_cost = sum(self._cell_cost(need, 0) for day in self.demand for need in day)
+
+    def _expand_demand(self, demand):
+        if demand and not isinstance(demand[0], (list, tuple)):
+            return [list(demand) for _ in range(self.num_days)]
+        if len(demand) == 7 and self.num_days != 7:
+            return [list(demand[(self.start_date + timedelta(days=day)).weekday()])
+                    for day in range(self.num_days)]
+        return [list(day) for day in demand]
+
+    def _cell_cost(self, need, have):
+        if have < need:
+            return self.understaff_weight * (need - have)
+        return self.overstaff_weight * (have - need)
+
+    def _fairness(self):
+        count = len(self.staff_ids)
+        if not count:
+            return 0.0
+        return self.fairness_weight * (self.sum_sq_hours - self.sum_hours * self.sum_hours / count)
+
+    def cost(self):
+        """Giá trị hàm mục tiêu hiện tại"""
+        return self.coverage_cost + self._fairness()
+
+    # ------------------------------------------------------------------ #
+    # Thao tác cơ bản với chi phí tăng dần
+    # ------------------------------------------------------------------ #
+    def _can_place(self, s, d, k):
+        if self.weekly_count[s][d // 7] >= self.max_shifts_per_week:
+            return False
+        for other in self.day_shifts[s][d]:
+            if self._overlap[k][other]:
+                return False
+        if d > 0:
+            for other in self.day_shifts[s][d - 1]:
+                if self._rest_conflict[other][k]:
+                    return False
+        if d + 1 < self.num_days:
+            for other in self.day_shifts[s][d + 1]:
+                if self._rest_conflict[k][other]:
+                    return False
+        return True
+
+    def _change_hours(self, s, hours):
+        old = self.staff_hours[s]
+        new = old + hours
+        before = self._fairness()
+        self.staff_hours[s] = new
+        self.sum_hours += hours
+        self.sum_sq_hours += new * new - old * old
+        return self._fairness() - before
+
+    def _place(self, s, d, k):
+        delta = 0.0
+        demand = self.demand[d]
+        coverage = self.coverage[d]
+        for hour in self._cells[k]:
+            have = coverage[hour]
+            delta += self._cell_cost(demand[hour], have + 1) - self._cell_cost(demand[hour], have)
+            coverage[hour] = have + 1
+        self.coverage_cost += delta
+
+        if not self.day_shifts[s][d]:
+            self.day_staff[d] += 1
+        self.day_shifts[s][d].append(k)
+        role = self._staff_role[s]
+        if role is not None:
+            self.role_count[d][k][role] += 1
+        self.weekly_count[s][d // 7] += 1
+
+        slot = (s, d, k)
+        self.slot_pos[slot] = len(self.slots)
+        self.slots.append(slot)
+        return delta + self._change_hours(s, self._hours[k])
+
+    def _unplace(self, s, d, k):
+        delta = 0.0
+        demand = self.demand[d]
+        coverage = self.coverage[d]
+        for hour in self._cells[k]:
+            have = coverage[hour]
+            delta += self._cell_cost(demand[hour], have - 1) - self._cell_cost(demand[hour], have)
+            coverage[hour] = have - 1
+        self.coverage_cost += delta
+
+        self.day_shifts[s][d].remove(k)
+        if not self.day_shifts[s][d]:
+            self.day_staff[d] -= 1
+        role = self._staff_role[s]
+        if role is not None:
+            self.role_count[d][k][role] -= 1
+        self.weekly_count[s][d // 7] -= 1
+
+        # Xóa O(1): đổi chỗ với phần tử cuối danh sách
+        slot = (s, d, k)
+        pos = self.slot_pos.pop(slot)
+        last = self.slots.pop()
+        if pos < len(self.slots):
+            self.slots[pos] = last
+            self.slot_pos[last] = pos
+        return delta + self._change_hours(s, -self._hours[k])
+
+    def _apply(self, ops):
+        """
+        Thực hiện một chuỗi thao tác ("add"/"remove", s, d, k)
+
+        Returns:
+            float: Thay đổi chi phí, hoặc None nếu vi phạm ràng buộc (đã hoàn tác)
+        """
+        staff_before = {d: self.day_staff[d] for op, _, d, _ in ops if op == "remove"}
+        roles_before = {}
+        for action, s, d, k in ops:
+            role = self._staff_role[s]
+            if action == "remove" and role is not None:
+                roles_before[(d, k, role)] = self.role_count[d][k][role]
+        done = []
+        delta = 0.0
+        for op in ops:
+            action, s, d, k = op
+            if action == "add":
+                if (s, d, k) in self.slot_pos or not self._can_place(s, d, k):
+                    self._revert(done)
+                    return None
+                delta += self._place(s, d, k)
+            else:
+                delta += self._unplace(s, d, k)
+            done.append(op)
+
+        # Không để ngày nào xuống dưới số nhân viên tối thiểu (hoặc tệ hơn trước)
+        for d, before in staff_before.items():
+            if self.day_staff[d] < min(self.min_staff_per_day, before):
+                self._revert(done)
+                return None
+        # Mỗi ca phải giữ đủ người của từng vai trò bắt buộc
+        for (d, k, role), before in roles_before.items():
+            if self.role_count[d][k][role] < min(self._role_required[k], before):
+                self._revert(done)
+                return None
+        return delta
+
+    def _revert(self, ops):
+        for action, s, d, k in reversed(ops):
+            if action == "add":
+                self._unplace(s, d, k)
+            else:
+                self._place(s, d, k)
+
+    def _random_move(self):
+        """Sinh ngẫu nhiên một bước di chuyển dưới dạng chuỗi thao tác"""
+        rng = self.rng
+        kind = rng.choices([name for name, _ in MOVE_WEIGHTS], [w for _, w in MOVE_WEIGHTS])[0]
+        num_staff = len(self.staff_ids)
+
+        if kind == "add" or not self.slots:
+            return [("add", rng.randrange(num_staff), rng.randrange(self.num_days),
+                     rng.randrange(len(self.shifts)))]
+
+        s, d, k = rng.choice(self.slots)
+        if kind == "drop":
+            return [("remove", s, d, k)]
+        if kind == "move":
+            # Dời ca của cùng nhân viên sang ngày/ca khác trong tuần lân cận
+            new_d = min(max(d + rng.randint(-3, 3), 0), self.num_days - 1)
+            new_k = rng.randrange(len(self.shifts))
+            if (new_d, new_k) == (d, k):
+                return None
+            return [("remove", s, d, k), ("add", s, new_d, new_k)]
+        if kind == "transfer":
+            # Giao ca cho nhân viên khác
+            other = rng.randrange(num_staff)
+            if other == s or self._staff_role[other] != self._staff_role[s]:
+                return None
+            return [("remove", s, d, k), ("add", other, d, k)]
+
+        # swap: hai nhân viên đổi ca cho nhau
+        s2, d2, k2 = rng.choice(self.slots)
+        if s2 == s or (d2, k2) == (d, k) or self._staff_role[s2] != self._staff_role[s]:
+            return None
+        return [("remove", s, d, k), ("remove", s2, d2, k2), ("add", s, d2, k2), ("add", s2, d, k)]
+
+    # ------------------------------------------------------------------ #
+    # Khởi tạo và tối ưu
+    # ------------------------------------------------------------------ #
+    def load(self, slots):
+        """
+        Nạp lịch ban đầu [(staff_id, day, shift_idx)]; các ô vi phạm ràng buộc bị bỏ qua
+
+        Returns:
+            int: Số ô đã nạp
+        """
+        staff_index = {staff_id: i for i, staff_id in enumerate(self.staff_ids)}
+        loaded = 0
+        for staff_id, d, k in slots:
+            s = staff_index.get(staff_id)
+            if s is None or not 0 <= d < self.num_days:
+                continue
+            if (s, d, k) not in self.slot_pos and self._can_place(s, d, k):
+                self._place(s, d, k)
+                loaded += 1
+        return loaded
+
+    def _reset(self, slots):
+        for slot in list(self.slots):
+            self._unplace(*slot)
+        for slot in slots:
+            self._place(*slot)
+
+    def optimize(self, time_budget=DEFAULT_TIME_BUDGET, max_iterations=None,
+                 initial_temp=None, final_temp=0.05):
+        """
+        Simulated annealing với nhiệt độ giảm theo thời gian đã dùng
+
+        Args:
+            time_budget: Thời gian tối đa (giây)
+            max_iterations: Số bước tối đa (None: chỉ giới hạn theo thời gian)
+            initial_temp: Nhiệt độ ban đầu (mặc định bằng trọng số thiếu người)
+            final_temp: Nhiệt độ ở cuối ngân sách thời gian
+
+        Returns:
+            float: Chi phí tốt nhất tìm được (trạng thái được đặt về lời giải tốt nhất)
+        """
+        rng = self.rng
+        initial_temp = initial_temp or self.understaff_weight
+        began = timer.perf_counter()
+        deadline = began + time_budget
+
+        current = self.cost()
+        best = current
+        best_slots = list(self.slots)
+        initial_cost = current
+        temp = initial_temp
+        iterations = accepted = 0
+
+        while max_iterations is None or iterations < max_iterations:
+            if iterations % 256 == 0:
+                now = timer.perf_counter()
+                if now >= deadline:
+                    break
+                progress = (now - began) / time_budget if time_budget > 0 else 1.0
+                temp = initial_temp * (final_temp / initial_temp) ** progress
+            iterations += 1
+
+            ops = self._random_move()
+            if not ops:
+                continue
+            delta = self._apply(ops)
+            if delta is None:
+                continue
+
+            if delta <= 0 or rng.random() < math.exp(-delta / temp):
+                accepted += 1
+                current += delta
+                if current < best - 1e-9:
+                    best = current
+                    best_slots = list(self.slots)
+            else:
+                self._revert(ops)
+
+        self._reset(best_slots)
+        self.stats = {
+            "iterations": iterations,
+            "accepted": accepted,
+            "initial_cost": initial_cost,
+            "best_cost": best,
+            "elapsed": timer.perf_counter() - began
+        }
+        return best
+
+    def summary(self):
+        """Các chỉ số của lịch hiện tại"""
+        understaffed = sum(max(0, need - have)
+                           for demand, coverage in zip(self.demand, self.coverage)
+                           for need, have in zip(demand, coverage))
+        hours = self.staff_hours or [0.0]
+        return {
+            "shifts": len(self.slots),
+            "understaffed_hours": understaffed,
+            "min_staff_hours": min(hours),
+            "max_staff_hours": max(hours),
+            "cost": self.cost()
+        }
+
+    def to_shifts(self):
+        """
+        Chuyển lịch hiện tại thành danh sách ca theo định dạng của StaffShiftCSP.generate_shifts
+        """
+        return [build_shift(self.staff_ids[s], self.start_date + timedelta(days=d), self.shifts[k])
+                for s, d, k in sorted(self.slots, key=lambda slot: (slot[1], slot[2], slot[0]))]
+
+
+def optimize_shifts(staff_list, start_date, demand, weeks=1, min_staff_per_day=2,
+                    max_shifts_per_week=5, time_budget=DEFAULT_TIME_BUDGET, seed=None,
+                    shifts=STANDARD_SHIFTS, initial_slots=None, coverage_roles=()):
+    """
+    Tối ưu lịch trên toàn bộ khoảng thời gian, xuất phát từ initial_slots hoặc
+    từ lời giải của solve_roster
+
+    Args:
+        staff_list: Danh sách nhân viên
+        start_date: Ngày bắt đầu (đầu tuần)
+        demand: Nhu cầu nhân viên theo giờ (xem ShiftScheduleOptimizer)
+        weeks: Số tuần cần xếp lịch
+        min_staff_per_day: Số nhân viên tối thiểu mỗi ngày
+        max_shifts_per_week: Số ca tối đa mỗi nhân viên một tuần
+        time_budget: Thời gian tối đa cho pha tối ưu (giây)
+        seed: Hạt giống ngẫu nhiên
+        shifts: Các ca mẫu
+        initial_slots: Lịch khởi đầu [(staff_id, day, shift_idx)], ví dụ từ solve_roster
+        coverage_roles: Các vai trò bắt buộc trong mỗi ca (xem ShiftScheduleOptimizer)
+
+    Returns:
+        tuple: (danh sách ca làm việc, các chỉ số của lịch)
+    """
+    optimizer = ShiftScheduleOptimizer(
+        [staff.id for staff in staff_list], start_date, weeks * 7, demand, shifts=shifts,
+        min_staff_per_day=min_staff_per_day, max_shifts_per_week=max_shifts_per_week, seed=seed,
+        staff_roles=[getattr(staff, "role", None) for staff in staff_list], coverage_roles=coverage_roles
+    )
+
+    if initial_slots is None:
+        # Lời giải khởi đầu: solve_roster có độ sâu tìm kiếm bằng số ca cần phủ (không phải số
+        # biến nhân viên x ngày x ca như StaffShiftCSP) nên dùng được cho nhiều tuần, nhiều nhân viên
+        # (không giải được thì để trống cho pha tối ưu)
+        initial_slots, _, _ = solve_roster(
+            [(staff.id, getattr(staff, "role", None)) for staff in staff_list], weeks, shifts,
+            min_staff_per_day, max_shifts_per_week, coverage_roles, allow_partial=True
+        )
+        initial_slots = initial_slots or []
+    optimizer.load(initial_slots)
+
+    optimizer.optimize(time_budget)
+    summary = optimizer.summary()
+    summary.update(optimizer.stats)
+    return optimizer.to_shifts(), summary
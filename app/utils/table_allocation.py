@@ -0,0 +1,75 @@
+"""
+Table Allocation
+Xếp bàn cho khách đặt trước theo độ vừa sức chứa và thời gian ngồi dự kiến
+"""
+
+from datetime import timedelta
+
+# Thời gian ngồi mặc định khi chưa có dữ liệu lịch sử (phút), trùng với Reservation.duration
+DEFAULT_DWELL_MINUTES = 60
+
+
+def rank_tables(tables, index, num_guests, start, end):
+    """
+    Xếp hạng các bàn còn trống trong [start, end) cho một nhóm khách
+
+    Tiêu chí: ít ghế thừa nhất, sau đó là khoảng trống ngắn nhất tới lượt đặt kế
+    tiếp (để các khoảng trống còn lại đủ dài cho nhóm khác).
+
+    Args:
+        tables: Danh sách bàn [{'id': id, 'capacity': capacity, ...}]
+        index: KeyedIntervalIndex các lượt đặt theo table_id
+        num_guests: Số khách
+        start, end: Khoảng thời gian cần bàn
+
+    Returns:
+        list: Các bàn phù hợp theo thứ tự ưu tiên
+    """
+    candidates = []
+    for table in tables:
+        capacity = table["capacity"] or 0
+        if capacity < num_guests:
+            continue
+        if index.overlaps(table["id"], start, end):
+            continue
+
+        next_start = index.next_start(table["id"], end)
+        idle_after = (next_start - end) if next_start is not None else timedelta.max
+        candidates.append(((capacity - num_guests, idle_after, table["id"]), table))
+
+    candidates.sort(key=lambda candidate: candidate[0])
+    return [table for _, table in candidates]
+
+
+def allocate_parties(tables, index, parties, predict_dwell=None):
+    """
+    Xếp bàn cho nhiều nhóm khách cùng lúc (tham lam, nhóm đông xếp trước)
+
+    Args:
+        tables: Danh sách bàn [{'id': id, 'capacity': capacity}]
+        index: KeyedIntervalIndex các lượt đặt hiện có; các lượt xếp được sẽ được thêm vào
+        parties: Danh sách [{'num_guests': n, 'start': datetime, 'duration': phút (tùy chọn)}]
+        predict_dwell: Hàm (num_guests) -> số phút dự kiến, dùng khi không có duration
+
+    Returns:
+        list: table_id được xếp cho từng nhóm theo thứ tự đầu vào (None nếu hết bàn)
+    """
+    assignments = [None] * len(parties)
+    order = sorted(range(len(parties)),
+                   key=lambda i: (-parties[i]["num_guests"], parties[i]["start"]))
+
+    for i in order:
+        party = parties[i]
+        duration = party.get("duration")
+        if not duration:
+            duration = predict_dwell(party["num_guests"]) if predict_dwell else DEFAULT_DWELL_MINUTES
+        start = party["start"]
+        end = start + timedelta(minutes=duration)
+
+        ranked = rank_tables(tables, index, party["num_guests"], start, end)
+        if ranked:
+            table_id = ranked[0]["id"]
+            index.add(table_id, start, end, ("plan", i))
+            assignments[i] = table_id
+
+    return assignments
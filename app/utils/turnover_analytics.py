@@ -0,0 +1,149 @@
+"""
+Turnover Analytics
+Tính toán thời gian ngồi (dwell time), số lượt quay bàn và doanh thu trên mỗi
+ghế-giờ bằng các phép toán vector hóa của NumPy/pandas
+"""
+
+import numpy as np
+import pandas as pd
+
+# Giờ mở cửa mỗi ngày (8h - 22h), dùng để tính số ghế-giờ khả dụng
+OPENING_HOURS = 14
+
+# Ngưỡng phân nhóm thời gian ngồi (phút) và tên cột tương ứng trong bảng tổng hợp
+DWELL_BUCKET_EDGES = [0, 30, 60, 90, np.inf]
+DWELL_BUCKET_COLUMNS = ["dwell_under_30", "dwell_30_60", "dwell_60_90", "dwell_over_90"]
+
+
+def compute_dwell_minutes(start_times, end_times):
+    """
+    Tính thời gian ngồi (phút) cho từng lượt khách
+
+    Args:
+        start_times: Mảng thời điểm vào bàn (order_time)
+        end_times: Mảng thời điểm rời bàn (paid_at), có thể chứa NaT
+
+    Returns:
+        np.ndarray: Thời gian ngồi theo phút, NaN nếu không xác định được
+    """
+    start = pd.to_datetime(pd.Series(start_times)).to_numpy(dtype="datetime64[ns]")
+    end = pd.to_datetime(pd.Series(end_times)).to_numpy(dtype="datetime64[ns]")
+    minutes = (end - start) / np.timedelta64(1, "m")
+    minutes = minutes.astype(float)
+    minutes[minutes < 0] = np.nan
+    return minutes
+
+
+def summarize_turns(visits):
+    """
+    Gom các lượt khách thành bảng tổng hợp theo (ngày, bàn)
+
+    Args:
+        visits: DataFrame với các cột table_id, order_time, paid_at, revenue
+
+    Returns:
+        DataFrame: Các cột day, table_id, turns, dwell_minutes, revenue và
+        số lượt theo từng nhóm thời gian ngồi (DWELL_BUCKET_COLUMNS)
+    """
+    columns = ["day", "table_id", "turns", "dwell_minutes", "revenue"] + DWELL_BUCKET_COLUMNS
+    if visits.empty:
+        return pd.DataFrame(columns=columns)
+
+    frame = pd.DataFrame({
+        "day": pd.to_datetime(visits["order_time"]).dt.date,
+        "table_id": visits["table_id"].to_numpy(),
+        "dwell": compute_dwell_minutes(visits["order_time"], visits["paid_at"]),
+        "revenue": visits["revenue"].fillna(0).to_numpy(dtype=float),
+    })
+
+    # Đánh dấu nhóm thời gian ngồi bằng one-hot để cộng dồn theo group
+    bucket = np.digitize(frame["dwell"].fillna(-1).to_numpy(), DWELL_BUCKET_EDGES[1:-1])
+    known = frame["dwell"].notna().to_numpy()
+    for idx, column in enumerate(DWELL_BUCKET_COLUMNS):
+        frame[column] = ((bucket == idx) & known).astype(int)
+
+    summary = frame.groupby(["day", "table_id"], sort=True).agg(
+        turns=("revenue", "size"),
+        dwell_minutes=("dwell", "sum"),
+        revenue=("revenue", "sum"),
+        **{column: (column, "sum") for column in DWELL_BUCKET_COLUMNS}
+    ).reset_index()
+
+    return summary[columns]
+
+
+def section_report(summary, tables, days, opening_hours=OPENING_HOURS):
+    """
+    Báo cáo hiệu quả theo khu vực và sức chứa của bàn
+
+    Args:
+        summary: DataFrame tổng hợp theo (ngày, bàn) như summarize_turns trả về
+        tables: DataFrame danh sách bàn với các cột table_id, location, capacity
+        days: Số ngày trong khoảng báo cáo
+        opening_hours: Số giờ mở cửa mỗi ngày
+
+    Returns:
+        DataFrame: Mỗi dòng là một (location, capacity) với số bàn, số lượt quay
+        bàn mỗi bàn mỗi ngày, thời gian ngồi trung bình, tỷ lệ lấp đầy và doanh
+        thu trên mỗi ghế-giờ; sắp xếp từ khu vực chậm nhất
+    """
+    columns = ["location", "capacity", "tables", "turns", "turns_per_table_day",
+               "avg_dwell_minutes", "occupancy", "revenue", "revenue_per_seat_hour"] + DWELL_BUCKET_COLUMNS
+    if tables.empty:
+        return pd.DataFrame(columns=columns)
+
+    days = max(int(days), 1)
+    per_table = summary.groupby("table_id").agg(
+        turns=("turns", "sum"),
+        dwell_minutes=("dwell_minutes", "sum"),
+        revenue=("revenue", "sum"),
+        **{column: (column, "sum") for column in DWELL_BUCKET_COLUMNS}
+    ) if not summary.empty else pd.DataFrame(
+        columns=["turns", "dwell_minutes", "revenue"] + DWELL_BUCKET_COLUMNS
+    )
+
+    # Bàn không có khách vẫn được tính vào số ghế-giờ khả dụng
+    merged = tables.set_index("table_id").join(per_table, how="left").fillna(
+        {column: 0 for column in ["turns", "dwell_minutes", "revenue"] + DWELL_BUCKET_COLUMNS}
+    )
+    merged["location"] = merged["location"].fillna("Khác")
+    merged["seat_hours"] = merged["capacity"].astype(float) * opening_hours * days
+
+    report = merged.groupby(["location", "capacity"]).agg(
+        tables=("seat_hours", "size"),
+        turns=("turns", "sum"),
+        dwell_minutes=("dwell_minutes", "sum"),
+        revenue=("revenue", "sum"),
+        seat_hours=("seat_hours", "sum"),
+        **{column: (column, "sum") for column in DWELL_BUCKET_COLUMNS}
+    ).reset_index()
+
+    turns = report["turns"].to_numpy(dtype=float)
+    dwell_counts = report[DWELL_BUCKET_COLUMNS].sum(axis=1).to_numpy(dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        report["turns_per_table_day"] = turns / (report["tables"].to_numpy(dtype=float) * days)
+        report["avg_dwell_minutes"] = np.where(dwell_counts > 0,
+                                               report["dwell_minutes"].to_numpy(dtype=float) / dwell_counts,
+                                               0.0)
+        report["occupancy"] = (report["dwell_minutes"].to_numpy(dtype=float) / 60) / (
+            report["seat_hours"].to_numpy(dtype=float) / report["capacity"].to_numpy(dtype=float))
+        report["revenue_per_seat_hour"] = report["revenue"].to_numpy(dtype=float) / report["seat_hours"].to_numpy(dtype=float)
+    report = report.replace([np.inf, -np.inf], 0).fillna(0)
+
+    return report.sort_values("revenue_per_seat_hour")[columns].reset_index(drop=True)
+
+
+def dwell_distribution(summary, tables, by="location"):
+    """
+    Phân bố thời gian ngồi theo nhóm (khu vực hoặc sức chứa) từ bảng tổng hợp
+
+    Returns:
+        DataFrame: Tỷ lệ lượt khách trong từng nhóm thời gian ngồi
+    """
+    if summary.empty or tables.empty:
+        return pd.DataFrame(columns=[by] + DWELL_BUCKET_COLUMNS)
+
+    merged = summary.merge(tables[["table_id", by]], on="table_id", how="left")
+    counts = merged.groupby(by)[DWELL_BUCKET_COLUMNS].sum()
+    totals = counts.sum(axis=1).replace(0, np.nan)
+    return counts.div(totals, axis=0).fillna(0).reset_index()
@@ -6,9 +6,8 @@ from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
 from PyQt5.QtCore import Qt, QSize, QTimer, QDateTime
 from PyQt5.QtGui import QIcon, QFont, QColor, QBrush
 
-from app.controllers.order_controller import OrderController
+from app.service.client import OrderController, InventoryController
 from app.controllers.staff_controller import StaffController
-from app.controllers.inventory_controller import InventoryController
 
 class OrderItemWidget(QWidget):
     def __init__(self, order_item, parent=None):
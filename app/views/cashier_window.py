@@ -1,21 +1,22 @@
 from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                              QTabWidget, QPushButton, QLabel, QStatusBar, QAction, 
                              QMessageBox, QFrame, QToolButton, QSplitter, QTableWidget,
-                             QTableWidgetItem, QHeaderView)
+                             QTableWidgetItem, QHeaderView, QTableView, QAbstractItemView)
 from PyQt5.QtCore import Qt, QSize, QDateTime
 from PyQt5.QtGui import QIcon, QFont, QColor
 
 from app.views.table_view import TableView
 from app.views.order_view import OrderView
-from app.controllers.order_controller import OrderController
+from app.views.paged_table_model import PagedTableModel, PagedColumn
+from app.service.client import OrderController
 from app.controllers.staff_controller import StaffController
+from app.models.status import OrderStatus, ACTIVE_ORDER_STATUSES, status_label
 
 class CashierWindow(QMainWindow):
     def __init__(self, current_staff=None):
         super().__init__()
         
         self.current_staff = current_staff
-        self.active_orders = []
         
         self.setWindowTitle("Thu Ngân - Quản lý Quán Cafe")
         self.setMinimumSize(1200, 800)
@@ -128,12 +129,24 @@ class CashierWindow(QMainWindow):
         orders_header = QLabel("ĐƠN HÀNG ĐANG XỬ LÝ")
         orders_header.setFont(QFont("Arial", 12, QFont.Bold))
         
-        self.orders_table = QTableWidget()
-        self.orders_table.setColumnCount(5)
-        self.orders_table.setHorizontalHeaderLabels(["ID", "Bàn", "Thời gian", "Trạng thái", "Tổng tiền"])
+        # Bảng ảo: chỉ tải thêm đơn hàng khi cuộn tới cuối
+        self.orders_model = PagedTableModel([
+            PagedColumn("ID", lambda o: str(o.id)),
+            PagedColumn("Bàn", lambda o: o.table_name or "Không xác định"),
+            PagedColumn("Thời gian", lambda o: o.order_time.strftime("%H:%M - %d/%m/%Y") if o.order_time else "Không xác định"),
+            PagedColumn("Trạng thái", lambda o: status_label(o.status),
+                        foreground=lambda o: "#FF9800" if o.status == OrderStatus.SERVING else None),
+            PagedColumn("Tổng tiền", lambda o: f"{o.total_amount:,.0f} VNĐ" if o.total_amount else "0 VNĐ"),
+        ], lambda before_id, limit: OrderController.get_orders_page(
+            before_id, limit, statuses=ACTIVE_ORDER_STATUSES
+        ))
+
+        self.orders_table = QTableView()
+        self.orders_table.setModel(self.orders_model)
         self.orders_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        self.orders_table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.orders_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.orders_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.orders_table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.orders_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.orders_table.doubleClicked.connect(self.view_order_details)
         
         refresh_btn = QPushButton("Làm mới")
@@ -195,51 +208,26 @@ class CashierWindow(QMainWindow):
         help_menu.addAction(about_action)
     
     def load_active_orders(self):
-        # Xóa dữ liệu hiện tại
-        self.orders_table.setRowCount(0)
-        
-        # Lấy các đơn hàng đang hoạt động (đang phục vụ, chưa thanh toán)
-        self.active_orders = OrderController.get_active_orders()
-        
-        # Hiển thị lên bảng
-        for row, order in enumerate(self.active_orders):
-            self.orders_table.insertRow(row)
-            
-            # ID
-            id_item = QTableWidgetItem(str(order.id))
-            self.orders_table.setItem(row, 0, id_item)
-            
-            # Bàn
-            table_name = order.table.name if order.table else "Không xác định"
-            table_item = QTableWidgetItem(table_name)
-            self.orders_table.setItem(row, 1, table_item)
-            
-            # Thời gian
-            time_str = order.created_at.strftime("%H:%M - %d/%m/%Y") if order.created_at else "Không xác định"
-            time_item = QTableWidgetItem(time_str)
-            self.orders_table.setItem(row, 2, time_item)
-            
-            # Trạng thái
-            status_item = QTableWidgetItem(order.status)
-            if order.status == "đang phục vụ":
-                status_item.setForeground(QColor("#FF9800"))
-            elif order.status == "hoàn thành":
-                status_item.setForeground(QColor("#4CAF50"))
-            self.orders_table.setItem(row, 3, status_item)
-            
-            # Tổng tiền
-            total_item = QTableWidgetItem(f"{order.total_amount:,.0f} VNĐ" if order.total_amount else "0 VNĐ")
-            self.orders_table.setItem(row, 4, total_item)
+        # Tải lại trang đầu của các đơn hàng đang hoạt động (đang phục vụ, chưa thanh toán)
+        self.orders_model.reload()
         
         # Cập nhật trạng thái
-        self.status_bar.showMessage(f"Đang có {len(self.active_orders)} đơn hàng đang xử lý")
+        count = OrderController.count_orders(ACTIVE_ORDER_STATUSES)
+        self.status_bar.showMessage(f"Đang có {count} đơn hàng đang xử lý")
+    
+    def selected_order_id(self):
+        """ID đơn hàng đang chọn trong bảng (None nếu chưa chọn)"""
+        rows = self.orders_table.selectionModel().selectedRows()
+        if not rows:
+            return None
+        order = self.orders_model.row_at(rows[0].row())
+        return order.id if order else None
     
     def view_order_details(self, index):
-        row = index.row()
-        order_id = int(self.orders_table.item(row, 0).text())
+        row = self.orders_model.row_at(index.row())
         
-        # Tìm đơn hàng trong danh sách
-        order = next((o for o in self.active_orders if o.id == order_id), None)
+        # Tải chi tiết đơn hàng khi cần
+        order = OrderController.get_order(row.id) if row else None
         
         if order:
             # Xóa widget chi tiết hiện tại
@@ -263,8 +251,8 @@ class CashierWindow(QMainWindow):
             order_info_layout.addWidget(QLabel(f"<b>Mã đơn:</b> #{order.id}"))
             order_info_layout.addWidget(QLabel(f"<b>Bàn:</b> {order.table.name if order.table else 'Không xác định'}"))
             order_info_layout.addWidget(QLabel(f"<b>Nhân viên:</b> {order.staff.name if order.staff else 'Không xác định'}"))
-            order_info_layout.addWidget(QLabel(f"<b>Thời gian:</b> {order.created_at.strftime('%H:%M - %d/%m/%Y') if order.created_at else 'Không xác định'}"))
-            order_info_layout.addWidget(QLabel(f"<b>Trạng thái:</b> {order.status}"))
+            order_info_layout.addWidget(QLabel(f"<b>Thời gian:</b> {order.order_time.strftime('%H:%M - %d/%m/%Y') if order.order_time else 'Không xác định'}"))
+            order_info_layout.addWidget(QLabel(f"<b>Trạng thái:</b> {status_label(order.status)}"))
             
             self.detail_layout.addWidget(order_frame)
             
@@ -291,12 +279,12 @@ class CashierWindow(QMainWindow):
                     items_table.setItem(row, 1, quantity_item)
                     
                     # Đơn giá
-                    price = item.menu_item.price if item.menu_item else 0
+                    price = item.unit_price or 0
                     price_item = QTableWidgetItem(f"{price:,.0f} VNĐ")
                     items_table.setItem(row, 2, price_item)
                     
                     # Thành tiền
-                    subtotal = price * item.quantity
+                    subtotal = item.line_total or price * item.quantity
                     subtotal_item = QTableWidgetItem(f"{subtotal:,.0f} VNĐ")
                     items_table.setItem(row, 3, subtotal_item)
             else:
@@ -351,9 +339,8 @@ class CashierWindow(QMainWindow):
         self.table_view.destroyed.connect(self.load_active_orders)
     
     def process_payment(self, order_id=None):
-        if not order_id and self.orders_table.selectedItems():
-            row = self.orders_table.currentRow()
-            order_id = int(self.orders_table.item(row, 0).text())
+        if not order_id:
+            order_id = self.selected_order_id()
         
         if order_id:
             # TODO: Tạo dialog thu tiền và xử lý thanh toán
@@ -367,9 +354,8 @@ class CashierWindow(QMainWindow):
             QMessageBox.warning(self, "Chưa chọn đơn", "Vui lòng chọn một đơn hàng để thanh toán")
     
     def print_receipt(self, order_id=None):
-        if not order_id and self.orders_table.selectedItems():
-            row = self.orders_table.currentRow()
-            order_id = int(self.orders_table.item(row, 0).text())
+        if not order_id:
+            order_id = self.selected_order_id()
         
         if order_id:
             # TODO: Tạo và in hóa đơn
@@ -1,12 +1,22 @@
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QTableWidget, 
                              QTableWidgetItem, QPushButton, QLabel, QHeaderView,
                              QMessageBox, QDialog, QLineEdit, QFormLayout, QComboBox,
-                             QDoubleSpinBox, QSpinBox, QGroupBox, QTabWidget, QCheckBox)
+                             QDoubleSpinBox, QSpinBox, QGroupBox, QTabWidget, QCheckBox,
+                             QTableView, QAbstractItemView)
 from PyQt5.QtCore import Qt, QDateTime
 from PyQt5.QtGui import QIcon, QColor, QFont, QBrush
 
-from app.controllers.inventory_controller import InventoryController
-from app.controllers.menu_controller import MenuController
+from app.service.client import MenuController, InventoryController
+from app.views.paged_table_model import PagedTableModel, PagedColumn
+from app.database.concurrency import Conflict
+
+def stock_status(item):
+    """Trạng thái tồn kho và màu hiển thị của một nguyên liệu"""
+    if item.quantity <= 0:
+        return "Hết hàng", "#f44336"  # Đỏ
+    if item.quantity <= item.min_quantity:
+        return "Sắp hết", "#FFC107"  # Vàng
+    return "Đủ hàng", "#4CAF50"  # Xanh lá
 
 class AddEditInventoryDialog(QDialog):
     def __init__(self, parent=None, inventory_item=None):
@@ -95,14 +105,20 @@ class AddEditInventoryDialog(QDialog):
             )
         else:
             # Cập nhật
-            InventoryController.update_inventory_item(
+            result = InventoryController.update_inventory_item(
                 self.inventory_item.id,
                 name=name,
                 quantity=quantity,
                 unit=unit,
                 supplier=supplier if supplier else None,
-                min_quantity=min_quantity
+                min_quantity=min_quantity,
+                expected_version=self.inventory_item.version
             )
+            if isinstance(result, Conflict):
+                QMessageBox.warning(self, "Dữ liệu đã thay đổi",
+                                    f"{result.message}\nVui lòng tải lại kho rồi sửa lại.")
+                self.reject()
+                return
         
         self.accept()
 
@@ -145,11 +161,25 @@ class InventoryView(QWidget):
         inventory_layout.addLayout(header_layout)
         
         # Bảng hiển thị kho
-        self.inventory_table = QTableWidget()
-        self.inventory_table.setColumnCount(7)
-        self.inventory_table.setHorizontalHeaderLabels(["ID", "Tên nguyên liệu", "Số lượng", "Đơn vị", "Nhà cung cấp", "Cập nhật lần cuối", "Trạng thái"])
+        # Bảng ảo: chỉ tải thêm nguyên liệu khi cuộn tới cuối
+        self.inventory_model = PagedTableModel([
+            PagedColumn("ID", lambda item: str(item.id)),
+            PagedColumn("Tên nguyên liệu", lambda item: item.name),
+            PagedColumn("Số lượng", lambda item: f"{item.quantity:.2f}"),
+            PagedColumn("Đơn vị", lambda item: item.unit),
+            PagedColumn("Nhà cung cấp", lambda item: item.supplier or ""),
+            PagedColumn("Cập nhật lần cuối",
+                        lambda item: item.last_update.strftime("%d/%m/%Y %H:%M") if item.last_update else ""),
+            PagedColumn("Trạng thái", lambda item: stock_status(item)[0],
+                        foreground=lambda item: stock_status(item)[1], alignment=Qt.AlignCenter),
+        ], InventoryController.get_inventory_page)
+
+        self.inventory_table = QTableView()
+        self.inventory_table.setModel(self.inventory_model)
         self.inventory_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        self.inventory_table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.inventory_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.inventory_table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.inventory_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
         
         # Context menu hoặc các nút điều khiển
         button_layout = QHBoxLayout()
@@ -286,54 +316,13 @@ class InventoryView(QWidget):
         self.load_menu_items()
     
     def load_inventory(self):
-        """Tải dữ liệu kho hàng vào bảng"""
-        self.inventory_table.setRowCount(0)
-        
-        inventory_items = InventoryController.get_all_inventory_items()
-        
-        for row, item in enumerate(inventory_items):
-            self.inventory_table.insertRow(row)
-            
-            # ID
-            id_item = QTableWidgetItem(str(item.id))
-            self.inventory_table.setItem(row, 0, id_item)
-            
-            # Tên
-            name_item = QTableWidgetItem(item.name)
-            self.inventory_table.setItem(row, 1, name_item)
-            
-            # Số lượng
-            quantity_item = QTableWidgetItem(f"{item.quantity:.2f}")
-            self.inventory_table.setItem(row, 2, quantity_item)
-            
-            # Đơn vị
-            unit_item = QTableWidgetItem(item.unit)
-            self.inventory_table.setItem(row, 3, unit_item)
-            
-            # Nhà cung cấp
-            supplier_item = QTableWidgetItem(item.supplier if item.supplier else "")
-            self.inventory_table.setItem(row, 4, supplier_item)
-            
-            # Thời gian cập nhật
-            last_update = item.last_update.strftime("%d/%m/%Y %H:%M") if item.last_update else ""
-            update_item = QTableWidgetItem(last_update)
-            self.inventory_table.setItem(row, 5, update_item)
-            
-            # Trạng thái
-            status_text = "Đủ hàng"
-            status_color = QColor("#4CAF50")  # Xanh lá
-            
-            if item.quantity <= 0:
-                status_text = "Hết hàng"
-                status_color = QColor("#f44336")  # Đỏ
-            elif item.quantity <= item.min_quantity:
-                status_text = "Sắp hết"
-                status_color = QColor("#FFC107")  # Vàng
-            
-            status_item = QTableWidgetItem(status_text)
-            status_item.setForeground(QBrush(status_color))
-            status_item.setTextAlignment(Qt.AlignCenter)
-            self.inventory_table.setItem(row, 6, status_item)
+        """Tải lại trang đầu của dữ liệu kho hàng vào bảng"""
+        self.inventory_model.reload()
+    
+    def selected_inventory(self):
+        """Nguyên liệu đang chọn trong bảng (None nếu chưa chọn)"""
+        rows = self.inventory_table.selectionModel().selectedRows()
+        return self.inventory_model.row_at(rows[0].row()) if rows else None
     
     def add_inventory(self):
         """Mở dialog thêm nguyên liệu mới"""
@@ -343,12 +332,12 @@ class InventoryView(QWidget):
     
     def edit_inventory(self):
         """Chỉnh sửa nguyên liệu đã chọn"""
-        selected_row = self.inventory_table.currentRow()
-        if selected_row < 0:
+        selected = self.selected_inventory()
+        if not selected:
             QMessageBox.warning(self, "Cảnh báo", "Vui lòng chọn một nguyên liệu để chỉnh sửa")
             return
         
-        inventory_id = int(self.inventory_table.item(selected_row, 0).text())
+        inventory_id = selected.id
         inventory_item = InventoryController.get_inventory_item(inventory_id)
         
         if not inventory_item:
@@ -361,12 +350,12 @@ class InventoryView(QWidget):
     
     def delete_inventory(self):
         """Xóa nguyên liệu đã chọn"""
-        selected_row = self.inventory_table.currentRow()
-        if selected_row < 0:
+        selected = self.selected_inventory()
+        if not selected:
             QMessageBox.warning(self, "Cảnh báo", "Vui lòng chọn một nguyên liệu để xóa")
             return
         
-        inventory_id = int(self.inventory_table.item(selected_row, 0).text())
+        inventory_id = selected.id
         
         reply = QMessageBox.question(self, "Xác nhận xóa", 
                                      "Bạn có chắc chắn muốn xóa nguyên liệu này?",
@@ -382,13 +371,13 @@ class InventoryView(QWidget):
     
     def update_quantity(self):
         """Cập nhật số lượng nguyên liệu"""
-        selected_row = self.inventory_table.currentRow()
-        if selected_row < 0:
+        selected = self.selected_inventory()
+        if not selected:
             QMessageBox.warning(self, "Cảnh báo", "Vui lòng chọn một nguyên liệu để cập nhật")
             return
         
-        inventory_id = int(self.inventory_table.item(selected_row, 0).text())
-        current_quantity = float(self.inventory_table.item(selected_row, 2).text())
+        inventory_id = selected.id
+        current_quantity = selected.quantity
         
         dialog = QDialog(self)
         dialog.setWindowTitle("Cập nhật số lượng")
@@ -419,9 +408,15 @@ class InventoryView(QWidget):
         
         if dialog.exec_() == QDialog.Accepted:
             new_quantity = quantity_input.value()
-            if InventoryController.update_inventory_quantity(inventory_id, new_quantity):
+            result = InventoryController.update_inventory_quantity(inventory_id, new_quantity,
+                                                                   expected_version=selected.version)
+            if result:
                 self.load_inventory()
                 QMessageBox.information(self, "Thành công", "Đã cập nhật số lượng")
+            elif isinstance(result, Conflict):
+                self.load_inventory()
+                QMessageBox.warning(self, "Dữ liệu đã thay đổi",
+                                    f"{result.message}\nSố lượng hiện tại đã được tải lại.")
             else:
                 QMessageBox.warning(self, "Lỗi", "Không thể cập nhật số lượng")
     
@@ -1,9 +1,22 @@
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, 
                              QLineEdit, QPushButton, QMessageBox, QFrame)
-from PyQt5.QtCore import Qt, QSize
+from PyQt5.QtCore import Qt, QSize, QThread, pyqtSignal
 from PyQt5.QtGui import QIcon, QFont, QPixmap
 
 from app.controllers.staff_controller import StaffController
+from app.controllers.warmup import warm_up
+
+# Thời gian tối đa chờ khởi động nóng xong khi bấm đăng nhập (ms)
+WARMUP_WAIT_MS = 3000
+
+class WarmupWorker(QThread):
+    """Khởi động nóng (mapper, pool, truy vấn nóng, dữ liệu tham chiếu) trong lúc chờ đăng nhập"""
+    
+    warmup_finished = pyqtSignal(dict)
+    
+    def run(self):
+        self.warmup_finished.emit(warm_up())
+
 
 class LoginView(QWidget):
     def __init__(self):
@@ -14,6 +27,9 @@ class LoginView(QWidget):
         self.setWindowFlags(Qt.Window | Qt.WindowCloseButtonHint)
         
         self.setup_ui()
+        
+        self.warmup_worker = WarmupWorker(self)
+        self.warmup_worker.start()
     
     def setup_ui(self):
         main_layout = QVBoxLayout(self)
@@ -130,6 +146,10 @@ class LoginView(QWidget):
             QMessageBox.warning(self, "Lỗi đăng nhập", "Vui lòng nhập đầy đủ tên đăng nhập và mật khẩu")
             return
         
+        # Màn hình sau đăng nhập dùng dữ liệu đã nạp sẵn; nếu chưa xong thì chờ thay vì truy vấn lại
+        if self.warmup_worker.isRunning():
+            self.warmup_worker.wait(WARMUP_WAIT_MS)
+        
         # Authenticate
         staff = StaffController.authenticate(username, password)
         
@@ -1,7 +1,7 @@
 from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                              QTabWidget, QPushButton, QLabel, QStatusBar, QAction, 
                              QMessageBox, QMenu)
-from PyQt5.QtCore import Qt, QSize
+from PyQt5.QtCore import Qt, QSize, QThread, pyqtSignal
 from PyQt5.QtGui import QIcon, QFont
 
 from app.views.table_view import TableView
@@ -11,12 +11,30 @@ from app.views.staff_view import StaffView
 from app.views.shift_view import ShiftView
 from app.views.stats_view import StatsView
 from app.controllers.staff_controller import StaffController
+from app.controllers.archive_controller import ArchiveController, ARCHIVE_AFTER_DAYS
+from app.controllers.backup_controller import BackupController
+from app.utils.instrumentation import registry as instrumentation
+
+class BackupWorker(QThread):
+    """Sao lưu cơ sở dữ liệu ở luồng nền, các máy POS vẫn ghi bình thường trong lúc chạy"""
+    
+    backup_progress = pyqtSignal(int, int)
+    backup_finished = pyqtSignal(bool, str)
+    
+    def run(self):
+        try:
+            success, message = BackupController.backup_database(progress=self.backup_progress.emit)
+        except Exception as e:
+            success, message = False, f"Lỗi khi sao lưu: {e}"
+        self.backup_finished.emit(success, message)
+
 
 class MainWindow(QMainWindow):
     def __init__(self, current_staff=None):
         super().__init__()
         
         self.current_staff = current_staff
+        self.backup_worker = None
         
         self.setWindowTitle("Quản lý Quán Cafe")
         self.setMinimumSize(1200, 800)
@@ -94,9 +112,26 @@ class MainWindow(QMainWindow):
         file_menu.addAction(settings_action)
         
         # Backup action
-        backup_action = QAction("Sao lưu dữ liệu", self)
-        backup_action.triggered.connect(self.backup_data)
-        file_menu.addAction(backup_action)
+        self.backup_action = QAction("Sao lưu dữ liệu", self)
+        self.backup_action.triggered.connect(self.backup_data)
+        file_menu.addAction(self.backup_action)
+        
+        # Archive action (chỉ quản lý)
+        if self.current_staff and self.current_staff.role == "Quản lý":
+            archive_action = QAction("Lưu trữ đơn hàng cũ", self)
+            archive_action.triggered.connect(self.archive_orders)
+            file_menu.addAction(archive_action)
+            
+            # Đo hiệu năng truy vấn (bật/tắt lúc chạy)
+            self.instrument_action = QAction("Đo hiệu năng truy vấn", self)
+            self.instrument_action.setCheckable(True)
+            self.instrument_action.setChecked(instrumentation.enabled)
+            self.instrument_action.toggled.connect(self.toggle_instrumentation)
+            file_menu.addAction(self.instrument_action)
+            
+            report_action = QAction("Báo cáo truy vấn", self)
+            report_action.triggered.connect(self.show_query_report)
+            file_menu.addAction(report_action)
         
         file_menu.addSeparator()
         
@@ -154,7 +189,77 @@ class MainWindow(QMainWindow):
         QMessageBox.information(self, "Cài đặt", "Chức năng cài đặt đang được phát triển")
     
     def backup_data(self):
-        QMessageBox.information(self, "Sao lưu", "Chức năng sao lưu đang được phát triển")
+        if self.backup_worker is not None:
+            return
+        
+        # Khóa menu trong lúc sao lưu ở luồng nền
+        self.backup_action.setEnabled(False)
+        self.status_bar.showMessage("Đang sao lưu dữ liệu...")
+        
+        self.backup_worker = BackupWorker(self)
+        self.backup_worker.backup_progress.connect(self.on_backup_progress)
+        self.backup_worker.backup_finished.connect(self.on_backup_finished)
+        self.backup_worker.start()
+    
+    def on_backup_progress(self, copied, total):
+        if total:
+            self.status_bar.showMessage(f"Đang sao lưu dữ liệu... {copied * 100 // total}%")
+    
+    def on_backup_finished(self, success, message):
+        """Nhận kết quả sao lưu từ luồng nền"""
+        self.backup_action.setEnabled(True)
+        self.status_bar.clearMessage()
+        
+        self.backup_worker.deleteLater()
+        self.backup_worker = None
+        
+        if success:
+            QMessageBox.information(self, "Sao lưu", message)
+        else:
+            QMessageBox.warning(self, "Lỗi", message)
+    
+    def archive_orders(self):
+        status = ArchiveController.get_archive_status()
+        reply = QMessageBox.question(self, "Lưu trữ đơn hàng",
+                                     f"Chuyển các đơn đã thanh toán/hủy cũ hơn {ARCHIVE_AFTER_DAYS} ngày "
+                                     f"sang bảng lưu trữ?\n\n"
+                                     f"Đơn đang dùng: {status['live_orders']}\n"
+                                     f"Đơn đã lưu trữ: {status['archived_orders']}",
+                                     QMessageBox.Yes | QMessageBox.No,
+                                     QMessageBox.No)
+        
+        if reply == QMessageBox.Yes:
+            success, message = ArchiveController.archive_orders()
+            if success:
+                QMessageBox.information(self, "Lưu trữ đơn hàng", message)
+            else:
+                QMessageBox.warning(self, "Lỗi", message)
+    
+    def toggle_instrumentation(self, checked):
+        if checked:
+            instrumentation.enable()
+            self.status_bar.showMessage("Đã bật đo hiệu năng truy vấn", 3000)
+        else:
+            instrumentation.disable()
+            self.status_bar.showMessage("Đã tắt đo hiệu năng truy vấn", 3000)
+    
+    def show_query_report(self):
+        if not instrumentation.methods and not instrumentation.queries:
+            QMessageBox.information(self, "Báo cáo truy vấn",
+                                    "Chưa có số liệu. Bật \"Đo hiệu năng truy vấn\" rồi thao tác trên phần mềm.")
+            return
+        
+        try:
+            path = instrumentation.dump()
+        except OSError as e:
+            QMessageBox.warning(self, "Lỗi", f"Không ghi được báo cáo: {e}")
+            return
+        
+        box = QMessageBox(self)
+        box.setWindowTitle("Báo cáo truy vấn")
+        box.setText(f"Đã ghi báo cáo chi tiết vào {path}")
+        box.setDetailedText(instrumentation.report())
+        box.exec_()
     
     def logout(self):
         reply = QMessageBox.question(self, "Đăng xuất", 
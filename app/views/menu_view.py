@@ -5,7 +5,7 @@ from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
 from PyQt5.QtCore import Qt, QSize
 from PyQt5.QtGui import QIcon, QFont, QPixmap
 
-from app.controllers.menu_controller import MenuController
+from app.service.client import MenuController
 
 class MenuView(QWidget):
     def __init__(self, current_staff=None):
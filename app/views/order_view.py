@@ -3,22 +3,30 @@ from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
                              QComboBox, QLineEdit, QDialog, QSpinBox, QGroupBox,
                              QMessageBox, QSplitter, QTabWidget, QTreeWidget, QTreeWidgetItem,
                              QFormLayout, QDoubleSpinBox, QTextEdit, QFrame, QSlider,
-                             QRadioButton, QButtonGroup)
+                             QRadioButton, QButtonGroup, QTableView, QAbstractItemView)
 from PyQt5.QtCore import Qt, QSize, pyqtSignal
 from PyQt5.QtGui import QIcon, QFont, QColor, QPixmap
 
-from app.controllers.order_controller import OrderController
-from app.controllers.table_controller import TableController
-from app.controllers.menu_controller import MenuController
+from app.service.client import OrderController, TableController, MenuController
 from app.controllers.feedback_controller import FeedbackController
+from app.views.paged_table_model import PagedTableModel, PagedColumn
+from app.models.status import OrderStatus, ACTIVE_ORDER_STATUSES, status_label
+from app.database.concurrency import Conflict
 from datetime import datetime
 
+# Màu hiển thị trạng thái đơn hàng
+ORDER_STATUS_COLORS = {
+    OrderStatus.PENDING: "#FF9800",  # Orange
+    OrderStatus.SERVING: "#2196F3",  # Blue
+    OrderStatus.PAID: "#4CAF50",     # Green
+}
+CANCELLED_COLOR = "#f44336"     # Red
+
 class OrderView(QWidget):
     def __init__(self, current_staff=None):
         super().__init__()
         
         self.current_staff = current_staff
-        self.current_orders = []
         self.selected_order_id = None
         self.selected_order_details = None
         
@@ -52,11 +60,24 @@ class OrderView(QWidget):
         order_list_layout = QVBoxLayout(order_list_widget)
         
         # Order table
-        self.order_table = QTableWidget()
-        self.order_table.setColumnCount(5)
-        self.order_table.setHorizontalHeaderLabels(["ID", "Bàn", "Thời gian", "Trạng thái", "Tổng tiền"])
-        self.order_table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.order_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        # Bảng ảo: chỉ tải thêm đơn hàng khi cuộn tới cuối
+        self.order_model = PagedTableModel([
+            PagedColumn("ID", lambda o: str(o.id)),
+            PagedColumn("Bàn", lambda o: o.table_name or "--"),
+            PagedColumn("Thời gian", lambda o: o.order_time.strftime("%H:%M:%S %d/%m/%Y") if o.order_time else ""),
+            PagedColumn("Trạng thái", lambda o: status_label(o.status),
+                        foreground=lambda o: ORDER_STATUS_COLORS.get(o.status, CANCELLED_COLOR)),
+            PagedColumn("Tổng tiền", lambda o: f"{o.final_amount or 0:,.0f} đ",
+                        alignment=Qt.AlignRight | Qt.AlignVCenter),
+        ], lambda before_id, limit: OrderController.get_orders_page(
+            before_id, limit, exclude_statuses=[OrderStatus.PAID]
+        ))
+
+        self.order_table = QTableView()
+        self.order_table.setModel(self.order_model)
+        self.order_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.order_table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.order_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.order_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
         self.order_table.horizontalHeader().setSectionResizeMode(2, QHeaderView.Stretch)
         self.order_table.verticalHeader().setVisible(False)
@@ -158,46 +179,8 @@ class OrderView(QWidget):
         self.toggle_details_enabled(False)
     
     def load_orders(self):
-        # Get all active orders
-        self.current_orders = OrderController.get_current_orders()
-        
-        # Clear table
-        self.order_table.setRowCount(0)
-        
-        # Add orders to table
-        for row, order in enumerate(self.current_orders):
-            self.order_table.insertRow(row)
-            
-            # ID
-            id_item = QTableWidgetItem(str(order.id))
-            self.order_table.setItem(row, 0, id_item)
-            
-            # Table
-            table_name = order.table.name if order.table else "--"
-            table_item = QTableWidgetItem(table_name)
-            self.order_table.setItem(row, 1, table_item)
-            
-            # Time
-            time_str = order.order_time.strftime("%H:%M:%S %d/%m/%Y")
-            time_item = QTableWidgetItem(time_str)
-            self.order_table.setItem(row, 2, time_item)
-            
-            # Status
-            status_item = QTableWidgetItem(order.status)
-            if order.status == "chờ xử lý":
-                status_item.setForeground(QColor("#FF9800"))  # Orange
-            elif order.status == "đang phục vụ":
-                status_item.setForeground(QColor("#2196F3"))  # Blue
-            elif order.status == "đã thanh toán":
-                status_item.setForeground(QColor("#4CAF50"))  # Green
-            else:  # Cancelled
-                status_item.setForeground(QColor("#f44336"))  # Red
-            self.order_table.setItem(row, 3, status_item)
-            
-            # Total
-            total_item = QTableWidgetItem(f"{order.final_amount:,.0f} đ")
-            total_item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
-            self.order_table.setItem(row, 4, total_item)
+        # Tải lại trang đầu của các đơn hàng đang hoạt động
+        self.order_model.reload()
         
         # Clear current selection
         self.selected_order_id = None
@@ -206,10 +189,11 @@ class OrderView(QWidget):
         self.toggle_details_enabled(False)
     
     def on_order_selected(self, index):
-        row = index.row()
-        order_id = int(self.order_table.item(row, 0).text())
+        order = self.order_model.row_at(index.row())
+        if not order:
+            return
         
-        self.selected_order_id = order_id
+        self.selected_order_id = order.id
         self.load_order_details()
     
     def load_order_details(self):
@@ -235,7 +219,7 @@ class OrderView(QWidget):
         self.time_label.setText(time_str)
         
         self.staff_label.setText(self.selected_order_details['staff_name'] or "--")
-        self.status_label.setText(self.selected_order_details['status'])
+        self.status_label.setText(status_label(self.selected_order_details['status']))
         
         # Update items table
         self.items_table.setRowCount(0)
@@ -272,7 +256,7 @@ class OrderView(QWidget):
         self.total_label.setText(f"{self.selected_order_details['final_amount']:,.0f} đ")
         
         # Special handling for completed orders
-        if self.selected_order_details['status'] == "đã thanh toán":
+        if self.selected_order_details['status'] not in ACTIVE_ORDER_STATUSES:
             self.complete_button.setEnabled(False)
             self.add_item_button.setEnabled(False)
             self.edit_item_button.setEnabled(False)
@@ -531,13 +515,16 @@ class OrderView(QWidget):
                 self.selected_order_id,
                 item['id'],
                 quantity,
-                note
+                note,
+                expected_version=self.selected_order_details['version']
             )
             
             if success:
                 # Reload order details
                 self.load_order_details()
                 self.load_orders()  # Refresh total in order list
+            elif isinstance(success, Conflict):
+                self.show_conflict(success)
             else:
                 QMessageBox.warning(self, "Lỗi", "Không thể cập nhật món")
     
@@ -624,7 +611,8 @@ class OrderView(QWidget):
             success = OrderController.complete_order(
                 self.selected_order_id,
                 payment_method,
-                discount
+                discount,
+                expected_version=self.selected_order_details['version']
             )
             
             if success:
@@ -637,6 +625,8 @@ class OrderView(QWidget):
                 
                 # Reload orders
                 self.load_orders()
+            elif isinstance(success, Conflict):
+                self.show_conflict(success)
             else:
                 QMessageBox.warning(self, "Lỗi", "Không thể hoàn tất thanh toán")
     
@@ -843,11 +833,23 @@ class OrderView(QWidget):
         
         if reply == QMessageBox.Yes:
             # Cancel order
-            success = OrderController.cancel_order(self.selected_order_id)
+            success = OrderController.cancel_order(
+                self.selected_order_id,
+                expected_version=self.selected_order_details['version'] if self.selected_order_details else None
+            )
             
             if success:
                 QMessageBox.information(self, "Thành công", 
                                      f"Đơn hàng #{self.selected_order_id} đã được hủy")
                 self.load_orders()
+            elif isinstance(success, Conflict):
+                self.show_conflict(success)
             else:
-                QMessageBox.warning(self, "Lỗi", "Không thể hủy đơn hàng") 
\ No newline at end of file
+                QMessageBox.warning(self, "Lỗi", "Không thể hủy đơn hàng")
+    
+    def show_conflict(self, conflict):
+        """Đơn hàng đã bị sửa ở máy khác: báo và tải lại chi tiết mới nhất"""
+        QMessageBox.warning(self, "Dữ liệu đã thay đổi",
+                            f"{conflict.message}\nĐơn hàng đã được tải lại, vui lòng kiểm tra rồi thử lại.")
+        self.load_order_details()
+        self.load_orders() 
\ No newline at end of file
@@ -0,0 +1,109 @@
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+from PyQt5.QtGui import QColor, QBrush
+
+# Số dòng tải mỗi lần cuộn tới cuối bảng
+PAGE_SIZE = 100
+
+class PagedColumn:
+    """Mô tả một cột của PagedTableModel"""
+
+    def __init__(self, header, text, foreground=None, alignment=None):
+        """
+        Args:
+            header: Tiêu đề cột
+            text: Hàm (row) -> chuỗi hiển thị
+            foreground: Hàm (row) -> mã màu chữ (ví dụ "#4CAF50") hoặc None
+            alignment: Căn lề (Qt.AlignmentFlag)
+        """
+        self.header = header
+        self.text = text
+        self.foreground = foreground
+        self.alignment = alignment
+
+class PagedTableModel(QAbstractTableModel):
+    """
+    Model bảng ảo cho QTableView: chỉ giữ các dòng đã tải và tải thêm từng trang theo
+    keyset (WHERE id < :cursor ORDER BY id DESC LIMIT n) khi người dùng cuộn tới cuối.
+    Thời gian mở bảng không phụ thuộc vào số dòng lịch sử.
+    """
+
+    def __init__(self, columns, fetch_page, cursor_key=lambda row: row.id, page_size=PAGE_SIZE, parent=None):
+        """
+        Args:
+            columns: Danh sách PagedColumn
+            fetch_page: Hàm (cursor, limit) -> danh sách dòng; cursor là None ở trang đầu
+            cursor_key: Hàm (row) -> con trỏ cho trang kế tiếp
+            page_size: Số dòng mỗi trang
+        """
+        super().__init__(parent)
+        self.columns = columns
+        self.fetch_page = fetch_page
+        self.cursor_key = cursor_key
+        self.page_size = page_size
+        self._rows = []
+        self._cursor = None
+        self._has_more = True
+
+    # ------------------------------------------------------------------ #
+    # QAbstractTableModel
+    # ------------------------------------------------------------------ #
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self._rows[index.row()]
+        column = self.columns[index.column()]
+
+        if role == Qt.DisplayRole:
+            return column.text(row)
+        if role == Qt.ForegroundRole and column.foreground:
+            color = column.foreground(row)
+            return QBrush(QColor(color)) if color else None
+        if role == Qt.TextAlignmentRole and column.alignment is not None:
+            return int(column.alignment)
+        if role == Qt.UserRole:
+            return row
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.columns[section].header
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._has_more
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or not self._has_more:
+            return
+        rows = self.fetch_page(self._cursor, self.page_size)
+        self._has_more = len(rows) >= self.page_size
+        if not rows:
+            return
+
+        first = len(self._rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self._rows.extend(rows)
+        self.endInsertRows()
+        self._cursor = self.cursor_key(rows[-1])
+
+    # ------------------------------------------------------------------ #
+    # Tiện ích cho view
+    # ------------------------------------------------------------------ #
+    def reload(self):
+        """Xóa các dòng đã tải và tải lại trang đầu tiên"""
+        self.beginResetModel()
+        self._rows = []
+        self._cursor = None
+        self._has_more = True
+        self.endResetModel()
+        self.fetchMore()
+
+    def row_at(self, row):
+        """Dòng dữ liệu tại vị trí row (None nếu ngoài phạm vi)"""
+        return self._rows[row] if 0 <= row < len(self._rows) else None
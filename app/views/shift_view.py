@@ -2,8 +2,8 @@ from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
                              QPushButton, QTableWidget, QTableWidgetItem, QHeaderView,
                              QDialog, QFormLayout, QLineEdit, QComboBox, QMessageBox,
                              QDateEdit, QTimeEdit, QCalendarWidget, QTabWidget, QScrollArea,
-                             QGridLayout, QFrame, QSplitter, QMenu, QGroupBox, QSpinBox)
-from PyQt5.QtCore import Qt, QSize, QDate, QTime, QDateTime
+                             QGridLayout, QFrame, QSplitter, QMenu, QGroupBox, QSpinBox, QCheckBox)
+from PyQt5.QtCore import Qt, QSize, QDate, QTime, QDateTime, QThread, pyqtSignal
 from PyQt5.QtGui import QIcon, QFont, QColor, QBrush
 
 from datetime import datetime, timedelta, time
@@ -11,6 +11,17 @@ import calendar
 
 from app.controllers.shift_controller import ShiftController
 from app.controllers.staff_controller import StaffController
+from app.utils.roster_scheduler import COVERAGE_ROLES
+from app.utils.csp_scheduler import (describe_stats, STATUS_SOLVED, STATUS_INFEASIBLE, STATUS_TIMEOUT,
+                                     STATUS_NODE_LIMIT)
+
+# Trạng thái bộ giải hiển thị cho người dùng sau khi tạo lịch tự động
+SOLVER_STATUS_LABELS = {
+    STATUS_SOLVED: "Đã tìm được lịch đầy đủ",
+    STATUS_INFEASIBLE: "Không có lịch thỏa mãn tất cả ràng buộc",
+    STATUS_TIMEOUT: "Bộ giải đã hết thời gian tìm kiếm",
+    STATUS_NODE_LIMIT: "Bộ giải đã vượt giới hạn số bước tìm kiếm",
+}
 
 class WeeklyShiftTable(QTableWidget):
     """Bảng hiển thị ca làm việc theo tuần"""
@@ -33,6 +44,7 @@ class WeeklyShiftTable(QTableWidget):
         
         self.week_start_date = self._get_current_week_start()
         self.shifts = []
+        self.shifts_by_id = {}
         self.staffs = []
         
         # Kết nối sự kiện khi click chuột phải
@@ -85,17 +97,17 @@ class WeeklyShiftTable(QTableWidget):
         
         # Lấy ca làm việc trong tuần
         self.shifts = ShiftController.get_shifts_by_week(self.week_start_date)
+        self.shifts_by_id = {shift.id: shift for shift in self.shifts}
+        
+        # Tra cứu hàng của nhân viên theo id
+        staff_rows = {staff.id: row for row, staff in enumerate(self.staffs)}
         
         # Hiển thị ca làm việc trong bảng
         for shift in self.shifts:
             # Tìm nhân viên tương ứng
-            staff_row = -1
-            for row, staff in enumerate(self.staffs):
-                if staff.id == shift.staff_id:
-                    staff_row = row
-                    break
+            staff_row = staff_rows.get(shift.staff_id)
             
-            if staff_row == -1:
+            if staff_row is None:
                 continue
             
             # Xác định cột tương ứng với ngày của ca làm việc
@@ -160,7 +172,7 @@ class WeeklyShiftTable(QTableWidget):
         
         if shift_id:  # Đã có ca làm việc
             # Tìm shift trong danh sách
-            shift = next((s for s in self.shifts if s.id == shift_id), None)
+            shift = self.shifts_by_id.get(shift_id)
             
             if shift:
                 # Menu cho ca làm việc đã tồn tại
@@ -399,11 +411,45 @@ class WeeklyShiftTable(QTableWidget):
             QMessageBox.warning(self, "Lỗi", message)
 
 
+class ScheduleWorker(QThread):
+    """Chạy thuật toán tạo lịch tự động ở luồng nền để giao diện không bị treo"""
+    
+    schedule_finished = pyqtSignal(bool, str, dict)
+    
+    def __init__(self, week_start_date, min_staff, max_shifts, optimize=False, weeks=1,
+                 require_roles=True, allow_partial=False, parent=None):
+        super().__init__(parent)
+        self.week_start_date = week_start_date
+        self.min_staff = min_staff
+        self.max_shifts = max_shifts
+        self.optimize = optimize
+        self.weeks = weeks
+        self.require_roles = require_roles
+        self.allow_partial = allow_partial
+    
+    def run(self):
+        stats = {}
+        try:
+            success, message, stats = ShiftController.generate_automatic_schedule(
+                self.week_start_date,
+                self.min_staff,
+                self.max_shifts,
+                optimize=self.optimize,
+                weeks=self.weeks,
+                coverage_roles=COVERAGE_ROLES if self.require_roles else (),
+                allow_partial=self.allow_partial
+            )
+        except Exception as e:
+            success, message = False, f"Lỗi khi tạo lịch: {e}"
+        self.schedule_finished.emit(success, message, stats or {})
+
+
 class ShiftView(QWidget):
     def __init__(self, current_staff=None):
         super().__init__()
         
         self.current_staff = current_staff
+        self.schedule_worker = None
         
         self.setup_ui()
         
@@ -500,7 +546,7 @@ class ShiftView(QWidget):
         layout = QVBoxLayout(dialog)
         
         # Thông báo
-        info_label = QLabel("Lưu ý: Tất cả ca làm việc hiện tại trong tuần này sẽ bị xóa!")
+        info_label = QLabel("Lưu ý: Các ca làm việc hiện tại trong khoảng thời gian này sẽ được thay thế!")
         info_label.setStyleSheet("color: red;")
         layout.addWidget(info_label)
         
@@ -520,6 +566,28 @@ class ShiftView(QWidget):
         max_shifts_spin.setValue(5)
         form_layout.addRow("Số ca tối đa mỗi nhân viên một tuần:", max_shifts_spin)
         
+        # Số tuần cần xếp lịch
+        weeks_spin = QSpinBox()
+        weeks_spin.setMinimum(1)
+        weeks_spin.setMaximum(5)
+        weeks_spin.setValue(1)
+        form_layout.addRow("Số tuần:", weeks_spin)
+        
+        # Tối ưu theo nhu cầu khách theo giờ và cân bằng giờ làm
+        optimize_check = QCheckBox("Tối ưu theo lượng khách từng giờ")
+        optimize_check.setChecked(True)
+        form_layout.addRow("", optimize_check)
+        
+        # Mỗi ca phải có pha chế và thu ngân
+        roles_check = QCheckBox("Mỗi ca có ít nhất 1 " + " và 1 ".join(role.lower() for role in COVERAGE_ROLES))
+        roles_check.setChecked(True)
+        form_layout.addRow("", roles_check)
+        
+        # Hết thời gian/giới hạn tìm kiếm: áp dụng lịch một phần thay vì báo lỗi
+        partial_check = QCheckBox("Dùng lịch một phần nếu bộ giải hết thời gian")
+        partial_check.setChecked(False)
+        form_layout.addRow("", partial_check)
+        
         layout.addLayout(form_layout)
         
         # Buttons
@@ -540,47 +608,71 @@ class ShiftView(QWidget):
         if dialog.exec_() == QDialog.Accepted:
             min_staff = min_staff_spin.value()
             max_shifts = max_shifts_spin.value()
+            weeks = weeks_spin.value()
+            optimize = optimize_check.isChecked()
+            require_roles = roles_check.isChecked()
+            allow_partial = partial_check.isChecked()
             
             # Xác nhận một lần nữa
             reply = QMessageBox.question(
                 self,
                 "Xác nhận tạo lịch tự động",
-                "Tất cả ca làm việc hiện tại trong tuần này sẽ bị xóa. Bạn có chắc chắn muốn tiếp tục?",
+                f"Các ca làm việc hiện tại trong {weeks} tuần kể từ tuần này sẽ được thay thế. "
+                "Bạn có chắc chắn muốn tiếp tục?",
                 QMessageBox.Yes | QMessageBox.No,
                 QMessageBox.No
             )
             
             if reply == QMessageBox.Yes:
-                # Thay đổi cách hiển thị thông báo đang xử lý
-                from PyQt5.QtWidgets import QApplication
-                from PyQt5.QtCore import QTimer
-                
-                # Thiết lập con trỏ chờ
-                QApplication.setOverrideCursor(Qt.WaitCursor)
+                # Khóa nút trong lúc thuật toán chạy ở luồng nền
+                self.auto_schedule_btn.setEnabled(False)
+                self.auto_schedule_btn.setText("Đang tạo lịch...")
                 
                 # Cập nhật status bar nếu có
                 if hasattr(self, 'parentWidget') and hasattr(self.parentWidget(), 'statusBar'):
                     self.parentWidget().statusBar().showMessage("Đang tạo lịch làm việc tự động...")
                 
                 # Thực hiện tạo lịch tự động
-                success, message = ShiftController.generate_automatic_schedule(
+                self.schedule_worker = ScheduleWorker(
                     self.shift_table.week_start_date,
                     min_staff,
-                    max_shifts
+                    max_shifts,
+                    optimize,
+                    weeks,
+                    require_roles,
+                    allow_partial,
+                    self
                 )
-                
-                # Khôi phục con trỏ
-                QApplication.restoreOverrideCursor()
-                
-                # Xóa thông báo từ status bar
-                if hasattr(self, 'parentWidget') and hasattr(self.parentWidget(), 'statusBar'):
-                    self.parentWidget().statusBar().clearMessage()
-                
-                if success:
-                    QMessageBox.information(self, "Thành công", message)
-                    self.refresh()
-                else:
-                    QMessageBox.warning(self, "Lỗi", message)
+                self.schedule_worker.schedule_finished.connect(self.on_auto_schedule_finished)
+                self.schedule_worker.start()
+    
+    def on_auto_schedule_finished(self, success, message, stats):
+        """Nhận kết quả tạo lịch tự động từ luồng nền (stats: thống kê bộ giải)"""
+        self.auto_schedule_btn.setEnabled(True)
+        self.auto_schedule_btn.setText("Tạo lịch tự động")
+        
+        # Xóa thông báo từ status bar
+        if hasattr(self, 'parentWidget') and hasattr(self.parentWidget(), 'statusBar'):
+            self.parentWidget().statusBar().clearMessage()
+        
+        self.schedule_worker.deleteLater()
+        self.schedule_worker = None
+        
+        # Lịch một phần hoặc bộ giải bị dừng do giới hạn: nêu rõ trạng thái, chi tiết trong "Show Details"
+        status = stats.get("status")
+        if status and status != STATUS_SOLVED:
+            message += f"\n\nTrạng thái bộ giải: {SOLVER_STATUS_LABELS.get(status, status)}"
+        
+        box = QMessageBox(QMessageBox.Information if success else QMessageBox.Warning,
+                          "Thành công" if success else "Lỗi", message, QMessageBox.Ok, self)
+        if stats:
+            details = [describe_stats(stats)]
+            details += [f"{name}: {describe_stats(subproblem)}"
+                        for name, subproblem in stats.get("subproblems", {}).items()]
+            box.setDetailedText("\n".join(details))
+        box.exec_()
+        if success:
+            self.refresh()
     
     def show_workload_dialog(self):
         """Hiển thị khối lượng công việc của nhân viên trong tuần"""
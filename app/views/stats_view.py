@@ -13,10 +13,10 @@ import pandas as pd
 from datetime import datetime, timedelta
 
 from app.controllers.stats_controller import StatsController
-from app.controllers.order_controller import OrderController
-from app.controllers.menu_controller import MenuController
-from app.controllers.inventory_controller import InventoryController
+from app.database.consolidation import ALL_BRANCHES
+from app.service.client import OrderController, MenuController, InventoryController
 from app.controllers.feedback_controller import FeedbackController
+from app.controllers.turnover_controller import TurnoverController
 
 class MatplotlibCanvas(FigureCanvas):
     def __init__(self, parent=None, width=5, height=4, dpi=100):
@@ -56,6 +56,19 @@ class StatsView(QWidget):
         self.end_date_edit.setDate(QDate.currentDate())  # Default to today
         date_range_layout.addWidget(self.end_date_edit)
         
+        # Chọn chi nhánh (chỉ hiện khi đã có kho hợp nhất các chi nhánh)
+        self.branch_combo = QComboBox()
+        self.branch_combo.addItem("Quán này", None)
+        branch_codes = StatsController.get_branch_codes()
+        if branch_codes:
+            self.branch_combo.addItem("Tất cả chi nhánh", ALL_BRANCHES)
+            for code in branch_codes:
+                self.branch_combo.addItem(f"Chi nhánh {code}", [code])
+            date_range_layout.addWidget(QLabel("Chi nhánh:"))
+            date_range_layout.addWidget(self.branch_combo)
+        else:
+            self.branch_combo.hide()
+        
         refresh_button = QPushButton("Làm mới")
         refresh_button.setFixedSize(100, 30)
         refresh_button.clicked.connect(self.refresh_stats)
@@ -76,12 +89,14 @@ class StatsView(QWidget):
         popular_tab = self.create_products_tab()
         prediction_tab = self.create_prediction_tab()
         feedback_tab = self.create_feedback_tab()
+        turnover_tab = self.create_turnover_tab()
         
         # Thêm tabs
         self.tab_widget.addTab(sales_tab, "Doanh thu")
         self.tab_widget.addTab(popular_tab, "Món phổ biến")
         self.tab_widget.addTab(prediction_tab, "Dự báo")
         self.tab_widget.addTab(feedback_tab, "Đánh giá khách hàng")
+        self.tab_widget.addTab(turnover_tab, "Luân chuyển bàn")
         
         main_layout.addWidget(self.tab_widget)
         
@@ -139,10 +154,12 @@ class StatsView(QWidget):
             self.update_prediction_tab()
         elif tab_index == 3:  # Đánh giá
             self.update_feedback_stats()
+        elif tab_index == 4:  # Luân chuyển bàn
+            self.update_turnover_tab(start_date, end_date)
         
     def update_revenue_tab(self, start_date, end_date):
         # Get revenue data
-        revenue_data = StatsController.get_revenue_by_date_range(start_date, end_date)
+        revenue_data = StatsController.get_revenue_by_date_range(start_date, end_date, self.branch_combo.currentData())
         
         # Update summary
         total_revenue = revenue_data['revenue'].sum()
@@ -182,7 +199,7 @@ class StatsView(QWidget):
     
     def update_products_tab(self, start_date, end_date):
         # Get top selling products
-        top_products = StatsController.get_top_selling_items(start_date, end_date)
+        top_products = StatsController.get_top_selling_items(start_date, end_date, branches=self.branch_combo.currentData())
         
         # Update table
         self.top_products_table.setRowCount(0)
@@ -230,7 +247,7 @@ class StatsView(QWidget):
     
     def update_prediction_tab(self):
         # Get prediction data
-        predictions = StatsController.predict_revenue()
+        predictions = StatsController.predict_revenue(branches=self.branch_combo.currentData())
         
         # Update chart
         ax = self.prediction_chart.axes
@@ -479,6 +496,9 @@ class StatsView(QWidget):
             self.update_prediction_tab()
         elif tab_index == 3:  # Đánh giá khách hàng
             self.update_feedback_stats()
+        elif tab_index == 4:  # Luân chuyển bàn
+            self.update_turnover_tab(self.start_date_edit.date().toPyDate(), 
+                                 self.end_date_edit.date().toPyDate() + timedelta(days=1))
     
     def update_feedback_stats(self):
         """Cập nhật thống kê đánh giá"""
@@ -590,4 +610,77 @@ class StatsView(QWidget):
         
         prediction_layout.addWidget(prediction_group)
         
-        return prediction_tab 
\ No newline at end of file
+        return prediction_tab
+    
+    def create_turnover_tab(self):
+        turnover_tab = QWidget()
+        turnover_layout = QVBoxLayout(turnover_tab)
+        
+        # Hiệu quả theo khu vực, sắp xếp từ khu vực chậm nhất
+        section_group = QGroupBox("Hiệu quả theo khu vực và loại bàn")
+        section_layout = QVBoxLayout(section_group)
+        
+        self.turnover_table = QTableWidget()
+        self.turnover_table.setColumnCount(8)
+        self.turnover_table.setHorizontalHeaderLabels([
+            "Khu vực", "Số chỗ", "Số bàn", "Lượt khách", "Lượt/bàn/ngày",
+            "Ngồi TB (phút)", "Tỷ lệ lấp đầy", "Doanh thu/ghế-giờ"
+        ])
+        self.turnover_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.turnover_table.verticalHeader().setVisible(False)
+        self.turnover_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        
+        section_layout.addWidget(self.turnover_table)
+        
+        # Phân bố thời gian ngồi
+        dwell_group = QGroupBox("Phân bố thời gian ngồi theo khu vực")
+        dwell_layout = QVBoxLayout(dwell_group)
+        
+        self.dwell_chart = MatplotlibCanvas(self, width=5, height=3, dpi=100)
+        dwell_layout.addWidget(self.dwell_chart)
+        
+        turnover_splitter = QSplitter(Qt.Vertical)
+        turnover_splitter.addWidget(section_group)
+        turnover_splitter.addWidget(dwell_group)
+        
+        turnover_layout.addWidget(turnover_splitter)
+        
+        return turnover_tab
+    
+    def update_turnover_tab(self, start_date, end_date):
+        report = TurnoverController.get_section_report(start_date, end_date)
+        
+        self.turnover_table.setRowCount(0)
+        for row, section in enumerate(report.itertuples(index=False)):
+            self.turnover_table.insertRow(row)
+            values = [
+                str(section.location),
+                str(int(section.capacity)),
+                str(int(section.tables)),
+                str(int(section.turns)),
+                f"{section.turns_per_table_day:.2f}",
+                f"{section.avg_dwell_minutes:.0f}",
+                f"{section.occupancy:.1%}",
+                f"{section.revenue_per_seat_hour:,.0f} đ"
+            ]
+            for column, value in enumerate(values):
+                self.turnover_table.setItem(row, column, QTableWidgetItem(value))
+        
+        # Biểu đồ cột chồng phân bố thời gian ngồi
+        distribution = TurnoverController.get_dwell_distribution(start_date, end_date)
+        ax = self.dwell_chart.axes
+        ax.clear()
+        
+        if not distribution.empty:
+            labels = ["< 30 phút", "30-60 phút", "60-90 phút", "> 90 phút"]
+            columns = ["dwell_under_30", "dwell_30_60", "dwell_60_90", "dwell_over_90"]
+            bottom = np.zeros(len(distribution))
+            for label, column in zip(labels, columns):
+                values = distribution[column].to_numpy() * 100
+                ax.bar(distribution["location"].astype(str), values, bottom=bottom, label=label)
+                bottom += values
+            ax.set_ylabel('% lượt khách')
+            ax.legend(fontsize=8)
+        
+        self.dwell_chart.fig.tight_layout()
+        self.dwell_chart.draw()
@@ -3,19 +3,24 @@ from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
                              QDialog, QLineEdit, QSpinBox, QComboBox, QMessageBox,
                              QGraphicsView, QGraphicsScene, QGraphicsItem, QGraphicsRectItem,
                              QGraphicsEllipseItem, QGraphicsTextItem, QGraphicsPixmapItem)
-from PyQt5.QtCore import Qt, QSize, pyqtSignal, QRectF, QPointF
+from PyQt5.QtCore import Qt, QSize, pyqtSignal, QRectF, QPointF, QTimer
 from PyQt5.QtGui import QIcon, QFont, QColor, QPen, QBrush, QPainter, QPainterPath, QPixmap
 
-from app.controllers.table_controller import TableController
-from app.controllers.order_controller import OrderController
+from app.service.client import OrderController, TableController
+from app.controllers.table_state_store import table_state_store
+from app.database.concurrency import Conflict
+
+# Mã kết quả của hộp thoại mở đơn khi chọn "Khách đặt trước đã đến" (khác Accepted/Rejected)
+RESERVATION_ARRIVED = 2
 
 class TableItem(QGraphicsRectItem):
-    def __init__(self, table_id, table_name, status, capacity, x, y, width, height, parent=None):
+    def __init__(self, table_id, table_name, status, capacity, x, y, width, height, parent=None, location=None):
         super().__init__(x, y, width, height, parent)
         self.table_id = table_id
         self.table_name = table_name
         self.status = status
         self.capacity = capacity
+        self.location = location
         self.setAcceptHoverEvents(True)
         
         # Thiết lập màu sắc dựa trên trạng thái
@@ -44,6 +49,14 @@ class TableItem(QGraphicsRectItem):
         pen.setWidth(2)
         self.setPen(pen)
     
+    def update_order_info(self, order_id=None, seated_at=None, running_total=0):
+        # Hiển thị thông tin đơn đang mở khi hover
+        if order_id:
+            seated = seated_at.strftime("%H:%M") if seated_at else "?"
+            self.setToolTip(f"Đơn #{order_id}\nVào bàn: {seated}\nTạm tính: {running_total:,.0f} VNĐ")
+        else:
+            self.setToolTip("")
+    
     def mousePressEvent(self, event):
         # Gửi tín hiệu tới scene khi bàn được nhấp vào
         scene = self.scene()
@@ -160,7 +173,7 @@ class CafeScene(QGraphicsScene):
         height = min(70 + capacity * 5, 100)
         
         # Tạo đối tượng TableItem
-        table_item = TableItem(table_id, table_name, status, capacity, x, y, width, height)
+        table_item = TableItem(table_id, table_name, status, capacity, x, y, width, height, location=location)
         
         # Thêm vào scene và lưu trữ
         self.addItem(table_item)
@@ -191,12 +204,23 @@ class CafeScene(QGraphicsScene):
             # Mặc định nếu không rơi vào các khu vực trên
             return 350, 300
     
-    def update_table(self, table_id, status):
+    def remove_table(self, table_id):
+        table_item = self.tables.pop(table_id, None)
+        if table_item:
+            self.removeItem(table_item)
+    
+    def update_table(self, table_id, status, order_id=None, seated_at=None, running_total=0):
         if table_id in self.tables:
-            self.tables[table_id].status = status
-            self.tables[table_id].update_color()
+            table_item = self.tables[table_id]
+            if table_item.status != status:
+                table_item.status = status
+                table_item.update_color()
+            table_item.update_order_info(order_id, seated_at, running_total)
 
 class TableView(QWidget):
+    # Phát lại thay đổi từ table_state_store về luồng giao diện
+    tableStatesChanged = pyqtSignal(list)
+    
     def __init__(self, current_staff=None):
         super().__init__()
         
@@ -205,6 +229,17 @@ class TableView(QWidget):
         
         self.setup_ui()
         self.load_tables()
+        
+        # Nhận thay đổi trạng thái bàn từ các sự kiện đơn hàng
+        self.tableStatesChanged.connect(self.apply_table_changes)
+        listener = self.tableStatesChanged.emit
+        table_state_store.subscribe(listener)
+        self.destroyed.connect(lambda *args: table_state_store.unsubscribe(listener))
+        
+        # Timer đồng bộ với các máy POS khác
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh_tables)
+        self.refresh_timer.start(5000)  # Đồng bộ mỗi 5 giây
     
     def setup_ui(self):
         main_layout = QVBoxLayout(self)
@@ -217,7 +252,7 @@ class TableView(QWidget):
         
         refresh_button = QPushButton("Làm mới")
         refresh_button.setFixedSize(100, 30)
-        refresh_button.clicked.connect(self.load_tables)
+        refresh_button.clicked.connect(self.refresh_tables)
         
         add_table_button = QPushButton("Thêm bàn")
         add_table_button.setFixedSize(100, 30)
@@ -286,45 +321,82 @@ class TableView(QWidget):
     def load_tables(self):
         # Clear existing tables
         for table_id in list(self.cafe_scene.tables.keys()):
-            self.cafe_scene.removeItem(self.cafe_scene.tables[table_id])
-            self.cafe_scene.tables.pop(table_id)
+            self.cafe_scene.remove_table(table_id)
         
-        # Get tables from database
-        self.tables = TableController.get_all_tables()
+        # Get tables from the shared table state cache
+        self.tables = table_state_store.all()
         
         # Add tables to the cafe map
         for table in self.tables:
-            self.cafe_scene.add_table(
-                table.id,
-                table.name,
-                table.status,
-                table.capacity,
-                table.location
-            )
+            self.add_table_item(table)
+    
+    def add_table_item(self, table):
+        self.cafe_scene.add_table(
+            table.id,
+            table.name,
+            table.status,
+            table.capacity,
+            table.location
+        )
+        self.cafe_scene.update_table(table.id, table.status, table.order_id,
+                                     table.seated_at, table.running_total)
+    
+    def refresh_tables(self):
+        # Đồng bộ khi có thay đổi mới, các bàn thay đổi được áp dụng qua apply_table_changes
+        if self.isVisible():
+            table_state_store.refresh_if_changed()
+    
+    def apply_table_changes(self, table_ids):
+        # Chỉ vẽ lại các bàn có thay đổi
+        for table_id in table_ids:
+            table = table_state_store.get(table_id)
+            table_item = self.cafe_scene.tables.get(table_id)
+            
+            if table is None:
+                self.cafe_scene.remove_table(table_id)
+            elif (table_item is None or table_item.table_name != table.name
+                  or table_item.capacity != table.capacity or table_item.location != table.location):
+                # Bàn mới hoặc thay đổi vị trí/kích thước: tạo lại riêng bàn này
+                self.cafe_scene.remove_table(table_id)
+                self.add_table_item(table)
+            else:
+                self.cafe_scene.update_table(table.id, table.status, table.order_id,
+                                             table.seated_at, table.running_total)
     
     def handle_table_click(self, table_id):
         # Find the table
-        table = TableController.get_table_by_id(table_id)
+        table = table_state_store.get(table_id)
         
         if not table:
             return
         
-        if table.status == "trống":
-            # Create new order if table is available
-            self.create_new_order(table)
-        else:
+        if table.status == "đang phục vụ":
             # View existing order if table is occupied
             self.view_table_order(table)
+        else:
+            # Bàn trống hoặc đã đặt trước: mở đơn (cho khách vãng lai hoặc khách đặt trước đã đến)
+            self.create_new_order(table)
     
     def create_new_order(self, table):
+        # Lượt đặt sắp tới của bàn: khách đặt trước đã đến thì mở đơn theo lượt đặt đó
+        reservation = OrderController.get_upcoming_reservation(table.id)
+        
         # Create a confirmation dialog
         dialog = QDialog(self)
         dialog.setWindowTitle(f"Tạo đơn hàng mới cho {table.name}")
-        dialog.setFixedSize(300, 200)
+        dialog.setFixedSize(360 if reservation else 300, 200)
         
         layout = QVBoxLayout(dialog)
         
         layout.addWidget(QLabel(f"Bạn muốn tạo đơn hàng mới cho {table.name}?"))
+        if reservation:
+            reservation_label = QLabel(
+                f"Bàn có khách đặt trước lúc {reservation.reservation_time.strftime('%H:%M')} "
+                f"({reservation.num_guests} khách)"
+            )
+            reservation_label.setStyleSheet("color: #E65100;")
+            reservation_label.setWordWrap(True)
+            layout.addWidget(reservation_label)
         layout.addSpacing(20)
         
         # Create buttons
@@ -332,28 +404,37 @@ class TableView(QWidget):
         
         cancel_button = QPushButton("Hủy")
         cancel_button.clicked.connect(dialog.reject)
+        buttons_layout.addWidget(cancel_button)
+        
+        if reservation:
+            arrived_button = QPushButton("Khách đặt trước đã đến")
+            arrived_button.setStyleSheet("background-color: #2196F3; color: white;")
+            arrived_button.clicked.connect(lambda: dialog.done(RESERVATION_ARRIVED))
+            buttons_layout.addWidget(arrived_button)
         
         confirm_button = QPushButton("Tạo đơn hàng")
         confirm_button.setStyleSheet("background-color: #4CAF50; color: white;")
         confirm_button.clicked.connect(dialog.accept)
-        
-        buttons_layout.addWidget(cancel_button)
         buttons_layout.addWidget(confirm_button)
         
         layout.addLayout(buttons_layout)
         
-        if dialog.exec_() == QDialog.Accepted:
+        result = dialog.exec_()
+        if result in (QDialog.Accepted, RESERVATION_ARRIVED):
             # Create new order
             if self.current_staff:
-                order_id = OrderController.create_order(table.id, self.current_staff.id)
+                reservation_id = reservation.id if result == RESERVATION_ARRIVED else None
+                order_id = OrderController.create_order(table.id, self.current_staff.id,
+                                                        reservation_id=reservation_id)
                 
                 if order_id:
                     QMessageBox.information(self, "Thành công", 
                                            f"Đã tạo đơn hàng mới cho {table.name}")
-                    self.load_tables()
                     
                     # Switch to order view tab
                     self.parent().parent().setCurrentIndex(2)  # Index of order tab
+                elif isinstance(order_id, Conflict):
+                    QMessageBox.warning(self, "Không thể tạo đơn hàng", order_id.message)
                 else:
                     QMessageBox.warning(self, "Lỗi", 
                                        f"Không thể tạo đơn hàng cho {table.name}")
@@ -430,7 +511,6 @@ class TableView(QWidget):
             
             if success:
                 QMessageBox.information(self, "Thành công", f"Đã thêm bàn {name}")
-                self.load_tables()
             else:
                 QMessageBox.warning(self, "Lỗi", "Không thể thêm bàn mới")
     
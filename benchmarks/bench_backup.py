@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Ảnh hưởng của sao lưu trực tuyến (app.database.backup) lên thông lượng đơn hàng đồng thời
+
+Một cơ sở dữ liệu lịch sử được sinh (app/database/test_db.py) trong thư mục tạm; với mỗi chế độ
+nhật ký (WAL, rollback journal) các luồng POS liên tục tạo đơn, thêm món và thanh toán qua
+OrderController trong ba pha:
+  - không sao lưu (mốc so sánh)
+  - sao lưu theo bước (PAGES_PER_STEP trang mỗi bước, nghỉ giữa các bước)
+  - sao lưu một bước (pages=-1, chép toàn bộ trong một lần giữ khóa)
+Thông lượng và độ trễ một đơn (p50/p95/p99) được ghi riêng cho giai đoạn chép trang (khóa đọc)
+và giai đoạn nén (chỉ tốn CPU), kèm thời gian, số bước và số lần sao chép lại của bản sao lưu.
+Bản sao lưu cuối cùng được khôi phục thử để kiểm tra.
+
+Cơ sở dữ liệu cỡ vài GB: --scale 500 --years 2 (sinh dữ liệu mất vài phút).
+
+Chạy: python benchmarks/bench_backup.py [--scale 50] [--years 1] [--threads 4] [--duration 10]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import Recorder, environment, save_json, print_results
+
+DEFAULT_OUTPUT = os.path.join(ROOT, "benchmarks", "results", "backup.json")
+
+ITEMS_PER_ORDER = 2
+JOURNAL_MODES = ["WAL", "DELETE"]
+
+
+def set_journal_mode(mode):
+    from app.database.db_config import engine
+
+    engine.dispose()
+    with engine.connect() as conn:
+        return conn.exec_driver_sql(f"PRAGMA journal_mode={mode}").scalar()
+
+
+def order_load(recorder, phase, tables, staff_ids, menu_ids, threads, stop):
+    """Các luồng POS tạo đơn - thêm món - thanh toán cho đến khi stop được đặt (ghi theo phase['label'])"""
+    from app.controllers.order_controller import OrderController
+
+    def place_order(rng):
+        order_id = OrderController.create_order(rng.choice(tables), rng.choice(staff_ids))
+        for _ in range(ITEMS_PER_ORDER):
+            OrderController.add_item_to_order(order_id, rng.choice(menu_ids), rng.randint(1, 3))
+        OrderController.complete_order(order_id)
+
+    def worker(seed):
+        rng = random.Random(seed)
+        while not stop.is_set():
+            recorder.measure(phase["label"], place_order, rng)
+
+    workers = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads)]
+    for thread in workers:
+        thread.start()
+    return workers
+
+
+def run_phase(recorder, name, fixtures, args, pages_per_step=None):
+    """
+    Một pha tải đơn hàng; pages_per_step khác None thì chạy kèm một bản sao lưu.
+    Khi sao lưu, đơn hàng được ghi riêng theo giai đoạn chép trang và giai đoạn nén.
+    """
+    from app.database.backup import create_backup
+
+    spans = {}
+    phase = {"label": name if pages_per_step is None else f"{name}: chép trang", "since": time.perf_counter()}
+
+    def switch(label):
+        now = time.perf_counter()
+        spans[phase["label"]] = spans.get(phase["label"], 0.0) + now - phase["since"]
+        phase["label"], phase["since"] = label, now
+
+    def on_copy(copied, total):
+        if copied == total:
+            switch(f"{name}: nén")
+
+    stop = threading.Event()
+    began = time.perf_counter()
+    workers = order_load(recorder, phase, *fixtures, args.threads, stop)
+    manifest = None
+    try:
+        if pages_per_step is None:
+            time.sleep(args.duration)
+        else:
+            manifest = create_backup(os.path.join(args.workdir, "backups"), keep=1,
+                                     pages_per_step=pages_per_step, progress=on_copy)
+            # Sau khi sao lưu xong, tải tiếp tục đến đủ duration giây
+            switch(f"{name}: sau sao lưu")
+            time.sleep(max(0.0, args.duration - (time.perf_counter() - began)))
+    finally:
+        stop.set()
+        for thread in workers:
+            thread.join()
+        switch(None)
+
+    for label, seconds in spans.items():
+        if label in recorder.samples and seconds > 0:
+            recorder.set(label, "orders_per_s", round(len(recorder.samples[label]) / seconds, 1))
+            recorder.set(label, "seconds", round(seconds, 2))
+    if manifest:
+        copy_label = f"{name}: chép trang"
+        recorder.set(copy_label, "backup_copy_s", manifest["copy"]["seconds"])
+        recorder.set(copy_label, "backup_restarts", manifest["copy"]["restarts"])
+        recorder.set(copy_label, "backup_steps", manifest["copy"]["steps"])
+        recorder.set(f"{name}: nén", "compress_s", manifest["compress_seconds"])
+    return manifest
+
+
+def run(args):
+    from app.database.test_db import create_test_database
+    from app.database.init_db import init_db
+    from app.database.backup import PAGES_PER_STEP, database_path, verify_backup
+    from app.database.db_config import get_db
+    from app.models.models import Table, Staff, MenuItem
+
+    if not os.path.exists(database_path()):
+        create_test_database(scale=args.scale, seed=args.seed, years=args.years)
+    init_db()
+
+    db = get_db()
+    try:
+        fixtures = ([t.id for t in db.query(Table)], [s.id for s in db.query(Staff)],
+                    [m.id for m in db.query(MenuItem)])
+    finally:
+        db.close()
+
+    size_mb = os.path.getsize(database_path()) / 1024 / 1024
+    print(f"Cơ sở dữ liệu {size_mb:,.0f} MB, {args.threads} luồng POS, mỗi pha >= {args.duration}s")
+
+    results = {"environment": environment(), "database_mb": round(size_mb), "scales": {}}
+    manifest = None
+    for mode in args.modes:
+        actual = set_journal_mode(mode)
+        recorder = Recorder()
+        run_phase(recorder, "1 không sao lưu", fixtures, args)
+        run_phase(recorder, "2 sao lưu theo bước", fixtures, args, pages_per_step=args.pages or PAGES_PER_STEP)
+        manifest = run_phase(recorder, "3 sao lưu một bước", fixtures, args, pages_per_step=-1)
+        results["scales"][f"journal_mode={actual}"] = recorder.results()
+    set_journal_mode(args.modes[0])
+
+    print_results(results)
+    if manifest:
+        verified, message = verify_backup(manifest)
+        print(f"\nKhôi phục thử: {message}")
+        results["verified"] = verified
+    save_json(args.output, results)
+    print(f"Đã ghi kết quả vào {args.output}")
+    return results.get("verified", True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Đo ảnh hưởng của sao lưu trực tuyến lên thông lượng đơn hàng")
+    parser.add_argument("--scale", type=float, default=50, help="Hệ số số đơn mỗi ngày của dữ liệu sinh")
+    parser.add_argument("--years", type=float, default=1, help="Số năm dữ liệu lịch sử")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--threads", type=int, default=4, help="Số luồng POS ghi đồng thời")
+    parser.add_argument("--duration", type=float, default=10, help="Thời gian tối thiểu mỗi pha (giây)")
+    parser.add_argument("--pages", type=int, default=None, help="Số trang mỗi bước sao lưu")
+    parser.add_argument("--modes", nargs="+", default=JOURNAL_MODES, help="Các chế độ nhật ký cần đo")
+    parser.add_argument("--workdir", default=None, help="Thư mục chứa cơ sở dữ liệu thử (dùng lại nếu đã có)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+
+    keep = args.workdir is not None
+    args.workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="coffee-backup-"))
+    args.output = os.path.abspath(args.output)
+    os.makedirs(os.path.join(args.workdir, "app", "database"), exist_ok=True)
+    os.chdir(args.workdir)  # DATABASE_URL là đường dẫn tương đối
+    try:
+        passed = run(args)
+    finally:
+        if not keep:
+            shutil.rmtree(args.workdir, ignore_errors=True)
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Benchmark các đường nóng của controller trên cơ sở dữ liệu sinh sẵn ở nhiều quy mô
+
+Với mỗi quy mô, một cơ sở dữ liệu SQLite mới được sinh (app/database/test_db.py, hạt giống
+cố định) trong thư mục tạm và các tải sau được đo trong một tiến trình con riêng:
+  - luồng đơn hàng: create_order + add_item_to_order + complete_order (độ trễ và thông lượng)
+  - get_pending_items khi có đơn đang chờ pha chế
+  - các truy vấn của StatsController
+  - generate_optimal_shifts
+  - tối ưu giá menu bằng thuật toán di truyền (GA) và simulated annealing (SA)
+
+Kết quả (p50/p95/p99) được ghi ra JSON và so sánh với baseline nếu có.
+
+Chạy:
+  python benchmarks/bench_hot_paths.py [--scales 1 10] [--output benchmarks/results/latest.json]
+  python benchmarks/bench_hot_paths.py --save-baseline      # ghi kết quả làm baseline mới
+"""
+
+import argparse
+import importlib.util
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import (Recorder, environment, save_json, load_json, compare, print_results,
+                     print_comparison, DEFAULT_TOLERANCE)
+
+DEFAULT_OUTPUT = os.path.join(ROOT, "benchmarks", "results", "latest.json")
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+ITEMS_PER_ORDER = 3
+PENDING_ORDERS = 20
+SALES_HISTORY_DAYS = 30
+
+
+# ---------------------------------------------------------------------- #
+# Các tải đo (chạy trong tiến trình con, thư mục làm việc chứa cơ sở dữ liệu)
+# ---------------------------------------------------------------------- #
+def load_fixtures():
+    from app.database.db_config import get_db
+    from app.models.models import Table, Staff, MenuItem
+
+    db = get_db()
+    try:
+        tables = [t.id for t in db.query(Table).order_by(Table.id)]
+        staff = db.query(Staff).filter(Staff.is_active == True).order_by(Staff.id).all()
+        menu_items = [
+            {"id": m.id, "name": m.name, "price": m.price, "category_id": m.category_id}
+            for m in db.query(MenuItem).order_by(MenuItem.id)
+        ]
+        return tables, staff, menu_items
+    finally:
+        db.close()
+
+
+def load_sales(days):
+    """Dữ liệu bán hàng cho các bộ tối ưu giá, lấy từ các đơn đã thanh toán gần đây"""
+    from app.database.db_config import get_db
+    from app.models.models import OrderHistory, OrderItemHistory
+    from app.models.status import OrderStatus
+
+    since = datetime.now() - timedelta(days=days)
+    db = get_db()
+    try:
+        rows = db.query(
+            OrderItemHistory.menu_item_id, OrderItemHistory.quantity, OrderItemHistory.unit_price,
+            OrderHistory.order_time, OrderItemHistory.order_id
+        ).join(
+            OrderHistory, OrderHistory.id == OrderItemHistory.order_id
+        ).filter(
+            OrderHistory.status == OrderStatus.PAID,
+            OrderHistory.order_time >= since
+        ).all()
+        return [
+            {"menu_item_id": menu_item_id, "quantity": quantity, "price": unit_price,
+             "date": order_time.strftime("%Y-%m-%d"), "order_id": order_id}
+            for menu_item_id, quantity, unit_price, order_time, order_id in rows
+        ]
+    finally:
+        db.close()
+
+
+def bench_order_flow(recorder, rng, tables, staff, menu_items, orders):
+    from app.controllers.order_controller import OrderController
+
+    menu_ids = [m["id"] for m in menu_items]
+    completed = 0
+    began = time.perf_counter()
+    for i in range(orders):
+        table_id = tables[i % len(tables)]
+        order_id = recorder.measure("order.create_order", OrderController.create_order,
+                                    table_id, staff[i % len(staff)].id)
+        if not order_id:
+            continue
+        for menu_item_id in rng.sample(menu_ids, min(ITEMS_PER_ORDER, len(menu_ids))):
+            recorder.measure("order.add_item_to_order", OrderController.add_item_to_order,
+                             order_id, menu_item_id, rng.randint(1, 3))
+        if recorder.measure("order.complete_order", OrderController.complete_order, order_id):
+            completed += 1
+    elapsed = time.perf_counter() - began
+    recorder.set("order.flow", "orders", completed)
+    recorder.set("order.flow", "orders_per_s", round(completed / elapsed, 2) if elapsed else 0.0)
+
+
+def bench_pending_items(recorder, rng, tables, staff, menu_items, repeat):
+    from app.controllers.order_controller import OrderController
+
+    # Mở sẵn một số đơn đang chờ pha chế như giờ cao điểm
+    menu_ids = [m["id"] for m in menu_items]
+    open_orders = []
+    for i in range(min(PENDING_ORDERS, len(tables))):
+        order_id = OrderController.create_order(tables[i], staff[i % len(staff)].id)
+        if order_id:
+            for menu_item_id in rng.sample(menu_ids, min(ITEMS_PER_ORDER, len(menu_ids))):
+                OrderController.add_item_to_order(order_id, menu_item_id)
+            open_orders.append(order_id)
+
+    try:
+        pending = recorder.repeat("kitchen.get_pending_items", OrderController.get_pending_items, repeat)
+        recorder.set("kitchen.get_pending_items", "rows", len(pending or []))
+    finally:
+        for order_id in open_orders:
+            OrderController.cancel_order(order_id)
+
+
+def bench_stats(recorder, repeat):
+    from app.controllers.stats_controller import StatsController
+
+    # Khoảng ngày giống màn hình thống kê (date, ngày cuối cộng thêm 1)
+    end = datetime.now().date() + timedelta(days=1)
+    month = end - timedelta(days=30)
+    year = end - timedelta(days=365)
+
+    recorder.repeat("stats.revenue_30d", lambda: StatsController.get_revenue_by_date_range(month, end), repeat)
+    recorder.repeat("stats.revenue_365d", lambda: StatsController.get_revenue_by_date_range(year, end), repeat)
+    recorder.repeat("stats.top_selling_items_30d", lambda: StatsController.get_top_selling_items(month, end), repeat)
+    recorder.repeat("stats.hourly_distribution_30d", lambda: StatsController.get_hourly_distribution(30), repeat)
+    recorder.repeat("stats.staff_performance_30d", lambda: StatsController.get_staff_performance(month, end), repeat)
+    recorder.repeat("stats.category_distribution_30d",
+                    lambda: StatsController.get_category_distribution(month, end), repeat)
+    if importlib.util.find_spec("sklearn"):
+        recorder.repeat("stats.predict_revenue", StatsController.predict_revenue, repeat)
+    else:
+        recorder.set("stats.predict_revenue", "skipped", "chưa cài scikit-learn")
+
+
+def bench_shifts(recorder, staff, repeat, timeout):
+    from app.utils.csp_scheduler import generate_optimal_shifts
+
+    today = datetime.now().date()
+    week_start = today + timedelta(days=7 - today.weekday())
+    shifts = recorder.repeat("scheduling.generate_optimal_shifts",
+                             lambda: generate_optimal_shifts(staff, week_start, timeout=timeout), repeat)
+    recorder.set("scheduling.generate_optimal_shifts", "shifts", len(shifts or []))
+
+
+def bench_optimizers(recorder, seed, menu_items, sales_data, repeat):
+    from app.utils.genetic_algorithm import MenuPriceGeneticOptimizer
+    from app.utils.local_search import MenuPriceOptimizer
+
+    def seeded(func):
+        def run():
+            random.seed(seed)
+            np.random.seed(seed)
+            return func()
+        return run
+
+    recorder.repeat("optimizer.genetic_algorithm", seeded(
+        lambda: MenuPriceGeneticOptimizer(menu_items, sales_data).optimize(max_generations=30)
+    ), repeat, warmup=0)
+    recorder.repeat("optimizer.simulated_annealing", seeded(
+        lambda: MenuPriceOptimizer(menu_items, sales_data).optimize_menu_prices(
+            algorithm="simulated_annealing", max_iterations=2000)
+    ), repeat, warmup=0)
+    recorder.set("optimizer.genetic_algorithm", "sales_rows", len(sales_data))
+
+
+def run_worker(args):
+    """Sinh cơ sở dữ liệu cho một quy mô trong thư mục hiện tại rồi chạy toàn bộ các tải"""
+    os.makedirs(os.path.join("app", "database"), exist_ok=True)
+
+    from app.database.test_db import create_test_database
+    from app.database.init_db import init_db
+
+    began = time.perf_counter()
+    create_test_database(scale=args.worker, seed=args.seed, years=args.years)
+    init_db()
+    setup_seconds = time.perf_counter() - began
+
+    rng = random.Random(args.seed)
+    tables, staff, menu_items = load_fixtures()
+    sales_data = load_sales(SALES_HISTORY_DAYS)
+
+    recorder = Recorder()
+    bench_order_flow(recorder, rng, tables, staff, menu_items, args.orders)
+    bench_pending_items(recorder, rng, tables, staff, menu_items, args.repeat)
+    bench_stats(recorder, args.repeat)
+    bench_shifts(recorder, staff, args.repeat, args.shift_timeout)
+    bench_optimizers(recorder, args.seed, menu_items, sales_data, max(3, args.repeat // 5))
+    recorder.set("setup", "generate_seconds", round(setup_seconds, 2))
+
+    save_json(args.result_file, recorder.results())
+
+
+# ---------------------------------------------------------------------- #
+# Điều phối
+# ---------------------------------------------------------------------- #
+def scale_key(scale):
+    return f"{scale:g}"
+
+
+def run_scale(args, scale, workdir):
+    scale_dir = os.path.join(workdir, f"scale-{scale_key(scale)}")
+    shutil.rmtree(scale_dir, ignore_errors=True)
+    os.makedirs(scale_dir)
+    result_file = os.path.join(scale_dir, "result.json")
+    command = [
+        sys.executable, os.path.abspath(__file__), "--worker", str(scale),
+        "--result-file", result_file, "--seed", str(args.seed), "--years", str(args.years),
+        "--orders", str(args.orders), "--repeat", str(args.repeat), "--shift-timeout", str(args.shift_timeout),
+    ]
+    print(f"Đang chạy quy mô {scale_key(scale)} trong {scale_dir} ...")
+    subprocess.run(command, cwd=scale_dir, check=True,
+                   stdout=None if args.verbose else subprocess.DEVNULL)
+    return load_json(result_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 10], help="Các hệ số quy mô dữ liệu")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--years", type=float, default=1, help="Số năm dữ liệu lịch sử")
+    parser.add_argument("--orders", type=int, default=100, help="Số đơn trong luồng đơn hàng")
+    parser.add_argument("--repeat", type=int, default=20, help="Số lần lặp mỗi truy vấn")
+    parser.add_argument("--shift-timeout", type=float, default=10.0, help="Giới hạn thời gian xếp ca (giây)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Tệp JSON kết quả")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Tệp JSON baseline để so sánh")
+    parser.add_argument("--save-baseline", action="store_true", help="Ghi kết quả làm baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Mức chậm đi (tỷ lệ p95) coi là hồi quy")
+    parser.add_argument("--workdir", default=None, help="Thư mục chứa cơ sở dữ liệu sinh ra (mặc định: thư mục tạm)")
+    parser.add_argument("--verbose", action="store_true", help="Hiện log sinh dữ liệu")
+    parser.add_argument("--worker", type=float, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        run_worker(args)
+        return 0
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="coffee-bench-")
+    try:
+        results = {
+            "environment": environment(),
+            "config": {"seed": args.seed, "years": args.years, "orders": args.orders, "repeat": args.repeat},
+            "scales": {scale_key(scale): run_scale(args, scale, workdir) for scale in args.scales},
+        }
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_results(results)
+    save_json(args.output, results)
+    print(f"\nĐã ghi kết quả vào {args.output}")
+
+    if args.save_baseline:
+        save_json(args.baseline, results)
+        print(f"Đã ghi baseline vào {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"Chưa có baseline ({args.baseline}); chạy lại với --save-baseline để tạo")
+        return 0
+
+    rows = compare(results, load_json(args.baseline), args.tolerance)
+    print_comparison(rows)
+    regressions = [row for row in rows if row[-1]]
+    if regressions:
+        print(f"\n{len(regressions)} thao tác chậm hơn baseline quá {args.tolerance:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
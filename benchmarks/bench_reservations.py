@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark chỉ mục đặt bàn và bộ xếp bàn với hàng nghìn lượt đặt
+
+Chạy: python benchmarks/bench_reservations.py [--bookings 5000] [--tables 60]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.utils.interval_index import KeyedIntervalIndex
+from app.utils.table_allocation import allocate_parties, rank_tables
+
+
+def generate_bookings(tables, num_bookings, days, seed):
+    """Sinh các lượt đặt không trùng nhau trên từng bàn"""
+    rng = random.Random(seed)
+    start_day = datetime(2024, 1, 1, 8, 0)
+    index = KeyedIntervalIndex()
+    bookings = []
+    attempts = 0
+    while len(bookings) < num_bookings and attempts < num_bookings * 20:
+        attempts += 1
+        table = rng.choice(tables)
+        start = start_day + timedelta(days=rng.randrange(days), minutes=15 * rng.randrange(52))
+        end = start + timedelta(minutes=rng.choice([45, 60, 90, 120]))
+        if index.overlaps(table["id"], start, end):
+            continue
+        index.add(table["id"], start, end, len(bookings))
+        bookings.append((table["id"], start, end))
+    return index, bookings
+
+
+def naive_overlaps(bookings, table_id, start, end):
+    return any(t == table_id and s < end and e > start for t, s, e in bookings)
+
+
+def timed(label, func, repeat):
+    began = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    elapsed = time.perf_counter() - began
+    print(f"{label:<45} {elapsed / repeat * 1e6:>10.1f} µs/lần")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--bookings", type=int, default=5000)
+    parser.add_argument("--tables", type=int, default=60)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    tables = [{"id": i, "capacity": rng.choice([2, 2, 4, 4, 6, 8])} for i in range(1, args.tables + 1)]
+
+    began = time.perf_counter()
+    index, bookings = generate_bookings(tables, args.bookings, args.days, args.seed)
+    print(f"Đã tạo {len(bookings)} lượt đặt cho {len(tables)} bàn trong {time.perf_counter() - began:.2f}s")
+
+    probe_start = datetime(2024, 1, 1, 8, 0) + timedelta(days=args.days // 2, hours=11)
+    probe_end = probe_start + timedelta(minutes=90)
+
+    # Kiểm tra trùng lịch cho một bàn
+    timed("Kiểm tra trùng (chỉ mục)", lambda: index.overlaps(1, probe_start, probe_end), 10000)
+    timed("Kiểm tra trùng (quét tuyến tính)", lambda: naive_overlaps(bookings, 1, probe_start, probe_end), 100)
+
+    # Truy vấn bàn trống hàng loạt: 4 người từ 19:00 đến 20:30
+    evening = probe_start.replace(hour=19, minute=0)
+    free = timed("Bàn trống cho 4 người 19:00-20:30",
+                 lambda: rank_tables(tables, index, 4, evening, evening + timedelta(minutes=90)), 1000)
+    print(f"  -> {len(free)} bàn phù hợp")
+
+    # Xếp bàn cho 500 nhóm khách
+    parties = [{
+        "num_guests": rng.randint(1, 8),
+        "start": probe_start + timedelta(minutes=15 * rng.randrange(40)),
+    } for _ in range(500)]
+
+    def plan():
+        planning_index = KeyedIntervalIndex()
+        for table_id, start, end in bookings:
+            planning_index.add(table_id, start, end, (table_id, start))
+        return allocate_parties(tables, planning_index, parties, lambda guests: 60 + 10 * guests)
+
+    assignments = timed("Xếp bàn cho 500 nhóm (gồm dựng chỉ mục)", plan, 3)
+    seated = sum(1 for table_id in assignments if table_id is not None)
+    print(f"  -> xếp được {seated}/{len(parties)} nhóm")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Công cụ đo dùng chung cho các benchmark: đo độ trễ, tính phân vị, ghi JSON và so sánh baseline
+"""
+
+import json
+import os
+import platform
+import time
+from datetime import datetime
+
+import numpy as np
+
+# Mức chậm đi (so với baseline) được coi là hồi quy
+DEFAULT_TOLERANCE = 0.25
+
+# Bỏ qua các thao tác quá nhanh: nhiễu đo lớn hơn chênh lệch thật
+MIN_COMPARABLE_MS = 0.5
+
+
+def summarize(samples):
+    """Thống kê độ trễ (ms) của một danh sách mẫu tính bằng giây"""
+    values = np.asarray(samples, dtype=np.float64) * 1000
+    if not len(values):
+        return {"count": 0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "count": int(len(values)),
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+
+
+class Recorder:
+    """Gom mẫu độ trễ theo tên thao tác"""
+
+    def __init__(self):
+        self.samples = {}
+        self.extra = {}
+
+    def measure(self, name, func, *args, **kwargs):
+        """Gọi func một lần, ghi thời gian chạy và trả về kết quả của func"""
+        began = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.samples.setdefault(name, []).append(time.perf_counter() - began)
+        return result
+
+    def repeat(self, name, func, times, warmup=1):
+        """Chạy func `times` lần (sau `warmup` lần khởi động không tính)"""
+        for _ in range(warmup):
+            func()
+        result = None
+        for _ in range(times):
+            result = self.measure(name, func)
+        return result
+
+    def set(self, name, key, value):
+        """Ghi thêm một chỉ số không phải độ trễ (ví dụ thông lượng)"""
+        self.extra.setdefault(name, {})[key] = value
+
+    def results(self):
+        results = {name: summarize(samples) for name, samples in self.samples.items()}
+        for name, values in self.extra.items():
+            results.setdefault(name, {}).update(values)
+        return results
+
+
+def environment():
+    """Thông tin máy chạy, lưu kèm kết quả để đối chiếu baseline"""
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def save_json(path, data):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+def load_json(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(current, baseline, tolerance=DEFAULT_TOLERANCE, metric="p95_ms"):
+    """
+    So sánh kết quả với baseline theo từng quy mô và thao tác
+
+    Returns:
+        list: [(scale, name, baseline_ms, current_ms, ratio, regressed)] cho các thao tác có ở cả hai
+    """
+    rows = []
+    for scale, operations in sorted(current.get("scales", {}).items()):
+        baseline_operations = baseline.get("scales", {}).get(scale, {})
+        for name, stats in sorted(operations.items()):
+            before = baseline_operations.get(name, {}).get(metric)
+            after = stats.get(metric)
+            if before is None or after is None:
+                continue
+            ratio = after / before if before else float("inf")
+            regressed = ratio > 1 + tolerance and after >= MIN_COMPARABLE_MS
+            rows.append((scale, name, before, after, ratio, regressed))
+    return rows
+
+
+def print_results(results):
+    for scale, operations in sorted(results.get("scales", {}).items()):
+        print(f"\nQuy mô {scale}")
+        print(f"  {'Thao tác':<40} {'n':>5} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+        for name, stats in sorted(operations.items()):
+            if "p50_ms" in stats:
+                print(f"  {name:<40} {stats['count']:>5} {stats['p50_ms']:>10.2f} "
+                      f"{stats['p95_ms']:>10.2f} {stats['p99_ms']:>10.2f}")
+            else:
+                print(f"  {name:<40}")
+            for key, value in sorted(stats.items()):
+                if not key.endswith("_ms") and key != "count":
+                    print(f"  {'':<40} {key} = {value}")
+
+
+def print_comparison(rows, metric="p95_ms"):
+    print(f"\nSo sánh với baseline ({metric})")
+    print(f"  {'Quy mô':<8} {'Thao tác':<40} {'baseline':>10} {'hiện tại':>10} {'tỷ lệ':>7}")
+    for scale, name, before, after, ratio, regressed in rows:
+        flag = "  <-- CHẬM HƠN" if regressed else ""
+        print(f"  {scale:<8} {name:<40} {before:>10.2f} {after:>10.2f} {ratio:>7.2f}{flag}")
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Kiểm tra tải ghi đồng thời: không được mất cập nhật (lost update) trên Order và Inventory
+
+Một cơ sở dữ liệu mới được tạo trong thư mục tạm. Nhiều tiến trình con (mỗi tiến trình một hàng đợi
+ghi và kết nối SQLite riêng, giống nhiều máy POS) cùng chạy nhiều luồng liên tục:
+  - thêm món vào cùng một đơn hàng (order.total_amount += ...)
+  - tăng/giảm số lượng của cùng một nguyên liệu (inventory.quantity += ...)
+Mỗi tiến trình đếm các thao tác thành công; cuối cùng tổng tiền đơn hàng và số lượng tồn kho
+phải khớp đúng tổng các thao tác thành công. Ngoài ra kiểm tra hai lần sửa dựa trên cùng một
+phiên bản: lần sau phải nhận Conflict.
+
+Chạy: python benchmarks/stress_concurrency.py [--processes 3] [--threads 8] [--ops 150]
+Mã thoát khác 0 nếu phát hiện mất cập nhật.
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+# Thao tác thêm món chiếm tỉ lệ này, còn lại là điều chỉnh kho
+ADD_ITEM_RATE = 0.6
+TOLERANCE = 1e-6
+
+
+# ---------------------------------------------------------------------- #
+# Tiến trình con (thư mục làm việc chứa cơ sở dữ liệu)
+# ---------------------------------------------------------------------- #
+def run_worker(args):
+    from app.controllers.order_controller import OrderController
+    from app.controllers.inventory_controller import InventoryController
+    from app.controllers.menu_controller import MenuController
+    from app.database.write_queue import write_queue
+
+    prices = {item.id: item.price for item in MenuController.get_all_items()}
+    menu_ids = sorted(prices)
+    lock = threading.Lock()
+    totals = {"amount": 0.0, "stock": 0.0, "ok": 0, "failed": 0}
+
+    def thread_main(seed):
+        rng = random.Random(seed)
+        amount = stock = 0.0
+        ok = failed = 0
+        for _ in range(args.ops):
+            if rng.random() < ADD_ITEM_RATE:
+                menu_item_id = rng.choice(menu_ids)
+                quantity = rng.randint(1, 3)
+                if OrderController.add_item_to_order(args.order_id, menu_item_id, quantity):
+                    amount += prices[menu_item_id] * quantity
+                    ok += 1
+                else:
+                    failed += 1
+            else:
+                delta = rng.choice([-1, -0.5, 0.5, 1, 2])
+                if InventoryController.adjust_inventory_quantity(args.inventory_id, delta):
+                    stock += delta
+                    ok += 1
+                else:
+                    failed += 1
+        with lock:
+            totals["amount"] += amount
+            totals["stock"] += stock
+            totals["ok"] += ok
+            totals["failed"] += failed
+
+    threads = [threading.Thread(target=thread_main, args=(args.seed * 1000 + i,)) for i in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = write_queue.stats()
+    totals["write_queue"] = {key: stats[key] for key in
+                             ("commits", "units_per_commit", "busy_retries", "conflict_retries", "conflicts")}
+    print(json.dumps(totals))
+
+
+# ---------------------------------------------------------------------- #
+# Tiến trình điều phối
+# ---------------------------------------------------------------------- #
+def check_stale_version(inventory_id):
+    """Hai máy cùng đọc một phiên bản rồi cùng sửa: chỉ lần đầu được ghi"""
+    from app.controllers.inventory_controller import InventoryController
+    from app.database.concurrency import Conflict
+
+    item = InventoryController.get_inventory_item(inventory_id)
+    first = InventoryController.update_inventory_quantity(inventory_id, item.quantity + 10,
+                                                          expected_version=item.version)
+    second = InventoryController.update_inventory_quantity(inventory_id, item.quantity + 20,
+                                                           expected_version=item.version)
+    current = InventoryController.get_inventory_item(inventory_id)
+    passed = first is True and isinstance(second, Conflict) and abs(current.quantity - (item.quantity + 10)) < TOLERANCE
+    print(f"Sửa theo phiên bản cũ: lần 1={first}, lần 2={second!r} -> {'ĐẠT' if passed else 'LỖI'}")
+    return passed
+
+
+def run(args):
+    from app.database.init_db import init_db
+    from app.database.db_config import get_db
+    from app.models.models import Order, OrderItem, Inventory
+    from app.controllers.order_controller import OrderController
+    from app.controllers.inventory_controller import InventoryController
+    from sqlalchemy import func
+
+    init_db()
+    start_stock = 1000.0
+    order_id = OrderController.create_order(1, 1)
+    inventory_id = InventoryController.add_inventory_item("Cà phê hạt (thử tải)", start_stock, "kg")
+
+    print(f"{args.processes} tiến trình x {args.threads} luồng x {args.ops} thao tác "
+          f"trên đơn #{order_id} và nguyên liệu #{inventory_id}")
+    command = [sys.executable, os.path.abspath(__file__), "--worker", "--order-id", str(order_id),
+               "--inventory-id", str(inventory_id), "--threads", str(args.threads), "--ops", str(args.ops)]
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    began = time.perf_counter()
+    workers = [subprocess.Popen(command + ["--seed", str(seed)], stdout=subprocess.PIPE, env=env, text=True)
+               for seed in range(1, args.processes + 1)]
+    results = []
+    for worker in workers:
+        output, _ = worker.communicate()
+        if worker.returncode != 0:
+            print(f"Tiến trình con lỗi (mã {worker.returncode})")
+            return False
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    elapsed = time.perf_counter() - began
+
+    expected_amount = sum(result["amount"] for result in results)
+    expected_stock = start_stock + sum(result["stock"] for result in results)
+    operations = sum(result["ok"] for result in results)
+    db = get_db()
+    try:
+        order = db.query(Order).filter(Order.id == order_id).first()
+        items_total = db.query(func.sum(OrderItem.line_total)).filter(OrderItem.order_id == order_id).scalar() or 0
+        stock = db.query(Inventory.quantity).filter(Inventory.id == inventory_id).scalar()
+        order_total, order_version = order.total_amount, order.version
+    finally:
+        db.close()
+
+    print(f"{operations} thao tác thành công, {sum(r['failed'] for r in results)} thất bại "
+          f"trong {elapsed:.1f}s ({operations / elapsed:.0f} thao tác/s)")
+    for index, result in enumerate(results, 1):
+        print(f"  tiến trình {index}: {result['write_queue']}")
+    checks = [
+        ("Tổng tiền đơn = tổng các lần thêm món", order_total, expected_amount),
+        ("Tổng tiền đơn = tổng line_total", order_total, items_total),
+        ("Tồn kho = ban đầu + tổng điều chỉnh", stock, expected_stock),
+    ]
+    passed = True
+    for label, actual, expected in checks:
+        ok = abs(actual - expected) < TOLERANCE
+        passed &= ok
+        print(f"{label:<40} {actual:>14,.2f} / {expected:>14,.2f} -> {'ĐẠT' if ok else 'LỖI'}")
+    print(f"Phiên bản đơn hàng cuối: {order_version}")
+    return check_stale_version(inventory_id) and passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kiểm tra mất cập nhật khi ghi đồng thời")
+    parser.add_argument("--processes", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=150, help="Số thao tác mỗi luồng")
+    parser.add_argument("--workdir", default=None, help="Thư mục chứa cơ sở dữ liệu thử (mặc định: thư mục tạm)")
+    parser.add_argument("--keep", action="store_true", help="Giữ lại thư mục thử")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--order-id", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--inventory-id", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--seed", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="coffee-stress-")
+    os.makedirs(os.path.join(workdir, "app", "database"), exist_ok=True)
+    os.chdir(workdir)  # DATABASE_URL là đường dẫn tương đối
+    try:
+        passed = run(args)
+    finally:
+        if not args.keep and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    print("KẾT QUẢ:", "ĐẠT" if passed else "LỖI")
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Xuất lịch sử đơn hàng sang kho dạng cột (Parquet nếu có pyarrow, ngược lại .npy) theo tháng
+
+Chạy: python scripts/export_columnar.py [--dir app/database/columnar] [--force]
+"""
+import argparse
+import os
+import sys
+
+# Thêm thư mục gốc vào Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database.init_db import init_db
+from app.controllers.export_controller import ExportController
+from app.utils.columnar_store import DEFAULT_STORE_DIR, parquet_available
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dir", default=DEFAULT_STORE_DIR, help="Thư mục kho dạng cột")
+    parser.add_argument("--force", action="store_true", help="Ghi lại toàn bộ các tháng")
+    args = parser.parse_args()
+
+    # Đảm bảo lược đồ (view hợp nhất, ...) đã được nâng cấp
+    init_db()
+
+    print(f"Định dạng: {'Parquet' if parquet_available() else 'NumPy .npy (memmap)'}")
+    success, message = ExportController.export_order_history(args.dir, force=args.force)
+    print(message)
+    return 0 if success else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
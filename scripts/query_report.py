@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+In báo cáo đo truy vấn từ tệp JSON đã ghi (menu "Báo cáo truy vấn" hoặc registry.dump())
+
+Chạy: python scripts/query_report.py [--file app/database/query_report.json] [--limit 15]
+
+Bật đo khi chạy phần mềm: COFFEE_INSTRUMENT=1 [COFFEE_SLOW_QUERY_MS=100] python -m app.main
+"""
+import argparse
+import json
+import os
+import sys
+
+# Thêm thư mục gốc vào Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.instrumentation import DEFAULT_REPORT_PATH, format_report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", default=DEFAULT_REPORT_PATH, help="Tệp JSON báo cáo")
+    parser.add_argument("--limit", type=int, default=15, help="Số phương thức/truy vấn hiển thị")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.file):
+        print(f"Không tìm thấy {args.file}")
+        return 1
+
+    with open(args.file, encoding="utf-8") as f:
+        snapshot = json.load(f)
+    print(format_report(snapshot, args.limit))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
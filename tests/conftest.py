@@ -0,0 +1,38 @@
+"""
+Tiện ích dùng chung cho kiểm thử
+
+Engine gắn với đường dẫn app/database/*.db (tính từ thư mục làm việc lúc import) nên các kịch bản
+cần cơ sở dữ liệu chạy trong một tiến trình con ở thư mục tạm, với cơ sở dữ liệu mới do init_db tạo.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def run_scenario(tmp_path):
+    """
+    Chạy setup + script trong thư mục tạm; script gán kết quả (giá trị JSON được) vào biến result
+
+    Returns:
+        callable: run(script, setup="") -> result
+    """
+    def run(script, setup=""):
+        os.makedirs(tmp_path / "app" / "database", exist_ok=True)
+        code = (textwrap.dedent(setup) + textwrap.dedent(script)
+                + "\nimport json\nprint(json.dumps(result, default=str))\n")
+        env = {**os.environ, "PYTHONPATH": ROOT}
+        env.pop("COFFEE_SERVICE_URL", None)
+        completed = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=env,
+                                   capture_output=True, text=True, timeout=300)
+        assert completed.returncode == 0, completed.stderr
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+
+    return run
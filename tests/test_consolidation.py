@@ -0,0 +1,86 @@
+"""
+Hợp nhất chi nhánh tăng dần qua một lần bảo trì nền
+
+Mỗi kịch bản chạy trong thư mục tạm (run_scenario, xem conftest): cơ sở dữ liệu mới do init_db
+tạo, đồng thời là tệp của chi nhánh duy nhất.
+"""
+
+SETUP = """
+import os
+from datetime import datetime, timedelta
+from app.database.db_config import get_db, get_analytics_db
+from app.database.init_db import init_db
+from app.database.change_log import compact
+from app.database.consolidation import register_branch, consolidate
+from app.database.maintenance import run_maintenance, OUTBOX_RETENTION_DAYS
+from app.controllers.order_controller import OrderController
+from app.models.models import BranchOrder, ChangeRecord, Staff, Table
+
+init_db()
+ok, message = register_branch("Q1", os.path.join("app", "database", "coffee_management.db"))
+assert ok, message
+
+def open_order():
+    db = get_db()
+    try:
+        table_id = db.query(Table.id).order_by(Table.id).first()[0]
+        staff_id = db.query(Staff.id).order_by(Staff.id).first()[0]
+    finally:
+        db.close()
+    return OrderController.create_order(table_id, staff_id)
+
+def consolidated_order_ids():
+    db = get_analytics_db()
+    try:
+        return [order_id for (order_id,) in db.query(BranchOrder.id)]
+    finally:
+        db.close()
+
+def outbox_seqs():
+    db = get_db()
+    try:
+        return [seq for (seq,) in db.query(ChangeRecord.seq).order_by(ChangeRecord.seq)]
+    finally:
+        db.close()
+"""
+
+
+def test_sync_stays_incremental_across_maintenance(run_scenario):
+    result = run_scenario("""
+        first = consolidate()["Q1"]
+        # Đơn mở giữa lần hợp nhất trước và lần bảo trì không được làm mất mốc tăng dần
+        order_id = open_order()
+        maintenance = run_maintenance()
+        second = consolidate()["Q1"]
+        result = {"first": first, "second": second, "order_id": order_id,
+                  "maintenance_error": maintenance["error"], "orders": consolidated_order_ids()}
+    """, SETUP)
+
+    assert result["first"]["error"] is None
+    assert result["first"]["mode"] == "full"
+    assert result["maintenance_error"] is None
+    assert result["second"]["error"] is None
+    assert result["second"]["mode"] == "incremental"
+    assert result["order_id"] in result["orders"]
+
+
+def test_compact_keeps_retention_window(run_scenario):
+    result = run_scenario("""
+        open_order()
+        db = get_db()
+        db.add(ChangeRecord(table_name="orders", row_id=0, op="U",
+                            changed_at=datetime.now() - timedelta(days=OUTBOX_RETENTION_DAYS + 1)))
+        db.commit()
+        db.close()
+        expired_seq = outbox_seqs()[-1]
+        open_order()
+        before = outbox_seqs()
+        deleted = compact(OUTBOX_RETENTION_DAYS)
+        result = {"expired_seq": expired_seq, "before": before, "after": outbox_seqs(), "deleted": deleted}
+    """, SETUP)
+
+    # Chỉ dòng cũ hơn khoảng giữ lại (và các dòng trước nó) bị xóa, dòng mới hơn còn nguyên
+    kept = [seq for seq in result["before"] if seq > result["expired_seq"]]
+    assert kept
+    assert result["after"] == kept
+    assert result["deleted"] == len(result["before"]) - len(kept)
@@ -0,0 +1,56 @@
+"""
+Phân trang keyset của FeedbackController.get_all_feedbacks trên các cột điểm có thể NULL
+"""
+
+from app.controllers.feedback_controller import SORTABLE_COLUMNS
+
+SETUP = """
+from app.database.db_config import get_db
+from app.database.init_db import init_db
+from app.controllers.feedback_controller import FeedbackController, SORTABLE_COLUMNS
+from app.controllers.order_controller import OrderController
+from app.models.models import Staff
+
+init_db()
+db = get_db()
+staff_id = db.query(Staff.id).order_by(Staff.id).first()[0]
+db.close()
+
+# Điểm thành phần NULL xen kẽ, nhiều giá trị trùng để thứ tự phụ thuộc id
+RATINGS = [(5, None, 4, None), (4, 3, None, 2), (3, None, None, None), (5, 3, 4, 5),
+           (1, 1, None, 1), (2, None, 2, None), (4, 5, 5, 5), (5, None, None, 3),
+           (3, 3, 3, None), (2, 2, None, 2), (4, None, 1, None), (1, 4, 4, 4), (5, None, None, None)]
+for rating, service, food, ambience in RATINGS:
+    order_id = OrderController.create_online_order(staff_id, "Khách", "0900000000")
+    assert FeedbackController.add_feedback(order_id, rating, service_rating=service,
+                                           food_rating=food, ambience_rating=ambience)
+
+def paged_ids(sort_by, sort_dir, page_size=3):
+    ids, after = [], None
+    while True:
+        page = FeedbackController.get_all_feedbacks(limit=page_size, sort_by=sort_by,
+                                                    sort_dir=sort_dir, after=after)
+        if not page:
+            return ids
+        ids.extend(feedback.id for feedback in page)
+        after = (getattr(page[-1], sort_by), page[-1].id)
+"""
+
+PAGING = """
+result = {}
+for sort_by in SORTABLE_COLUMNS:
+    for sort_dir in ("asc", "desc"):
+        full = [feedback.id for feedback in FeedbackController.get_all_feedbacks(
+            limit=1000, sort_by=sort_by, sort_dir=sort_dir)]
+        result[f"{sort_by} {sort_dir}"] = {"full": full, "paged": paged_ids(sort_by, sort_dir)}
+"""
+
+
+def test_keyset_pages_cover_null_ratings(run_scenario):
+    result = run_scenario(PAGING, SETUP)
+
+    assert set(result) == {f"{column} {direction}" for column in SORTABLE_COLUMNS for direction in ("asc", "desc")}
+    for order, ids in result.items():
+        assert len(ids["full"]) == 13, order
+        # Đi hết các trang theo con trỏ phải được đúng thứ tự của một lần đọc toàn bộ, không mất/lặp dòng
+        assert ids["paged"] == ids["full"], order
@@ -0,0 +1,46 @@
+"""
+Tối ưu lịch ca nhiều tuần (optimize_shifts không có lịch khởi đầu)
+"""
+
+from collections import Counter, defaultdict
+from datetime import date, time, timedelta
+from types import SimpleNamespace
+
+from app.utils.csp_scheduler import STANDARD_SHIFTS
+from app.utils.roster_scheduler import COVERAGE_ROLES
+from app.utils.shift_optimizer import optimize_shifts
+
+ROLES = ["Pha chế", "Thu ngân", "Phục vụ", "Phục vụ"]
+START = date(2026, 10, 19)  # thứ Hai
+WEEKS = 4
+MAX_SHIFTS_PER_WEEK = 5
+
+
+def test_four_week_horizon_with_forty_staff():
+    staff = [SimpleNamespace(id=i + 1, role=ROLES[i % len(ROLES)]) for i in range(40)]
+
+    shifts, summary = optimize_shifts(
+        staff, START, [2] * 24, weeks=WEEKS, max_shifts_per_week=MAX_SHIFTS_PER_WEEK,
+        time_budget=0.5, seed=1, coverage_roles=COVERAGE_ROLES
+    )
+
+    assert shifts
+    assert summary["iterations"] > 0
+
+    weekly = Counter((shift["staff_id"], (shift["date"] - START).days // 7) for shift in shifts)
+    assert max(weekly.values()) <= MAX_SHIFTS_PER_WEEK
+
+    # Lịch khởi đầu từ solve_roster giữ đủ vai trò bắt buộc trong từng ca mẫu
+    role_of = {member.id: member.role for member in staff}
+    covered = defaultdict(set)
+    for shift in shifts:
+        key = (shift["date"], shift["start_time"].time(), shift["end_time"].time())
+        covered[key].add(role_of[shift["staff_id"]])
+    for day in range(WEEKS * 7):
+        shift_date = START + timedelta(days=day)
+        for template in STANDARD_SHIFTS:
+            if not template["min_per_role"]:
+                continue
+            key = (shift_date, time(template["start_hour"], template["start_minute"]),
+                   time(template["end_hour"], template["end_minute"]))
+            assert set(COVERAGE_ROLES) <= covered[key]